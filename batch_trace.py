@@ -0,0 +1,447 @@
+#!/bin/env python3
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from argparse import ArgumentParser
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from glob import glob
+from hashlib import sha256
+from os import makedirs, replace
+from os.path import join as joinpath, basename, splitext, isdir, isfile
+from time import perf_counter
+import json
+import sys
+import traceback
+import numpy as np
+import numpy.typing as npt
+from field import FIELD_FILE_EXTENSION, BINARY_FIELD_FILE_EXTENSION, INTEGRATOR_EULER
+from field_journal import read_field_file, journaled_field_file_hash
+from headless_trace import trace_viewport, trace_store_params, write_viewport_lines, add_trace_arguments, DTYPES, OUTPUT_FORMATS
+from field_line_tiles import tile_trace_margin
+from recalculation_worker import TraceConfig
+from viewport import Viewport
+from settings import load_settings
+from metrics import metrics
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows, so worker memory can't be limited
+
+
+RESULT_INFO_EXTENSION: str = ".info.json"
+
+SUMMARY_FILENAME: str = "summary.json"
+
+DEFAULT_MAX_TASKS_PER_WORKER: int = 50
+"""How many scenarios each worker process traces before being replaced, so memory that a worker's scenarios leave allocated is returned"""
+
+STATUS_TRACED: str = "traced"
+STATUS_CACHED: str = "cached"
+STATUS_FAILED: str = "failed"
+
+
+class BatchConfig:
+    """How every scenario of a batch is traced and written
+
+Parameters:
+
+    base_config - the values to trace the lines with, for the default scale
+
+    origin - the world-space position shown at the bottom-left corner of the viewport
+
+    zoom_level - the zoom level of the viewport
+
+    width - the width of the viewport in pixels
+
+    height - the height of the viewport in pixels
+
+    integrator - the method to step along the lines with. See Field.trace_field_lines
+
+    dtype - the floating-point type to trace the lines' positions with
+
+    output_format - one of OUTPUT_FORMATS
+"""
+
+    def __init__(self,
+                 base_config: TraceConfig,
+                 origin: Sequence[float] = (0.0, 0.0),
+                 zoom_level: int = 0,
+                 width: int = 720,
+                 height: int = 480,
+                 integrator: str = INTEGRATOR_EULER,
+                 dtype: npt.DTypeLike = float,
+                 output_format: str = "npz"):
+
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Unknown output format")
+
+        self.base_config = base_config
+        self.origin = tuple(float(v) for v in origin)
+        self.zoom_level = zoom_level
+        self.width = width
+        self.height = height
+        self.integrator = integrator
+        self.dtype = dtype
+        self.output_format = output_format
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        """The JSON-serializable parameters that results depend on"""
+
+        params = trace_store_params(self.base_config, self.integrator, self.dtype, tile_trace_margin(self.width, self.height))
+
+        params["viewport"] = [list(self.origin), self.zoom_level, self.width, self.height]
+        params["output_format"] = self.output_format
+
+        return params
+
+    @property
+    def params_hash(self) -> str:
+        return sha256(json.dumps(self.params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def find_scenarios(inputs: Sequence[str]) -> List[str]:
+    """Finds the field files to trace, from directories (whose field files are all traced) and glob patterns, without duplicates and in sorted order"""
+
+    filenames = set()
+
+    for pattern in inputs:
+
+        if isdir(pattern):
+            matches = glob(joinpath(pattern, "*" + FIELD_FILE_EXTENSION)) + glob(joinpath(pattern, "*" + BINARY_FIELD_FILE_EXTENSION))
+        else:
+            matches = glob(pattern, recursive=True)
+
+        filenames.update(filename for filename in matches if isfile(filename))
+
+    return sorted(filenames)
+
+
+def scenario_name(field_filename: str) -> str:
+    return splitext(basename(field_filename))[0]
+
+
+def result_filename(out_dir: str, field_filename: str, config: BatchConfig) -> str:
+    return joinpath(out_dir, scenario_name(field_filename) + "." + config.output_format)
+
+
+def result_info_filename(result_filename: str) -> str:
+    """The file next to a result that records what the result was traced from, so it can be reused while still valid"""
+    return result_filename + RESULT_INFO_EXTENSION
+
+
+def is_result_valid(field_filename: str, result_filename: str, config: BatchConfig) -> bool:
+    """Whether a scenario's result file was traced from the scenario's current field file and journal with the same configuration"""
+
+    info_filename = result_info_filename(result_filename)
+
+    if not (isfile(result_filename) and isfile(info_filename)):
+        return False
+
+    try:
+        with open(info_filename, "r") as file:
+            info = json.load(file)
+    except (OSError, ValueError):
+        return False
+
+    return (info.get("params_hash") == config.params_hash) and (info.get("field_file_hash") == journaled_field_file_hash(field_filename))
+
+
+# Workers
+
+def _init_worker(max_memory: Optional[int]) -> None:
+
+    if (max_memory is not None) and (resource is not None):
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+
+def _create_executor(workers: int, max_tasks_per_worker: int, max_worker_memory: Optional[int]) -> ProcessPoolExecutor:
+
+    executor_kwargs: Dict[str, Any] = {}
+
+    if sys.version_info >= (3, 11):
+        executor_kwargs["max_tasks_per_child"] = max_tasks_per_worker
+
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(max_worker_memory,),
+        **executor_kwargs
+    )
+
+
+def _failed_report(field_filename: str, e: BaseException) -> Dict[str, Any]:
+    """The report of a scenario whose worker itself failed (eg. it was killed)"""
+    return {
+        "scenario": field_filename,
+        "status": STATUS_FAILED,
+        "seconds": 0.0,
+        "error": "".join(traceback.format_exception_only(type(e), e)).strip(),
+    }
+
+
+def run_scenario(field_filename: str, out_filename: str, config: BatchConfig) -> Dict[str, Any]:
+    """Traces a scenario and writes its result and the result's info file
+
+Returns:
+
+    report - the scenario's entry in the batch summary
+"""
+
+    start_time = perf_counter()
+
+    try:
+
+        file_hash = journaled_field_file_hash(field_filename)
+
+        field = read_field_file(field_filename)
+
+        viewport_lines = trace_viewport(
+            field,
+            Viewport(config.origin, config.zoom_level),
+            config.width,
+            config.height,
+            base_config=config.base_config,
+            integrator=config.integrator,
+            dtype=config.dtype
+        )
+
+        # N.B. the result is written to a temporary file first so an interrupted batch never leaves a partial result
+
+        temp_filename = splitext(out_filename)[0] + ".tmp." + config.output_format
+        write_viewport_lines(temp_filename, viewport_lines, config.output_format)
+        replace(temp_filename, out_filename)
+
+        with open(result_info_filename(out_filename), "w") as file:
+            json.dump({
+                "field": field_filename,
+                "field_file_hash": file_hash,
+                "params_hash": config.params_hash,
+                "params": config.params,
+            }, file)
+
+    except MemoryError:
+        return {
+            "scenario": field_filename,
+            "status": STATUS_FAILED,
+            "seconds": perf_counter() - start_time,
+            "error": "Ran out of memory",
+        }
+
+    except Exception as e:
+        return {
+            "scenario": field_filename,
+            "status": STATUS_FAILED,
+            "seconds": perf_counter() - start_time,
+            "error": "".join(traceback.format_exception_only(type(e), e)).strip(),
+        }
+
+    return {
+        "scenario": field_filename,
+        "status": STATUS_TRACED,
+        "seconds": perf_counter() - start_time,
+        "result": out_filename,
+        "line_count": viewport_lines.lines.line_count,
+        "point_count": int(viewport_lines.lines.offsets[-1]),
+    }
+
+
+def run_batch(field_filenames: Sequence[str],
+              out_dir: str,
+              config: BatchConfig,
+              workers: int = 1,
+              max_tasks_per_worker: int = DEFAULT_MAX_TASKS_PER_WORKER,
+              max_worker_memory: Optional[int] = None,
+              force: bool = False) -> Dict[str, Any]:
+    """Traces many scenarios with the same configuration, writing a result file for each and a summary of the batch.
+
+Scenarios whose results are still valid (traced from the same field file contents with the same configuration) are skipped. \
+Scenarios are traced in a pool of worker processes. Each worker is replaced after tracing a number of scenarios and can have its memory limited, \
+so one large scenario can't exhaust the machine's memory and a scenario failing doesn't stop the batch. \
+If a worker crashes, breaking the pool, the pool is replaced and the scenarios that were being traced are retried one at a time, \
+so that only the scenario that crashed its worker is reported as failed
+
+Parameters:
+
+    field_filenames - the field files of the scenarios
+
+    out_dir - the directory to write the results and the summary to
+
+    config - how to trace and write each scenario
+
+    workers (default 1) - how many processes to trace scenarios in
+
+    max_tasks_per_worker (optional) - how many scenarios each worker traces before being replaced. \
+Workers are only replaced from Python 3.11, as ProcessPoolExecutor can't replace them before then
+
+    max_worker_memory (optional) - the most memory (in bytes) each worker can allocate. Only supported where the resource module is available
+
+    force (default False) - whether to trace scenarios even if their results are still valid
+
+Returns:
+
+    summary - the summary of the batch, which is also written to SUMMARY_FILENAME in out_dir
+"""
+
+    names = [scenario_name(filename) for filename in field_filenames]
+
+    if len(set(names)) != len(names):
+        raise ValueError("Scenarios must have distinct file names")
+
+    makedirs(out_dir, exist_ok=True)
+
+    start_time = perf_counter()
+
+    reports: Dict[str, Dict[str, Any]] = {}
+    pending: List[str] = []
+
+    for field_filename in field_filenames:
+
+        out_filename = result_filename(out_dir, field_filename, config)
+
+        if (not force) and is_result_valid(field_filename, out_filename, config):
+            reports[field_filename] = {
+                "scenario": field_filename,
+                "status": STATUS_CACHED,
+                "seconds": 0.0,
+                "result": out_filename,
+            }
+            metrics.increment(f"batch.{STATUS_CACHED}")
+        else:
+            pending.append(field_filename)
+
+    def record(field_filename: str, report: Dict[str, Any]) -> None:
+
+        reports[field_filename] = report
+
+        metrics.increment(f"batch.{report['status']}")
+        metrics.observe("batch.scenario", report["seconds"] * 1000, unit="ms")
+
+        print(f"{report['status']:>7} {report['seconds']:8.2f}s {field_filename}")
+
+    def submit(executor: ProcessPoolExecutor, field_filename: str) -> "Future[Dict[str, Any]]":
+        return executor.submit(run_scenario, field_filename, result_filename(out_dir, field_filename, config), config)
+
+    while len(pending) > 0:
+
+        # The scenarios that were being traced when the pool broke, and the error they failed with. Any of them could have crashed its worker
+        interrupted: List[Tuple[str, BrokenProcessPool]] = []
+
+        with _create_executor(workers, max_tasks_per_worker, max_worker_memory) as executor:
+
+            # N.B. only as many scenarios as there are workers are submitted at once, so that when the pool breaks only they need retrying
+
+            futures: Dict["Future[Dict[str, Any]]", str] = {}
+
+            while ((len(pending) > 0) or (len(futures) > 0)) and (len(interrupted) == 0):
+
+                while (len(pending) > 0) and (len(futures) < workers):
+                    field_filename = pending.pop(0)
+                    futures[submit(executor, field_filename)] = field_filename
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+                # Once the pool has broken, all of its futures fail
+                if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                    done, _ = wait(futures)
+
+                for future in done:
+
+                    field_filename = futures.pop(future)
+
+                    try:
+                        record(field_filename, future.result())
+                    except BrokenProcessPool as e:
+                        interrupted.append((field_filename, e))
+                    except Exception as e:
+                        record(field_filename, _failed_report(field_filename, e))
+
+        if len(interrupted) == 1:
+            record(interrupted[0][0], _failed_report(*interrupted[0]))
+            continue
+
+        for field_filename, _ in interrupted:
+
+            with _create_executor(1, max_tasks_per_worker, max_worker_memory) as executor:
+
+                try:
+                    record(field_filename, submit(executor, field_filename).result())
+                except Exception as e:
+                    record(field_filename, _failed_report(field_filename, e))
+
+    scenario_reports = [reports[field_filename] for field_filename in field_filenames]
+    traced_seconds = np.array([report["seconds"] for report in scenario_reports if report["status"] == STATUS_TRACED])
+
+    summary = {
+        "params": config.params,
+        "scenario_count": len(scenario_reports),
+        "traced_count": sum(1 for report in scenario_reports if report["status"] == STATUS_TRACED),
+        "cached_count": sum(1 for report in scenario_reports if report["status"] == STATUS_CACHED),
+        "failed_count": sum(1 for report in scenario_reports if report["status"] == STATUS_FAILED),
+        "wall_seconds": perf_counter() - start_time,
+        "traced_seconds_total": float(np.sum(traced_seconds)),
+        "traced_seconds_max": float(np.max(traced_seconds)) if traced_seconds.shape[0] > 0 else 0.0,
+        "scenarios": scenario_reports,
+    }
+
+    with open(joinpath(out_dir, SUMMARY_FILENAME), "w") as file:
+        json.dump(summary, file, indent=2)
+
+    return summary
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Trace the field lines of many field files without a display")
+    parser.add_argument("inputs", nargs="+", help="directories of field files, or glob patterns of field files, to trace")
+    parser.add_argument("-o", "--out-dir", required=True, help="the directory to write the results and the summary to")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="npz", help="the format to write each scenario's lines in")
+    parser.add_argument("--workers", type=int, default=1, help="how many processes to trace scenarios in")
+    parser.add_argument("--max-tasks-per-worker", type=int, default=DEFAULT_MAX_TASKS_PER_WORKER, help="how many scenarios each worker traces before being replaced")
+    parser.add_argument("--max-worker-memory", type=float, default=None, help="the most memory (in MiB) each worker can allocate")
+    parser.add_argument("--force", action="store_true", help="trace scenarios even if their results are still valid")
+    parser.add_argument("--metrics", default=None, help="a file to write a snapshot of the batch's metrics to, as JSON")
+    add_trace_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    if args.settings is not None:
+        load_settings(args.settings)
+
+    metrics.enabled = args.metrics is not None
+
+    config = BatchConfig(
+        TraceConfig.from_settings(),
+        origin=args.origin,
+        zoom_level=args.zoom_level,
+        width=args.width,
+        height=args.height,
+        integrator=args.integrator,
+        dtype=DTYPES[args.dtype],
+        output_format=args.format
+    )
+
+    field_filenames = find_scenarios(args.inputs)
+
+    summary = run_batch(
+        field_filenames,
+        args.out_dir,
+        config,
+        workers=args.workers,
+        max_tasks_per_worker=args.max_tasks_per_worker,
+        max_worker_memory=round(args.max_worker_memory * (1 << 20)) if args.max_worker_memory is not None else None,
+        force=args.force
+    )
+
+    if args.metrics is not None:
+        metrics.dump(args.metrics)
+
+    print(f"{summary['scenario_count']} scenarios: {summary['traced_count']} traced, {summary['cached_count']} cached, {summary['failed_count']} failed in {summary['wall_seconds']:.2f}s")
+
+    if summary["failed_count"] > 0:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
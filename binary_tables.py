@@ -0,0 +1,221 @@
+from typing import Any, BinaryIO, Dict, Iterator, Tuple
+from io import BytesIO
+import json
+import struct
+from os import replace
+import numpy as np
+
+
+ALIGNMENT: int = 64
+"""The byte alignment of the start of each table's data, so tables can be memory-mapped and read efficiently"""
+
+_ROWS_PER_WRITE: int = 1 << 16
+"""How many rows of a table are converted to bytes and written at a time"""
+
+
+class InvalidBinaryFileException(Exception): pass
+
+
+def _aligned(n: int) -> int:
+    return ((n + ALIGNMENT - 1) // ALIGNMENT) * ALIGNMENT
+
+
+def _dtype_to_json(dtype: np.dtype) -> Any:
+    return dtype.descr if dtype.names is not None else dtype.str
+
+
+def _dtype_from_json(value: Any) -> np.dtype:
+
+    if isinstance(value, str):
+        return np.dtype(value)
+
+    return np.dtype([
+        (name, fmt) if len(rest) == 0 else (name, fmt, tuple(rest[0]))
+        for name, fmt, *rest in value
+    ])
+
+
+def write_tables(stream: BinaryIO,
+                 magic: bytes,
+                 tables: Dict[str, np.ndarray],
+                 metadata: Dict[str, Any]) -> None:
+    """Writes a binary container of named NumPy tables.
+
+The container is the magic bytes, the length of the header, a JSON header describing the metadata and each table's dtype, shape and offset, \
+and then each table's raw little-endian data, aligned so that tables can be memory-mapped
+
+Parameters:
+
+    stream - the binary stream to write to
+
+    magic - bytes identifying the type of file
+
+    tables - the tables to write, by name
+
+    metadata - JSON-serializable values to store in the header
+"""
+
+    prefix_length = len(magic) + 4
+
+    def create_header(data_start: int) -> bytes:
+
+        table_entries = []
+        offset = data_start
+
+        for name, table in tables.items():
+
+            table_entries.append({
+                "name": name,
+                "dtype": _dtype_to_json(table.dtype),
+                "shape": list(table.shape),
+                "offset": offset,
+            })
+
+            offset = _aligned(offset + table.nbytes)
+
+        return json.dumps({"metadata": metadata, "tables": table_entries}).encode("utf-8")
+
+    # The header's length depends on the offsets it contains, so find the data start that fits the header
+
+    data_start = _aligned(prefix_length + len(create_header(0)))
+
+    while True:
+
+        header = create_header(data_start)
+        needed_data_start = _aligned(prefix_length + len(header))
+
+        if needed_data_start <= data_start:
+            break
+
+        data_start = needed_data_start
+
+    header = header.ljust(data_start - prefix_length, b" ")
+
+    stream.write(magic)
+    stream.write(struct.pack("<I", len(header)))
+    stream.write(header)
+
+    position = data_start
+
+    for table in tables.values():
+
+        flat_table = table.reshape((table.shape[0], -1)) if table.ndim > 1 else table
+
+        for start in range(0, max(1, flat_table.shape[0]), _ROWS_PER_WRITE):
+            stream.write(np.ascontiguousarray(flat_table[start:start+_ROWS_PER_WRITE]).tobytes())
+
+        position += table.nbytes
+
+        padding = _aligned(position) - position
+        stream.write(b"\0" * padding)
+        position += padding
+
+
+def write_tables_file(filename: str,
+                      magic: bytes,
+                      tables: Dict[str, np.ndarray],
+                      metadata: Dict[str, Any]) -> None:
+    """Writes a binary container of named NumPy tables to a file. See write_tables.
+
+The container is written to a temporary file which then replaces the file, \
+so tables memory-mapped from the file being replaced (which may be being written) stay valid
+"""
+
+    temp_filename = filename + ".tmp"
+
+    with open(temp_filename, "wb") as file:
+        write_tables(file, magic, tables, metadata)
+
+    replace(temp_filename, filename)
+
+
+def _read_header(file: BinaryIO, magic: bytes) -> Dict[str, Any]:
+
+    if file.read(len(magic)) != magic:
+        raise InvalidBinaryFileException("File isn't of the expected type")
+
+    header_length_bytes = file.read(4)
+
+    if len(header_length_bytes) != 4:
+        raise InvalidBinaryFileException("File is truncated")
+
+    header_length, = struct.unpack("<I", header_length_bytes)
+
+    try:
+        return json.loads(file.read(header_length).decode("utf-8"))
+    except ValueError as e:
+        raise InvalidBinaryFileException("Invalid header") from e
+
+
+def _table_entries(header: Dict[str, Any], length: int) -> Iterator[Tuple[str, np.dtype, Tuple[int, ...], int, int]]:
+    """The name, dtype, shape, offset and element count of each table described by a header, checking that each table fits in the data's length"""
+
+    for entry in header["tables"]:
+
+        dtype = _dtype_from_json(entry["dtype"])
+        shape = tuple(entry["shape"])
+        offset = entry["offset"]
+        count = int(np.prod(shape))
+
+        if offset + (count * dtype.itemsize) > length:
+            raise InvalidBinaryFileException(f"Table \"{entry['name']}\" is truncated")
+
+        yield entry["name"], dtype, shape, offset, count
+
+
+def read_tables(filename: str,
+                magic: bytes,
+                mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Reads a binary container of named NumPy tables, as written by write_tables
+
+Parameters:
+
+    filename - the file to read
+
+    magic - the bytes identifying the type of file expected
+
+    mmap (default True) - whether to memory-map the tables (read-only) instead of reading them into memory
+
+Returns:
+
+    tables - the tables, by name
+
+    metadata - the values stored in the header
+"""
+
+    with open(filename, "rb") as file:
+
+        header = _read_header(file, magic)
+
+        file.seek(0, 2)
+        file_length = file.tell()
+
+        tables: Dict[str, np.ndarray] = {}
+
+        for name, dtype, shape, offset, count in _table_entries(header, file_length):
+
+            if count == 0:
+                table = np.zeros(shape=shape, dtype=dtype)
+            elif mmap:
+                table = np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+            else:
+                file.seek(offset)
+                table = np.fromfile(file, dtype=dtype, count=count).reshape(shape)
+
+            tables[name] = table
+
+    return tables, header["metadata"]
+
+
+def read_tables_bytes(data: bytes, magic: bytes) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Reads a binary container of named NumPy tables from bytes, as written by write_tables. \
+The tables are read-only views of the bytes. See read_tables"""
+
+    header = _read_header(BytesIO(data), magic)
+
+    tables: Dict[str, np.ndarray] = {
+        name: np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape) if count > 0 else np.zeros(shape=shape, dtype=dtype)
+        for name, dtype, shape, offset, count in _table_entries(header, len(data))
+    }
+
+    return tables, header["metadata"]
@@ -0,0 +1,186 @@
+from typing import Dict, List, Tuple, Optional
+import numpy as np
+import vectors
+from field import Field
+from field_element import ElementBase, PointSource, ChargePlane
+
+
+GridCell = Tuple[int, int]
+
+
+class ElementHitIndex:
+    """A world-space index of a field's elements for finding which element is drawn at a position.
+
+Point sources are kept in a uniform grid of cells so only those near the queried position are tested. \
+Charge planes are infinite so can't be put in the grid and are instead kept in a separate (usually small) set that is always tested. \
+As the grid is in world space, the index doesn't depend on the zoom level so only needs updating when elements are added or removed.
+
+When multiple elements are at a position, the one added to the index earliest is found, matching the order that a field iterates its elements in.
+
+Parameters:
+
+    point_radius - how far (in screen space) from a point source's position counts as being on the point source
+
+    plane_width - how far (in screen space) from a charge plane counts as being on the charge plane
+
+    cell_size (optional) - the width and height of the grid cells in world space
+"""
+
+    DEFAULT_CELL_SIZE: float = 320
+    """The default width and height of grid cells in world space (32 pixels at the default zoom level)"""
+
+    def __init__(self,
+                 point_radius: float,
+                 plane_width: float,
+                 cell_size: float = DEFAULT_CELL_SIZE):
+
+        self.__point_radius = point_radius
+        self.__plane_width = plane_width
+        self.__cell_size = cell_size
+
+        self.__next_order: int = 0
+
+        self.__cells: Dict[GridCell, Dict[PointSource, int]] = {}
+        """The point sources in each grid cell, mapped to the order they were added in"""
+        self.__point_cells: Dict[PointSource, GridCell] = {}
+
+        self.__planes: Dict[ChargePlane, int] = {}
+        """The charge planes, mapped to the order they were added in"""
+
+    def __len__(self) -> int:
+        return len(self.__point_cells) + len(self.__planes)
+
+    def __cell_of(self, pos: np.ndarray) -> GridCell:
+        return (
+            int(np.floor(pos[0] / self.__cell_size)),
+            int(np.floor(pos[1] / self.__cell_size))
+        )
+
+    def clear(self) -> None:
+
+        self.__cells.clear()
+        self.__point_cells.clear()
+        self.__planes.clear()
+
+    def rebuild(self, field: Field) -> None:
+        """Clears the index and adds all of the elements of a field to it"""
+
+        self.clear()
+
+        for ele in field.iter_elements():
+            self.add(ele)
+
+    def add(self, ele: ElementBase) -> None:
+        self.__add(ele, self.__next_order)
+        self.__next_order += 1
+
+    def __add(self, ele: ElementBase, order: int) -> None:
+
+        match ele:
+
+            case PointSource():
+                cell = self.__cell_of(ele.pos)
+                self.__cells.setdefault(cell, {})[ele] = order
+                self.__point_cells[ele] = cell
+
+            case ChargePlane():
+                self.__planes[ele] = order
+
+            case _:
+                raise ValueError("Unhandled element class")
+
+    def remove(self, ele: ElementBase) -> None:
+        self.__remove(ele)
+
+    def __remove(self, ele: ElementBase) -> Optional[int]:
+        """Removes an element from the index, returning the order it was added in or None if it wasn't in the index"""
+
+        match ele:
+
+            case PointSource():
+
+                cell = self.__point_cells.pop(ele, None)
+
+                if cell is None:
+                    return None
+
+                cell_eles = self.__cells[cell]
+                order = cell_eles.pop(ele)
+
+                if len(cell_eles) == 0:
+                    del self.__cells[cell]
+
+                return order
+
+            case ChargePlane():
+                return self.__planes.pop(ele, None)
+
+            case _:
+                raise ValueError("Unhandled element class")
+
+    def replace(self, old: ElementBase, new: ElementBase) -> None:
+        """Replaces an element in the index with another, giving the new element the old element's place in the order"""
+
+        order = self.__remove(old)
+
+        if order is None:
+            self.add(new)
+        else:
+            self.__add(new, order)
+
+    def find_at(self, posx: float, posy: float, scale: float) -> Optional[ElementBase]:
+        """Finds the element drawn at a world-space position, or None if there isn't one
+
+Parameters:
+
+    posx - the x-coordinate of the position
+
+    posy - the y-coordinate of the position
+
+    scale - the number of units of distance in the field per pixel of display, which the elements' screen-space sizes are converted to world space with
+
+Returns:
+
+    ele - the earliest-added element drawn at the position, or None
+"""
+
+        pos = np.array([posx, posy], dtype=float)
+
+        candidates: List[Tuple[int, ElementBase]] = []
+
+        # Point sources in nearby grid cells
+
+        radius = self.__point_radius * scale
+
+        min_cell = self.__cell_of(pos - radius)
+        max_cell = self.__cell_of(pos + radius)
+
+        sqr_radius = radius * radius
+
+        for cx in range(min_cell[0], max_cell[0]+1):
+            for cy in range(min_cell[1], max_cell[1]+1):
+                for ps, order in self.__cells.get((cx, cy), {}).items():
+                    if vectors.sqr_magnitudes(pos - ps.pos)[0] <= sqr_radius:
+                        candidates.append((order, ps))
+
+        # Charge planes
+
+        if len(self.__planes) > 0:
+
+            planes = list(self.__planes.keys())
+
+            dists = vectors.plane_distance_to_point(
+                np.array([cp.pos for cp in planes]),
+                np.array([cp.normal for cp in planes]),
+                np.tile(pos, (len(planes), 1))
+            )
+
+            for i in np.flatnonzero(dists <= self.__plane_width * scale):
+                candidates.append((self.__planes[planes[i]], planes[i]))
+
+        # Choose the earliest-added element
+
+        if len(candidates) == 0:
+            return None
+        else:
+            return min(candidates, key=lambda c: c[0])[1]
@@ -1,19 +1,137 @@
-from typing import List, Tuple, Optional, Iterator, TextIO
-from field_element import ElementBase, PointSource, ChargePlane
+from typing import Dict, List, Tuple, Optional, Iterator, TextIO, BinaryIO, Callable
+from field_element import ElementBase, PointSource, ChargePlane, POINT_SOURCE_DTYPE, CHARGE_PLANE_DTYPE
+from binary_tables import write_tables, write_tables_file, read_tables, InvalidBinaryFileException
+from metrics import metrics
 import numpy as np
+import numpy.typing as npt
 import vectors
 from settings import settings
 import re
+from hashlib import sha256
+from itertools import count
+from time import perf_counter_ns
+
+
+_field_versions = count(1)
+
+
+SERIALIZED_DECIMALS: int = 3
+"""How many decimal places the values of elements are written to .field files with. \
+Content hashes are of values rounded to this precision, so that a field has the same content hash after being saved and read back"""
+
+
+# Reasons that traced field lines stopped
+
+LINE_TERMINATION_MAX_POINTS: int = 0
+"""The line was still being traced when it reached the maximum number of points"""
+LINE_TERMINATION_CLIPPED: int = 1
+"""The line left the clip ranges"""
+LINE_TERMINATION_ELEMENT: int = 2
+"""The line reached a complementary field element"""
+
+
+# Methods of stepping along traced field lines
+
+INTEGRATOR_EULER: str = "euler"
+"""Step along the field's direction at the current point"""
+INTEGRATOR_MIDPOINT: str = "midpoint"
+"""Step along the field's direction halfway along an Euler step"""
+INTEGRATOR_RK4: str = "rk4"
+"""Step along the classic fourth-order Runge-Kutta combination of the field's directions at four points"""
+
+INTEGRATORS: Tuple[str, ...] = (INTEGRATOR_EULER, INTEGRATOR_MIDPOINT, INTEGRATOR_RK4)
+
+INTEGRATOR_GRAD_EVALUATION_COUNTS: Dict[str, int] = {
+    INTEGRATOR_EULER: 1,
+    INTEGRATOR_MIDPOINT: 2,
+    INTEGRATOR_RK4: 4,
+}
+"""How many times each integrator evaluates the field's gradient for each line at each step"""
+
+STALL_DISTANCE_FRACTION: float = 0.1
+"""A line is counted as stalled at a step if it moves less than this fraction of the step distance (or to a non-finite position), \
+such as when it reaches a point where the field's gradient is zero"""
+
+
+def _serialized_values(table: np.ndarray) -> np.ndarray:
+    """The values of a table of elements as they would be written to a .field file, as a (rows, fields) array of integer multiples of the last decimal place"""
+
+    if table.shape[0] == 0:
+        return np.zeros(shape=(0, len(table.dtype.names)), dtype=np.int64)
+
+    values = np.stack([np.asarray(table[name], dtype=float) for name in table.dtype.names], axis=1)
+
+    return np.rint(values * (10 ** SERIALIZED_DECIMALS)).astype(np.int64)
+
+
+class TraceTelemetry:
+    """Statistics of each iteration of tracing field lines, filled by Field.trace_field_lines.
+
+Each array has an entry for each iteration (one less than the maximum number of points), \
+of which only the first iteration_count are filled as tracing stops once no lines are active
+
+Parameters:
+
+    max_points - the maximum number of points of the lines being traced
+"""
+
+    PHASES: Tuple[str, ...] = ("clip", "nearest_element", "step", "apply")
+    """The phases of each iteration that are timed"""
+
+    def __init__(self, max_points: int):
+
+        iterations = max(max_points - 1, 0)
+
+        self.iteration_count: int = 0
+
+        self.active_counts = np.zeros(shape=(iterations,), dtype=np.int64)
+        """How many lines were being traced at the start of the iteration"""
+        self.clipped_counts = np.zeros(shape=(iterations,), dtype=np.int64)
+        """How many lines left the clip ranges"""
+        self.positive_element_hit_counts = np.zeros(shape=(iterations,), dtype=np.int64)
+        """How many positive lines reached an element"""
+        self.negative_element_hit_counts = np.zeros(shape=(iterations,), dtype=np.int64)
+        """How many negative lines reached an element"""
+        self.stalled_counts = np.zeros(shape=(iterations,), dtype=np.int64)
+        """How many of the lines that continued barely moved. See STALL_DISTANCE_FRACTION"""
+        self.grad_evaluation_counts = np.zeros(shape=(iterations,), dtype=np.int64)
+        """How many positions the field's gradient was evaluated at"""
+        self.phase_times_ms = np.zeros(shape=(iterations, len(TraceTelemetry.PHASES)))
+        """How long each of the PHASES of the iteration took, in milliseconds"""
+
+    def to_json(self) -> Dict:
+        """The filled entries of the arrays, as JSON-serializable lists"""
+
+        n = self.iteration_count
+
+        return {
+            "active_counts": self.active_counts[:n].tolist(),
+            "clipped_counts": self.clipped_counts[:n].tolist(),
+            "positive_element_hit_counts": self.positive_element_hit_counts[:n].tolist(),
+            "negative_element_hit_counts": self.negative_element_hit_counts[:n].tolist(),
+            "stalled_counts": self.stalled_counts[:n].tolist(),
+            "grad_evaluation_counts": self.grad_evaluation_counts[:n].tolist(),
+            "phase_times_ms": {phase: self.phase_times_ms[:n, i].tolist() for i, phase in enumerate(TraceTelemetry.PHASES)},
+        }
 
 
 class ElementNotInFieldException(Exception): pass
+class TraceCancelledException(Exception): pass
+class LoadCancelledException(Exception): pass
 
 
 class Field:
 
     def __init__(self):
 
+        self.__point_source_table: np.ndarray = np.zeros(shape=(0,), dtype=POINT_SOURCE_DTYPE)
+        """Point sources that haven't been created as element objects. These come before the element objects in the field's order of elements"""
+        self.__point_source_buffer: Optional[np.ndarray] = None
+        """An array owned by this field whose start is the point source table, with space after it for point sources to be added without copying the table"""
         self.__elements: List[ElementBase] = []
+        self.__version: int = next(_field_versions)
+        self.__content_hash: Optional[Tuple[int, str]] = None
+        """The version of the field that the content hash was last calculated for and the hash"""
 
     def write_to_file(self, stream: TextIO) -> None:
 
@@ -28,25 +146,215 @@ class Field:
 
         raise NotImplementedError()  # TODO
 
+    def copy(self) -> "Field":
+        """Creates a copy of the field that can have elements added to or removed from it without affecting this field. \
+The element objects themselves are shared between the two fields"""
+
+        field = Field()
+        field.__point_source_table = self.__point_source_table
+        # N.B. the copy doesn't own the buffer, so neither field's additions can overwrite the other's point sources
+        field.__elements = self.__elements.copy()
+        field.__version = self.__version
+        field.__content_hash = self.__content_hash
+
+        return field
+
+    @property
+    def version(self) -> int:
+        """An identifier for the field's current elements. \
+It changes whenever the field's elements change and two fields with the same version will have the same elements"""
+        return self.__version
+
+    def __modified(self) -> None:
+        self.__version = next(_field_versions)
+
+    @property
+    def content_hash(self) -> str:
+        """A hash of the field's elements (in order) that, unlike the version, is the same for equal fields loaded separately. \
+The elements' values are rounded to SERIALIZED_DECIMALS decimal places, so the hash is the same after saving the field and reading it back"""
+
+        if (self.__content_hash is None) or (self.__content_hash[0] != self.__version):
+
+            point_source_table, others = self.get_element_tables()
+
+            charge_planes: List[ChargePlane] = []
+
+            for ele in others:
+                match ele:
+                    case ChargePlane():
+                        charge_planes.append(ele)
+                    case _:
+                        raise ValueError("Unhandled element class")
+
+            h = sha256()
+            h.update(b"point_sources")
+            h.update(_serialized_values(point_source_table).tobytes())
+            h.update(b"charge_planes")
+            h.update(_serialized_values(ChargePlane.create_table(charge_planes)).tobytes())
+
+            self.__content_hash = (self.__version, h.hexdigest())
+
+        return self.__content_hash[1]
+
+    @property
+    def element_count(self) -> int:
+        return self.__point_source_table.shape[0] + len(self.__elements)
+
     def add_element(self, ele: ElementBase) -> None:
         self.__elements.append(ele)
+        self.__modified()
+
+    def add_point_source_table(self, table: np.ndarray) -> None:
+        """Adds many point sources to the field from a table of POINT_SOURCE_DTYPE rows, without creating an element object for each of them \
+(unless the field's elements are iterated over or individually edited). The table isn't copied so mustn't be modified afterwards"""
+
+        assert table.dtype == POINT_SOURCE_DTYPE, "Invalid point source table dtype"
+
+        if len(self.__elements) > 0:
+            # Element objects must come after the table in the field's order
+            self.__elements.extend(PointSource.table_elements(table))
+        elif (self.__point_source_table.shape[0] == 0) and (self.__point_source_buffer is None):
+            self.__point_source_table = table
+        else:
+            self.__extend_point_source_table(table)
+
+        self.__modified()
+
+    def __extend_point_source_table(self, table: np.ndarray) -> None:
+        """Appends to the point source table, growing its buffer geometrically so that adding many small tables takes linear time overall"""
+
+        old_count = self.__point_source_table.shape[0]
+        new_count = old_count + table.shape[0]
+
+        if (self.__point_source_buffer is None) or (self.__point_source_buffer.shape[0] < new_count):
+
+            buffer = np.empty(shape=(max(new_count, (old_count * 3) // 2),), dtype=POINT_SOURCE_DTYPE)
+            buffer[:old_count] = self.__point_source_table
+
+            self.__point_source_buffer = buffer
+
+        self.__point_source_buffer[old_count:new_count] = table
+        self.__point_source_table = self.__point_source_buffer[:new_count]
+
+    def __materialise(self) -> None:
+        """Creates element objects for the point sources in the point source table"""
+
+        if self.__point_source_table.shape[0] > 0:
+            self.__elements = PointSource.table_elements(self.__point_source_table) + self.__elements
+            self.__point_source_table = np.zeros(shape=(0,), dtype=POINT_SOURCE_DTYPE)
+            self.__point_source_buffer = None
+
+    def get_element_tables(self) -> Tuple[np.ndarray, List[ElementBase]]:
+        """Gets the field's elements with all of its point sources in a table
+
+Returns:
+
+    point_sources - a table of POINT_SOURCE_DTYPE rows of the field's point sources, in the field's order
+
+    others - the field's other elements, in the field's order
+"""
+
+        object_pss = [ele for ele in self.__elements if isinstance(ele, PointSource)]
+        others = [ele for ele in self.__elements if not isinstance(ele, PointSource)]
+
+        if len(object_pss) == 0:
+            return self.__point_source_table, others
+        else:
+            return np.concatenate([self.__point_source_table, PointSource.create_table(object_pss)]), others
+
+    def index_of(self, ele: ElementBase) -> int:
+        """Finds the position of an element in the field's order of elements"""
+
+        self.__materialise()
+
+        if ele in self.__elements:
+            return self.__elements.index(ele)
+        else:
+            raise ElementNotInFieldException()
+
+    def element_at(self, index: int) -> ElementBase:
+        """Gets the element at a position in the field's order of elements"""
+
+        self.__materialise()
+
+        if 0 <= index < len(self.__elements):
+            return self.__elements[index]
+        else:
+            raise ElementNotInFieldException()
 
     def remove_element(self, ele: ElementBase) -> None:
 
+        self.__materialise()
+
         if ele in self.__elements:
             self.__elements.remove(ele)
+            self.__modified()
+        else:
+            raise ElementNotInFieldException()
+
+    def replace_element(self, old: ElementBase, new: ElementBase) -> None:
+        """Replaces an element of the field with another, keeping its place in the field's order of elements"""
+
+        self.__materialise()
+
+        if old in self.__elements:
+            self.__elements[self.__elements.index(old)] = new
+            self.__modified()
         else:
             raise ElementNotInFieldException()
 
     def iter_elements(self) -> Iterator[ElementBase]:
+        """Iterates through the field's elements in order. \
+Any point sources added as a table have element objects created for them"""
+
+        self.__materialise()
+
         for ele in self.__elements:
             yield ele
 
+    def get_field_line_starts(self, bounds: np.ndarray, fac: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """Collects the positions to start tracing field lines from for all of the field's elements
+
+Parameters:
+
+    bounds - an array of pairs for the bounds of the region being rendered
+
+    fac (default 1.0) - how much to multiply the number of lines decided to create by
+
+Returns:
+
+    line_starts - the positions to start the lines in
+
+    positives - which lines are positive lines
+"""
+
+        line_starts_list = []
+        positives_list = []
+
+        if self.__point_source_table.shape[0] > 0:
+            starts, pos = PointSource.table_field_line_starts(self.__point_source_table, fac=fac)
+            line_starts_list.append(starts)
+            positives_list.append(pos)
+
+        for ele in self.__elements:
+
+            starts, pos = ele.get_field_line_starts(bounds, fac=fac)
+            line_starts_list.append(starts)
+            positives_list.append(pos)
+
+        if len(line_starts_list) == 0:
+            return np.zeros(shape=(0, bounds.shape[0])), np.zeros(shape=(0,), dtype=bool)
+
+        return np.concatenate(line_starts_list), np.concatenate(positives_list)
+
     def evaluate(self, poss: np.ndarray) -> np.ndarray:
 
         vals = np.zeros(shape=(poss.shape[0]))
 
-        for ele in self.iter_elements():
+        if self.__point_source_table.shape[0] > 0:
+            vals += PointSource.table_field_at(self.__point_source_table, poss)
+
+        for ele in self.__elements:
 
             vals += ele.get_field_at(poss)
 
@@ -57,7 +365,10 @@ class Field:
 
         grads = np.zeros_like(poss)
 
-        for ele in self.iter_elements():
+        if self.__point_source_table.shape[0] > 0:
+            grads += PointSource.table_grad_at(self.__point_source_table, poss)
+
+        for ele in self.__elements:
             grads += ele.get_grad_at(poss)
 
         return grads
@@ -89,8 +400,11 @@ Returns:
         assert use_absorbers.dtype == bool, "use_absorbers must be a boolean array"
         assert use_absorbers.ndim == 1, "Invalid use_absorbers dimensionality"
 
-        out_sqr_distances = np.inf * np.ones(shape=(seg_starts.shape[0],), dtype=seg_starts.dtype)
-        out_positions = np.zeros_like(seg_starts)
+        if self.__point_source_table.shape[0] > 0:
+            out_sqr_distances, out_positions = PointSource.table_line_seg_nearest(self.__point_source_table, seg_starts, seg_ends, use_absorbers)
+        else:
+            out_sqr_distances = np.inf * np.ones(shape=(seg_starts.shape[0],), dtype=seg_starts.dtype)
+            out_positions = np.zeros_like(seg_starts)
 
         for ele in self.__elements:  # Iterate through each field element
 
@@ -129,10 +443,24 @@ Returns:
 
         return out_sqr_distances, out_positions
 
+    def __line_trace_directions(self,
+                                poss: np.ndarray,
+                                positives: np.ndarray) -> np.ndarray:
+        """Computes the unit vectors of the directions that field lines at some points move in"""
+
+        grads = self.grad(poss)  # R^(line_count)x(dim)
+
+        move_dir = grads / vectors.magnitudes(grads)[:, np.newaxis]  # R^(line_count)x(dim)
+
+        move_dir[positives] *= -1  # Invert the direction of the positive lines' move directions
+
+        return move_dir
+
     def __line_trace_next_positions(self,
                                     poss: np.ndarray,
                                     positives: np.ndarray,
-                                    step_distance: float) -> np.ndarray:
+                                    step_distance: float,
+                                    integrator: str = INTEGRATOR_EULER) -> Tuple[np.ndarray, np.ndarray]:
         """Computes the next point to extend a field line being traced
 
 Parameters:
@@ -143,58 +471,114 @@ Parameters:
 
     step_distance - how far the lines should step
 
+    integrator (default INTEGRATOR_EULER) - the method to step with, one of INTEGRATORS
+
 Returns:
 
     nexts - a 2D array of the position vectors of the next points that the lines should go to
+
+    probes - a 2D array of the position vectors that the lines would go to with a single Euler step. \
+The later stages of the other integrators are sampled around the segments to these, \
+so a line whose segment passes an absorber/emitter may have been sent back across it
 """
 
-        grads = self.grad(poss)  # R^(line_count)x(dim)
+        h = step_distance
 
-        move_dir = grads / vectors.magnitudes(grads)[:, np.newaxis]  # R^(line_count)x(dim)
+        k1 = self.__line_trace_directions(poss, positives)
 
-        move_dir[positives] *= -1  # Invert the direction of the positive lines' move directions
+        if integrator == INTEGRATOR_EULER:
 
-        nexts = poss + (move_dir * step_distance)  # R^(line_count)x(dim)
+            move_dir = k1
 
-        return nexts
+        elif integrator == INTEGRATOR_MIDPOINT:
+
+            move_dir = self.__line_trace_directions(poss + (k1 * (h / 2)), positives)
+
+        elif integrator == INTEGRATOR_RK4:
+
+            k2 = self.__line_trace_directions(poss + (k1 * (h / 2)), positives)
+            k3 = self.__line_trace_directions(poss + (k2 * (h / 2)), positives)
+            k4 = self.__line_trace_directions(poss + (k3 * h), positives)
+
+            move_dir = (k1 + (2 * k2) + (2 * k3) + k4) / 6
+
+        else:
+            raise ValueError("Unknown integrator")
+
+        nexts = poss + (move_dir * h)  # R^(line_count)x(dim)
+        probes = poss + (k1 * h)  # R^(line_count)x(dim)
+
+        return nexts, probes
 
     def __field_line_trace_single_iteration(self,
                                             t: int,
                                             lines: np.ndarray,
+                                            prev_poss: np.ndarray,
+                                            curr_poss: np.ndarray,
                                             active_mask: np.ndarray,
                                             positives: np.ndarray,
                                             step_distance: float,
                                             element_stop_distance: float,
-                                            clip_ranges: np.ndarray) -> None:
+                                            clip_ranges: np.ndarray,
+                                            terminations: Optional[np.ndarray],
+                                            integrator: str,
+                                            telemetry: Optional[TraceTelemetry]) -> None:
 
         dim = lines.shape[2]
 
+        if telemetry is not None:
+            phase_start_times_ns = [perf_counter_ns()]
+
         # Clip any lines outside of the allowed range and deactivate them
 
-        clip_mask = vectors.outside_bounds(lines[active_mask, t, :], clip_ranges)
+        clip_mask = vectors.outside_bounds(curr_poss[active_mask], clip_ranges)
+
+        if telemetry is not None:
+            phase_start_times_ns.append(perf_counter_ns())
 
         # Deactivate lines that went too close to a field element
 
         nearest_sqr_distances, nearest_poss = self.line_seg_nearest_element(
-            lines[active_mask, max(t-1, 0)],  # The old positions
-            lines[active_mask, t],  # The new positions
+            prev_poss[active_mask],  # The old positions
+            curr_poss[active_mask],  # The new positions
             positives[active_mask]  # Which lines are positive
         )
 
         point_close_mask = nearest_sqr_distances <= element_stop_distance  # Which of the active lines have been deactivated
 
+        if telemetry is not None:
+            phase_start_times_ns.append(perf_counter_ns())
+
         # Calculate next positions for active lines
 
-        active_curr_poss = lines[active_mask, t]  # R^(line_count)x(dim)
+        active_curr_poss = curr_poss[active_mask]  # R^(line_count)x(dim)
         active_positives = positives[active_mask]  # {0,1}^(line_count)
 
-        active_next_poss = self.__line_trace_next_positions(active_curr_poss, active_positives, step_distance=step_distance)
+        active_next_poss, active_probe_poss = self.__line_trace_next_positions(active_curr_poss, active_positives, step_distance=step_distance, integrator=integrator)
+
+        # The stages of the integrators other than Euler's can jump across an absorber/emitter that the line is about to reach
+        # and send it back the way it came, so lines whose first stage passes close to a field element are stopped at it.
+        # Euler steps are only ever along this first stage, so are checked by the next iteration instead
+
+        if integrator != INTEGRATOR_EULER:
+
+            probe_sqr_distances, probe_nearest_poss = self.line_seg_nearest_element(active_curr_poss, active_probe_poss, active_positives)
+
+            probe_close_mask = (probe_sqr_distances <= element_stop_distance) & (~point_close_mask)
+
+            nearest_poss = np.where(vectors.mat_mask(probe_close_mask, dim), probe_nearest_poss, nearest_poss)
+            point_close_mask = point_close_mask | probe_close_mask
+
+        if telemetry is not None:
+            phase_start_times_ns.append(perf_counter_ns())
 
         # Apply effects of computations to active lines, inactive lines and the active mask
 
-        lines[active_mask, t+1, :] = np.where(
+        prev_poss[:] = curr_poss
+
+        curr_poss[active_mask] = np.where(
             vectors.mat_mask(clip_mask, dim),
-            lines[active_mask, t, :],  # When line gets clipped this iteration
+            active_curr_poss,  # When line gets clipped this iteration
             np.where(
                 vectors.mat_mask(point_close_mask, dim),
                 nearest_poss,  # When line reaches a field element this iteration
@@ -202,7 +586,30 @@ Returns:
             )
         )
 
-        lines[~active_mask, t+1, :] = lines[~active_mask, t, :]
+        lines[:, t+1, :] = curr_poss  # Inactive lines' positions don't change, so their final points are repeated
+
+        if terminations is not None:
+            active_idxs = np.flatnonzero(active_mask)
+            terminations[active_idxs[point_close_mask]] = LINE_TERMINATION_ELEMENT
+            terminations[active_idxs[clip_mask]] = LINE_TERMINATION_CLIPPED  # Clipping takes precedence as the line is stopped where it was clipped
+
+        if telemetry is not None:
+
+            phase_start_times_ns.append(perf_counter_ns())
+
+            hit_mask = point_close_mask & (~clip_mask)
+            continuing_mask = (~clip_mask) & (~point_close_mask)
+
+            step_lengths = vectors.magnitudes(active_next_poss[continuing_mask] - active_curr_poss[continuing_mask])
+
+            telemetry.iteration_count = t + 1
+            telemetry.active_counts[t] = active_curr_poss.shape[0]
+            telemetry.clipped_counts[t] = np.count_nonzero(clip_mask)
+            telemetry.positive_element_hit_counts[t] = np.count_nonzero(hit_mask & active_positives)
+            telemetry.negative_element_hit_counts[t] = np.count_nonzero(hit_mask & (~active_positives))
+            telemetry.stalled_counts[t] = np.count_nonzero(~(step_lengths >= STALL_DISTANCE_FRACTION * step_distance))
+            telemetry.grad_evaluation_counts[t] = active_curr_poss.shape[0] * INTEGRATOR_GRAD_EVALUATION_COUNTS[integrator]
+            telemetry.phase_times_ms[t] = np.diff(phase_start_times_ns) / 1e6
 
         active_mask[active_mask] = (~clip_mask) & (~point_close_mask)
 
@@ -212,7 +619,12 @@ Returns:
                           positives: np.ndarray,
                           step_distance: Optional[float] = None,
                           element_stop_distance: Optional[float] = None,
-                          clip_ranges: Optional[np.ndarray] = None) -> np.ndarray:
+                          clip_ranges: Optional[np.ndarray] = None,
+                          should_cancel: Optional[Callable[[], bool]] = None,
+                          terminations: Optional[np.ndarray] = None,
+                          integrator: str = INTEGRATOR_EULER,
+                          dtype: npt.DTypeLike = float,
+                          telemetry: Optional[TraceTelemetry] = None) -> np.ndarray:
         """Traces field lines starting at some position vectors and following the field for a specified distance or until reaching an absorber/emitter field element
 
 Parameters:
@@ -230,6 +642,17 @@ Parameters:
     clip_ranges - a 2D array of shape (N,2) where N is the number of dimensions of the space of the field. \
 Each pair describes the range of values outside which the field lines will be clipped
 
+    should_cancel (optional) - a callable checked before each step of tracing. If it returns True then tracing is abandoned by raising a TraceCancelledException
+
+    terminations (optional) - a 1D integer array with an entry for each line. If provided, it is filled with the LINE_TERMINATION_ value of why each line stopped
+
+    integrator (default INTEGRATOR_EULER) - the method to step along the lines with, one of INTEGRATORS
+
+    dtype (default float) - the floating-point type that the returned lines' positions are stored with. \
+Lines are always stepped at full precision, so a smaller type only reduces the memory used and the precision of the returned points
+
+    telemetry (optional) - a TraceTelemetry for max_points. If provided, it is filled with the statistics of each iteration of tracing
+
 Returns:
 
     lines - a 3D array where each axis 0 is each field line, axis 1 is the positions of each point of each field line and axis 2 is the components of these positions. \
@@ -240,6 +663,9 @@ When a field line is ended early, the final value before clipping is propagated
         assert positives.ndim == 1, "Invalid positives array dimensionality"
         assert starts.shape[0] == positives.shape[0], "Starting point and positives arrays are not of matching shapes"
 
+        if integrator not in INTEGRATORS:
+            raise ValueError("Unknown integrator")
+
         if step_distance is None:
             step_distance = settings.field_line_trace_step_distance_screen_space * settings.VIEWPORT_SCALE_FAC
 
@@ -261,20 +687,34 @@ When a field line is ended early, the final value before clipping is propagated
 
         # Initialise output array with the maximum number of possible points needed for each line
 
-        lines = np.zeros(shape=(line_count, max_points, dim))
+        lines = np.zeros(shape=(line_count, max_points, dim), dtype=dtype)
         # To get the c'th component of the t'th point on the n'th line, we look at:
         #     lines[n, t, c]
 
         lines[:, 0] = starts
 
+        # The lines' latest and previous positions, at full precision
+
+        curr_poss = np.array(starts, dtype=float)
+        prev_poss = curr_poss.copy()
+
         active_mask = np.ones(shape=(line_count,), dtype=bool)  # Which lines are still being generated
 
+        if terminations is not None:
+            assert terminations.shape == (line_count,), "Invalid terminations array shape"
+            terminations[:] = LINE_TERMINATION_MAX_POINTS
+
         for t in range(0, max_points-1):
 
+            # Abandon tracing if requested
+
+            if (should_cancel is not None) and should_cancel():
+                raise TraceCancelledException()
+
             # Stop (after writing final points) if no active lines
 
             if ~np.any(active_mask):
-                lines[:, t+1] = lines[:, t]
+                lines[:, t+1] = curr_poss
                 break
 
             # Calculate next points on lines and find lines to become inactive
@@ -282,11 +722,16 @@ When a field line is ended early, the final value before clipping is propagated
             self.__field_line_trace_single_iteration(
                 t,
                 lines,
+                prev_poss,
+                curr_poss,
                 active_mask,
                 positives,
                 step_distance,
                 element_stop_distance,
-                clip_ranges
+                clip_ranges,
+                terminations,
+                integrator,
+                telemetry
             )
 
         # Return the output
@@ -294,8 +739,127 @@ When a field line is ended early, the final value before clipping is propagated
         return lines
 
 
+class FieldRecords:
+    """The elements parsed from lines of a field file, as tables.
+
+Each table has the indices of the lines that its rows were parsed from, so that the elements can be put in the file's order
+
+Parameters:
+
+    point_sources - a table of POINT_SOURCE_DTYPE rows
+
+    point_source_lines - the line index of each point source
+
+    charge_planes - a table of CHARGE_PLANE_DTYPE rows
+
+    charge_plane_lines - the line index of each charge plane
+
+    invalid_lines - the (line index, line) of each line that couldn't be parsed
+"""
+
+    def __init__(self,
+                 point_sources: np.ndarray,
+                 point_source_lines: np.ndarray,
+                 charge_planes: np.ndarray,
+                 charge_plane_lines: np.ndarray,
+                 invalid_lines: List[Tuple[int, str]]):
+
+        self.point_sources = point_sources
+        self.point_source_lines = point_source_lines
+        self.charge_planes = charge_planes
+        self.charge_plane_lines = charge_plane_lines
+        self.invalid_lines = invalid_lines
+
+    @property
+    def element_count(self) -> int:
+        return self.point_sources.shape[0] + self.charge_planes.shape[0]
+
+    def within(self, bounds: np.ndarray, margin: float = 0.0) -> "FieldRecords":
+        """Filters the elements to those within or near a region
+
+Parameters:
+
+    bounds - the range of positions of the region, as a (2,2) array of the minimum and maximum of each dimension
+
+    margin (default 0) - how far outside of the region elements can be and still be kept
+
+Returns:
+
+    records - the point sources within the region and the charge planes that pass through it
+"""
+
+        lows = bounds[:, 0] - margin
+        highs = bounds[:, 1] + margin
+
+        ps_mask = (self.point_sources["x"] >= lows[0]) & (self.point_sources["x"] <= highs[0]) \
+            & (self.point_sources["y"] >= lows[1]) & (self.point_sources["y"] <= highs[1])
+
+        # A plane passes through the region if the region's corners aren't all on the same side of it
+
+        corners = np.array([
+            [lows[0], lows[1]],
+            [lows[0], highs[1]],
+            [highs[0], lows[1]],
+            [highs[0], highs[1]],
+        ])
+
+        corner_sides = ((corners[np.newaxis, :, 0] - self.charge_planes["x"][:, np.newaxis]) * self.charge_planes["normal_x"][:, np.newaxis]) \
+            + ((corners[np.newaxis, :, 1] - self.charge_planes["y"][:, np.newaxis]) * self.charge_planes["normal_y"][:, np.newaxis])  # (planes, corners)
+
+        cp_mask = (np.min(corner_sides, axis=1) <= 0) & (np.max(corner_sides, axis=1) >= 0)
+
+        return FieldRecords(
+            self.point_sources[ps_mask],
+            self.point_source_lines[ps_mask],
+            self.charge_planes[cp_mask],
+            self.charge_plane_lines[cp_mask],
+            self.invalid_lines
+        )
+
+    def add_to_field(self, field: Field) -> None:
+        """Adds the elements to a field in the order of the lines they were parsed from.
+
+If all of the point sources come before all of the charge planes then the point sources are added as a table, without creating an element object for each"""
+
+        if (self.charge_planes.shape[0] == 0) \
+            or (self.point_sources.shape[0] == 0) \
+            or (np.max(self.point_source_lines) < np.min(self.charge_plane_lines)):
+
+            if self.point_sources.shape[0] > 0:
+                field.add_point_source_table(self.point_sources)
+
+            for cp in ChargePlane.table_elements(self.charge_planes):
+                field.add_element(cp)
+
+        else:
+
+            eles: List[ElementBase] = PointSource.table_elements(self.point_sources) + ChargePlane.table_elements(self.charge_planes)
+            order = np.argsort(np.concatenate([self.point_source_lines, self.charge_plane_lines]), kind="stable")
+
+            for i in order.tolist():
+                field.add_element(eles[i])
+
+
+class LoadProgress:
+    """How far through loading a field file a load is"""
+
+    def __init__(self):
+
+        self.line_count: int = 0
+        self.character_count: int = 0
+        """How many characters of the file have been read. For files of only ASCII characters this is the number of bytes read"""
+        self.element_count: int = 0
+        """How many elements have been added to the field"""
+        self.filtered_element_count: int = 0
+        """How many elements have been read but not added to the field as they were outside of the region of interest"""
+        self.invalid_line_count: int = 0
+
+
 class FieldSerialize:
 
+    DEFAULT_CHUNK_SIZE: int = 1 << 20
+    """Roughly how many characters of a field file are read and parsed at a time"""
+
     POINT_SOURCE_REGEX = re.compile(
         r"pointsource (?P<posx>-?\d+.?\d*) (?P<posy>-?\d+.?\d*) (?P<strength>-?\d+.?\d*)",
         re.IGNORECASE
@@ -306,54 +870,241 @@ class FieldSerialize:
         re.IGNORECASE
     )
 
+    POINT_SOURCE_KEYWORD = "pointsource"
+    CHARGE_PLANE_KEYWORD = "chargeplane"
+
+    BULK_NUMBERS_REGEX = re.compile(r"[0-9. \-]*")
+    """The characters that the numbers of records parsed in bulk can contain. \
+With only these characters, a number is valid for the records' regexes exactly when it can be converted to a float and doesn't start with a point"""
+
+    BULK_LEADING_POINT_REGEX = re.compile(r"(?:^| )-?\.")
+
     @staticmethod
+    @metrics.timed("io.serialize_field")
     def serialize(field: Field, stream: TextIO) -> None:
         for ele in field.iter_elements():
             FieldSerialize.write_element(stream, ele)
 
     @staticmethod
-    def deserialize(stream: TextIO) -> Field:
+    @metrics.timed("io.deserialize_field")
+    def deserialize(stream: TextIO,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    progress_callback: Optional[Callable[[LoadProgress], None]] = None,
+                    region: Optional[np.ndarray] = None,
+                    region_margin: float = 0.0,
+                    should_cancel: Optional[Callable[[], bool]] = None) -> Field:
+        """Reads a field from a field file.
+
+The file is read and parsed a chunk of lines at a time, with each chunk's elements being added to the field before the next is read, \
+so only the field's elements and a chunk of the file are held in memory at once. \
+Elements keep the file's order, so point sources are only stored as a table (without an element object each) while no other element has come before them
 
-        eles: List[ElementBase] = []
+Parameters:
 
-        # Read elements from stream
+    stream - the stream to read the file from
 
-        while True:#stream.readable():
+    chunk_size (optional) - roughly how many characters to read and parse at a time
 
-            line = stream.readline()
+    progress_callback (optional) - called after each chunk has been added to the field, with the progress so far
+
+    region (optional) - if provided, only the elements within or near this range of positions are added to the field, as a (2,2) array of the minimum and maximum of each dimension
+
+    region_margin (default 0) - how far outside of the region elements can be and still be added
+
+    should_cancel (optional) - a callable checked before each chunk is read. If it returns True then loading is abandoned by raising a LoadCancelledException
 
-            # Final line is blank without newline
-            if len(line) == 0:
+Returns:
+
+    field - the field read
+"""
+
+        field = Field()
+        progress = LoadProgress()
+
+        while True:
+
+            if (should_cancel is not None) and should_cancel():
+                raise LoadCancelledException()
+
+            # N.B. readlines only stops after a whole line, so lines aren't split between chunks
+            lines = stream.readlines(chunk_size)
+
+            if len(lines) == 0:
                 break
 
+            records = FieldSerialize.parse_lines(lines, first_line_index=progress.line_count)
+
+            for _, line in records.invalid_lines:
+                print(f"Encountered invalid line when reading file:\n{line}")
+
+            progress.line_count += len(lines)
+            progress.character_count += sum(map(len, lines))
+            progress.invalid_line_count += len(records.invalid_lines)
+
+            if region is not None:
+                read_count = records.element_count
+                records = records.within(region, region_margin)
+                progress.filtered_element_count += read_count - records.element_count
+
+            records.add_to_field(field)
+            progress.element_count += records.element_count
+
+            if progress_callback is not None:
+                progress_callback(progress)
+
+        return field
+
+    @staticmethod
+    def parse_lines(lines: List[str], first_line_index: int = 0) -> FieldRecords:
+        """Parses the lines of a field file.
+
+Lines are grouped by their keyword and the numbers of each group are parsed all at once. \
+If any line of a group might not be valid then the group's lines are parsed one at a time instead, so that the invalid lines can be found
+
+Parameters:
+
+    lines - the lines to parse
+
+    first_line_index (default 0) - the index of the first line, used to number the lines parsed
+
+Returns:
+
+    records - the elements parsed
+"""
+
+        keyword_groups: Dict[str, Tuple[List[int], List[str], List[str]]] = {
+            FieldSerialize.POINT_SOURCE_KEYWORD: ([], [], []),
+            FieldSerialize.CHARGE_PLANE_KEYWORD: ([], [], []),
+        }
+        """The line indices, lines and the parts of the lines after the keyword of the lines of each keyword"""
+        other_lines: List[Tuple[int, str]] = []
+
+        # Group the lines by keyword
+
+        for i, line in enumerate(lines, start=first_line_index):
+
             # Strip whitespace
             line = line.strip()
 
-            # Blank lines
-            if len(line) == 0:
+            # Blank lines and comment lines
+            if (len(line) == 0) or (line[0] == "#"):
                 continue
 
-            # Comment lines
-            if line[0] == "#":
-                continue
+            keyword, _, rest = line.partition(" ")
+            group = keyword_groups.get(keyword.lower())
+
+            if group is None:
+                other_lines.append((i, line))
+            else:
+                group[0].append(i)
+                group[1].append(line)
+                group[2].append(rest)
+
+        # Parse each group
+
+        ps_idxs, ps_lines, ps_rests = keyword_groups[FieldSerialize.POINT_SOURCE_KEYWORD]
+        cp_idxs, cp_lines, cp_rests = keyword_groups[FieldSerialize.CHARGE_PLANE_KEYWORD]
+
+        ps_columns = FieldSerialize.__bulk_parse_columns(ps_rests, 3)
+        cp_columns = FieldSerialize.__bulk_parse_columns(cp_rests, 5)
+
+        # Lines that couldn't be parsed in bulk are parsed one at a time
+
+        if ps_columns is None:
+            other_lines.extend(zip(ps_idxs, ps_lines))
+            ps_idxs = []
+        if cp_columns is None:
+            other_lines.extend(zip(cp_idxs, cp_lines))
+            cp_idxs = []
+
+        pss: List[PointSource] = []
+        pss_idxs: List[int] = []
+        cps: List[ChargePlane] = []
+        cps_idxs: List[int] = []
+        invalid_lines: List[Tuple[int, str]] = []
+
+        for i, line in sorted(other_lines):
 
-            # Regular lines
             try:
                 ele = FieldSerialize.parse_element(line)
-                eles.append(ele)
             except ValueError:
-                print(f"Encountered invalid line when reading file:\n{line}")
+                invalid_lines.append((i, line))
+                continue
 
-        # Create field from elements
+            match ele:
+                case PointSource():
+                    pss.append(ele)
+                    pss_idxs.append(i)
+                case ChargePlane():
+                    cps.append(ele)
+                    cps_idxs.append(i)
+                case _:
+                    raise ValueError("Unhandled element subclass")
 
-        field = Field()
+        # Create the tables
 
-        for ele in eles:
-            field.add_element(ele)
+        point_sources = np.empty(shape=(len(ps_idxs),), dtype=POINT_SOURCE_DTYPE)
 
-        # Return output
+        if ps_columns is not None:
+            point_sources["x"] = ps_columns[:, 0]
+            point_sources["y"] = ps_columns[:, 1]
+            point_sources["strength"] = ps_columns[:, 2]
 
-        return field
+        charge_planes = np.empty(shape=(len(cp_idxs),), dtype=CHARGE_PLANE_DTYPE)
+
+        if cp_columns is not None:
+            charge_planes["x"] = cp_columns[:, 0]
+            charge_planes["y"] = cp_columns[:, 1]
+            charge_planes["strength_density"] = cp_columns[:, 2]
+            charge_planes["normal_x"] = cp_columns[:, 3]
+            charge_planes["normal_y"] = cp_columns[:, 4]
+
+        point_source_lines = np.array(ps_idxs + pss_idxs, dtype=np.int64)
+        charge_plane_lines = np.array(cp_idxs + cps_idxs, dtype=np.int64)
+
+        point_sources = np.concatenate([point_sources, PointSource.create_table(pss)])
+        charge_planes = np.concatenate([charge_planes, ChargePlane.create_table(cps)])
+
+        # Put each table in line order
+
+        ps_order = np.argsort(point_source_lines, kind="stable")
+        cp_order = np.argsort(charge_plane_lines, kind="stable")
+
+        return FieldRecords(
+            point_sources[ps_order],
+            point_source_lines[ps_order],
+            charge_planes[cp_order],
+            charge_plane_lines[cp_order],
+            invalid_lines
+        )
+
+    @staticmethod
+    def __bulk_parse_columns(rests: List[str], column_count: int) -> Optional[np.ndarray]:
+        """Parses the numbers after the keywords of lines of the same record type all at once.
+
+Returns:
+
+    columns - a (N,column_count) array of the numbers, or None if any of the lines might not be valid
+"""
+
+        if len(rests) == 0:
+            return np.zeros(shape=(0, column_count))
+
+        joined = " ".join(rests)
+
+        if (FieldSerialize.BULK_NUMBERS_REGEX.fullmatch(joined) is None) \
+            or (FieldSerialize.BULK_LEADING_POINT_REGEX.search(joined) is not None):
+            return None
+
+        space_counts = np.fromiter((rest.count(" ") for rest in rests), dtype=np.int64, count=len(rests))
+
+        if np.any(space_counts != column_count - 1):
+            return None
+
+        try:
+            return np.array(joined.split(" "), dtype=float).reshape((len(rests), column_count))
+        except ValueError:
+            return None
 
     @staticmethod
     def write_element(stream: TextIO, ele: ElementBase) -> None:
@@ -367,11 +1118,13 @@ class FieldSerialize:
 
     @staticmethod
     def write_point_source(stream: TextIO, ps: PointSource) -> None:
-        stream.write(f"pointsource {ps.x:.3f} {ps.y:.3f} {ps.strength:.3f}\n")
+        d = SERIALIZED_DECIMALS
+        stream.write(f"pointsource {ps.x:.{d}f} {ps.y:.{d}f} {ps.strength:.{d}f}\n")
 
     @staticmethod
     def write_charge_plane(stream: TextIO, cp: ChargePlane) -> None:
-        stream.write(f"chargeplane {cp.x:.3f} {cp.y:.3f} {cp.strength_density:.3f} {cp.normal[0]:.3f} {cp.normal[1]:.3f}")
+        d = SERIALIZED_DECIMALS
+        stream.write(f"chargeplane {cp.x:.{d}f} {cp.y:.{d}f} {cp.strength_density / ChargePlane.STRENGTH_DENSITY_FACTOR:.{d}f} {cp.normal[0]:.{d}f} {cp.normal[1]:.{d}f}\n")
 
     @staticmethod
     def parse_element(s: str) -> ElementBase:
@@ -428,3 +1181,119 @@ class FieldSerialize:
             cp = ChargePlane(pos, norm, strengthdensity)
 
             return cp
+
+
+class FieldBinarySerialize:
+    """Reading and writing fields as .fieldb files, which store the field's elements as typed tables that can be memory-mapped.
+
+Loading a .fieldb file doesn't create an element object for each point source, so fields of millions of point sources can be loaded quickly. \
+The elements are stored grouped by type, so a field's point sources come before its other elements when it is loaded
+"""
+
+    MAGIC: bytes = b"FIELDB\0\0"
+    FORMAT_VERSION: int = 1
+
+    @staticmethod
+    def serialize(field: Field, stream: BinaryIO) -> None:
+        tables, metadata = FieldBinarySerialize.__tables(field)
+        write_tables(stream, FieldBinarySerialize.MAGIC, tables, metadata)
+
+    @staticmethod
+    @metrics.timed("io.serialize_field_binary")
+    def serialize_file(field: Field, filename: str) -> None:
+        """Writes a field to a .fieldb file. The file is replaced rather than overwritten, so fields memory-mapped from it stay valid"""
+        tables, metadata = FieldBinarySerialize.__tables(field)
+        write_tables_file(filename, FieldBinarySerialize.MAGIC, tables, metadata)
+
+    @staticmethod
+    def __tables(field: Field) -> Tuple[Dict[str, np.ndarray], Dict]:
+
+        point_source_table, others = field.get_element_tables()
+
+        charge_planes: List[ChargePlane] = []
+
+        for ele in others:
+            match ele:
+                case ChargePlane():
+                    charge_planes.append(ele)
+                case _:
+                    raise ValueError("Unhandled element subclass")
+
+        tables = {
+            "point_sources": point_source_table,
+            "charge_planes": ChargePlane.create_table(charge_planes),
+        }
+
+        return tables, {"version": FieldBinarySerialize.FORMAT_VERSION}
+
+    @staticmethod
+    @metrics.timed("io.deserialize_field_binary")
+    def deserialize(filename: str, mmap: bool = True) -> Field:
+        """Reads a field from a .fieldb file
+
+Parameters:
+
+    filename - the file to read
+
+    mmap (default True) - whether to memory-map the point sources instead of reading them into memory. \
+If memory-mapped, the file mustn't be modified while the field is in use
+
+Returns:
+
+    field - the field read
+"""
+
+        tables, metadata = read_tables(filename, FieldBinarySerialize.MAGIC, mmap=mmap)
+
+        if metadata.get("version") != FieldBinarySerialize.FORMAT_VERSION:
+            raise InvalidBinaryFileException("Unsupported field file version")
+
+        for name, dtype in (("point_sources", POINT_SOURCE_DTYPE), ("charge_planes", CHARGE_PLANE_DTYPE)):
+            if (name not in tables) or (tables[name].dtype != dtype) or (tables[name].ndim != 1):
+                raise InvalidBinaryFileException(f"Invalid {name} table")
+
+        field = Field()
+
+        if tables["point_sources"].shape[0] > 0:
+            field.add_point_source_table(tables["point_sources"])
+
+        for cp in ChargePlane.table_elements(tables["charge_planes"]):
+            field.add_element(cp)
+
+        return field
+
+
+# Field files
+
+FIELD_FILE_EXTENSION: str = ".field"
+BINARY_FIELD_FILE_EXTENSION: str = ".fieldb"
+
+
+def is_binary_field_filename(filename: str) -> bool:
+    return filename.lower().endswith(BINARY_FIELD_FILE_EXTENSION)
+
+
+def field_file_hash(filename: str) -> str:
+    """The SHA-256 hash of a field file's contents. Cheaper than the content hash of the field read from it, as the file isn't parsed"""
+
+    h = sha256()
+
+    with open(filename, "rb") as file:
+        while True:
+            block = file.read(1 << 20)
+            if not block:
+                break
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def write_field_file(field: Field, filename: str) -> None:
+    """Writes a field to a .field file, or to a .fieldb file if the filename has that extension"""
+
+    if is_binary_field_filename(filename):
+        FieldBinarySerialize.serialize_file(field, filename)
+        return
+
+    with open(filename, "w") as file:
+        FieldSerialize.serialize(field, file)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List, Sequence
 import numpy as np
 import vectors
 from settings import settings
@@ -13,6 +13,31 @@ LINE_SPAWN_OFFSET = EPS * 3
 """How far away from a field element to start a line"""
 
 
+# Element tables
+
+POINT_SOURCE_DTYPE = np.dtype([
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("strength", "<f8"),
+])
+"""The row type of tables of 2D point sources"""
+
+CHARGE_PLANE_DTYPE = np.dtype([
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("normal_x", "<f8"),
+    ("normal_y", "<f8"),
+    ("strength_density", "<f8"),
+])
+"""The row type of tables of 2D charge planes. The strength density is as passed to ChargePlane's constructor"""
+
+TABLE_ZERO_DISTANCE: float = 1e-8
+"""The distance within which table kernels treat positions as being at a point source, matching np.isclose(distance, 0) as used by PointSource.get_field_at"""
+
+TABLE_CHUNK_SIZE: int = 1 << 16
+"""Roughly how many (position, element) pairs table kernels work on at once. Limits the memory used by the kernels"""
+
+
 class UnboundedException(Exception): pass
 
 
@@ -194,6 +219,188 @@ class PointSource(ElementBase):
         else:
             raise ValueError("Unable to generate field line starts for more than 3-dimensional space for point sources")
 
+    # Tables
+    #
+    # Tables of point sources are structured arrays of POINT_SOURCE_DTYPE rows.
+    # The table kernels give the same results as summing the results of the equivalent element objects' methods,
+    # but work on many point sources at once without creating an object for each of them
+
+    @staticmethod
+    def create_table(pss: Sequence["PointSource"]) -> np.ndarray:
+
+        table = np.empty(shape=(len(pss),), dtype=POINT_SOURCE_DTYPE)
+
+        table["x"] = [ps.x for ps in pss]
+        table["y"] = [ps.y for ps in pss]
+        table["strength"] = [ps.strength for ps in pss]
+
+        return table
+
+    @staticmethod
+    def table_elements(table: np.ndarray) -> List["PointSource"]:
+        """Creates an element object for each row of a point source table"""
+
+        return [
+            PointSource(np.array([x, y], dtype=float), strength)
+            for x, y, strength in zip(table["x"].tolist(), table["y"].tolist(), table["strength"].tolist())
+        ]
+
+    @staticmethod
+    def _table_chunks(table: np.ndarray, pos_count: int):
+        """Splits a point source table into chunks of (positions, strengths), each small enough to be paired with pos_count positions at once"""
+
+        chunk_size = max(1, TABLE_CHUNK_SIZE // max(1, pos_count))
+
+        for start in range(0, table.shape[0], chunk_size):
+
+            chunk = table[start:start+chunk_size]
+
+            yield np.stack([chunk["x"], chunk["y"]], axis=1), np.asarray(chunk["strength"], dtype=float)
+
+    @staticmethod
+    def _table_sqr_distances(poss: np.ndarray, chunk_poss: np.ndarray) -> np.ndarray:
+        """The (N, chunk) squared distances between positions and a chunk's point sources"""
+        return sum(np.square(poss[:, [i]] - chunk_poss[np.newaxis, :, i]) for i in range(poss.shape[1]))
+
+    @staticmethod
+    def _table_line_seg_sqr_distances(seg_starts: np.ndarray, seg_ends: np.ndarray, chunk_poss: np.ndarray) -> np.ndarray:
+        """The (N, chunk) squared distances between line segments and a chunk's point sources. See vectors.line_seg_sqr_distance_to_point"""
+
+        vecs_se = seg_ends - seg_starts  # (N, dim)
+        sqr_seg_lengths = np.sum(np.square(vecs_se), axis=1)[:, np.newaxis]  # (N, 1)
+
+        vecs_sr = [chunk_poss[np.newaxis, :, i] - seg_starts[:, [i]] for i in range(seg_starts.shape[1])]  # dim * (N, chunk)
+        vecs_er = [chunk_poss[np.newaxis, :, i] - seg_ends[:, [i]] for i in range(seg_starts.shape[1])]  # dim * (N, chunk)
+
+        start_dots = sum(vecs_se[:, [i]] * v for i, v in enumerate(vecs_sr))
+        end_dots = sum(vecs_se[:, [i]] * v for i, v in enumerate(vecs_er))
+
+        dists_to_s = sum(np.square(v) for v in vecs_sr)
+        dists_to_e = sum(np.square(v) for v in vecs_er)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            projections = start_dots / sqr_seg_lengths
+            dists_to_line = sum(np.square(v - (projections * vecs_se[:, [i]])) for i, v in enumerate(vecs_sr))
+
+        return np.where(
+            np.all(np.isclose(seg_starts, seg_ends), axis=1)[:, np.newaxis],
+            dists_to_s,  # If start and end are same then just use distance to the point
+            np.where(
+                end_dots > 0,
+                dists_to_e,
+                np.where(
+                    start_dots < 0,
+                    dists_to_s,
+                    dists_to_line
+                )
+            )
+        )
+
+    @staticmethod
+    def table_field_at(table: np.ndarray, poss: np.ndarray) -> np.ndarray:
+        """Gets the sum of the values of the fields of a table of point sources at the positions given. See get_field_at"""
+
+        values = np.zeros(shape=(poss.shape[0],))
+
+        for chunk_poss, chunk_strengths in PointSource._table_chunks(table, poss.shape[0]):
+
+            dists = np.sqrt(PointSource._table_sqr_distances(poss, chunk_poss))  # (N, chunk)
+
+            with np.errstate(divide="ignore"):
+                values += np.sum(
+                    np.where(
+                        dists <= TABLE_ZERO_DISTANCE,
+                        np.inf,
+                        chunk_strengths[np.newaxis, :] / dists
+                    ),
+                    axis=1
+                )
+
+        return values
+
+    @staticmethod
+    def table_grad_at(table: np.ndarray, poss: np.ndarray) -> np.ndarray:
+        """Gets the sum of the grads of the fields of a table of point sources at the positions given. See get_grad_at"""
+
+        grads = np.zeros_like(poss, dtype=float)
+
+        for chunk_poss, chunk_strengths in PointSource._table_chunks(table, poss.shape[0]):
+
+            # Each dimension is worked on separately to keep the arrays two-dimensional, which is much faster to reduce over
+
+            displacements = [poss[:, [i]] - chunk_poss[np.newaxis, :, i] for i in range(poss.shape[1])]  # dim * (N, chunk)
+            weights = chunk_strengths[np.newaxis, :] / sum(np.square(d) for d in displacements)  # (N, chunk)
+
+            for i, d in enumerate(displacements):
+                grads[:, i] += -2 * np.einsum("ij,ij->i", d, weights)
+
+        return grads
+
+    @staticmethod
+    def table_line_seg_nearest(table: np.ndarray,
+                               seg_starts: np.ndarray,
+                               seg_ends: np.ndarray,
+                               use_absorbers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest absorbing or emitting point sources of a table to line segments. \
+Where multiple point sources are equally near, the earliest in the table is used. See Field.line_seg_nearest_element
+
+Returns:
+
+    out_sqr_distances - array of squares of distances of each line segment from its nearest point source (infinite if there were none)
+
+    out_positions - array of position vectors of the nearest point sources
+"""
+
+        N = seg_starts.shape[0]
+
+        out_sqr_distances = np.inf * np.ones(shape=(N,), dtype=seg_starts.dtype)
+        out_positions = np.zeros_like(seg_starts)
+
+        for chunk_poss, chunk_strengths in PointSource._table_chunks(table, N):
+
+            sqr_distances = PointSource._table_line_seg_sqr_distances(seg_starts, seg_ends, chunk_poss)  # (N, chunk)
+
+            # Only point sources of the type being looked for
+            type_mask = np.where(
+                use_absorbers[:, np.newaxis],
+                (chunk_strengths < 0)[np.newaxis, :],
+                (chunk_strengths > 0)[np.newaxis, :]
+            )
+
+            sqr_distances = np.where(type_mask, sqr_distances, np.inf)
+
+            nearest_idxs = np.argmin(sqr_distances, axis=1)
+            nearest_sqr_distances = sqr_distances[np.arange(N), nearest_idxs]
+
+            closer_mask = nearest_sqr_distances < out_sqr_distances
+
+            out_sqr_distances = np.where(closer_mask, nearest_sqr_distances, out_sqr_distances)
+            out_positions[closer_mask] = chunk_poss[nearest_idxs[closer_mask]]
+
+        return out_sqr_distances, out_positions
+
+    @staticmethod
+    def table_field_line_starts(table: np.ndarray, fac: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """Gets the field line starts of all of the point sources of a table, in the table's order. See get_field_line_starts"""
+
+        strengths = np.asarray(table["strength"], dtype=float)
+
+        counts = np.round(np.abs(np.ceil(np.sqrt(np.abs(strengths)))) * fac).astype(int)
+
+        source_idxs = np.repeat(np.arange(table.shape[0]), counts)
+        line_idxs = np.arange(source_idxs.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        phi = line_idxs * ((2 * np.pi) / np.maximum(1, counts[source_idxs]))
+
+        line_starts = np.stack([
+            table["x"][source_idxs] + (np.cos(phi) * LINE_SPAWN_OFFSET),
+            table["y"][source_idxs] + (np.sin(phi) * LINE_SPAWN_OFFSET),
+        ], axis=1)
+
+        positives = strengths[source_idxs] > 0
+
+        return line_starts, positives
+
 
 class ChargePlane(ElementBase):
     """An infinite plane of constant charge"""
@@ -214,6 +421,28 @@ class ChargePlane(ElementBase):
     def normal(self) -> np.ndarray:
         return self._normal
 
+    @staticmethod
+    def create_table(cps: Sequence["ChargePlane"]) -> np.ndarray:
+
+        table = np.empty(shape=(len(cps),), dtype=CHARGE_PLANE_DTYPE)
+
+        table["x"] = [cp.x for cp in cps]
+        table["y"] = [cp.y for cp in cps]
+        table["normal_x"] = [cp.normal[0] for cp in cps]
+        table["normal_y"] = [cp.normal[1] for cp in cps]
+        table["strength_density"] = [cp.strength_density / ChargePlane.STRENGTH_DENSITY_FACTOR for cp in cps]
+
+        return table
+
+    @staticmethod
+    def table_elements(table: np.ndarray) -> List["ChargePlane"]:
+        """Creates an element object for each row of a charge plane table"""
+
+        return [
+            ChargePlane(np.array([row["x"], row["y"]], dtype=float), np.array([row["normal_x"], row["normal_y"]], dtype=float), float(row["strength_density"]))
+            for row in table
+        ]
+
     @property
     def d_value(self) -> float:
         return vectors.single_dot(
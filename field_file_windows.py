@@ -1,42 +1,34 @@
 from typing import Optional
 from tkinter import filedialog
-from field import Field
-from field import FieldSerialize
+from field import FIELD_FILE_EXTENSION, BINARY_FIELD_FILE_EXTENSION
 
 
-FIELD_FILE_FILETYPE: str = "*.field"
+FIELD_FILE_FILETYPE: str = "*" + FIELD_FILE_EXTENSION
+BINARY_FIELD_FILE_FILETYPE: str = "*" + BINARY_FIELD_FILE_EXTENSION
 
+FIELD_FILETYPES = [
+    ("Field file", FIELD_FILE_FILETYPE),
+    ("Binary field file", BINARY_FIELD_FILE_FILETYPE),
+    ("All files", "*.*")
+]
 
-def save_field(field: Field) -> None:
 
-    file = filedialog.asksaveasfile(
-        mode="w",
+def ask_save_field_filename() -> Optional[str]:
+    """Asks for a file to save a field to. Returns the file's name, or None if no file was chosen"""
+
+    filename = filedialog.asksaveasfilename(
         defaultextension=FIELD_FILE_FILETYPE,
-        filetypes=[("Field file", FIELD_FILE_FILETYPE), ("All files", "*.*")]
+        filetypes=FIELD_FILETYPES
     )
 
-    if file is not None:
-
-        FieldSerialize.serialize(field, file)  # type: ignore
+    return filename if filename else None
 
-        file.close()
 
+def ask_load_field_filename() -> Optional[str]:
+    """Asks for a file to load a field from. Returns the file's name, or None if no file was chosen"""
 
-def load_field() -> Optional[Field]:
-
-    file = filedialog.askopenfile(
-        mode="r",
-        filetypes=[("Field file", FIELD_FILE_FILETYPE), ("All files", "*.*")]
+    filename = filedialog.askopenfilename(
+        filetypes=FIELD_FILETYPES
     )
 
-    if file is not None:
-
-        field = FieldSerialize.deserialize(file)  # type: ignore
-
-        file.close()
-
-        return field
-
-    else:
-
-        return None
+    return filename if filename else None
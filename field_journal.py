@@ -0,0 +1,330 @@
+from typing import List, Tuple
+from hashlib import sha256
+from io import StringIO
+from os import fsync, replace, truncate
+from os.path import splitext, isfile, getsize
+from threading import Lock
+from field import Field, FieldSerialize, FieldBinarySerialize, ElementNotInFieldException, field_file_hash, is_binary_field_filename
+from field_element import ElementBase
+from metrics import metrics
+
+
+FIELD_JOURNAL_EXTENSION: str = ".fieldjournal"
+
+JOURNAL_HEADER_KEYWORD: str = "snapshot"
+
+COMPACTION_MIN_OPERATION_COUNT: int = 1000
+"""The journal is never compacted while it has fewer operations than this"""
+
+COMPACTION_ELEMENT_COUNT_FRACTION: float = 0.5
+"""The journal is compacted once it has more operations than this fraction of the field's element count (and at least COMPACTION_MIN_OPERATION_COUNT), \
+so that replaying it never takes much longer than reading the snapshot"""
+
+
+def field_journal_filename(field_filename: str) -> str:
+    """The file that a field file's journal is stored in, next to the field file"""
+    return splitext(field_filename)[0] + FIELD_JOURNAL_EXTENSION
+
+
+def journaled_field_file_hash(field_filename: str) -> str:
+    """The SHA-256 hash of a field file's contents and of its journal's, if it has one. \
+Unlike field_file_hash, this changes when edits are saved to the journal without the field file being written"""
+
+    h = sha256(field_file_hash(field_filename).encode())
+
+    journal_filename = field_journal_filename(field_filename)
+
+    if isfile(journal_filename):
+        with open(journal_filename, "rb") as file:
+            while True:
+                block = file.read(1 << 20)
+                if not block:
+                    break
+                h.update(block)
+
+    return h.hexdigest()
+
+
+def read_field_file(filename: str) -> Field:
+    """Reads a field from a .field file with its journal's edits applied, or from a .fieldb file if the filename has that extension. \
+Neither file is changed, so this is for reading fields that won't be edited"""
+
+    if is_binary_field_filename(filename):
+        return FieldBinarySerialize.deserialize(filename)
+
+    return FieldJournal.read(filename)
+
+
+def _write_snapshot(field: Field, filename: str) -> None:
+    """Writes a field to its file, replacing the file rather than overwriting it so that a crash while writing leaves the previous file intact"""
+
+    temp_filename = filename + ".tmp"
+
+    with open(temp_filename, "w") as file:
+        FieldSerialize.serialize(field, file)
+        file.flush()
+        fsync(file.fileno())
+
+    replace(temp_filename, filename)
+
+
+def _element_text(ele: ElementBase) -> str:
+
+    stream = StringIO()
+    FieldSerialize.write_element(stream, ele)
+
+    return stream.getvalue().strip()
+
+
+class FieldJournal:
+    """An append-only journal of the edits made to a field since it was last fully saved to its .field file (the snapshot).
+
+Saving appends the edits made since the last save, so costs time proportional to the number of edits rather than to the size of the field. \
+Once the journal has grown large enough, saving instead compacts it by writing a full snapshot and starting a new, empty journal. \
+The journal starts with the hash of the snapshot it applies to, so a journal left behind by an interrupted compaction is ignored. \
+Operations are written one line each and a final line without a newline is ignored when replaying, so a crash while saving loses at most the edits being saved. \
+Anything after the last operation that could be replayed is cut off the journal when it is opened, so that later edits aren't appended to a broken line. \
+Operations refer to elements by their position in the field's order of elements, which .field files keep
+
+Parameters:
+
+    field_filename - the field file that is the journal's snapshot
+"""
+
+    def __init__(self, field_filename: str):
+
+        self.__field_filename = field_filename
+        self.__journal_filename = field_journal_filename(field_filename)
+
+        self.__lock = Lock()
+        self.__pending: List[str] = []
+        """Operations recorded but not yet written"""
+        self.__operation_count: int = 0
+        """How many operations have been written to the journal file"""
+        self.__journal_length: int = 0
+        """How many bytes at the start of the journal file are its header and written operations. Anything after these is incomplete"""
+
+    @property
+    def field_filename(self) -> str:
+        return self.__field_filename
+
+    @property
+    def journal_filename(self) -> str:
+        return self.__journal_filename
+
+    @property
+    def operation_count(self) -> int:
+        """How many operations are in the journal, including those not yet written"""
+        with self.__lock:
+            return self.__operation_count + len(self.__pending)
+
+    @property
+    def has_unsaved_operations(self) -> bool:
+        with self.__lock:
+            return len(self.__pending) > 0
+
+    # Creating and opening
+
+    @staticmethod
+    def create(field: Field, field_filename: str) -> "FieldJournal":
+        """Writes a field to a file as a full snapshot and starts a new journal for it"""
+
+        journal = FieldJournal(field_filename)
+        journal.compact(field)
+
+        return journal
+
+    @staticmethod
+    def open(field_filename: str) -> Tuple[Field, "FieldJournal"]:
+        """Reads a field from its file and replays the file's journal, if it has one that applies to the file
+
+Returns:
+
+    field - the field, with the journal's edits applied
+
+    journal - the journal, to record further edits to
+"""
+
+        with open(field_filename, "r") as file:
+            field = FieldSerialize.deserialize(file)
+
+        journal = FieldJournal(field_filename)
+
+        if not (isfile(journal.__journal_filename) and journal.__replay(field)):
+            with journal.__lock:
+                journal.__start_journal()
+
+        elif journal.__journal_length < getsize(journal.__journal_filename):
+            # Operations appended after an incomplete or invalid line would never be replayed, so the rest of the journal is cut off
+            truncate(journal.__journal_filename, journal.__journal_length)
+
+        return field, journal
+
+    @staticmethod
+    def read(field_filename: str) -> Field:
+        """Reads a field from its file and replays the file's journal, if it has one that applies to the file, without changing either file"""
+
+        with open(field_filename, "r") as file:
+            field = FieldSerialize.deserialize(file)
+
+        journal = FieldJournal(field_filename)
+
+        if isfile(journal.__journal_filename):
+            journal.__replay(field)
+
+        return field
+
+    def __replay(self, field: Field) -> bool:
+        """Applies the journal's operations to the field read from the snapshot. Returns whether the journal applies to the snapshot"""
+
+        with open(self.__journal_filename, "rb") as file:
+            data = file.read()
+
+        # A final line without a newline was being written when the program stopped, so is incomplete
+        lines = data.split(b"\n")[:-1]
+
+        if len(lines) == 0:
+            return False
+
+        keyword, _, snapshot_hash = lines[0].decode(errors="replace").partition(" ")
+
+        if (keyword != JOURNAL_HEADER_KEYWORD) or (snapshot_hash != field_file_hash(self.__field_filename)):
+            # The journal is for a previous snapshot so its operations are already in the snapshot
+            return False
+
+        journal_length = len(lines[0]) + 1
+
+        for line in lines[1:]:
+
+            try:
+                FieldJournal.__apply(field, line.decode())
+            except (ValueError, ElementNotInFieldException):
+                # Later operations depend on the order of elements after this one so can't be applied either
+                print(f"Encountered invalid line when reading journal:\n{line.decode(errors='replace')}")
+                break
+
+            self.__operation_count += 1
+            journal_length += len(line) + 1
+
+        self.__journal_length = journal_length
+
+        return True
+
+    @staticmethod
+    def __apply(field: Field, line: str) -> None:
+
+        operation, _, rest = line.partition(" ")
+
+        match operation:
+
+            case "add":
+                field.add_element(FieldSerialize.parse_element(rest))
+
+            case "remove":
+                field.remove_element(field.element_at(int(rest)))
+
+            case "modify":
+                index, _, ele_text = rest.partition(" ")
+                field.replace_element(field.element_at(int(index)), FieldSerialize.parse_element(ele_text))
+
+            case _:
+                raise ValueError("Unknown journal operation")
+
+    # Recording
+
+    def record_add(self, ele: ElementBase) -> None:
+        """Records an element being added to the end of the field"""
+        with self.__lock:
+            self.__pending.append(f"add {_element_text(ele)}")
+
+    def record_remove(self, index: int) -> None:
+        """Records the element at a position in the field's order of elements being removed"""
+        with self.__lock:
+            self.__pending.append(f"remove {index}")
+
+    def record_modify(self, index: int, new: ElementBase) -> None:
+        """Records the element at a position in the field's order of elements being replaced"""
+        with self.__lock:
+            self.__pending.append(f"modify {index} {_element_text(new)}")
+
+    # Saving
+
+    def should_compact(self, field: Field) -> bool:
+        return self.operation_count >= max(
+            COMPACTION_MIN_OPERATION_COUNT,
+            COMPACTION_ELEMENT_COUNT_FRACTION * field.element_count
+        )
+
+    def save(self, field: Field) -> None:
+        """Saves the operations recorded since the last save, compacting the journal into a new snapshot if it has grown large enough
+
+Parameters:
+
+    field - the field with all of the recorded operations applied, for if the journal is compacted
+"""
+
+        if self.should_compact(field):
+            self.compact(field)
+        else:
+            self.flush()
+
+    @metrics.timed("io.journal_flush")
+    def flush(self) -> None:
+        """Appends the operations recorded since the last save to the journal file"""
+
+        with self.__lock:
+
+            if len(self.__pending) == 0:
+                return
+
+            data = "".join(line + "\n" for line in self.__pending).encode()
+
+            with open(self.__journal_filename, "r+b") as file:
+
+                # Anything after the written operations is left from a save that was interrupted, so is overwritten
+
+                file.truncate(self.__journal_length)
+                file.seek(self.__journal_length)
+
+                file.write(data)
+                file.flush()
+                fsync(file.fileno())
+
+            self.__journal_length += len(data)
+            self.__operation_count += len(self.__pending)
+            self.__pending = []
+
+    @metrics.timed("io.journal_compact")
+    def compact(self, field: Field) -> None:
+        """Writes the field to the field file as a full snapshot and starts a new, empty journal
+
+Parameters:
+
+    field - the field with all of the recorded operations applied
+"""
+
+        with self.__lock:
+
+            # N.B. if this is interrupted after the snapshot is written, the old journal doesn't match the new snapshot so is ignored
+
+            _write_snapshot(field, self.__field_filename)
+
+            self.__start_journal()
+
+    def __start_journal(self) -> None:
+        """Replaces the journal file with an empty journal for the current snapshot. Must be called with the lock held"""
+
+        temp_filename = self.__journal_filename + ".tmp"
+
+        header = f"{JOURNAL_HEADER_KEYWORD} {field_file_hash(self.__field_filename)}\n".encode()
+
+        with open(temp_filename, "wb") as file:
+            file.write(header)
+            file.flush()
+            fsync(file.fileno())
+
+        replace(temp_filename, self.__journal_filename)
+
+        self.__journal_length = len(header)
+        self.__operation_count = 0
+        self.__pending = []
@@ -0,0 +1,252 @@
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+from os.path import splitext
+import json
+import numpy as np
+import numpy.typing as npt
+from render_geometry import line_point_counts
+from binary_tables import write_tables_file, read_tables, InvalidBinaryFileException
+from metrics import metrics
+
+
+FIELD_LINES_EXTENSION: str = ".fieldlines"
+
+FIELD_LINES_MAGIC: bytes = b"FLINES\0\0"
+FIELD_LINES_FORMAT_VERSION: int = 1
+
+
+def field_lines_filename(field_filename: str) -> str:
+    """The file that a field file's traced lines are stored in, next to the field file"""
+    return splitext(field_filename)[0] + FIELD_LINES_EXTENSION
+
+
+class TracedLines:
+    """Traced field lines stored without padding, with the points of all of the lines in one array.
+
+Parameters:
+
+    points - a (P,dim) array of the points of all of the lines, one line after another
+
+    offsets - a (L+1,) array of the index of each line's first point in points, followed by the total number of points
+
+    positives - a (L,) array of whether each line is a positive line
+
+    terminations - a (L,) array of the LINE_TERMINATION_ value of why each line stopped
+"""
+
+    def __init__(self,
+                 points: np.ndarray,
+                 offsets: np.ndarray,
+                 positives: np.ndarray,
+                 terminations: np.ndarray):
+
+        self.points = points
+        self.offsets = offsets
+        self.positives = positives
+        self.terminations = terminations
+
+    @property
+    def line_count(self) -> int:
+        return self.positives.shape[0]
+
+    @staticmethod
+    def empty(dim: int = 2, dtype: npt.DTypeLike = float) -> "TracedLines":
+        return TracedLines(
+            np.zeros(shape=(0, dim), dtype=dtype),
+            np.zeros(shape=(1,), dtype=np.int64),
+            np.zeros(shape=(0,), dtype=bool),
+            np.zeros(shape=(0,), dtype=np.int8)
+        )
+
+    @staticmethod
+    def from_padded(lines: np.ndarray, positives: np.ndarray, terminations: np.ndarray) -> "TracedLines":
+        """Stores the lines returned by Field.trace_field_lines, keeping only the points of each line that would be drawn"""
+
+        counts = line_point_counts(lines)
+
+        keep_mask = np.arange(lines.shape[1])[np.newaxis, :] < counts[:, np.newaxis]
+
+        return TracedLines(
+            lines[keep_mask],
+            np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            positives.astype(bool),
+            terminations.astype(np.int8)
+        )
+
+    @staticmethod
+    def concatenate(groups: Sequence["TracedLines"], dim: int = 2) -> "TracedLines":
+        """Joins the lines of many groups into one group, keeping the groups' lines in order"""
+
+        if len(groups) == 0:
+            return TracedLines.empty(dim)
+
+        point_counts = np.array([group.offsets[-1] for group in groups], dtype=np.int64)
+        point_starts = np.concatenate([[0], np.cumsum(point_counts)])
+
+        return TracedLines(
+            np.concatenate([np.asarray(group.points) for group in groups]),
+            np.concatenate(
+                [np.asarray(group.offsets[:-1]) + point_starts[i] for i, group in enumerate(groups)]
+                + [np.array([point_starts[-1]])]
+            ).astype(np.int64),
+            np.concatenate([group.positives for group in groups]).astype(bool),
+            np.concatenate([group.terminations for group in groups]).astype(np.int8)
+        )
+
+    def to_padded(self) -> np.ndarray:
+        """Recreates the lines in the form returned by Field.trace_field_lines, with each line padded by repeating its final point"""
+
+        counts = np.diff(self.offsets)
+
+        if (self.line_count == 0) or (np.max(counts) == 0):
+            return np.zeros(shape=(self.line_count, 1, self.points.shape[1]))
+
+        point_idxs = self.offsets[:-1, np.newaxis] + np.minimum(
+            np.arange(np.max(counts))[np.newaxis, :],
+            np.maximum(counts, 1)[:, np.newaxis] - 1
+        )
+
+        return np.asarray(self.points)[point_idxs]
+
+
+class FieldLineStore:
+    """Traced field lines of a field, in groups (such as line tiles), that can be saved and reloaded without retracing them.
+
+A store is only valid for the field (identified by its content hash) and the trace parameters that its lines were traced with
+
+Parameters:
+
+    field_hash - the content hash of the field that the lines were traced for
+
+    params - the JSON-serializable parameters that the lines were traced with
+
+    groups (optional) - the lines of each group, by the group's key. Keys must be tuples of integers
+"""
+
+    def __init__(self,
+                 field_hash: str,
+                 params: Any,
+                 groups: Optional[Dict[Tuple[int, ...], TracedLines]] = None):
+
+        self.__field_hash = field_hash
+        self.__params = FieldLineStore.__normalised_params(params)
+        self.__groups: Dict[Tuple[int, ...], TracedLines] = groups if groups is not None else {}
+
+    @staticmethod
+    def __normalised_params(params: Any) -> Any:
+        # N.B. this makes the parameters the same as they would be after being saved and loaded (eg. tuples become lists)
+        return json.loads(json.dumps(params))
+
+    @property
+    def field_hash(self) -> str:
+        return self.__field_hash
+
+    @property
+    def params(self) -> Any:
+        return self.__params
+
+    def __len__(self) -> int:
+        return len(self.__groups)
+
+    def __contains__(self, key: Tuple[int, ...]) -> bool:
+        return key in self.__groups
+
+    def matches(self, field_hash: str, params: Any) -> bool:
+        """Whether the lines are valid for a field with some parameters"""
+        return (field_hash == self.__field_hash) and (FieldLineStore.__normalised_params(params) == self.__params)
+
+    def get(self, key: Tuple[int, ...]) -> Optional[TracedLines]:
+        return self.__groups.get(key)
+
+    def put(self, key: Tuple[int, ...], lines: TracedLines) -> None:
+        self.__groups[key] = lines
+
+    def items(self) -> Iterator[Tuple[Tuple[int, ...], TracedLines]]:
+        return iter(self.__groups.items())
+
+    @metrics.timed("io.field_lines_save")
+    def save(self, filename: str) -> None:
+        """Writes the store to a file of all of the groups' lines concatenated, with the groups' keys and line ranges"""
+
+        keys = list(self.__groups.keys())
+        groups = [self.__groups[key] for key in keys]
+
+        key_length = len(keys[0]) if len(keys) > 0 else 0
+        assert all(len(key) == key_length for key in keys), "Group keys must all be the same length"
+
+        dim = groups[0].points.shape[1] if len(groups) > 0 else 2
+
+        line_counts = np.array([group.line_count for group in groups], dtype=np.int64)
+        point_counts = np.array([group.offsets[-1] for group in groups], dtype=np.int64)
+
+        # Each group's offsets are shifted to be offsets into the concatenated points
+
+        point_starts = np.concatenate([[0], np.cumsum(point_counts)])
+
+        offsets = np.concatenate(
+            [group.offsets[:-1] + point_starts[i] for i, group in enumerate(groups)]
+            + [np.array([point_starts[-1]])]
+        ).astype(np.int64)
+
+        tables = {
+            "group_keys": np.array(keys, dtype=np.int64).reshape((len(keys), key_length)),
+            "group_line_offsets": np.concatenate([[0], np.cumsum(line_counts)]).astype(np.int64),
+            "points": np.concatenate([np.asarray(group.points, dtype=float) for group in groups]) if len(groups) > 0 else np.zeros(shape=(0, dim)),
+            "line_offsets": offsets,
+            "positives": np.concatenate([group.positives for group in groups]).astype(np.uint8) if len(groups) > 0 else np.zeros(shape=(0,), dtype=np.uint8),
+            "terminations": np.concatenate([group.terminations for group in groups]).astype(np.int8) if len(groups) > 0 else np.zeros(shape=(0,), dtype=np.int8),
+        }
+
+        metadata = {
+            "version": FIELD_LINES_FORMAT_VERSION,
+            "field_hash": self.__field_hash,
+            "params": self.__params,
+        }
+
+        # N.B. the file is replaced rather than overwritten as this store's lines may be memory-mapped from it
+        write_tables_file(filename, FIELD_LINES_MAGIC, tables, metadata)
+
+    @staticmethod
+    @metrics.timed("io.field_lines_load")
+    def load(filename: str) -> "FieldLineStore":
+        """Reads a store from a file. The lines' points are memory-mapped, so reading is fast however many lines there are"""
+
+        tables, metadata = read_tables(filename, FIELD_LINES_MAGIC, mmap=True)
+
+        if metadata.get("version") != FIELD_LINES_FORMAT_VERSION:
+            raise InvalidBinaryFileException("Unsupported field lines file version")
+
+        group_keys = tables["group_keys"]
+        group_line_offsets = tables["group_line_offsets"]
+        line_offsets = tables["line_offsets"]
+        positives = tables["positives"]
+        terminations = tables["terminations"]
+
+        groups: Dict[Tuple[int, ...], TracedLines] = {}
+
+        for i, key in enumerate(group_keys.tolist()):
+
+            first_line = int(group_line_offsets[i])
+            end_line = int(group_line_offsets[i+1])
+
+            group_offsets = np.asarray(line_offsets[first_line:end_line+1])
+            first_point = int(group_offsets[0])
+
+            groups[tuple(key)] = TracedLines(
+                tables["points"][first_point:int(group_offsets[-1])],
+                group_offsets - first_point,
+                np.asarray(positives[first_line:end_line], dtype=bool),
+                terminations[first_line:end_line]
+            )
+
+        return FieldLineStore(metadata["field_hash"], metadata["params"], groups)
+
+    @staticmethod
+    def try_load(filename: str, field_hash: str, params: Any) -> Optional["FieldLineStore"]:
+        """Reads a store from a file if the file exists and its lines are valid for a field with some parameters, otherwise returns None"""
+
+        try:
+            store = FieldLineStore.load(filename)
+        except (OSError, InvalidBinaryFileException, KeyError):
+            return None
+
+        return store if store.matches(field_hash, params) else None
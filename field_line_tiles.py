@@ -0,0 +1,461 @@
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from threading import Thread, Condition
+import numpy as np
+import numpy.typing as npt
+from field import Field, TraceCancelledException, LINE_TERMINATION_MAX_POINTS, INTEGRATOR_EULER
+from render_geometry import FieldLineGeometry, build_field_line_geometry
+from field_line_store import TracedLines
+from recalculation_worker import TraceConfig
+from viewport import Viewport
+from perf_stats import perf_stats, PerfTotals
+from metrics import metrics
+
+
+TILE_SIZE: int = 256
+"""The width and height of line tiles in screen space"""
+
+TILE_TRACE_MARGIN: int = 1
+"""How many tiles around the shown region have their lines drawn, as their lines can enter the shown region. \
+Also the fewest tiles beyond its own tile that a tile's lines are traced for before being clipped"""
+
+MAX_CACHED_TILES: int = 1024
+"""How many tiles' geometry is kept before the least recently used tiles are discarded"""
+
+
+TileKey = Tuple[int, int, int]
+"""A tile's zoom level, column and row"""
+
+
+def tile_world_size(zoom_level: int) -> float:
+    return TILE_SIZE * Viewport.scale_of_zoom_level(zoom_level)
+
+
+def tile_bounds(key: TileKey) -> np.ndarray:
+    """The range of positions in world-space covered by a tile"""
+
+    zoom_level, col, row = key
+    size = tile_world_size(zoom_level)
+
+    return np.array([
+        [col * size, (col + 1) * size],
+        [row * size, (row + 1) * size]
+    ])
+
+
+def tiles_covering(bounds: np.ndarray, zoom_level: int, margin: int = 0) -> List[TileKey]:
+    """Finds the tiles of a zoom level that cover some world-space bounds, ordered by how close they are to the centre of the bounds
+
+Parameters:
+
+    bounds - the range of positions in world-space to cover
+
+    zoom_level - the zoom level of the tiles
+
+    margin (default 0) - how many extra tiles to include around the tiles that cover the bounds
+
+Returns:
+
+    keys - the tiles' keys
+"""
+
+    size = tile_world_size(zoom_level)
+
+    min_col = int(np.floor(bounds[0, 0] / size)) - margin
+    max_col = int(np.ceil(bounds[0, 1] / size)) - 1 + margin
+    min_row = int(np.floor(bounds[1, 0] / size)) - margin
+    max_row = int(np.ceil(bounds[1, 1] / size)) - 1 + margin
+
+    centre = np.mean(bounds, axis=1) / size - 0.5
+
+    keys = [
+        (zoom_level, col, row)
+        for col in range(min_col, max_col + 1)
+        for row in range(min_row, max_row + 1)
+    ]
+
+    keys.sort(key=lambda key: (key[1] - centre[0]) ** 2 + (key[2] - centre[1]) ** 2)
+
+    return keys
+
+
+def tile_trace_margin(width: int, height: int) -> int:
+    """How many tiles beyond its own tile a tile's lines are traced for before being clipped, when showing a region of some size in screen space. \
+Lines starting in any of the tiles covering the shown region are traced to at least its edges, as they would be by tracing the whole region at once"""
+    return max(TILE_TRACE_MARGIN, int(np.ceil(max(width, height) / TILE_SIZE)))
+
+
+def tile_store_params(base_config: TraceConfig, margin: int = TILE_TRACE_MARGIN) -> Dict[str, Any]:
+    """The parameters that line tiles traced with a config and a margin (see tile_trace_margin) depend on, for checking that stored tiles are still valid"""
+    return {
+        "config": list(base_config.key),
+        "tile_size": TILE_SIZE,
+        "tile_trace_margin": margin,
+    }
+
+
+def trace_tile_lines(field: Field,
+                     key: TileKey,
+                     config: TraceConfig,
+                     should_cancel: Optional[Callable[[], bool]] = None,
+                     stats: Optional[PerfTotals] = None,
+                     integrator: str = INTEGRATOR_EULER,
+                     dtype: npt.DTypeLike = float,
+                     margin: int = TILE_TRACE_MARGIN) -> TracedLines:
+    """Traces the field lines starting in a tile.
+
+Each line is started by the tile it starts in, so the tiles of a zoom level together have each of the field's lines exactly once. \
+Lines are traced until they leave the tile's surrounding margin of tiles, so the margin should be large enough for lines to reach the edges of the shown region. See tile_trace_margin
+
+Parameters:
+
+    field - the field to trace the lines of
+
+    key - the tile to trace
+
+    config - the values to trace the lines with. Its scale should be the tile's zoom level's scale
+
+    should_cancel (optional) - a callable checked before each step of tracing. If it returns True then tracing is abandoned by raising a TraceCancelledException
+
+    stats (optional) - the totals to add the performance figures of tracing the tile to
+
+    integrator (default INTEGRATOR_EULER) - the method to step along the lines with. See Field.trace_field_lines
+
+    dtype (default float) - the floating-point type to trace the lines' positions with. See Field.trace_field_lines
+
+    margin (default TILE_TRACE_MARGIN) - how many tiles beyond the tile the lines are traced for before being clipped
+
+Returns:
+
+    lines - the tile's lines
+"""
+
+    bounds = tile_bounds(key)
+    size = tile_world_size(key[0])
+
+    line_starts, positives = field.get_field_line_starts(bounds, fac=config.line_count_factor)
+
+    in_tile_mask = np.all((line_starts >= bounds[:, 0]) & (line_starts < bounds[:, 1]), axis=1)
+
+    line_starts = line_starts[in_tile_mask]
+    positives = positives[in_tile_mask]
+
+    if line_starts.shape[0] == 0:
+        return TracedLines.empty(bounds.shape[0], dtype)
+
+    clip_bounds = bounds + (np.array([-1.0, 1.0]) * margin * size)
+
+    terminations = np.zeros(shape=(line_starts.shape[0],), dtype=np.int8)
+
+    with metrics.timer("trace.tile") as trace_timer:
+        field_lines = field.trace_field_lines(
+            line_starts,
+            config.max_step_count,
+            positives,
+            step_distance=config.step_distance,
+            element_stop_distance=config.element_stop_distance,
+            clip_ranges=clip_bounds,
+            should_cancel=should_cancel,
+            terminations=terminations,
+            integrator=integrator,
+            dtype=dtype
+        )
+
+    if stats is not None:
+        stats.add_trace(
+            trace_timer.elapsed_ms,
+            traced_line_count=field_lines.shape[0],
+            unfinished_line_count=int(np.count_nonzero(terminations == LINE_TERMINATION_MAX_POINTS))
+        )
+
+    metrics.increment("trace.lines", field_lines.shape[0])
+
+    return TracedLines.from_padded(field_lines, positives, terminations)
+
+
+def build_tile_geometry(lines: TracedLines,
+                        config: TraceConfig,
+                        stats: Optional[PerfTotals] = None) -> FieldLineGeometry:
+    """Builds the zoom-space geometry of a tile's lines
+
+Parameters:
+
+    lines - the tile's lines
+
+    config - the values to draw the lines with. Its scale should be the tile's zoom level's scale
+
+    stats (optional) - the totals to add the size of the geometry to
+
+Returns:
+
+    geometry - the geometry of the tile's lines
+"""
+
+    if lines.line_count == 0:
+        return FieldLineGeometry.empty()
+
+    with metrics.timer("render.tile_geometry"):
+        geometry = build_field_line_geometry(
+            lines.to_padded(),
+            lines.positives,
+            scale=config.scale,
+            show_arrows=config.show_arrows,
+            arrowhead_spacing=config.arrowhead_spacing,
+            simplify_tolerance=config.simplify_tolerance
+        )
+
+    if stats is not None:
+        stats.add_geometry(geometry)
+
+    return geometry
+
+
+def trace_tile(field: Field,
+               key: TileKey,
+               config: TraceConfig,
+               should_cancel: Optional[Callable[[], bool]] = None,
+               stats: Optional[PerfTotals] = None,
+               margin: int = TILE_TRACE_MARGIN) -> FieldLineGeometry:
+    """Traces the field lines starting in a tile and builds their zoom-space geometry. See trace_tile_lines and build_tile_geometry"""
+
+    lines = trace_tile_lines(field, key, config, should_cancel, stats, margin=margin)
+
+    return build_tile_geometry(lines, config, stats)
+
+
+class LineTileCache:
+    """The geometry of the line tiles traced for a field, keeping only the most recently used tiles.
+
+All of the tiles are for the same context (eg. the field's version and the trace config used). \
+Changing the context discards all of the tiles. \
+The traced lines that tiles' geometry was built from can be kept with the geometry, so that they can be saved
+
+Parameters:
+
+    max_tiles (optional) - how many tiles to keep
+"""
+
+    def __init__(self, max_tiles: int = MAX_CACHED_TILES):
+
+        self.__max_tiles = max_tiles
+
+        self.__context: Optional[Hashable] = None
+        self.__tiles: OrderedDict[TileKey, FieldLineGeometry] = OrderedDict()
+        self.__tile_lines: Dict[TileKey, TracedLines] = {}
+
+    def __len__(self) -> int:
+        return len(self.__tiles)
+
+    def __contains__(self, key: TileKey) -> bool:
+        return key in self.__tiles
+
+    @property
+    def context(self) -> Optional[Hashable]:
+        return self.__context
+
+    def set_context(self, context: Hashable) -> None:
+        """Sets the context of the tiles, discarding the tiles if the context has changed"""
+
+        if context != self.__context:
+            self.__tiles.clear()
+            self.__tile_lines.clear()
+            self.__context = context
+
+    def get(self, key: TileKey) -> Optional[FieldLineGeometry]:
+
+        geometry = self.__tiles.get(key)
+
+        if geometry is not None:
+            self.__tiles.move_to_end(key)
+
+        return geometry
+
+    def put(self, key: TileKey, geometry: FieldLineGeometry, lines: Optional[TracedLines] = None) -> None:
+
+        self.__tiles[key] = geometry
+        self.__tiles.move_to_end(key)
+
+        if lines is not None:
+            self.__tile_lines[key] = lines
+        else:
+            self.__tile_lines.pop(key, None)
+
+        while len(self.__tiles) > self.__max_tiles:
+            discarded_key, _ = self.__tiles.popitem(last=False)
+            self.__tile_lines.pop(discarded_key, None)
+
+    def iter_lines(self) -> Iterator[Tuple[TileKey, TracedLines]]:
+        """Iterates through the traced lines kept for the tiles"""
+        return iter(list(self.__tile_lines.items()))
+
+
+class LineTileWorker:
+    """A background thread that traces line tiles.
+
+Submitting tiles replaces any tiles still waiting to be traced. \
+If the submission's context is the same as the previous submission's, the tile being traced is finished, otherwise it is cancelled. \
+Each tile's geometry and traced lines are published as soon as it has been traced
+
+Parameters:
+
+    record_stats (default True) - whether to record the performance figures of the worker's tiles in perf_stats. \
+The figures of all of the tiles traced between the worker being idle are added up and recorded once it is idle again
+"""
+
+    def __init__(self, record_stats: bool = True):
+
+        self.__record_stats = record_stats
+
+        self.__condition = Condition()
+
+        self.__generation: int = 0
+        """Incremented whenever the context changes, to cancel the tile being traced"""
+        self.__context: Optional[Hashable] = None
+        self.__field: Optional[Field] = None
+        self.__base_config: Optional[TraceConfig] = None
+        self.__margin: int = TILE_TRACE_MARGIN
+        self.__pending_keys: List[TileKey] = []
+
+        self.__working: bool = False
+        self.__totals: Optional[PerfTotals] = None
+        """The performance figures of the tiles traced since the worker was last idle"""
+        self.__results: List[Tuple[Hashable, TileKey, FieldLineGeometry, TracedLines]] = []
+        self.__running: bool = True
+
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    @property
+    def is_busy(self) -> bool:
+        """Whether there are tiles waiting or being traced"""
+        with self.__condition:
+            return self.__working or (len(self.__pending_keys) > 0)
+
+    def submit(self,
+               field: Field,
+               context: Hashable,
+               base_config: TraceConfig,
+               keys: Sequence[TileKey],
+               margin: int = TILE_TRACE_MARGIN) -> None:
+        """Requests tiles to be traced, replacing any tiles still waiting to be traced
+
+Parameters:
+
+    field - the field to trace. This mustn't be modified after being submitted, so should usually be a copy
+
+    context - what the tiles are being traced for. Tiles' results are published with the context they were traced for
+
+    base_config - the values to trace and draw the lines with, which are rescaled for each tile's zoom level
+
+    keys - the tiles to trace, in the order to trace them in
+
+    margin (default TILE_TRACE_MARGIN) - how many tiles beyond each tile its lines are traced for. As the tiles' lines depend on it, it should be part of the context
+"""
+
+        with self.__condition:
+
+            if context != self.__context:
+                self.__generation += 1
+                self.__context = context
+                self.__field = field
+                self.__base_config = base_config
+                self.__margin = margin
+
+            self.__pending_keys = list(keys)
+            self.__condition.notify_all()
+
+    def take_results(self) -> List[Tuple[Hashable, TileKey, FieldLineGeometry, TracedLines]]:
+        """Takes the (context, tile key, geometry, lines) of each tile traced since this was last called"""
+
+        with self.__condition:
+
+            results = self.__results
+            self.__results = []
+
+            return results
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until there are no tiles waiting or being traced. Returns False if the timeout was reached first"""
+
+        with self.__condition:
+            return self.__condition.wait_for(
+                lambda: (not self.__working) and (len(self.__pending_keys) == 0),
+                timeout=timeout
+            )
+
+    def stop(self) -> None:
+
+        with self.__condition:
+            self.__running = False
+            self.__pending_keys = []
+            self.__condition.notify_all()
+
+        self.__thread.join()
+
+    def __is_superseded(self, generation: int) -> bool:
+        # N.B. reading an int attribute is atomic so this doesn't need the lock
+        return (generation != self.__generation) or (not self.__running)
+
+    def __run(self) -> None:
+
+        while True:
+
+            # Wait for a tile
+
+            with self.__condition:
+
+                self.__condition.wait_for(lambda: (len(self.__pending_keys) > 0) or (not self.__running))
+
+                if not self.__running:
+                    return
+
+                key = self.__pending_keys.pop(0)
+                generation = self.__generation
+                context = self.__context
+                field = self.__field
+                base_config = self.__base_config
+                margin = self.__margin
+
+                self.__working = True
+
+                if self.__record_stats and (self.__totals is None):
+                    self.__totals = PerfTotals()
+
+                totals = self.__totals
+
+            assert field is not None
+            assert base_config is not None
+
+            # Trace the tile
+
+            config = base_config.rescaled(Viewport.scale_of_zoom_level(key[0]))
+
+            lines: Optional[TracedLines]
+
+            try:
+                lines = trace_tile_lines(
+                    field,
+                    key,
+                    config,
+                    should_cancel=lambda: self.__is_superseded(generation),
+                    stats=totals,
+                    margin=margin
+                )
+            except TraceCancelledException:
+                lines = None
+
+            geometry = build_tile_geometry(lines, config, stats=totals) if lines is not None else None
+
+            # Publish the result if it is still for the latest context
+
+            with self.__condition:
+
+                if (lines is not None) and (geometry is not None) and (not self.__is_superseded(generation)):
+                    self.__results.append((context, key, geometry, lines))
+
+                if (self.__totals is not None) and (len(self.__pending_keys) == 0):
+                    perf_stats.record_totals(self.__totals)
+                    self.__totals = None
+
+                self.__working = False
+                self.__condition.notify_all()
@@ -0,0 +1,361 @@
+#!/bin/env python3
+
+from typing import Any, Dict, List, Optional, Sequence, TextIO, Tuple
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from os import makedirs
+from os.path import join as joinpath, splitext
+import json
+import numpy as np
+import numpy.typing as npt
+from field import Field, INTEGRATORS, INTEGRATOR_EULER
+from field import LINE_TERMINATION_MAX_POINTS, LINE_TERMINATION_CLIPPED, LINE_TERMINATION_ELEMENT
+from field_journal import read_field_file
+from field_line_store import FieldLineStore, TracedLines, FIELD_LINES_EXTENSION
+from field_line_tiles import TileKey, tiles_covering, trace_tile_lines, tile_store_params, tile_trace_margin, TILE_TRACE_MARGIN
+from recalculation_worker import TraceConfig
+from viewport import Viewport
+from settings import load_settings
+from metrics import metrics
+
+
+DTYPES: Dict[str, type] = {
+    "float32": np.float32,
+    "float64": np.float64,
+}
+"""The floating-point types that lines can be traced with, by name"""
+
+OUTPUT_FORMATS: Tuple[str, ...] = ("npz", "csv", "json")
+
+TERMINATION_NAMES: Dict[int, str] = {
+    LINE_TERMINATION_MAX_POINTS: "max_points",
+    LINE_TERMINATION_CLIPPED: "clipped",
+    LINE_TERMINATION_ELEMENT: "element",
+}
+
+
+class ViewportLines:
+    """The lines traced for a viewport, in the line tiles that they start in
+
+Parameters:
+
+    tile_keys - the keys of the tiles that the lines were traced for
+
+    lines - the lines of all of the tiles, one tile's lines after another
+
+    tile_line_offsets - a (T+1,) array of the index of each tile's first line in lines, followed by the total number of lines
+"""
+
+    def __init__(self,
+                 tile_keys: List[TileKey],
+                 lines: TracedLines,
+                 tile_line_offsets: np.ndarray):
+
+        self.tile_keys = tile_keys
+        self.lines = lines
+        self.tile_line_offsets = tile_line_offsets
+
+    @property
+    def line_tile_keys(self) -> np.ndarray:
+        """A (L,3) array of the key of the tile that each line starts in"""
+
+        keys = np.array(self.tile_keys, dtype=np.int64).reshape((len(self.tile_keys), 3))
+
+        return np.repeat(keys, np.diff(self.tile_line_offsets), axis=0)
+
+
+# Tracing
+
+_worker_field: Optional[Field] = None
+_worker_base_config: Optional[TraceConfig] = None
+_worker_integrator: str = INTEGRATOR_EULER
+_worker_dtype: npt.DTypeLike = float
+_worker_margin: int = TILE_TRACE_MARGIN
+
+
+def _init_worker(field: Field, base_config: TraceConfig, integrator: str, dtype: npt.DTypeLike, margin: int) -> None:
+
+    global _worker_field, _worker_base_config, _worker_integrator, _worker_dtype, _worker_margin
+
+    _worker_field = field
+    _worker_base_config = base_config
+    _worker_integrator = integrator
+    _worker_dtype = dtype
+    _worker_margin = margin
+
+
+def _trace_tile(key: TileKey) -> TracedLines:
+
+    assert _worker_field is not None
+    assert _worker_base_config is not None
+
+    return trace_tile_lines(
+        _worker_field,
+        key,
+        _worker_base_config.rescaled(Viewport.scale_of_zoom_level(key[0])),
+        integrator=_worker_integrator,
+        dtype=_worker_dtype,
+        margin=_worker_margin
+    )
+
+
+def trace_store_params(base_config: TraceConfig, integrator: str, dtype: npt.DTypeLike, margin: int = TILE_TRACE_MARGIN) -> Dict[str, Any]:
+    """The parameters that lines traced by trace_viewport depend on, for checking that cached lines are still valid"""
+
+    params = tile_store_params(base_config, margin)
+    params["integrator"] = integrator
+    params["dtype"] = np.dtype(dtype).name
+
+    return params
+
+
+def cache_filename(cache_dir: str, field: Field) -> str:
+    """The file in a cache directory that the lines traced for a field are cached in"""
+    return joinpath(cache_dir, field.content_hash + FIELD_LINES_EXTENSION)
+
+
+def trace_viewport(field: Field,
+                   viewport: Viewport,
+                   width: int,
+                   height: int,
+                   base_config: Optional[TraceConfig] = None,
+                   integrator: str = INTEGRATOR_EULER,
+                   dtype: npt.DTypeLike = float,
+                   workers: int = 1,
+                   cache_dir: Optional[str] = None) -> ViewportLines:
+    """Traces the lines that the visualisation window would show for a viewport, without a display.
+
+The lines are traced in the same line tiles as the window traces, so the lines are the same as those drawn by the window. \
+Tiles are traced in parallel by a pool of worker processes, each given the field once when it starts
+
+Parameters:
+
+    field - the field to trace
+
+    viewport - the part of the field to trace the lines shown in
+
+    width - the width of the window in pixels
+
+    height - the height of the window in pixels
+
+    base_config (optional) - the values to trace the lines with, for the default scale. If not provided, the values are taken from the current settings
+
+    integrator (default INTEGRATOR_EULER) - the method to step along the lines with. See Field.trace_field_lines
+
+    dtype (default float) - the floating-point type to trace the lines' positions with. See Field.trace_field_lines
+
+    workers (default 1) - how many processes to trace tiles in. If 1, tiles are traced in this process
+
+    cache_dir (optional) - a directory to cache traced tiles in, by the field's content hash, so they aren't retraced for the same field and parameters
+
+Returns:
+
+    lines - the lines traced
+"""
+
+    if integrator not in INTEGRATORS:
+        raise ValueError("Unknown integrator")
+
+    if base_config is None:
+        base_config = TraceConfig.from_settings()
+
+    keys = tiles_covering(viewport.clip_bounds(width, height), viewport.zoom_level, margin=TILE_TRACE_MARGIN)
+    margin = tile_trace_margin(width, height)
+
+    # Take the tiles already traced from the cache
+
+    params = trace_store_params(base_config, integrator, dtype, margin)
+    store: Optional[FieldLineStore] = None
+
+    if cache_dir is not None:
+        store = FieldLineStore.try_load(cache_filename(cache_dir, field), field.content_hash, params)
+        if store is None:
+            store = FieldLineStore(field.content_hash, params)
+
+    tiles: Dict[TileKey, TracedLines] = {}
+
+    for key in keys:
+        stored_lines = store.get(key) if store is not None else None
+        if stored_lines is not None:
+            tiles[key] = stored_lines
+
+    missing_keys = [key for key in keys if key not in tiles]
+
+    # Trace the missing tiles
+
+    if len(missing_keys) > 0:
+
+        if workers <= 1:
+
+            _init_worker(field, base_config, integrator, dtype, margin)
+            traced = [_trace_tile(key) for key in missing_keys]
+
+        else:
+
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(field, base_config, integrator, dtype, margin)
+            ) as executor:
+                traced = list(executor.map(_trace_tile, missing_keys))
+
+        for key, lines in zip(missing_keys, traced):
+            tiles[key] = lines
+
+        if store is not None:
+
+            assert cache_dir is not None
+
+            for key, lines in zip(missing_keys, traced):
+                store.put(key, lines)
+
+            makedirs(cache_dir, exist_ok=True)
+            store.save(cache_filename(cache_dir, field))
+
+    # Join the tiles' lines
+
+    tile_lines = [tiles[key] for key in keys]
+
+    lines = TracedLines.concatenate(tile_lines)
+    lines.points = np.asarray(lines.points, dtype=dtype)
+
+    tile_line_offsets = np.concatenate([[0], np.cumsum([group.line_count for group in tile_lines])]).astype(np.int64)
+
+    return ViewportLines(keys, lines, tile_line_offsets)
+
+
+# Writing
+
+def write_npz(filename: str, viewport_lines: ViewportLines) -> None:
+    """Writes traced lines to a compressed NumPy archive of the arrays of a TracedLines and the tile that each line starts in"""
+
+    lines = viewport_lines.lines
+
+    np.savez_compressed(
+        filename,
+        points=lines.points,
+        offsets=lines.offsets,
+        positives=lines.positives,
+        terminations=lines.terminations,
+        tiles=viewport_lines.line_tile_keys
+    )
+
+
+def write_csv(stream: TextIO, viewport_lines: ViewportLines) -> None:
+    """Writes traced lines as CSV, with a row for each point of each line"""
+
+    lines = viewport_lines.lines
+    counts = np.diff(lines.offsets)
+
+    line_idxs = np.repeat(np.arange(lines.line_count), counts)
+    point_idxs = np.arange(lines.offsets[-1]) - np.repeat(lines.offsets[:-1], counts)
+
+    stream.write("line,point,x,y,positive,termination\n")
+
+    for line_idx, point_idx, (x, y) in zip(line_idxs.tolist(), point_idxs.tolist(), np.asarray(lines.points).tolist()):
+        stream.write(f"{line_idx},{point_idx},{x!r},{y!r},{int(lines.positives[line_idx])},{TERMINATION_NAMES[int(lines.terminations[line_idx])]}\n")
+
+
+def write_json(stream: TextIO, viewport_lines: ViewportLines) -> None:
+    """Writes traced lines as a JSON document with a list of lines, each with its tile, whether it is positive, why it stopped and its points"""
+
+    lines = viewport_lines.lines
+    line_tile_keys = viewport_lines.line_tile_keys.tolist()
+
+    json.dump({
+        "lines": [
+            {
+                "tile": line_tile_keys[i],
+                "positive": bool(lines.positives[i]),
+                "termination": TERMINATION_NAMES[int(lines.terminations[i])],
+                "points": np.asarray(lines.points[lines.offsets[i]:lines.offsets[i+1]]).tolist(),
+            }
+            for i in range(lines.line_count)
+        ]
+    }, stream)
+
+
+def write_viewport_lines(filename: str, viewport_lines: ViewportLines, output_format: Optional[str] = None) -> None:
+    """Writes traced lines to a file
+
+Parameters:
+
+    filename - the file to write to
+
+    viewport_lines - the lines to write
+
+    output_format (optional) - one of OUTPUT_FORMATS. If not provided, the format is taken from the filename's extension
+"""
+
+    if output_format is None:
+        output_format = splitext(filename)[1][1:].lower()
+
+    if output_format == "npz":
+        write_npz(filename, viewport_lines)
+
+    elif output_format == "csv":
+        with open(filename, "w") as file:
+            write_csv(file, viewport_lines)
+
+    elif output_format == "json":
+        with open(filename, "w") as file:
+            write_json(file, viewport_lines)
+
+    else:
+        raise ValueError("Unknown output format")
+
+
+def add_trace_arguments(parser: ArgumentParser) -> None:
+    """Adds the arguments describing the viewport to trace and how to trace it to a parser"""
+
+    parser.add_argument("--origin", type=float, nargs=2, default=(0.0, 0.0), metavar=("X", "Y"), help="the position shown at the bottom-left corner of the viewport")
+    parser.add_argument("--zoom-level", type=int, default=0)
+    parser.add_argument("--width", type=int, default=720)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--dtype", choices=list(DTYPES.keys()), default="float64", help="the floating-point type to trace lines with")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default=INTEGRATOR_EULER)
+    parser.add_argument("--settings", default=None, help="a settings file to take the field line settings from (defaults are used otherwise)")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Trace the field lines of a field file without a display")
+    parser.add_argument("field", help="the .field or .fieldb file to trace")
+    parser.add_argument("-o", "--out", required=True, help="the file to write the lines to (.npz, .csv or .json)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None, help="the format to write the lines in (defaults to the output file's extension)")
+    parser.add_argument("--workers", type=int, default=1, help="how many processes to trace lines in")
+    parser.add_argument("--cache-dir", default=None, help="a directory to cache traced lines in")
+    parser.add_argument("--metrics", default=None, help="a file to write a snapshot of the metrics of the stages run in this process to, as JSON")
+    add_trace_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    if args.settings is not None:
+        load_settings(args.settings)
+
+    metrics.enabled = args.metrics is not None
+
+    field = read_field_file(args.field)
+
+    viewport_lines = trace_viewport(
+        field,
+        Viewport(tuple(args.origin), args.zoom_level),
+        args.width,
+        args.height,
+        integrator=args.integrator,
+        dtype=DTYPES[args.dtype],
+        workers=args.workers,
+        cache_dir=args.cache_dir
+    )
+
+    with metrics.timer("io.write_lines"):
+        write_viewport_lines(args.out, viewport_lines, args.format)
+
+    if args.metrics is not None:
+        metrics.dump(args.metrics)
+
+    print(args.out)
+
+
+if __name__ == "__main__":
+    main()
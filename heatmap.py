@@ -0,0 +1,331 @@
+from typing import Hashable, Optional, Tuple
+from threading import Thread, Condition
+import numpy as np
+import vectors
+from field import Field
+from field_element import UnboundedException
+
+
+HEATMAP_MAX_ALPHA: int = 160
+"""The opacity of the most intense parts of the heatmap"""
+
+
+# (position along the colour map, (r, g, b)) stops for the field strength colour map
+_MAGNITUDE_COLOUR_STOPS = [
+    (0.0, (0, 0, 0)),
+    (0.35, (90, 20, 120)),
+    (0.7, (230, 90, 40)),
+    (1.0, (255, 240, 150)),
+]
+
+
+def raster_positions(clip_bounds: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Creates the world-space positions of the centres of the pixels of a raster covering the clip bounds
+
+Parameters:
+
+    clip_bounds - the range of positions in world-space that the raster covers
+
+    width - the number of pixels across the raster
+
+    height - the number of pixels up the raster
+
+Returns:
+
+    poss - a (height*width, 2) array of position vectors, ordered by row (from the bottom) then by column (from the left)
+"""
+
+    xs = clip_bounds[0, 0] + (np.arange(width) + 0.5) * (clip_bounds[0, 1] - clip_bounds[0, 0]) / width
+    ys = clip_bounds[1, 0] + (np.arange(height) + 0.5) * (clip_bounds[1, 1] - clip_bounds[1, 0]) / height
+
+    grid_xs, grid_ys = np.meshgrid(xs, ys)
+
+    return np.stack([grid_xs.ravel(), grid_ys.ravel()], axis=1)
+
+
+def raster_covering(clip_bounds: np.ndarray, width: int, height: int, pixel_size: int) -> Tuple[np.ndarray, int, int]:
+    """Finds the raster of square cells that covers a window, with each cell the same size on screen. \
+Partial cells at the top and right of the window are kept whole, so the raster can extend beyond the window
+
+Parameters:
+
+    clip_bounds - the range of positions in world-space shown in the window
+
+    width - the width of the window in pixels
+
+    height - the height of the window in pixels
+
+    pixel_size - the width and height of each cell in screen pixels
+
+Returns:
+
+    raster_bounds - the range of positions in world-space that the raster covers
+
+    raster_width - the number of cells across the raster
+
+    raster_height - the number of cells up the raster
+"""
+
+    raster_width = max(1, int(np.ceil(width / pixel_size)))
+    raster_height = max(1, int(np.ceil(height / pixel_size)))
+
+    cell_sizes = (clip_bounds[:, 1] - clip_bounds[:, 0]) * pixel_size / np.array([width, height], dtype=float)
+
+    raster_bounds = clip_bounds.astype(float)
+    raster_bounds[:, 1] = raster_bounds[:, 0] + (cell_sizes * np.array([raster_width, raster_height]))
+
+    return raster_bounds, raster_width, raster_height
+
+
+def field_raster(field: Field,
+                 clip_bounds: np.ndarray,
+                 width: int,
+                 height: int,
+                 show_field_strength: bool) -> Tuple[np.ndarray, bool]:
+    """Evaluates the potential or field strength over a raster covering the clip bounds
+
+Parameters:
+
+    field - the field to evaluate
+
+    clip_bounds - the range of positions in world-space that the raster covers
+
+    width - the number of pixels across the raster
+
+    height - the number of pixels up the raster
+
+    show_field_strength - whether to evaluate the magnitude of the field's grad instead of the field's potential. \
+The field strength is always used when the field contains elements with unbounded potential (eg. charge planes)
+
+Returns:
+
+    values - a (height, width) array of the values at each pixel, with row 0 being the bottom of the raster
+
+    is_field_strength - whether the values are field strengths (instead of potentials)
+"""
+
+    poss = raster_positions(clip_bounds, width, height)
+
+    values: np.ndarray
+
+    if not show_field_strength:
+        try:
+            values = field.evaluate(poss)
+        except UnboundedException:
+            show_field_strength = True
+
+    if show_field_strength:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = vectors.magnitudes(field.grad(poss))
+
+    return values.reshape((height, width)), show_field_strength
+
+
+def _robust_scale(values: np.ndarray) -> float:
+    """Finds a typical size of the values to normalise them by, ignoring singularities"""
+
+    finite_abs = np.abs(values[np.isfinite(values)])
+
+    if finite_abs.shape[0] == 0:
+        return 1.0
+
+    scale = float(np.percentile(finite_abs, 95))
+
+    return scale if scale > 0 else 1.0
+
+
+def colour_map(values: np.ndarray, is_field_strength: bool) -> np.ndarray:
+    """Converts a raster of values into RGBA colours.
+
+Potentials are shown red where positive and blue where negative (matching the colours of the field elements), more opaque where larger. \
+Field strengths are shown on a logarithmic dark-to-bright colour map
+
+Parameters:
+
+    values - a 2D array of values, as created by field_raster
+
+    is_field_strength - whether the values are field strengths (instead of potentials)
+
+Returns:
+
+    rgba - a 3D array of uint8 colours with shape (height, width, 4)
+"""
+
+    rgba = np.zeros(shape=(values.shape[0], values.shape[1], 4), dtype=np.uint8)
+
+    scale = _robust_scale(values)
+
+    clean_values = np.where(np.isnan(values), 0.0, values)  # N.B. infinite values (at singularities) are kept and shown as the most intense colour
+
+    if is_field_strength:
+
+        intensities = np.log1p(np.abs(clean_values) / scale) / np.log1p(4.0)
+        intensities = np.clip(np.nan_to_num(intensities, posinf=1.0), 0, 1)
+
+        positions = np.array([p for p, _ in _MAGNITUDE_COLOUR_STOPS])
+
+        for c in range(3):
+            channel_stops = np.array([col[c] for _, col in _MAGNITUDE_COLOUR_STOPS], dtype=float)
+            rgba[:, :, c] = np.interp(intensities, positions, channel_stops).astype(np.uint8)
+
+        rgba[:, :, 3] = HEATMAP_MAX_ALPHA
+
+    else:
+
+        intensities = np.tanh(clean_values / scale)  # In [-1, 1]
+
+        rgba[:, :, 0] = np.where(intensities > 0, 255, 0)
+        rgba[:, :, 2] = np.where(intensities < 0, 255, 0)
+        rgba[:, :, 3] = (np.abs(intensities) * HEATMAP_MAX_ALPHA).astype(np.uint8)
+
+    return rgba
+
+
+def render_heatmap(field: Field,
+                   clip_bounds: np.ndarray,
+                   width: int,
+                   height: int,
+                   show_field_strength: bool) -> np.ndarray:
+    """Creates the RGBA image of a field's heatmap. Row 0 of the image is the bottom of the clip bounds"""
+
+    values, is_field_strength = field_raster(field, clip_bounds, width, height, show_field_strength)
+
+    return colour_map(values, is_field_strength)
+
+
+class HeatmapJob:
+    """Everything needed to render a heatmap, as it was at the time the heatmap was requested"""
+
+    def __init__(self,
+                 field: Field,
+                 clip_bounds: np.ndarray,
+                 width: int,
+                 height: int,
+                 show_field_strength: bool,
+                 context: Hashable):
+
+        self.field = field
+        self.clip_bounds = clip_bounds.copy()
+        self.width = width
+        self.height = height
+        self.show_field_strength = show_field_strength
+        self.context = context
+
+
+class HeatmapResult:
+
+    def __init__(self,
+                 context: Hashable,
+                 clip_bounds: np.ndarray,
+                 rgba: np.ndarray):
+
+        self.context = context
+        self.clip_bounds = clip_bounds
+        self.rgba = rgba
+
+
+class HeatmapWorker:
+    """A background thread that renders heatmaps.
+
+Submitting a heatmap replaces any heatmap waiting to be rendered, so once the heatmap being rendered is finished only the latest one submitted is rendered. \
+Each heatmap is published, with the context it was rendered for, as soon as it has been rendered
+"""
+
+    def __init__(self):
+
+        self.__condition = Condition()
+
+        self.__pending_job: Optional[HeatmapJob] = None
+        self.__working: bool = False
+        self.__result: Optional[HeatmapResult] = None
+        self.__running: bool = True
+
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    @property
+    def is_busy(self) -> bool:
+        """Whether there is a heatmap waiting or being rendered"""
+        with self.__condition:
+            return self.__working or (self.__pending_job is not None)
+
+    def submit(self,
+               field: Field,
+               clip_bounds: np.ndarray,
+               width: int,
+               height: int,
+               show_field_strength: bool,
+               context: Hashable) -> None:
+        """Requests a heatmap to be rendered, replacing any heatmap waiting to be rendered
+
+Parameters:
+
+    field - the field to render the heatmap of. This mustn't be modified after being submitted, so should usually be a copy
+
+    clip_bounds, width, height, show_field_strength - see render_heatmap
+
+    context - what the heatmap is being rendered for. The heatmap is published with it
+"""
+
+        with self.__condition:
+            self.__pending_job = HeatmapJob(field, clip_bounds, width, height, show_field_strength, context)
+            self.__condition.notify_all()
+
+    def take_result(self) -> Optional[HeatmapResult]:
+        """Takes the most recently rendered heatmap, if one has been rendered since this was last called"""
+
+        with self.__condition:
+
+            result = self.__result
+            self.__result = None
+
+            return result
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until there are no heatmaps waiting or being rendered. Returns False if the timeout was reached first"""
+
+        with self.__condition:
+            return self.__condition.wait_for(
+                lambda: (not self.__working) and (self.__pending_job is None),
+                timeout=timeout
+            )
+
+    def stop(self) -> None:
+
+        with self.__condition:
+            self.__running = False
+            self.__pending_job = None
+            self.__condition.notify_all()
+
+        self.__thread.join()
+
+    def __run(self) -> None:
+
+        while True:
+
+            # Wait for a job
+
+            with self.__condition:
+
+                self.__condition.wait_for(lambda: (self.__pending_job is not None) or (not self.__running))
+
+                if not self.__running:
+                    return
+
+                job = self.__pending_job
+                assert job is not None
+                self.__pending_job = None
+                self.__working = True
+
+            # Render the heatmap
+
+            rgba = render_heatmap(job.field, job.clip_bounds, job.width, job.height, job.show_field_strength)
+
+            # Publish the heatmap
+
+            with self.__condition:
+
+                self.__result = HeatmapResult(job.context, job.clip_bounds, rgba)
+
+                self.__working = False
+                self.__condition.notify_all()
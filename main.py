@@ -2,19 +2,35 @@
 
 from typing import Optional, Callable
 from threading import Thread
-import numpy as np
+from time import monotonic, sleep
 from webbrowser import open as webbrowser_open
 from visualisation_window import create_window as create_visualisation_window
 from visualisation_window import Controller as VisualisationController
 from menu_windows import ControlsWindow, AddElementWindow
-from field_file_windows import save_field, load_field
+from field_file_windows import ask_save_field_filename, ask_load_field_filename
+from field_line_store import field_lines_filename
+from field_journal import FieldJournal
+from field import FieldBinarySerialize, is_binary_field_filename
 from shortcuts import Shortcuts, MOD_CTRL, MOD_SHIFT, MOD_ALT
 from shortcuts import Key
 from settings import settings, load_settings
+from metrics import metrics
+from sampling_profiler import SamplingProfiler, collapsed_profile_filename
 
 
 AddConfig = AddElementWindow.Config
 
+AUTOSAVE_DISABLED_CHECK_INTERVAL_MS: int = 1000
+
+METRICS_SNAPSHOT_FILENAME: str = "metrics.json"
+"""The file that metrics snapshots are written to. Read it with metrics.py"""
+
+PROFILE_POLL_INTERVAL: float = 0.1
+"""How often (in seconds) to check whether a profiled recalculation has finished"""
+
+PROFILE_MAX_DURATION: float = 60.0
+"""The longest (in seconds) that a recalculation is profiled for"""
+
 
 class ClickMode:
 
@@ -55,7 +71,7 @@ class ClickMode:
 
         assert self.add_config is not None, "Trying to add element without setting add_config"
 
-        new_ele = self.add_config.create_element(np.array([x*settings.VIEWPORT_SCALE_FAC, y*settings.VIEWPORT_SCALE_FAC], dtype=float))
+        new_ele = self.add_config.create_element(controller.screen_to_world(x, y))
 
         controller.add_field_element(new_ele)
 
@@ -79,6 +95,12 @@ class MainController:
         self.__click_mode = ClickMode()
         self.__shortcuts = Shortcuts()
 
+        self.__field_filename: Optional[str] = None
+        """The file that the field was loaded from or last saved to"""
+
+        self.__profiler: Optional[SamplingProfiler] = None
+        """The sampling profiler of the recalculation being profiled, if there is one"""
+
         # Create windows
 
         self.visualisation_controller = create_visualisation_window(
@@ -101,11 +123,17 @@ class MainController:
         # Set up shortcuts
 
         self.__shortcuts.add_shortcut(("S", MOD_CTRL), self.save)
+        self.__shortcuts.add_shortcut(("S", MOD_CTRL | MOD_SHIFT), self.save_as)
         self.__shortcuts.add_shortcut(("O", MOD_CTRL), self.load)
         self.__shortcuts.add_shortcut("A", self.controls_window.open_add_elements_window)
         self.__shortcuts.add_shortcut("X", self.set_click_mode_delete)
         self.__shortcuts.add_shortcut("S", self.controls_window.open_settings_window)
+        self.__shortcuts.add_shortcut(("R", MOD_CTRL), self.profile_recalculation)
         self.__shortcuts.add_shortcut("R", self.recalculate)
+        self.__shortcuts.add_shortcut("P", self.toggle_perf_hud)
+        self.__shortcuts.add_shortcut(("M", MOD_CTRL), self.dump_metrics)
+        self.__shortcuts.add_shortcut("M", self.toggle_heatmap)
+        self.__shortcuts.add_shortcut("H", self.reset_view)
         self.__shortcuts.add_shortcut(Key.ESCAPE, self.set_click_mode_none)
 
     def run(self):
@@ -120,6 +148,7 @@ class MainController:
         self._visualisation_thread.start()
 
         self.controls_window.after(100, self.visualisation_controller.activate_window)
+        self.__schedule_autosave()
         self.controls_window.mainloop()
 
         self._visualisation_thread.join()
@@ -132,18 +161,65 @@ class MainController:
         self.visualisation_controller.quit_app()
 
     def save(self):
+        """Saves the field's edits to the file it was loaded from or last saved to, or asks for a file to save it to if it doesn't have one"""
+
+        if self.visualisation_controller.save_journal():
+            self.__save_field_lines()
+        else:
+            self.save_as()
+
+    def save_as(self):
+
+        filename = ask_save_field_filename()
+
+        if filename is None:
+            return
+
+        if is_binary_field_filename(filename):
+            FieldBinarySerialize.serialize_file(self.visualisation_controller.get_field(), filename)
+            self.visualisation_controller.stop_journal()
+        else:
+            self.visualisation_controller.start_journal(filename)
 
-        field = self.visualisation_controller.get_field()
-        save_field(field)
+        self.__field_filename = filename
+        self.__save_field_lines()
+
+    def __save_field_lines(self):
+        if self.__field_filename is not None:
+            self.visualisation_controller.save_field_lines(field_lines_filename(self.__field_filename))
+
+    def __schedule_autosave(self):
+        if settings.autosave_interval > 0:
+            self.controls_window.after(int(settings.autosave_interval * 1000), self.__autosave)
+        else:
+            # Check again later in case autosaving is enabled
+            self.controls_window.after(AUTOSAVE_DISABLED_CHECK_INTERVAL_MS, self.__schedule_autosave)
+
+    def __autosave(self):
+
+        if self.visualisation_controller.has_unsaved_edits:
+            self.visualisation_controller.save_journal()
+
+        self.__schedule_autosave()
 
     def load(self):
 
-        field = load_field()
+        filename = ask_load_field_filename()
+
+        if filename is None:
+            return
+
+        if is_binary_field_filename(filename):
+            field = FieldBinarySerialize.deserialize(filename)
+            journal = None
+        else:
+            field, journal = FieldJournal.open(filename)
 
-        if field is not None:
+        self.__field_filename = filename
 
-            self.visualisation_controller.set_field(field)
-            self.recalculate()
+        self.visualisation_controller.set_field(field, journal)
+        self.visualisation_controller.load_field_lines(field_lines_filename(filename))
+        self.recalculate()
 
     def set_click_mode_none(self):
         self.visualisation_controller.set_click_mode_none()
@@ -167,11 +243,66 @@ class MainController:
         webbrowser_open("https://github.com/ofsouzap/field-line-simulator/wiki/Instructions")
 
     def recalculate(self):
+        if settings.profile_recalculations:
+            self.profile_recalculation()
+        else:
+            self.visualisation_controller.recalculate()
+
+    def profile_recalculation(self):
+        """Recalculates while running the sampling profiler, writing the profile to a collapsed-stack file once the recalculation has finished"""
+
+        if self.__profiler is not None:
+            # A recalculation is already being profiled, and the profile will continue until this one finishes too
+            self.visualisation_controller.recalculate()
+            return
+
+        self.__profiler = SamplingProfiler(settings.profiler_sample_interval)
+        self.__profiler.start()
+
         self.visualisation_controller.recalculate()
 
+        Thread(target=self.__finish_profile, daemon=True).start()
+
+    def __finish_profile(self):
+
+        start_time = monotonic()
+
+        # Wait at least once so that drawing the recalculated lines is included
+
+        sleep(PROFILE_POLL_INTERVAL)
+
+        while self.visualisation_controller.is_recalculating and (monotonic() - start_time < PROFILE_MAX_DURATION):
+            sleep(PROFILE_POLL_INTERVAL)
+
+        profiler = self.__profiler
+        assert profiler is not None
+
+        profiler.stop()
+        self.__profiler = None
+
+        filename = collapsed_profile_filename()
+        profiler.write_collapsed(filename)
+
+        print(f"Wrote profile of {profiler.sample_count} samples to {filename}")
+
+    def toggle_perf_hud(self):
+        self.visualisation_controller.toggle_perf_hud()
+
+    def dump_metrics(self):
+        metrics.dump(METRICS_SNAPSHOT_FILENAME)
+        print(f"Wrote metrics to {METRICS_SNAPSHOT_FILENAME}")
+
+    def reset_view(self):
+        self.visualisation_controller.reset_view()
+
+    def toggle_heatmap(self):
+        settings.show_heatmap = not settings.show_heatmap
+        settings.save_settings()
+
 
 def main():
     load_settings()
+    metrics.enabled = True
     main_controller = MainController()
     main_controller.run()
 
@@ -593,6 +593,64 @@ class SettingsWindow(tk.Toplevel, __CharKeyEventListener):
             resolution=0.5
         )
 
+        self.simplify_tolerance = tk.DoubleVar(self, settings.field_line_render_simplify_tolerance_screen_space)
+        self.__create_bounded_double_setting(
+            "Line simplification tolerance",
+            on_value_update=self.__update_simplify_tolerance,
+            var=self.simplify_tolerance,
+            start=0.0,
+            end=5.0,
+            resolution=0.25
+        )
+
+        self.live_preview = tk.BooleanVar(self, settings.live_field_line_preview)
+        self.__create_bool_setting(
+            "Live field line preview",
+            on_value_update=self.__update_live_preview,
+            var=self.live_preview
+        )
+
+        self.show_heatmap = tk.BooleanVar(self, settings.show_heatmap)
+        self.__create_bool_setting(
+            "Show heatmap",
+            on_value_update=self.__update_show_heatmap,
+            var=self.show_heatmap
+        )
+
+        self.heatmap_show_field_strength = tk.BooleanVar(self, settings.heatmap_show_field_strength)
+        self.__create_bool_setting(
+            "Heatmap shows field strength",
+            on_value_update=self.__update_heatmap_show_field_strength,
+            var=self.heatmap_show_field_strength
+        )
+
+        self.autosave_interval = tk.DoubleVar(self, settings.autosave_interval)
+        self.__create_bounded_double_setting(
+            "Autosave interval (s, 0 for off)",
+            on_value_update=self.__update_autosave_interval,
+            var=self.autosave_interval,
+            start=0.0,
+            end=60.0,
+            resolution=1.0
+        )
+
+        self.profile_recalculations = tk.BooleanVar(self, settings.profile_recalculations)
+        self.__create_bool_setting(
+            "Profile recalculations",
+            on_value_update=self.__update_profile_recalculations,
+            var=self.profile_recalculations
+        )
+
+        self.profiler_sample_interval = tk.DoubleVar(self, settings.profiler_sample_interval)
+        self.__create_bounded_double_setting(
+            "Profiler sample interval (s)",
+            on_value_update=self.__update_profiler_sample_interval,
+            var=self.profiler_sample_interval,
+            start=0.001,
+            end=0.05,
+            resolution=0.001
+        )
+
     def _handle_char_pressed(self, cmd) -> None:
         self.__on_char_press(cmd)
 
@@ -630,6 +688,34 @@ class SettingsWindow(tk.Toplevel, __CharKeyEventListener):
         settings.field_line_trace_element_stop_distance_screen_space = self.element_stop_distance.get()
         settings.save_settings()
 
+    def __update_simplify_tolerance(self):
+        settings.field_line_render_simplify_tolerance_screen_space = self.simplify_tolerance.get()
+        settings.save_settings()
+
+    def __update_live_preview(self):
+        settings.live_field_line_preview = self.live_preview.get()
+        settings.save_settings()
+
+    def __update_show_heatmap(self):
+        settings.show_heatmap = self.show_heatmap.get()
+        settings.save_settings()
+
+    def __update_heatmap_show_field_strength(self):
+        settings.heatmap_show_field_strength = self.heatmap_show_field_strength.get()
+        settings.save_settings()
+
+    def __update_autosave_interval(self):
+        settings.autosave_interval = self.autosave_interval.get()
+        settings.save_settings()
+
+    def __update_profile_recalculations(self):
+        settings.profile_recalculations = self.profile_recalculations.get()
+        settings.save_settings()
+
+    def __update_profiler_sample_interval(self):
+        settings.profiler_sample_interval = self.profiler_sample_interval.get()
+        settings.save_settings()
+
     def __create_bool_setting(self,
                               name: str,
                               on_value_update: Callable[[], None],
@@ -0,0 +1,315 @@
+#!/bin/env python3
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from argparse import ArgumentParser
+from collections import deque
+from datetime import datetime, timezone
+from functools import wraps
+from threading import Lock
+from time import perf_counter_ns
+import json
+import numpy as np
+
+
+SNAPSHOT_FORMAT_VERSION: int = 1
+
+HISTOGRAM_SAMPLE_COUNT: int = 2048
+"""How many of the most recent values each histogram keeps to find percentiles from"""
+
+PERCENTILES: Sequence[float] = (50, 90, 95, 99)
+
+
+class Counter:
+    """A count that only increases, such as a number of cache hits"""
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__value: int = 0
+
+    @property
+    def value(self) -> int:
+        return self.__value
+
+    def increment(self, n: int = 1) -> None:
+        with self.__lock:
+            self.__value += n
+
+
+class Gauge:
+    """A value that is set to the latest measurement, such as a number of shapes drawn"""
+
+    def __init__(self):
+        self.value: float = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram:
+    """The distribution of a measurement, such as a stage's latency.
+
+The count, sum, minimum and maximum cover every value recorded. \
+Percentiles are of the most recent values recorded, so that they describe current performance
+
+Parameters:
+
+    unit (optional) - the unit of the values recorded, for displaying them
+"""
+
+    def __init__(self, unit: str = ""):
+
+        self.unit = unit
+
+        self.__lock = Lock()
+        self.__samples: deque = deque(maxlen=HISTOGRAM_SAMPLE_COUNT)
+        self.__count: int = 0
+        self.__sum: float = 0.0
+        self.__min: float = float("inf")
+        self.__max: float = float("-inf")
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    def record(self, value: float) -> None:
+        with self.__lock:
+            self.__samples.append(value)
+            self.__count += 1
+            self.__sum += value
+            self.__min = min(self.__min, value)
+            self.__max = max(self.__max, value)
+
+    def summary(self) -> Dict[str, Any]:
+        """The count, sum, mean, minimum, maximum and percentiles of the values recorded"""
+
+        with self.__lock:
+            samples = np.array(self.__samples, dtype=float)
+            count = self.__count
+            total = self.__sum
+            minimum = self.__min
+            maximum = self.__max
+
+        summary: Dict[str, Any] = {
+            "unit": self.unit,
+            "count": count,
+            "sum": total,
+            "mean": total / count if count > 0 else None,
+            "min": minimum if count > 0 else None,
+            "max": maximum if count > 0 else None,
+        }
+
+        percentile_values = np.percentile(samples, PERCENTILES) if samples.shape[0] > 0 else [None] * len(PERCENTILES)
+
+        for percentile, value in zip(PERCENTILES, percentile_values):
+            summary[f"p{percentile:g}"] = float(value) if value is not None else None
+
+        return summary
+
+
+class MetricsTimer:
+    """Times a stage with a monotonic high-resolution clock and records its duration (in milliseconds) in a histogram when the stage ends.
+
+The duration is always measured, so it can be used by the caller, but is only recorded if the registry is enabled. \
+Timing a stage only reads the clock twice, so it is cheap enough to leave around every stage
+"""
+
+    def __init__(self, registry: "MetricsRegistry", name: str):
+
+        self.__registry = registry
+        self.__name = name
+        self.__start_time_ns: int = -1
+
+        self.elapsed_ms: float = 0.0
+
+    def __enter__(self) -> "MetricsTimer":
+        self.__start_time_ns = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+
+        assert self.__start_time_ns >= 0
+
+        self.elapsed_ms = (perf_counter_ns() - self.__start_time_ns) / 1e6
+
+        self.__registry.observe(self.__name, self.elapsed_ms, unit="ms")
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms of the program's performance.
+
+Metrics are created when they are first recorded. \
+While the registry is disabled, recording a metric does nothing but check that it is disabled
+
+Parameters:
+
+    enabled (default False) - whether metrics are recorded
+"""
+
+    def __init__(self, enabled: bool = False):
+
+        self.enabled = enabled
+
+        self.__lock = Lock()
+
+        self.__counters: Dict[str, Counter] = {}
+        self.__gauges: Dict[str, Gauge] = {}
+        self.__histograms: Dict[str, Histogram] = {}
+
+    # Recording
+
+    def increment(self, name: str, n: int = 1) -> None:
+
+        if not self.enabled:
+            return
+
+        counter = self.__counters.get(name)
+
+        if counter is None:
+            with self.__lock:
+                counter = self.__counters.setdefault(name, Counter())
+
+        counter.increment(n)
+
+    def set_gauge(self, name: str, value: float) -> None:
+
+        if not self.enabled:
+            return
+
+        gauge = self.__gauges.get(name)
+
+        if gauge is None:
+            with self.__lock:
+                gauge = self.__gauges.setdefault(name, Gauge())
+
+        gauge.set(value)
+
+    def observe(self, name: str, value: float, unit: str = "") -> None:
+
+        if not self.enabled:
+            return
+
+        histogram = self.__histograms.get(name)
+
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(name, Histogram(unit))
+
+        histogram.record(value)
+
+    def timer(self, name: str) -> MetricsTimer:
+        """Creates a context manager that times the stage it is around, recording the duration in milliseconds in the histogram of the name given"""
+        return MetricsTimer(self, name)
+
+    def timed(self, name: str) -> Callable[[Callable], Callable]:
+        """Creates a decorator that times each call of the function it decorates, recording the duration in milliseconds in the histogram of the name given"""
+
+        def decorator(func: Callable) -> Callable:
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+
+                if not self.enabled:
+                    return func(*args, **kwargs)
+
+                with self.timer(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__counters = {}
+            self.__gauges = {}
+            self.__histograms = {}
+
+    # Snapshots
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Creates a JSON-serializable snapshot of the current values of all of the metrics"""
+
+        with self.__lock:
+            counters = dict(self.__counters)
+            gauges = dict(self.__gauges)
+            histograms = dict(self.__histograms)
+
+        return {
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "enabled": self.enabled,
+            "counters": {name: counters[name].value for name in sorted(counters)},
+            "gauges": {name: gauges[name].value for name in sorted(gauges)},
+            "histograms": {name: histograms[name].summary() for name in sorted(histograms)},
+        }
+
+    def dump(self, filename: str) -> None:
+        """Writes a snapshot of the metrics to a JSON file"""
+        with open(filename, "w") as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+
+def load_snapshot(filename: str) -> Dict[str, Any]:
+    """Reads a snapshot written by MetricsRegistry.dump"""
+
+    with open(filename, "r") as file:
+        snapshot = json.load(file)
+
+    if snapshot.get("version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError("Unsupported metrics snapshot version")
+
+    return snapshot
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3g}"
+
+
+def histogram_summary_lines(snapshot: Dict[str, Any]) -> List[str]:
+    """Creates a line of text for each of a snapshot's histograms, describing its percentiles"""
+
+    lines = []
+
+    for name, summary in snapshot["histograms"].items():
+        unit = summary["unit"]
+        lines.append(f"{name}: p50 {_fmt(summary['p50'])}{unit}  p95 {_fmt(summary['p95'])}{unit}  p99 {_fmt(summary['p99'])}{unit}  max {_fmt(summary['max'])}{unit}  (n={summary['count']})")
+
+    return lines
+
+
+def snapshot_summary_lines(snapshot: Dict[str, Any]) -> List[str]:
+    """Creates the lines of text describing all of a snapshot's metrics"""
+
+    lines = histogram_summary_lines(snapshot)
+
+    for name, value in snapshot["counters"].items():
+        lines.append(f"{name}: {value}")
+
+    for name, value in snapshot["gauges"].items():
+        lines.append(f"{name}: {_fmt(value)}")
+
+    return lines
+
+
+metrics = MetricsRegistry()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Show metrics snapshots written by the program")
+    parser.add_argument("snapshots", nargs="+", help="the metrics snapshot files to show")
+
+    args = parser.parse_args(argv)
+
+    for filename in args.snapshots:
+
+        snapshot = load_snapshot(filename)
+
+        print(f"{filename} ({snapshot['timestamp']})")
+
+        for line in snapshot_summary_lines(snapshot):
+            print("    " + line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+from typing import Dict, List, Optional
+from collections import deque
+from threading import Lock
+from render_geometry import FieldLineGeometry
+from metrics import metrics, histogram_summary_lines
+
+
+FRAME_TIME_HISTORY_LENGTH: int = 60
+"""How many of the most recent frame times are averaged over"""
+
+
+class PerfTotals:
+    """Performance figures added up across the parts of one recalculation (eg. its line tiles), \
+so that the whole recalculation's figures can be recorded in PerfStats once it has finished"""
+
+    def __init__(self):
+
+        self.trace_ms: float = 0
+        self.traced_line_count: int = 0
+        self.unfinished_line_count: int = 0
+
+        self.segment_count: int = 0
+        self.arrowhead_count: int = 0
+        self.vertex_count: int = 0
+        self.removed_vertex_count: int = 0
+
+    def add_trace(self, elapsed_ms: float, traced_line_count: int, unfinished_line_count: int) -> None:
+        self.trace_ms += elapsed_ms
+        self.traced_line_count += traced_line_count
+        self.unfinished_line_count += unfinished_line_count
+
+    def add_geometry(self, geometry: FieldLineGeometry) -> None:
+        self.segment_count += geometry.segment_count
+        self.arrowhead_count += geometry.arrowhead_count
+        self.vertex_count += geometry.vertex_count
+        self.removed_vertex_count += geometry.removed_vertex_count
+
+
+class PerfStats:
+    """Performance figures from the latest field line recalculation and the most recent frames, as shown in the performance HUD.
+
+Recording figures only stores a few numbers, so it is cheap enough to always be done. \
+Frame times are only recorded while something (the HUD) is using them
+"""
+
+    def __init__(self):
+
+        self.__lock = Lock()
+
+        self.frame_times: deque = deque(maxlen=FRAME_TIME_HISTORY_LENGTH)
+        self.record_frame_times: bool = False
+
+        self.last_trace_ms: Optional[float] = None
+        self.last_plot_ms: Optional[float] = None
+
+        self.traced_line_count: int = 0
+        """How many lines were traced in the latest recalculation"""
+        self.unfinished_line_count: int = 0
+        """How many lines of the latest recalculation were stopped by reaching the maximum number of steps"""
+
+        self.segment_count: int = 0
+        self.arrowhead_count: int = 0
+        self.vertex_count: int = 0
+        self.removed_vertex_count: int = 0
+        self.field_line_shape_count: int = 0
+        self.field_element_shape_count: int = 0
+
+        self.__cache_hits: Dict[str, int] = {}
+        self.__cache_misses: Dict[str, int] = {}
+
+    def record_frame(self, frame_time: float) -> None:
+        if self.record_frame_times:
+            self.frame_times.append(frame_time)
+
+    def record_trace(self, elapsed_ms: float, traced_line_count: int, unfinished_line_count: int) -> None:
+        self.last_trace_ms = elapsed_ms
+        self.traced_line_count = traced_line_count
+        self.unfinished_line_count = unfinished_line_count
+
+    def record_geometry(self, geometry: FieldLineGeometry) -> None:
+        self.segment_count = geometry.segment_count
+        self.arrowhead_count = geometry.arrowhead_count
+        self.vertex_count = geometry.vertex_count
+        self.removed_vertex_count = geometry.removed_vertex_count
+
+    def record_totals(self, totals: PerfTotals) -> None:
+        """Records the figures of a recalculation made up of several parts, replacing those of the latest trace and geometry"""
+
+        self.record_trace(totals.trace_ms, totals.traced_line_count, totals.unfinished_line_count)
+
+        self.segment_count = totals.segment_count
+        self.arrowhead_count = totals.arrowhead_count
+        self.vertex_count = totals.vertex_count
+        self.removed_vertex_count = totals.removed_vertex_count
+
+    def record_plot(self, elapsed_ms: float, shape_count: int) -> None:
+        self.last_plot_ms = elapsed_ms
+        self.field_line_shape_count = shape_count
+
+    def record_cache_access(self, cache_name: str, hit: bool) -> None:
+
+        metrics.increment(f"cache.{cache_name.lower().replace(' ', '_')}.{'hits' if hit else 'misses'}")
+
+        with self.__lock:
+
+            if hit:
+                self.__cache_hits[cache_name] = self.__cache_hits.get(cache_name, 0) + 1
+            else:
+                self.__cache_misses[cache_name] = self.__cache_misses.get(cache_name, 0) + 1
+
+    def cache_hit_rates(self) -> Dict[str, float]:
+        """Gets the fraction of accesses of each cache that have been hits"""
+
+        with self.__lock:
+
+            names = set(self.__cache_hits.keys()) | set(self.__cache_misses.keys())
+
+            return {
+                name: self.__cache_hits.get(name, 0) / (self.__cache_hits.get(name, 0) + self.__cache_misses.get(name, 0))
+                for name in sorted(names)
+            }
+
+    @property
+    def fps(self) -> Optional[float]:
+
+        if len(self.frame_times) == 0:
+            return None
+
+        mean_frame_time = sum(self.frame_times) / len(self.frame_times)
+
+        if mean_frame_time <= 0:
+            return None
+
+        return 1 / mean_frame_time
+
+    def summary_lines(self) -> List[str]:
+        """Creates the lines of text describing the figures"""
+
+        def fmt_ms(ms: Optional[float]) -> str:
+            return "-" if ms is None else f"{ms:.0f}ms"
+
+        fps = self.fps
+
+        lines = [
+            f"FPS: {'-' if fps is None else f'{fps:.0f}'}",
+            f"Trace: {fmt_ms(self.last_trace_ms)}  Plot: {fmt_ms(self.last_plot_ms)}",
+            f"Lines: {self.traced_line_count} ({self.unfinished_line_count} hit step limit)",
+            f"Vertices: {self.vertex_count} ({self.removed_vertex_count} simplified away)",
+            f"Shapes: {self.field_line_shape_count} line ({self.segment_count} segments, {self.arrowhead_count} arrowheads), {self.field_element_shape_count} element",
+        ]
+
+        for name, rate in self.cache_hit_rates().items():
+            lines.append(f"Cache \"{name}\": {rate*100:.0f}% hits")
+
+        if metrics.enabled:
+            lines.extend(histogram_summary_lines(metrics.snapshot()))
+
+        return lines
+
+
+perf_stats = PerfStats()
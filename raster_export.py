@@ -0,0 +1,654 @@
+#!/bin/env python3
+
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import join as joinpath, basename, splitext
+import struct
+import zlib
+import numpy as np
+import vectors
+from field import Field
+from field_journal import read_field_file
+from field_element import ElementBase, PointSource, ChargePlane
+from render_geometry import FieldLineGeometry
+from render_geometry import POINT_SOURCE_RADIUS, CHARGE_PLANE_WIDTH, FIELD_LINE_COLOUR, Colour
+from render_geometry import element_colour, point_source_screen_pos, charge_plane_screen_segment
+from field_line_tiles import tiles_covering, tile_world_size, trace_tile_lines, build_tile_geometry, TILE_TRACE_MARGIN
+from recalculation_worker import TraceConfig
+from viewport import Viewport
+from settings import settings, load_settings
+
+
+BACKGROUND_COLOUR: Colour = (0, 0, 0, 255)
+
+DEFAULT_TILE_SIZE: int = 512
+"""The default width and height of the tiles that images are rasterized in"""
+
+LINE_SAMPLE_SPACING: float = 0.5
+"""The greatest distance (in pixels) between the samples that field line segments are drawn with"""
+
+ARROWHEAD_SUPERSAMPLING: int = 4
+"""How many samples across each pixel arrowheads' coverage is found with (in each direction)"""
+
+_ARROWHEAD_CHUNK_SIZE: int = 1024
+"""How many arrowheads are rasterized at once. Limits the memory used for the samples"""
+
+_MAX_TRANSPARENCY_ALPHA: float = 1 - 1e-7
+"""The greatest alpha used when compositing elements, so that the log of the transparency is always finite"""
+
+
+def line_tile_zoom_level(scale: float) -> int:
+    """The zoom level whose line tiles an image drawn at a scale is traced in: the closest zoom level whose scale isn't smaller, \
+so that its tiles are at least TILE_SIZE pixels wide in the image. Images drawn at a zoom level's scale are traced in that zoom level's tiles, as the window traces them"""
+    return int(np.floor(np.log2(settings.VIEWPORT_SCALE_FAC / scale) / np.log2(Viewport.ZOOM_FACTOR) + 1e-9))
+
+
+class RasterScene:
+    """Everything drawn in a rasterized image of a field, in image space. \
+Image space is screen space flipped vertically, so that (0, 0) is the top-left corner of the image and the centre of pixel (row, col) is at (col+0.5, row+0.5)
+
+Parameters:
+
+    width - the width of the image in pixels
+
+    height - the height of the image in pixels
+
+    geometry - the screen-space geometry of the field lines
+
+    elements - the field elements to draw glyphs for, in the order to draw them in
+
+    scale - the number of units of distance in the field per pixel of display
+"""
+
+    def __init__(self,
+                 width: int,
+                 height: int,
+                 geometry: FieldLineGeometry,
+                 elements: Sequence[ElementBase],
+                 scale: float):
+
+        self.width = width
+        self.height = height
+
+        self.segments = geometry.segments.astype(float)
+        """A (S,4) array of the field lines' segments in image space"""
+        self.segments[:, [1, 3]] = height - self.segments[:, [1, 3]]
+
+        self.arrowheads = geometry.arrowheads.astype(float)
+        """A (A,6) array of the arrowheads' triangles in image space"""
+        self.arrowheads[:, [1, 3, 5]] = height - self.arrowheads[:, [1, 3, 5]]
+
+        draw_bounds = np.array([
+            [0, width * scale],
+            [0, height * scale]
+        ], dtype=float)
+
+        circles: List[Tuple[float, float, int]] = []
+        planes: List[Tuple[float, float, float, float, int]] = []
+        colours: List[Colour] = []
+
+        for order, ele in enumerate(elements):
+
+            colours.append(element_colour(ele))
+
+            match ele:
+
+                case PointSource():
+                    x, y = point_source_screen_pos(ele, scale)
+                    circles.append((x, height - y, order))
+
+                case ChargePlane():
+                    x1, y1, x2, y2 = charge_plane_screen_segment(ele, draw_bounds, scale)
+                    planes.append((x1, height - y1, x2, height - y2, order))
+
+                case _:
+                    raise ValueError("Unhandled element class")
+
+        self.circles = np.array(circles, dtype=float).reshape((-1, 3))
+        """A (C,3) array of the point sources' circles (x, y, draw order) in image space"""
+
+        self.planes = np.array(planes, dtype=float).reshape((-1, 5))
+        """A (P,5) array of the charge planes' lines (x1, y1, x2, y2, draw order) in image space"""
+
+        self.element_colours = np.array(colours, dtype=float).reshape((-1, 4)) / 255
+        """The (E,4) RGBA colours of the elements, indexed by draw order"""
+
+    @staticmethod
+    def from_field(field: Field,
+                   width: int,
+                   height: int,
+                   config: Optional[TraceConfig] = None,
+                   scale: float = settings.VIEWPORT_SCALE_FAC) -> "RasterScene":
+        """Traces the lines of a field and creates the scene of an image of it, framed as the visualisation window frames it.
+
+Lines are traced a line tile at a time, in the same tiles as the window and the SVG exporter trace (see line_tile_zoom_level), \
+so only one tile's traced lines are held in memory at once and only their simplified geometry is kept
+
+Parameters:
+
+    field - the field to draw
+
+    width - the width of the image in pixels
+
+    height - the height of the image in pixels
+
+    config (optional) - the values to trace and draw the lines with. If not provided, the values are taken from the current settings
+
+    scale (optional) - the number of units of distance in the field per pixel of the image
+"""
+
+        if config is None:
+            config = TraceConfig.from_settings(scale)
+
+        clip_bounds = np.array([
+            [0, width * scale],
+            [0, height * scale]
+        ], dtype=float)
+
+        zoom_level = line_tile_zoom_level(scale)
+
+        # Lines starting in any of the tiles are traced to at least the edges of the image (see tile_trace_margin)
+        margin = max(TILE_TRACE_MARGIN, int(np.ceil(max(width, height) * scale / tile_world_size(zoom_level))))
+
+        tile_geometries: List[FieldLineGeometry] = []
+
+        for key in tiles_covering(clip_bounds, zoom_level, margin=TILE_TRACE_MARGIN):
+            tile_geometries.append(build_tile_geometry(trace_tile_lines(field, key, config, margin=margin), config))
+
+        geometry = FieldLineGeometry(
+            np.concatenate([FieldLineGeometry.empty().segments] + [tile.segments for tile in tile_geometries]),
+            np.concatenate([FieldLineGeometry.empty().arrowheads] + [tile.arrowheads for tile in tile_geometries]),
+            removed_vertex_count=sum(tile.removed_vertex_count for tile in tile_geometries)
+        )
+
+        return RasterScene(width, height, geometry, list(field.iter_elements()), scale)
+
+
+# Coverage
+
+def _segments_coverage(segments: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Finds how much of each pixel is covered by 1-pixel-wide anti-aliased line segments.
+
+Each segment is split into evenly-spaced samples which are splatted onto the pixels around them with bilinear weights. \
+Each sample's weight is the length of segment it stands for so a pixel's total weight is about the length of line passing through it
+
+Parameters:
+
+    segments - a (S,4) array of line segments (x1, y1, x2, y2) in the tile's image space
+
+    width - the width of the tile
+
+    height - the height of the tile
+
+Returns:
+
+    coverage - a (height, width) array of coverages in [0, 1]
+"""
+
+    if segments.shape[0] == 0:
+        return np.zeros(shape=(height, width))
+
+    starts = segments[:, :2]
+    deltas = segments[:, 2:] - starts
+    lengths = vectors.magnitudes(deltas)
+
+    sample_counts = np.maximum(1, np.ceil(lengths / LINE_SAMPLE_SPACING)).astype(int)
+
+    sample_segs = np.repeat(np.arange(segments.shape[0]), sample_counts)
+    sample_idxs = np.arange(sample_segs.shape[0]) - np.repeat(np.cumsum(sample_counts) - sample_counts, sample_counts)
+
+    ts = (sample_idxs + 0.5) / sample_counts[sample_segs]
+    samples = starts[sample_segs] + (deltas[sample_segs] * ts[:, np.newaxis])
+    weights = (lengths / sample_counts)[sample_segs]
+
+    # Bilinear splatting relative to the pixel centres
+
+    fracs = samples - 0.5
+    cells = np.floor(fracs).astype(int)
+    fracs -= cells
+
+    accumulated = np.zeros(shape=(height * width,))
+
+    for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+
+        cols = cells[:, 0] + dx
+        rows = cells[:, 1] + dy
+
+        pixel_weights = weights \
+            * (fracs[:, 0] if dx else 1 - fracs[:, 0]) \
+            * (fracs[:, 1] if dy else 1 - fracs[:, 1])
+
+        in_tile = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+
+        accumulated += np.bincount(
+            (rows[in_tile] * width) + cols[in_tile],
+            weights=pixel_weights[in_tile],
+            minlength=height * width
+        )
+
+    return np.clip(accumulated, 0, 1).reshape((height, width))
+
+
+def _triangles_coverage(triangles: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Finds how much of each pixel is covered by triangles, using a grid of samples within each pixel
+
+Parameters:
+
+    triangles - a (T,6) array of triangles (x1, y1, x2, y2, x3, y3) in the tile's image space
+
+    width - the width of the tile
+
+    height - the height of the tile
+
+Returns:
+
+    coverage - a (height, width) array of coverages in [0, 1]
+"""
+
+    accumulated = np.zeros(shape=(height * width,))
+
+    if triangles.shape[0] == 0:
+        return accumulated.reshape((height, width))
+
+    verts = triangles.reshape((-1, 3, 2))
+
+    window_size = int(np.ceil(np.max(np.ptp(verts, axis=1)))) + 2  # The width and height of the window of pixels tested around each triangle
+
+    sub_offsets = (np.arange(ARROWHEAD_SUPERSAMPLING) + 0.5) / ARROWHEAD_SUPERSAMPLING
+    window_offsets = np.arange(window_size)
+
+    for chunk_start in range(0, verts.shape[0], _ARROWHEAD_CHUNK_SIZE):
+
+        chunk_verts = verts[chunk_start:chunk_start+_ARROWHEAD_CHUNK_SIZE]
+        origins = np.floor(np.min(chunk_verts, axis=1)).astype(int)  # (T,2)
+
+        # Sample positions with shape (T, window row, window col, sub row, sub col)
+
+        xs = origins[:, 0, np.newaxis, np.newaxis, np.newaxis, np.newaxis] \
+            + window_offsets[np.newaxis, np.newaxis, :, np.newaxis, np.newaxis] \
+            + sub_offsets[np.newaxis, np.newaxis, np.newaxis, np.newaxis, :]
+        ys = origins[:, 1, np.newaxis, np.newaxis, np.newaxis, np.newaxis] \
+            + window_offsets[np.newaxis, :, np.newaxis, np.newaxis, np.newaxis] \
+            + sub_offsets[np.newaxis, np.newaxis, np.newaxis, :, np.newaxis]
+
+        # Edge function tests, oriented so that the inside of each triangle is non-negative
+
+        areas = ((chunk_verts[:, 1, 0] - chunk_verts[:, 0, 0]) * (chunk_verts[:, 2, 1] - chunk_verts[:, 0, 1])) \
+            - ((chunk_verts[:, 1, 1] - chunk_verts[:, 0, 1]) * (chunk_verts[:, 2, 0] - chunk_verts[:, 0, 0]))
+        orientations = np.where(areas < 0, -1.0, 1.0)[:, np.newaxis, np.newaxis, np.newaxis, np.newaxis]
+
+        inside = np.ones(shape=np.broadcast_shapes(xs.shape, ys.shape), dtype=bool)
+
+        for i in range(3):
+
+            ax = chunk_verts[:, i, 0, np.newaxis, np.newaxis, np.newaxis, np.newaxis]
+            ay = chunk_verts[:, i, 1, np.newaxis, np.newaxis, np.newaxis, np.newaxis]
+            bx = chunk_verts[:, (i+1) % 3, 0, np.newaxis, np.newaxis, np.newaxis, np.newaxis]
+            by = chunk_verts[:, (i+1) % 3, 1, np.newaxis, np.newaxis, np.newaxis, np.newaxis]
+
+            inside &= (((bx - ax) * (ys - ay)) - ((by - ay) * (xs - ax))) * orientations >= 0
+
+        window_coverage = np.mean(inside, axis=(3, 4))  # (T, window row, window col)
+
+        cols = np.broadcast_to(origins[:, 0, np.newaxis, np.newaxis] + window_offsets[np.newaxis, np.newaxis, :], window_coverage.shape)
+        rows = np.broadcast_to(origins[:, 1, np.newaxis, np.newaxis] + window_offsets[np.newaxis, :, np.newaxis], window_coverage.shape)
+
+        in_tile = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height) & (window_coverage > 0)
+
+        accumulated += np.bincount(
+            (rows[in_tile] * width) + cols[in_tile],
+            weights=window_coverage[in_tile],
+            minlength=height * width
+        )
+
+    return np.clip(accumulated, 0, 1).reshape((height, width))
+
+
+def _circles_contributions(circles: np.ndarray, width: int, height: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Finds the anti-aliased coverage of the pixels around point sources' circles
+
+Returns:
+
+    pixels - the flat indices of the covered pixels of the tile
+
+    orders - the draw orders of the elements covering each of the pixels
+
+    coverages - how much of each pixel is covered
+"""
+
+    radius = POINT_SOURCE_RADIUS
+    window_offsets = np.arange(-radius - 1, radius + 1)
+
+    cols = np.floor(circles[:, 0, np.newaxis, np.newaxis]).astype(int) + window_offsets[np.newaxis, np.newaxis, :]
+    rows = np.floor(circles[:, 1, np.newaxis, np.newaxis]).astype(int) + window_offsets[np.newaxis, :, np.newaxis]
+
+    sqr_dists = np.square(cols + 0.5 - circles[:, 0, np.newaxis, np.newaxis]) \
+        + np.square(rows + 0.5 - circles[:, 1, np.newaxis, np.newaxis])
+
+    coverages = np.clip(radius + 0.5 - np.sqrt(sqr_dists), 0, 1)
+
+    cols, rows = np.broadcast_arrays(cols, rows)
+    orders = np.broadcast_to(circles[:, 2, np.newaxis, np.newaxis], coverages.shape)
+
+    mask = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height) & (coverages > 0)
+
+    return (rows[mask] * width) + cols[mask], orders[mask].astype(int), coverages[mask]
+
+
+def _planes_contributions(planes: np.ndarray, width: int, height: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Finds the anti-aliased coverage of the pixels along charge planes' lines. Returns the same as _circles_contributions"""
+
+    pixel_centres = np.stack(np.meshgrid(np.arange(width) + 0.5, np.arange(height) + 0.5), axis=-1).reshape((-1, 2))
+
+    pixels_list: List[np.ndarray] = []
+    orders_list: List[np.ndarray] = []
+    coverages_list: List[np.ndarray] = []
+
+    for x1, y1, x2, y2, order in planes:
+
+        direction = np.array([x2 - x1, y2 - y1])
+        direction_length = np.linalg.norm(direction)
+
+        if direction_length == 0:
+            continue
+
+        normal = np.array([-direction[1], direction[0]]) / direction_length
+
+        dists = np.abs((pixel_centres - np.array([x1, y1])) @ normal)
+        coverages = np.clip((CHARGE_PLANE_WIDTH / 2) + 0.5 - dists, 0, 1)
+
+        covered = np.flatnonzero(coverages > 0)
+
+        pixels_list.append(covered)
+        orders_list.append(np.full(covered.shape, int(order)))
+        coverages_list.append(coverages[covered])
+
+    if len(pixels_list) == 0:
+        return np.zeros(shape=(0,), dtype=int), np.zeros(shape=(0,), dtype=int), np.zeros(shape=(0,))
+
+    return np.concatenate(pixels_list), np.concatenate(orders_list), np.concatenate(coverages_list)
+
+
+# Compositing
+
+def _composite_layer(rgb: np.ndarray, coverage: np.ndarray, colour: Colour) -> None:
+    """Composites a single-coloured layer over an image in-place"""
+
+    alphas = coverage[:, :, np.newaxis] * (colour[3] / 255)
+
+    rgb *= 1 - alphas
+    rgb += alphas * (np.array(colour[:3], dtype=float) / 255)
+
+
+def _composite_ordered(rgb: np.ndarray,
+                       pixels: np.ndarray,
+                       orders: np.ndarray,
+                       alphas: np.ndarray,
+                       colours: np.ndarray) -> None:
+    """Composites many overlapping glyphs over an image in-place, with higher-ordered glyphs drawn above lower-ordered ones.
+
+For each pixel, the glyphs covering it are sorted from the top down and each glyph's contribution is scaled \
+by the product of the transparencies of the glyphs above it, found as a cumulative sum of logs within each pixel's group
+
+Parameters:
+
+    rgb - the (H,W,3) image to composite onto
+
+    pixels - the flat indices of the pixels of each contribution
+
+    orders - the draw order of each contribution
+
+    alphas - the opacity of each contribution
+
+    colours - the (N,3) colour of each contribution
+"""
+
+    if pixels.shape[0] == 0:
+        return
+
+    flat_rgb = rgb.reshape((-1, 3))
+
+    sort_idxs = np.lexsort((-orders, pixels))  # By pixel, then from the top down
+
+    pixels = pixels[sort_idxs]
+    alphas = np.minimum(alphas[sort_idxs], _MAX_TRANSPARENCY_ALPHA)
+    colours = colours[sort_idxs]
+
+    group_starts = np.flatnonzero(np.concatenate([[True], pixels[1:] != pixels[:-1]]))
+    group_sizes = np.diff(np.append(group_starts, pixels.shape[0]))
+    group_pixels = pixels[group_starts]
+
+    log_transparencies = np.log1p(-alphas)
+    cumulative = np.cumsum(log_transparencies)
+    exclusive = cumulative - log_transparencies
+    exclusive -= np.repeat(exclusive[group_starts], group_sizes)  # Only the glyphs above within the same pixel
+
+    contributions = colours * (alphas * np.exp(exclusive))[:, np.newaxis]
+
+    group_contributions = np.stack([
+        np.bincount(np.repeat(np.arange(group_starts.shape[0]), group_sizes), weights=contributions[:, c])
+        for c in range(3)
+    ], axis=1)
+
+    group_transparencies = np.exp(np.add.reduceat(log_transparencies, group_starts))
+
+    flat_rgb[group_pixels] = (flat_rgb[group_pixels] * group_transparencies[:, np.newaxis]) + group_contributions
+
+
+# Tiles
+
+def rasterize_tile(scene: RasterScene,
+                   left: int,
+                   top: int,
+                   width: int,
+                   height: int) -> np.ndarray:
+    """Rasterizes a rectangular region of a scene's image
+
+Parameters:
+
+    scene - the scene to rasterize
+
+    left - the column of the image that the tile starts at
+
+    top - the row of the image that the tile starts at
+
+    width - the width of the tile
+
+    height - the height of the tile
+
+Returns:
+
+    rgba - a (height, width, 4) array of uint8 colours, with row 0 being the top of the tile
+"""
+
+    offset = np.array([left, top], dtype=float)
+
+    rgb = np.empty(shape=(height, width, 3))
+    rgb[:, :] = np.array(BACKGROUND_COLOUR[:3], dtype=float) / 255
+
+    # Field lines
+
+    segments = scene.segments
+    segments_mask = (np.maximum(segments[:, 0], segments[:, 2]) >= left - 1) \
+        & (np.minimum(segments[:, 0], segments[:, 2]) <= left + width + 1) \
+        & (np.maximum(segments[:, 1], segments[:, 3]) >= top - 1) \
+        & (np.minimum(segments[:, 1], segments[:, 3]) <= top + height + 1)
+
+    tile_segments = segments[segments_mask] - np.tile(offset, 2)
+
+    _composite_layer(rgb, _segments_coverage(tile_segments, width, height), FIELD_LINE_COLOUR)
+
+    # Arrowheads
+
+    arrowheads = scene.arrowheads
+    arrowheads_mask = (np.max(arrowheads[:, [0, 2, 4]], axis=1, initial=-np.inf) >= left - 1) \
+        & (np.min(arrowheads[:, [0, 2, 4]], axis=1, initial=np.inf) <= left + width + 1) \
+        & (np.max(arrowheads[:, [1, 3, 5]], axis=1, initial=-np.inf) >= top - 1) \
+        & (np.min(arrowheads[:, [1, 3, 5]], axis=1, initial=np.inf) <= top + height + 1)
+
+    tile_arrowheads = arrowheads[arrowheads_mask] - np.tile(offset, 3)
+
+    _composite_layer(rgb, _triangles_coverage(tile_arrowheads, width, height), FIELD_LINE_COLOUR)
+
+    # Field elements
+
+    circles = scene.circles
+    circles_mask = (circles[:, 0] >= left - POINT_SOURCE_RADIUS - 1) \
+        & (circles[:, 0] <= left + width + POINT_SOURCE_RADIUS + 1) \
+        & (circles[:, 1] >= top - POINT_SOURCE_RADIUS - 1) \
+        & (circles[:, 1] <= top + height + POINT_SOURCE_RADIUS + 1)
+
+    tile_circles = circles[circles_mask] - np.append(offset, 0)
+    tile_planes = scene.planes - np.append(np.tile(offset, 2), 0)
+
+    circle_pixels, circle_orders, circle_coverages = _circles_contributions(tile_circles, width, height)
+    plane_pixels, plane_orders, plane_coverages = _planes_contributions(tile_planes, width, height)
+
+    orders = np.concatenate([circle_orders, plane_orders])
+
+    _composite_ordered(
+        rgb,
+        np.concatenate([circle_pixels, plane_pixels]),
+        orders,
+        np.concatenate([circle_coverages, plane_coverages]) * scene.element_colours[orders, 3],
+        scene.element_colours[orders, :3]
+    )
+
+    # Conversion to bytes
+
+    rgba = np.empty(shape=(height, width, 4), dtype=np.uint8)
+    rgba[:, :, :3] = np.round(np.clip(rgb, 0, 1) * 255).astype(np.uint8)
+    rgba[:, :, 3] = 255
+
+    return rgba
+
+
+def iter_raster_strips(scene: RasterScene, tile_size: int = DEFAULT_TILE_SIZE) -> Iterator[np.ndarray]:
+    """Rasterizes a scene's image one tile at a time, yielding the rows of the image in strips from the top down. \
+Only one strip of the image is held in memory at a time
+
+Parameters:
+
+    scene - the scene to rasterize
+
+    tile_size (optional) - the width and height of the tiles (and so the height of the strips)
+
+Returns:
+
+    strips - an iterator of (rows, width, 4) uint8 arrays
+"""
+
+    for top in range(0, scene.height, tile_size):
+
+        strip_height = min(tile_size, scene.height - top)
+
+        yield np.concatenate([
+            rasterize_tile(scene, left, top, min(tile_size, scene.width - left), strip_height)
+            for left in range(0, scene.width, tile_size)
+        ], axis=1)
+
+
+def rasterize(scene: RasterScene, tile_size: int = DEFAULT_TILE_SIZE) -> np.ndarray:
+    """Rasterizes a scene's whole image. Returns a (height, width, 4) uint8 array with row 0 being the top of the image"""
+
+    return np.concatenate(list(iter_raster_strips(scene, tile_size)), axis=0)
+
+
+# PNG
+
+def _write_png_chunk(stream: BinaryIO, chunk_type: bytes, data: bytes) -> None:
+
+    stream.write(struct.pack(">I", len(data)))
+    stream.write(chunk_type)
+    stream.write(data)
+    stream.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+def write_png(stream: BinaryIO, width: int, height: int, strips: Iterator[np.ndarray]) -> None:
+    """Writes an 8-bit RGBA PNG image, compressing and writing each strip of rows as it is given
+
+Parameters:
+
+    stream - the binary stream to write to
+
+    width - the width of the image
+
+    height - the height of the image
+
+    strips - an iterator of (rows, width, 4) uint8 arrays of the image's rows from the top down
+"""
+
+    stream.write(b"\x89PNG\r\n\x1a\n")
+
+    _write_png_chunk(stream, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    compressor = zlib.compressobj()
+    row_count = 0
+
+    for strip in strips:
+
+        assert strip.ndim == 3 and strip.shape[1:] == (width, 4), "Invalid strip shape"
+
+        # Each row is prefixed with its filter type (0 - no filtering)
+        filtered = np.zeros(shape=(strip.shape[0], (width * 4) + 1), dtype=np.uint8)
+        filtered[:, 1:] = strip.reshape((strip.shape[0], -1))
+
+        data = compressor.compress(filtered.tobytes())
+        if len(data) > 0:
+            _write_png_chunk(stream, b"IDAT", data)
+
+        row_count += strip.shape[0]
+
+    assert row_count == height, "Strips don't cover the image's height"
+
+    _write_png_chunk(stream, b"IDAT", compressor.flush())
+    _write_png_chunk(stream, b"IEND", b"")
+
+
+def export_field_png(field: Field,
+                     filename: str,
+                     width: int,
+                     height: int,
+                     config: Optional[TraceConfig] = None,
+                     scale: float = settings.VIEWPORT_SCALE_FAC,
+                     tile_size: int = DEFAULT_TILE_SIZE) -> None:
+    """Draws an image of a field and its lines, framed as the visualisation window frames it, and writes it to a PNG file"""
+
+    scene = RasterScene.from_field(field, width, height, config, scale)
+
+    with open(filename, "wb") as file:
+        write_png(file, width, height, iter_raster_strips(scene, tile_size))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Draw images of field files without a display")
+    parser.add_argument("fields", nargs="+", help="the .field or .fieldb files to draw")
+    parser.add_argument("-o", "--out-dir", default=".", help="the directory to write the images to")
+    parser.add_argument("--width", type=int, default=720)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--scale", type=float, default=settings.VIEWPORT_SCALE_FAC, help="the number of units of distance in the field per pixel")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument("--settings", default=None, help="a settings file to take the field line settings from (defaults are used otherwise)")
+
+    args = parser.parse_args(argv)
+
+    if args.settings is not None:
+        load_settings(args.settings)
+
+    makedirs(args.out_dir, exist_ok=True)
+
+    for field_filename in args.fields:
+
+        field = read_field_file(field_filename)
+
+        out_filename = joinpath(args.out_dir, splitext(basename(field_filename))[0] + ".png")
+
+        export_field_png(field, out_filename, args.width, args.height, scale=args.scale, tile_size=args.tile_size)
+
+        print(out_filename)
+
+
+if __name__ == "__main__":
+    main()
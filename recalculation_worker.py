@@ -0,0 +1,434 @@
+from typing import Callable, Optional, Sequence, Tuple, Hashable
+from threading import Thread, Condition
+import numpy as np
+from field import Field, TraceCancelledException
+from field_element import ElementBase
+from render_geometry import FieldLineGeometry, build_field_line_geometry, line_point_counts
+from perf_stats import perf_stats
+from settings import settings
+from metrics import metrics
+
+
+EXTRA_ELEMENT_RETRACE_FRACTION: float = 0.05
+"""How strong the extra elements' field can be along a line of the field's own elements, as a fraction of the field's own elements' field there, \
+before the line is retraced with the extra elements instead of being reused. Lines the extra elements barely change are reused as they are"""
+
+
+class TraceConfig:
+    """The values used for tracing and drawing field lines"""
+
+    def __init__(self,
+                 line_count_factor: float,
+                 max_step_count: int,
+                 step_distance: float,
+                 element_stop_distance: float,
+                 show_arrows: bool,
+                 arrowhead_spacing: float,
+                 simplify_tolerance: float,
+                 scale: float = settings.VIEWPORT_SCALE_FAC):
+
+        self.line_count_factor = line_count_factor
+        self.max_step_count = max_step_count
+        self.step_distance = step_distance
+        self.element_stop_distance = element_stop_distance
+        self.show_arrows = show_arrows
+        self.arrowhead_spacing = arrowhead_spacing
+        self.simplify_tolerance = simplify_tolerance
+        self.scale = scale
+        """The number of units of distance in the field per pixel of display that the lines are drawn at"""
+
+    @staticmethod
+    def from_settings(scale: float = settings.VIEWPORT_SCALE_FAC) -> "TraceConfig":
+        """Creates the config described by the current settings, for drawing with scale units of distance in the field per pixel of display"""
+        return TraceConfig(
+            line_count_factor=settings.field_line_count_factor,
+            max_step_count=settings.field_line_trace_max_step_count,
+            step_distance=settings.field_line_trace_step_distance_screen_space * scale,
+            element_stop_distance=settings.field_line_trace_element_stop_distance_screen_space * scale,
+            show_arrows=settings.show_field_line_arrows,
+            arrowhead_spacing=settings.field_line_render_arrowhead_spacing,
+            simplify_tolerance=settings.field_line_render_simplify_tolerance_screen_space,
+            scale=scale
+        )
+
+    @property
+    def key(self) -> Tuple:
+        """A hashable value that is equal for equal configs"""
+        return (
+            self.line_count_factor,
+            self.max_step_count,
+            self.step_distance,
+            self.element_stop_distance,
+            self.show_arrows,
+            self.arrowhead_spacing,
+            self.simplify_tolerance,
+            self.scale
+        )
+
+    def rescaled(self, scale: float) -> "TraceConfig":
+        """Creates the same config for drawing at a different scale, keeping the distances that are measured in screen space the same on screen"""
+
+        fac = scale / self.scale
+
+        return TraceConfig(
+            line_count_factor=self.line_count_factor,
+            max_step_count=self.max_step_count,
+            step_distance=self.step_distance * fac,
+            element_stop_distance=self.element_stop_distance * fac,
+            show_arrows=self.show_arrows,
+            arrowhead_spacing=self.arrowhead_spacing,
+            simplify_tolerance=self.simplify_tolerance,
+            scale=scale
+        )
+
+    def coarsened(self, fac: float) -> "TraceConfig":
+        """Creates a cheaper version of the config with fewer lines, each traced with steps fac times longer (and so fac times fewer steps) and without arrowheads"""
+
+        return TraceConfig(
+            line_count_factor=self.line_count_factor / fac,
+            max_step_count=max(2, round(self.max_step_count / fac)),
+            step_distance=self.step_distance * fac,
+            element_stop_distance=self.element_stop_distance,
+            show_arrows=False,
+            arrowhead_spacing=self.arrowhead_spacing,
+            simplify_tolerance=self.simplify_tolerance * fac,
+            scale=self.scale
+        )
+
+
+class RecalculationJob:
+    """Everything needed to recalculate a field's lines, as they were at the time the recalculation was requested"""
+
+    def __init__(self,
+                 job_id: int,
+                 field: Field,
+                 clip_bounds: np.ndarray,
+                 config: TraceConfig,
+                 extra_elements: Sequence[ElementBase]):
+
+        self.job_id = job_id
+
+        self.field = field
+        self.clip_bounds = clip_bounds.copy()
+        self.config = config
+        self.extra_elements = list(extra_elements)
+
+
+class RecalculationResult:
+
+    def __init__(self,
+                 job_id: int,
+                 geometry: FieldLineGeometry):
+
+        self.job_id = job_id
+        self.geometry = geometry
+
+
+class RecalculationWorker:
+    """A background thread that traces field lines and builds their geometry.
+
+Only the most recently submitted job matters: submitting a job replaces any job waiting to be started \
+and cancels any job already being worked on. Results are only published for the most recent job
+
+Parameters:
+
+    record_stats (default True) - whether to record the performance figures of the worker's jobs in perf_stats
+"""
+
+    def __init__(self, record_stats: bool = True):
+
+        self.__record_stats = record_stats
+
+        self.__condition = Condition()
+
+        self.__latest_job_id: int = 0
+        self.__pending_job: Optional[RecalculationJob] = None
+        self.__working: bool = False
+        self.__result: Optional[RecalculationResult] = None
+        self.__running: bool = True
+
+        self.__line_starts_cache: Optional[Tuple[Hashable, np.ndarray, np.ndarray]] = None
+        """The last field's field line starts (only used by the worker thread)"""
+        self.__base_lines_cache: Optional[Tuple[Hashable, np.ndarray, np.ndarray, np.ndarray]] = None
+        """The last field's own traced lines and the magnitude of its grad at each of their points, for jobs with extra elements (only used by the worker thread)"""
+
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    @property
+    def is_busy(self) -> bool:
+        """Whether there is a job waiting or being worked on"""
+        with self.__condition:
+            return self.__working or (self.__pending_job is not None)
+
+    def submit(self,
+               field: Field,
+               clip_bounds: np.ndarray,
+               config: Optional[TraceConfig] = None,
+               extra_elements: Sequence[ElementBase] = ()) -> int:
+        """Requests a field's lines to be recalculated. Returns the id of the job created
+
+Parameters:
+
+    field - the field to calculate the lines of. This mustn't be modified after being submitted, so should usually be a copy
+
+    clip_bounds - the range of positions in world-space that should be rendered
+
+    config (optional) - the values to trace and draw the lines with. If not provided, the values are taken from the current settings
+
+    extra_elements (optional) - elements to include in the field's calculation in addition to the field's own elements. \
+Submitting the same field repeatedly with different extra elements reuses the field's own lines, \
+only retracing those that the extra elements noticeably change (see EXTRA_ELEMENT_RETRACE_FRACTION)
+"""
+
+        if config is None:
+            config = TraceConfig.from_settings()
+
+        with self.__condition:
+
+            self.__latest_job_id += 1
+            self.__pending_job = RecalculationJob(self.__latest_job_id, field, clip_bounds, config, extra_elements)
+            self.__condition.notify_all()
+
+            return self.__latest_job_id
+
+    def take_result(self) -> Optional[RecalculationResult]:
+        """Takes the latest published result, if there is one and no job has been submitted since its job. Each result is only returned once"""
+
+        with self.__condition:
+
+            result = self.__result
+            self.__result = None
+
+            if (result is not None) and (result.job_id != self.__latest_job_id):
+                return None
+
+            return result
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until there are no jobs waiting or being worked on. Returns False if the timeout was reached first"""
+
+        with self.__condition:
+            return self.__condition.wait_for(
+                lambda: (not self.__working) and (self.__pending_job is None),
+                timeout=timeout
+            )
+
+    def stop(self) -> None:
+
+        with self.__condition:
+            self.__running = False
+            self.__pending_job = None
+            self.__condition.notify_all()
+
+        self.__thread.join()
+
+    def __is_superseded(self, job_id: int) -> bool:
+        # N.B. reading an int attribute is atomic so this doesn't need the lock
+        return (job_id != self.__latest_job_id) or (not self.__running)
+
+    def __run(self) -> None:
+
+        while True:
+
+            # Wait for a job
+
+            with self.__condition:
+
+                self.__condition.wait_for(lambda: (self.__pending_job is not None) or (not self.__running))
+
+                if not self.__running:
+                    return
+
+                job = self.__pending_job
+                assert job is not None
+                self.__pending_job = None
+                self.__working = True
+
+            # Perform the job
+
+            result: Optional[RecalculationResult]
+
+            try:
+                result = self.__calculate(job)
+            except TraceCancelledException:
+                result = None
+
+            # Publish the result if nothing newer has been requested
+
+            with self.__condition:
+
+                if (result is not None) and (not self.__is_superseded(job.job_id)):
+                    self.__result = result
+
+                self.__working = False
+                self.__condition.notify_all()
+
+    def __get_field_line_starts(self, job: RecalculationJob) -> Tuple[np.ndarray, np.ndarray]:
+        """Gets the field line starts of the job's field, reusing the previous job's if it had the same field and bounds"""
+
+        key = (job.field.version, job.clip_bounds.tobytes(), job.config.line_count_factor)
+
+        hit = (self.__line_starts_cache is not None) and (self.__line_starts_cache[0] == key)
+
+        if self.__record_stats:
+            perf_stats.record_cache_access("Line starts", hit)
+
+        if hit:
+            assert self.__line_starts_cache is not None
+            return self.__line_starts_cache[1], self.__line_starts_cache[2]
+
+        line_starts, positives = job.field.get_field_line_starts(job.clip_bounds, fac=job.config.line_count_factor)
+
+        self.__line_starts_cache = (key, line_starts, positives)
+
+        return line_starts, positives
+
+    @staticmethod
+    def __base_key(job: RecalculationJob) -> Hashable:
+        return (job.field.version, job.clip_bounds.tobytes(), job.config.key)
+
+    def __is_base_superseded(self, job: RecalculationJob) -> bool:
+        """Whether tracing the job's field's own lines should be abandoned. \
+Unlike the job, this isn't superseded by a newer job for the same field, as the newer job can reuse the lines"""
+
+        # N.B. the attributes are read without the lock, so the pending job might not yet be the latest job's, in which case this is checked again on the next step
+
+        pending_job = self.__pending_job
+
+        if not self.__running:
+            return True
+
+        return self.__is_superseded(job.job_id) and (pending_job is not None) and (RecalculationWorker.__base_key(pending_job) != RecalculationWorker.__base_key(job))
+
+    def __trace(self, field: Field, job: RecalculationJob, line_starts: np.ndarray, positives: np.ndarray, should_cancel: Callable[[], bool]) -> np.ndarray:
+
+        config = job.config
+
+        return field.trace_field_lines(
+            line_starts,
+            config.max_step_count,
+            positives,
+            step_distance=config.step_distance,
+            element_stop_distance=config.element_stop_distance,
+            clip_ranges=job.clip_bounds,
+            should_cancel=should_cancel
+        )
+
+    def __get_base_lines(self, job: RecalculationJob) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Gets the lines of the job's field's own elements, their positives and the magnitude of the field's grad at each of their points \
+(zero for padding), reusing the previous job's if it had the same field, bounds and config"""
+
+        key = RecalculationWorker.__base_key(job)
+
+        hit = (self.__base_lines_cache is not None) and (self.__base_lines_cache[0] == key)
+
+        if self.__record_stats:
+            perf_stats.record_cache_access("Base lines", hit)
+
+        if not hit:
+
+            line_starts, positives = self.__get_field_line_starts(job)
+
+            lines = self.__trace(job.field, job, line_starts, positives, lambda: self.__is_base_superseded(job))
+
+            point_mask = np.arange(lines.shape[1])[np.newaxis, :] < line_point_counts(lines)[:, np.newaxis]
+
+            grad_mags = np.zeros(shape=lines.shape[:2], dtype=float)
+            grad_mags[point_mask] = np.linalg.norm(job.field.grad(lines[point_mask]), axis=1)
+
+            self.__base_lines_cache = (key, lines, positives, grad_mags)
+
+        assert self.__base_lines_cache is not None
+        return self.__base_lines_cache[1], self.__base_lines_cache[2], self.__base_lines_cache[3]
+
+    def __calculate_with_extra_elements(self, job: RecalculationJob) -> Tuple[np.ndarray, np.ndarray]:
+        """Traces the lines of the job's field with its extra elements, reusing the lines of the field's own elements that the extra elements barely change. \
+The lines are in the same order as if they had all been traced"""
+
+        base_lines, base_positives, base_grad_mags = self.__get_base_lines(job)
+        line_starts, _ = self.__get_field_line_starts(job)
+
+        field = job.field.copy()
+        extra_field = Field()
+
+        for ele in job.extra_elements:
+            field.add_element(ele)
+            extra_field.add_element(ele)
+
+        # Find the lines that the extra elements noticeably change
+
+        point_mask = np.arange(base_lines.shape[1])[np.newaxis, :] < line_point_counts(base_lines)[:, np.newaxis]
+
+        extra_grad_mags = np.zeros_like(base_grad_mags)
+        extra_grad_mags[point_mask] = np.linalg.norm(extra_field.grad(base_lines[point_mask]), axis=1)
+
+        # N.B. this is written so that NaNs (eg. at the position of an extra point source) count as noticeable changes
+        retrace_mask = np.any(~(extra_grad_mags <= EXTRA_ELEMENT_RETRACE_FRACTION * base_grad_mags), axis=1)
+
+        metrics.increment("trace.reused_lines", int(np.count_nonzero(~retrace_mask)))
+
+        # Retrace those lines and trace the extra elements' own lines
+
+        extra_starts, extra_positives = extra_field.get_field_line_starts(job.clip_bounds, fac=job.config.line_count_factor)
+
+        retraced_lines = self.__trace(
+            field,
+            job,
+            np.concatenate([line_starts[retrace_mask], extra_starts]),
+            np.concatenate([base_positives[retrace_mask], extra_positives]),
+            lambda: self.__is_superseded(job.job_id)
+        )
+
+        retraced_count = int(np.count_nonzero(retrace_mask))
+
+        lines = base_lines.copy()
+        lines[retrace_mask] = retraced_lines[:retraced_count]
+
+        return np.concatenate([lines, retraced_lines[retraced_count:]]), np.concatenate([base_positives, extra_positives])
+
+    def __calculate(self, job: RecalculationJob) -> RecalculationResult:
+
+        config = job.config
+
+        with metrics.timer("trace.recalculation") as trace_timer:
+
+            if len(job.extra_elements) == 0:
+
+                line_starts, positives = self.__get_field_line_starts(job)
+
+                if line_starts.shape[0] == 0:
+                    return RecalculationResult(job.job_id, FieldLineGeometry.empty())
+
+                field_lines = self.__trace(job.field, job, line_starts, positives, lambda: self.__is_superseded(job.job_id))
+
+            else:
+
+                field_lines, positives = self.__calculate_with_extra_elements(job)
+
+                if field_lines.shape[0] == 0:
+                    return RecalculationResult(job.job_id, FieldLineGeometry.empty())
+
+        with metrics.timer("render.geometry"):
+            geometry = build_field_line_geometry(
+                field_lines,
+                positives,
+                scale=config.scale,
+                show_arrows=config.show_arrows,
+                arrowhead_spacing=config.arrowhead_spacing,
+                simplify_tolerance=config.simplify_tolerance
+            )
+
+        metrics.increment("trace.lines", field_lines.shape[0])
+
+        if self.__record_stats:
+
+            perf_stats.record_trace(
+                trace_timer.elapsed_ms,
+                traced_line_count=field_lines.shape[0],
+                unfinished_line_count=int(np.count_nonzero(line_point_counts(field_lines) == field_lines.shape[1]))
+            )
+
+            perf_stats.record_geometry(geometry)
+
+        return RecalculationResult(job.job_id, geometry)
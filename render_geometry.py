@@ -0,0 +1,434 @@
+from typing import List, Tuple
+import numpy as np
+import vectors
+from field_element import ElementBase, PointSource, ChargePlane
+
+
+ARROWHEAD_LENGTH: int = 5
+POINT_SOURCE_RADIUS: int = 5
+CHARGE_PLANE_WIDTH: int = 5
+
+
+Colour = Tuple[int, int, int, int]
+
+
+WHITE: Colour = (255, 255, 255, 255)
+FIELD_LINE_COLOUR: Colour = WHITE
+
+
+def _strength_colour(strength: float) -> Colour:
+
+    if strength == 0:
+        return WHITE
+    elif strength > 0:
+        return (
+            255,
+            128*(1-round(np.tanh(strength/50))),
+            128*(1-round(np.tanh(strength/50))),
+            255
+        )
+    else:
+        return (
+            128*(1-round(np.tanh(-strength/50))),
+            128*(1-round(np.tanh(-strength/50))),
+            255,
+            255
+        )
+
+
+def element_colour(ele: ElementBase) -> Colour:
+    """Gets the colour that a field element is drawn with"""
+
+    match ele:
+
+        case PointSource():
+            return _strength_colour(ele.strength)
+
+        case ChargePlane():
+            return _strength_colour(ele.strength_density)
+
+        case _:
+            raise ValueError("Unhandled element class")
+
+
+def point_source_screen_pos(ps: PointSource, scale: float) -> Tuple[int, int]:
+    """Gets the screen-space position that a point source's circle is drawn centred on"""
+    return (
+        round(ps.x/scale),
+        round(ps.y/scale)
+    )
+
+
+def charge_plane_screen_segment(cp: ChargePlane, draw_bounds: np.ndarray, scale: float) -> Tuple[float, float, float, float]:
+    """Gets the screen-space line segment (x1, y1, x2, y2) that a charge plane is drawn as, spanning the drawing area
+
+Parameters:
+
+    cp - the charge plane
+
+    draw_bounds - the world-space boundaries of the drawing area
+
+    scale - the number of units of distance in the field per pixel of display
+"""
+
+    xstart: float
+    xend: float
+    ystart: float
+    yend: float
+
+    if np.isclose(cp.normal[0], 0):
+
+        # Plane is horizontal
+
+        xstart = draw_bounds[0][0]
+        xend = draw_bounds[0][1]
+
+        ystart = cp.pos[1]
+        yend = cp.pos[1]
+
+    elif np.isclose(cp.normal[1], 0):
+
+        # Plane is vertical
+
+        xstart = cp.pos[0]
+        xend = cp.pos[0]
+
+        ystart = draw_bounds[1][0]
+        yend = draw_bounds[1][1]
+
+    else:
+
+        plane_grad = -cp.normal[0] / cp.normal[1]
+
+        xstart = draw_bounds[0][0]
+        xend = draw_bounds[0][1]
+
+        ystart = cp.pos[1] + ((xstart - cp.pos[0]) * plane_grad)
+        yend = cp.pos[1] + ((xend - cp.pos[0]) * plane_grad)
+
+    return (
+        xstart/scale,
+        ystart/scale,
+        xend/scale,
+        yend/scale
+    )
+
+
+class FieldLineGeometry:
+    """The screen-space geometry needed to render a set of traced field lines"""
+
+    def __init__(self,
+                 segments: np.ndarray,
+                 arrowheads: np.ndarray,
+                 removed_vertex_count: int = 0):
+
+        assert segments.ndim == 2 and segments.shape[1] == 4, "Invalid segments array shape"
+        assert arrowheads.ndim == 2 and arrowheads.shape[1] == 6, "Invalid arrowheads array shape"
+
+        self.segments = segments
+        """A (S,4) array where each row is a line segment (x1, y1, x2, y2)"""
+
+        self.arrowheads = arrowheads
+        """A (A,6) array where each row is an arrowhead triangle (x1, y1, x2, y2, x3, y3)"""
+
+        self.removed_vertex_count = removed_vertex_count
+        """How many of the traced lines' points were removed by simplification"""
+
+    @staticmethod
+    def empty() -> "FieldLineGeometry":
+        return FieldLineGeometry(np.zeros(shape=(0, 4)), np.zeros(shape=(0, 6)))
+
+    @property
+    def segment_count(self) -> int:
+        return self.segments.shape[0]
+
+    @property
+    def arrowhead_count(self) -> int:
+        return self.arrowheads.shape[0]
+
+    @property
+    def vertex_count(self) -> int:
+        return 2 * self.segment_count
+
+
+def line_point_counts(lines: np.ndarray) -> np.ndarray:
+    """Finds how many points of each traced field line should be drawn. \
+A line is drawn up until its first infinite point or until its first repeated point (which is how a line that has stopped is padded)
+
+Parameters:
+
+    lines - a 3D array of field lines as returned by Field.trace_field_lines
+
+Returns:
+
+    counts - a 1D array of the number of leading points of each line that should be drawn
+"""
+
+    assert lines.ndim == 3, "Invalid lines array dimensionality"
+
+    if lines.shape[1] <= 1:
+        return np.repeat(lines.shape[1], lines.shape[0])
+
+    stops = np.logical_or(
+        np.any(lines[:, 1:] == np.inf, axis=2),
+        np.all(np.isclose(lines[:, :-1], lines[:, 1:]), axis=2)
+    )  # stops[n, t] is whether point t+1 of line n shouldn't be drawn
+
+    return np.where(
+        np.any(stops, axis=1),
+        np.argmax(stops, axis=1) + 1,
+        lines.shape[1]
+    )
+
+
+def simplify_lines_mask(screen_lines: np.ndarray,
+                        counts: np.ndarray,
+                        tolerance: float) -> np.ndarray:
+    """Simplifies many screen-space polylines at once using the Douglas-Peucker algorithm. \
+Each round of the algorithm is performed for every unfinished range of every line at the same time
+
+Parameters:
+
+    screen_lines - a 3D array of lines in screen space, with the same layout as the output of Field.trace_field_lines
+
+    counts - a 1D array of how many of the leading points of each line are part of the line
+
+    tolerance - the maximum distance (in pixels) that a removed point may be from the simplified line
+
+Returns:
+
+    keep_mask - a 2D boolean array of which points of each line should be kept
+"""
+
+    assert screen_lines.ndim == 3, "Invalid lines array dimensionality"
+    assert counts.ndim == 1, "Invalid counts array dimensionality"
+    assert screen_lines.shape[0] == counts.shape[0], "Lines and counts arrays are not of matching shapes"
+
+    line_count = screen_lines.shape[0]
+    point_idxs = np.arange(screen_lines.shape[1])
+
+    keep_mask = (point_idxs[np.newaxis, :] == 0) | (point_idxs[np.newaxis, :] == (counts - 1)[:, np.newaxis])
+    keep_mask &= (counts > 0)[:, np.newaxis]
+
+    # The ranges (of line indices and start and end point indices) still to be simplified
+
+    range_lines = np.arange(line_count)[counts > 2]
+    range_starts = np.zeros_like(range_lines)
+    range_ends = counts[range_lines] - 1
+
+    sqr_tolerance = tolerance * tolerance
+
+    while range_lines.shape[0] > 0:
+
+        # Flatten the interior points of all the ranges into single arrays
+
+        interior_counts = range_ends - range_starts - 1
+        range_offsets = np.cumsum(interior_counts) - interior_counts
+        flat_range_idxs = np.repeat(np.arange(range_lines.shape[0]), interior_counts)
+        flat_point_idxs = range_starts[flat_range_idxs] + 1 + (np.arange(flat_range_idxs.shape[0]) - range_offsets[flat_range_idxs])
+        flat_lines = range_lines[flat_range_idxs]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sqr_dists = vectors.line_seg_sqr_distance_to_point(
+                screen_lines[flat_lines, range_starts[flat_range_idxs]],
+                screen_lines[flat_lines, range_ends[flat_range_idxs]],
+                screen_lines[flat_lines, flat_point_idxs]
+            )
+
+        # Find the furthest point of each range
+
+        range_max_sqr_dists = np.maximum.reduceat(sqr_dists, range_offsets)
+
+        is_max = sqr_dists == range_max_sqr_dists[flat_range_idxs]
+        range_split_idxs = np.minimum.reduceat(
+            np.where(is_max, flat_point_idxs, screen_lines.shape[1]),
+            range_offsets
+        )
+
+        # Keep the furthest points that are out of tolerance and split their ranges around them
+
+        split_mask = range_max_sqr_dists > sqr_tolerance
+
+        split_lines = range_lines[split_mask]
+        split_idxs = range_split_idxs[split_mask]
+
+        keep_mask[split_lines, split_idxs] = True
+
+        range_lines = np.concatenate([split_lines, split_lines])
+        range_starts = np.concatenate([range_starts[split_mask], split_idxs])
+        range_ends = np.concatenate([split_idxs, range_ends[split_mask]])
+
+        has_interior = (range_ends - range_starts) > 1
+
+        range_lines = range_lines[has_interior]
+        range_starts = range_starts[has_interior]
+        range_ends = range_ends[has_interior]
+
+    return keep_mask
+
+
+def _arrowhead_indices(points: np.ndarray, spacing: float) -> List[int]:
+    """Finds the indices of the points of a single screen-space line that should have arrowheads drawn at them. \
+An arrowhead is drawn at the first point at least the spacing distance away from the previous arrowhead (or the start of the line)"""
+
+    indices: List[int] = []
+
+    anchor = points[0]  # N.B. not drawing arrowhead at start
+    start = 1
+
+    while start < points.shape[0]:
+
+        far_mask = vectors.magnitudes(points[start:] - anchor) >= spacing
+
+        if not np.any(far_mask):
+            break
+
+        idx = start + int(np.argmax(far_mask))
+
+        indices.append(idx)
+        anchor = points[idx]
+        start = idx + 1
+
+    return indices
+
+
+def _build_arrowheads(prevs: np.ndarray, currs: np.ndarray, signs: np.ndarray) -> np.ndarray:
+    """Creates arrowhead triangles at the currs positions pointing in the directions from the prevs positions (reversed where signs are negative)"""
+
+    line_dirs = vectors.many_normalise(currs - prevs) * signs[:, np.newaxis]
+    line_norms = np.stack([line_dirs[:, 1], -line_dirs[:, 0]], axis=1)
+
+    tips = currs + (line_dirs * ARROWHEAD_LENGTH)
+    sides1 = currs + (line_norms * ARROWHEAD_LENGTH / 2)
+    sides2 = currs - (line_norms * ARROWHEAD_LENGTH / 2)
+
+    return np.concatenate([tips, sides1, sides2], axis=1)
+
+
+def kept_points_mask(screen_lines: np.ndarray,
+                     counts: np.ndarray,
+                     simplify_tolerance: float = 0) -> np.ndarray:
+    """Finds which points of screen-space field lines are drawn
+
+Parameters:
+
+    screen_lines - a 3D array of field lines in screen space
+
+    counts - how many points of each line should be drawn, as found by line_point_counts
+
+    simplify_tolerance (default 0) - how far in screen space the drawn lines may deviate from the traced lines when removing redundant points. \
+If 0 then no points are removed
+
+Returns:
+
+    keep_mask - a 2D boolean array of which points of each line are drawn
+"""
+
+    if simplify_tolerance > 0:
+        return simplify_lines_mask(screen_lines, counts, simplify_tolerance)
+    else:
+        return np.arange(screen_lines.shape[1])[np.newaxis, :] < counts[:, np.newaxis]
+
+
+def build_arrowheads(screen_lines: np.ndarray,
+                     counts: np.ndarray,
+                     positives: np.ndarray,
+                     arrowhead_spacing: float) -> np.ndarray:
+    """Creates the arrowheads drawn along screen-space field lines
+
+Parameters:
+
+    screen_lines - a 3D array of field lines in screen space
+
+    counts - how many points of each line should be drawn, as found by line_point_counts
+
+    positives - a 1D array of which lines are positive lines
+
+    arrowhead_spacing - the spacing in screen space between arrowheads drawn on the lines
+
+Returns:
+
+    arrowheads - a (A,6) array where each row is an arrowhead triangle (x1, y1, x2, y2, x3, y3)
+"""
+
+    line_idxs: List[int] = []
+    point_idxs: List[int] = []
+
+    for i in range(screen_lines.shape[0]):
+        for idx in _arrowhead_indices(screen_lines[i, :counts[i]], arrowhead_spacing):
+            line_idxs.append(i)
+            point_idxs.append(idx)
+
+    if len(line_idxs) == 0:
+        return np.zeros(shape=(0, 6))
+
+    arrowhead_lines = np.array(line_idxs, dtype=int)
+    arrowhead_points = np.array(point_idxs, dtype=int)
+
+    return _build_arrowheads(
+        screen_lines[arrowhead_lines, arrowhead_points - 1],
+        screen_lines[arrowhead_lines, arrowhead_points],
+        np.where(positives[arrowhead_lines], 1.0, -1.0)
+    )
+
+
+def build_field_line_geometry(lines: np.ndarray,
+                              positives: np.ndarray,
+                              scale: float,
+                              show_arrows: bool,
+                              arrowhead_spacing: float,
+                              simplify_tolerance: float = 0) -> FieldLineGeometry:
+    """Converts traced field lines into the screen-space geometry used to render them
+
+Parameters:
+
+    lines - a 3D array of field lines as returned by Field.trace_field_lines
+
+    positives - a 1D array of which lines are positive lines
+
+    scale - the number of units of distance in the field per pixel of display
+
+    show_arrows - whether to create arrowheads along the lines
+
+    arrowhead_spacing - the spacing in screen space between arrowheads drawn on the lines
+
+    simplify_tolerance (default 0) - how far in screen space the drawn lines may deviate from the traced lines when removing redundant points. \
+If 0 then no points are removed
+
+Returns:
+
+    geometry - the geometry of the lines
+"""
+
+    assert lines.ndim == 3, "Invalid lines array dimensionality"
+    assert positives.ndim == 1, "Invalid positives array dimensionality"
+    assert lines.shape[0] == positives.shape[0], "Lines and positives arrays are not of matching shapes"
+
+    if (lines.shape[0] == 0) or (lines.shape[1] <= 1):
+        return FieldLineGeometry.empty()
+
+    screen_lines = lines[:, :, :2] / scale
+    counts = line_point_counts(lines)
+
+    # Line segments
+
+    keep_mask = kept_points_mask(screen_lines, counts, simplify_tolerance)
+
+    removed_vertex_count = int(np.sum(counts) - np.count_nonzero(keep_mask))
+
+    kept_lines, kept_points = np.nonzero(keep_mask)  # In order of line then of point along the line
+    same_line_mask = kept_lines[:-1] == kept_lines[1:]
+
+    segments = np.concatenate([
+        screen_lines[kept_lines[:-1][same_line_mask], kept_points[:-1][same_line_mask]],
+        screen_lines[kept_lines[1:][same_line_mask], kept_points[1:][same_line_mask]]
+    ], axis=1)
+
+    # Arrowheads
+
+    if not show_arrows:
+        return FieldLineGeometry(segments, np.zeros(shape=(0, 6)), removed_vertex_count)
+
+    arrowheads = build_arrowheads(screen_lines, counts, positives, arrowhead_spacing)
+
+    return FieldLineGeometry(segments, arrowheads, removed_vertex_count)
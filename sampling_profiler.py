@@ -0,0 +1,141 @@
+from typing import Dict, List, Optional
+from collections import Counter
+from datetime import datetime
+from os.path import basename
+from threading import Event, Lock, Thread, enumerate as enumerate_threads, get_ident
+from types import FrameType
+import sys
+
+
+DEFAULT_SAMPLE_INTERVAL: float = 0.005
+"""The default time (in seconds) between samples of the threads' stacks"""
+
+COLLAPSED_PROFILE_EXTENSION: str = ".collapsed"
+
+
+def collapsed_profile_filename() -> str:
+    """A filename for a profile, from the current time so that profiles don't overwrite each other"""
+    return datetime.now().strftime("profile-%Y%m%d-%H%M%S") + COLLAPSED_PROFILE_EXTENSION
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def frame_stack(frame: Optional[FrameType]) -> List[str]:
+    """The names of the functions of a frame's stack, from the outermost to the frame's"""
+
+    names = []
+
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+
+    names.reverse()
+
+    return names
+
+
+class SamplingProfiler:
+    """Profiles the program by regularly recording the stack of every thread from a background thread. \
+Unlike a tracing profiler, it adds no overhead to the functions being run so doesn't distort the timings of short, frequently-called functions.
+
+Each sample counts one stack for each thread. The counts are written in the collapsed-stack format used to draw flame graphs
+
+Parameters:
+
+    interval (optional) - the time (in seconds) between samples
+"""
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+
+        self.interval = interval
+
+        self.__lock = Lock()
+        self.__stack_counts: Counter = Counter()
+        self.__sample_count: int = 0
+
+        self.__stop_event = Event()
+        self.__thread: Optional[Thread] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.__thread is not None
+
+    @property
+    def sample_count(self) -> int:
+        return self.__sample_count
+
+    def start(self) -> None:
+
+        if self.__thread is not None:
+            return
+
+        self.__stop_event.clear()
+
+        self.__thread = Thread(target=self.__run, name="SamplingProfiler", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+
+        if self.__thread is None:
+            return
+
+        self.__stop_event.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def __run(self) -> None:
+
+        own_ident = get_ident()
+
+        while not self.__stop_event.is_set():
+            self.sample(ignore_ident=own_ident)
+            self.__stop_event.wait(self.interval)
+
+    def sample(self, ignore_ident: Optional[int] = None) -> None:
+        """Records the current stack of every thread
+
+Parameters:
+
+    ignore_ident (optional) - the identifier of a thread not to record, such as the thread sampling
+"""
+
+        thread_names = {thread.ident: thread.name for thread in enumerate_threads()}
+
+        stacks = []
+
+        for ident, frame in sys._current_frames().items():
+
+            if ident == ignore_ident:
+                continue
+
+            thread_name = thread_names.get(ident, str(ident))
+
+            stacks.append(";".join([thread_name] + frame_stack(frame)))
+
+        with self.__lock:
+            self.__stack_counts.update(stacks)
+            self.__sample_count += 1
+
+    def collapsed_stacks(self) -> Dict[str, int]:
+        """How many samples each stack was seen in, by the stack's frames (starting with the thread's name) joined with semicolons"""
+        with self.__lock:
+            return dict(self.__stack_counts)
+
+    def write_collapsed(self, filename: str) -> None:
+        """Writes the stacks sampled to a collapsed-stack file, with a line for each stack of its frames and how many samples it was seen in"""
+
+        stack_counts = self.collapsed_stacks()
+
+        with open(filename, "w") as file:
+            for stack in sorted(stack_counts):
+                file.write(f"{stack} {stack_counts[stack]}\n")
@@ -0,0 +1,266 @@
+#!/bin/env python3
+
+from typing import List, Optional, Sequence, Tuple
+from argparse import ArgumentParser
+import numpy as np
+from field import Field, write_field_file
+from field_element import ChargePlane, POINT_SOURCE_DTYPE
+
+
+SCENE_UNIFORM: str = "uniform"
+"""Point sources placed uniformly at random"""
+SCENE_CLUSTERED: str = "clustered"
+"""Point sources placed in randomly placed clusters"""
+SCENE_DIPOLE_LATTICE: str = "dipole_lattice"
+"""Pairs of equal and opposite point sources on a regular grid"""
+SCENE_CAPACITOR: str = "capacitor"
+"""A stack of evenly-spaced parallel charge planes of alternating signs"""
+SCENE_MIXED: str = "mixed"
+"""Uniform, clustered and dipole lattice point sources together, between the plates of a capacitor"""
+
+SCENE_KINDS: Tuple[str, ...] = (SCENE_UNIFORM, SCENE_CLUSTERED, SCENE_DIPOLE_LATTICE, SCENE_CAPACITOR, SCENE_MIXED)
+
+DEFAULT_EXTENT: float = 10000.0
+"""The default width and height of the square region, with a corner at the origin, that scenes' elements are placed in"""
+
+STRENGTH_RANGE: Tuple[float, float] = (0.5, 20.0)
+"""The range of the magnitudes of the strengths of point sources. \
+Strengths don't depend on how many elements a scene has, so larger scenes have proportionally more field lines"""
+
+CHARGE_PLANE_STRENGTH_RANGE: Tuple[float, float] = (10.0, 100.0)
+"""The range of the magnitudes of the strength densities of charge planes"""
+
+CLUSTER_ELEMENT_COUNT: int = 1000
+"""The average number of point sources in each cluster of a clustered scene"""
+
+CLUSTER_SPREAD: float = 0.01
+"""The standard deviation of the distances of clustered point sources from their cluster's centre, as a fraction of the scene's extent"""
+
+DIPOLE_SEPARATION: float = 0.25
+"""The distance between the point sources of each dipole of a dipole lattice, as a fraction of the lattice's spacing"""
+
+MIXED_FRACTIONS: Tuple[float, float, float] = (0.4, 0.4, 0.2)
+"""The fractions of the point sources of a mixed scene that are uniform, clustered and in a dipole lattice"""
+
+MIXED_PLATE_COUNT: int = 2
+
+
+def _random_strengths(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Random strengths with magnitudes in STRENGTH_RANGE and equally likely to be positive or negative"""
+    return rng.uniform(*STRENGTH_RANGE, size=count) * rng.choice([-1.0, 1.0], size=count)
+
+
+def _point_source_table(xs: np.ndarray, ys: np.ndarray, strengths: np.ndarray) -> np.ndarray:
+
+    table = np.empty(shape=(xs.shape[0],), dtype=POINT_SOURCE_DTYPE)
+
+    table["x"] = xs
+    table["y"] = ys
+    table["strength"] = strengths
+
+    return table
+
+
+# Scene parts
+
+def uniform_cloud(rng: np.random.Generator, count: int, extent: float = DEFAULT_EXTENT) -> np.ndarray:
+    """Creates a table of point sources placed uniformly at random
+
+Parameters:
+
+    rng - the random number generator to use
+
+    count - how many point sources to create
+
+    extent (optional) - the width and height of the region to place them in
+
+Returns:
+
+    table - the point sources, as a table of POINT_SOURCE_DTYPE rows
+"""
+
+    xs = rng.uniform(0, extent, size=count)
+    ys = rng.uniform(0, extent, size=count)
+
+    return _point_source_table(xs, ys, _random_strengths(rng, count))
+
+
+def clustered_cloud(rng: np.random.Generator, count: int, extent: float = DEFAULT_EXTENT, cluster_count: Optional[int] = None) -> np.ndarray:
+    """Creates a table of point sources placed in clusters, each normally distributed around a uniformly random centre. \
+Point sources are kept within the region
+
+Parameters:
+
+    rng - the random number generator to use
+
+    count - how many point sources to create
+
+    extent (optional) - the width and height of the region to place them in
+
+    cluster_count (optional) - how many clusters to create. By default, there is a cluster for each CLUSTER_ELEMENT_COUNT point sources
+
+Returns:
+
+    table - the point sources, as a table of POINT_SOURCE_DTYPE rows
+"""
+
+    if cluster_count is None:
+        cluster_count = max(1, count // CLUSTER_ELEMENT_COUNT)
+
+    centres = rng.uniform(0, extent, size=(cluster_count, 2))
+    cluster_idxs = rng.integers(0, cluster_count, size=count)
+
+    poss = np.clip(centres[cluster_idxs] + rng.normal(0, CLUSTER_SPREAD * extent, size=(count, 2)), 0, extent)
+
+    return _point_source_table(poss[:, 0], poss[:, 1], _random_strengths(rng, count))
+
+
+def dipole_lattice(rng: np.random.Generator, count: int, extent: float = DEFAULT_EXTENT) -> np.ndarray:
+    """Creates a table of dipoles, each a pair of point sources of equal and opposite strengths, on a square grid filling the region row by row. \
+Each dipole is aligned with the x-axis and its positive point source is on the left
+
+Parameters:
+
+    rng - the random number generator to use
+
+    count - how many point sources to create. If it is odd, one fewer is created
+
+    extent (optional) - the width and height of the region to place them in
+
+Returns:
+
+    table - the point sources, as a table of POINT_SOURCE_DTYPE rows
+"""
+
+    dipole_count = count // 2
+
+    side = max(1, int(np.ceil(np.sqrt(dipole_count))))
+    spacing = extent / side
+
+    idxs = np.arange(dipole_count)
+    centre_xs = ((idxs % side) + 0.5) * spacing
+    centre_ys = ((idxs // side) + 0.5) * spacing
+
+    offset = DIPOLE_SEPARATION * spacing / 2
+    strengths = np.abs(_random_strengths(rng, dipole_count))
+
+    return _point_source_table(
+        np.concatenate([centre_xs - offset, centre_xs + offset]),
+        np.concatenate([centre_ys, centre_ys]),
+        np.concatenate([strengths, -strengths])
+    )
+
+
+def capacitor_stack(rng: np.random.Generator, plate_count: int, extent: float = DEFAULT_EXTENT) -> List[ChargePlane]:
+    """Creates a stack of evenly-spaced horizontal charge planes across the region, alternating between positive and negative. \
+All of the planes have the same magnitude of strength density
+
+Parameters:
+
+    rng - the random number generator to use
+
+    plate_count - how many charge planes to create. As each is a separate element, this should be small
+
+    extent (optional) - the height of the region to place them in
+
+Returns:
+
+    plates - the charge planes, from bottom to top
+"""
+
+    strength_density = rng.uniform(*CHARGE_PLANE_STRENGTH_RANGE)
+    spacing = extent / max(1, plate_count)
+
+    return [
+        ChargePlane(
+            np.array([extent / 2, (i + 0.5) * spacing]),
+            np.array([0.0, 1.0]),
+            strength_density if i % 2 == 0 else -strength_density
+        )
+        for i in range(plate_count)
+    ]
+
+
+# Scenes
+
+def generate_scene(kind: str, element_count: int, seed: int = 0, extent: float = DEFAULT_EXTENT) -> Field:
+    """Creates a synthetic scene. The same arguments always create the same scene
+
+Parameters:
+
+    kind - the kind of scene, from SCENE_KINDS
+
+    element_count - how many point sources to create, or for capacitor scenes how many charge planes to create
+
+    seed (default 0) - the seed of the scene's random values
+
+    extent (optional) - the width and height of the square region, with a corner at the origin, to place the scene's elements in
+
+Returns:
+
+    field - the scene
+"""
+
+    rng = np.random.default_rng(seed)
+
+    field = Field()
+
+    if kind == SCENE_UNIFORM:
+        field.add_point_source_table(uniform_cloud(rng, element_count, extent))
+
+    elif kind == SCENE_CLUSTERED:
+        field.add_point_source_table(clustered_cloud(rng, element_count, extent))
+
+    elif kind == SCENE_DIPOLE_LATTICE:
+        field.add_point_source_table(dipole_lattice(rng, element_count, extent))
+
+    elif kind == SCENE_CAPACITOR:
+        for plate in capacitor_stack(rng, element_count, extent):
+            field.add_element(plate)
+
+    elif kind == SCENE_MIXED:
+
+        uniform_count = int(element_count * MIXED_FRACTIONS[0])
+        clustered_count = int(element_count * MIXED_FRACTIONS[1])
+        dipole_count = element_count - uniform_count - clustered_count
+
+        # The point sources are added as one table, before the charge planes, so that they stay in the field's table
+
+        field.add_point_source_table(np.concatenate([
+            uniform_cloud(rng, uniform_count, extent),
+            clustered_cloud(rng, clustered_count, extent),
+            dipole_lattice(rng, dipole_count, extent),
+        ]))
+
+        for plate in capacitor_stack(rng, MIXED_PLATE_COUNT, extent):
+            field.add_element(plate)
+
+    else:
+        raise ValueError("Unknown scene kind")
+
+    return field
+
+
+def scene_bounds(extent: float = DEFAULT_EXTENT) -> np.ndarray:
+    """The range of positions in world-space that scenes' elements are placed in"""
+    return np.array([[0, extent], [0, extent]], dtype=float)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Generate reproducible synthetic field files")
+    parser.add_argument("kind", choices=list(SCENE_KINDS), help="the kind of scene to generate")
+    parser.add_argument("element_count", type=int, help="how many point sources to generate, or for capacitor scenes how many charge planes")
+    parser.add_argument("-o", "--out", required=True, help="the field file to write. A .fieldb file is written in the binary format")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--extent", type=float, default=DEFAULT_EXTENT, help="the width and height of the region to place elements in")
+
+    args = parser.parse_args(argv)
+
+    field = generate_scene(args.kind, args.element_count, seed=args.seed, extent=args.extent)
+
+    write_field_file(field, args.out)
+
+
+if __name__ == "__main__":
+    main()
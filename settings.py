@@ -23,9 +23,26 @@ class Settings:
 
         self.field_line_render_arrowhead_spacing: int = 100
         """The spacing in screen space between arrowheads drawn on field lines"""
+        self.field_line_render_simplify_tolerance_screen_space: float = 0.5
+        """How far in screen space drawn field lines may deviate from the traced lines when removing redundant points (0 to disable)"""
 
         self.auto_recalcualate: bool = True
 
+        self.live_field_line_preview: bool = False
+        """Whether to show a quick, low-detail preview of the field lines when placing a field element"""
+
+        self.show_heatmap: bool = False
+        self.heatmap_show_field_strength: bool = False
+        """Whether the heatmap shows the field strength instead of the potential"""
+
+        self.autosave_interval: float = 0
+        """How often (in seconds) to save edits to the field's file, if it has been saved to or loaded from a .field file (0 to disable)"""
+
+        self.profile_recalculations: bool = False
+        """Whether to profile every recalculation with the sampling profiler, writing each profile to a collapsed-stack file"""
+        self.profiler_sample_interval: float = 0.005
+        """How often (in seconds) the sampling profiler records the stacks of the program's threads"""
+
     def set_default_settings(self) -> None:
 
         self.show_field_line_arrows = True
@@ -34,7 +51,14 @@ class Settings:
         self.field_line_trace_max_step_count = 500
         self.field_line_trace_element_stop_distance_screen_space = 1
         self.field_line_render_arrowhead_spacing = 100
+        self.field_line_render_simplify_tolerance_screen_space = 0.5
         self.auto_recalcualate = True
+        self.live_field_line_preview = False
+        self.show_heatmap = False
+        self.heatmap_show_field_strength = False
+        self.autosave_interval = 0
+        self.profile_recalculations = False
+        self.profiler_sample_interval = 0.005
 
     def __write_setting(self, stream: TextIO, name: str, val):
         stream.write(f"{name}={str(val)}\n")
@@ -56,7 +80,14 @@ class Settings:
             self.__write_setting(file, "field_line_trace_max_step_count", self.field_line_trace_max_step_count)
             self.__write_setting(file, "field_line_trace_element_stop_distance_screen_space", self.field_line_trace_element_stop_distance_screen_space)
             self.__write_setting(file, "field_line_render_arrowhead_spacing", self.field_line_render_arrowhead_spacing)
+            self.__write_setting(file, "field_line_render_simplify_tolerance_screen_space", self.field_line_render_simplify_tolerance_screen_space)
             self.__write_setting(file, "auto_recalcualate", self.__str_of_bool(self.auto_recalcualate))
+            self.__write_setting(file, "live_field_line_preview", self.__str_of_bool(self.live_field_line_preview))
+            self.__write_setting(file, "show_heatmap", self.__str_of_bool(self.show_heatmap))
+            self.__write_setting(file, "heatmap_show_field_strength", self.__str_of_bool(self.heatmap_show_field_strength))
+            self.__write_setting(file, "autosave_interval", self.autosave_interval)
+            self.__write_setting(file, "profile_recalculations", self.__str_of_bool(self.profile_recalculations))
+            self.__write_setting(file, "profiler_sample_interval", self.profiler_sample_interval)
 
 
 def __read_setting(stream: TextIO) -> Optional[Tuple[str, Any]]:
@@ -120,8 +151,22 @@ def load_settings(filename: str = _SETTINGS_DEFAULT_FILENAME) -> None:
                         settings.field_line_trace_element_stop_distance_screen_space = float(val)
                     elif name == "field_line_render_arrowhead_spacing":
                         settings.field_line_render_arrowhead_spacing = int(val)
+                    elif name == "field_line_render_simplify_tolerance_screen_space":
+                        settings.field_line_render_simplify_tolerance_screen_space = float(val)
                     elif name == "auto_recalcualate":
                         settings.auto_recalcualate = __read_bool(val)
+                    elif name == "live_field_line_preview":
+                        settings.live_field_line_preview = __read_bool(val)
+                    elif name == "show_heatmap":
+                        settings.show_heatmap = __read_bool(val)
+                    elif name == "heatmap_show_field_strength":
+                        settings.heatmap_show_field_strength = __read_bool(val)
+                    elif name == "autosave_interval":
+                        settings.autosave_interval = float(val)
+                    elif name == "profile_recalculations":
+                        settings.profile_recalculations = __read_bool(val)
+                    elif name == "profiler_sample_interval":
+                        settings.profiler_sample_interval = float(val)
 
 
 settings = Settings()
@@ -0,0 +1,265 @@
+#!/bin/env python3
+
+from typing import Iterator, Optional, Sequence, TextIO, Tuple
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import join as joinpath, basename, splitext
+import numpy as np
+from field import Field
+from field_journal import read_field_file
+from field_element import ElementBase, PointSource, ChargePlane
+from field_line_store import TracedLines
+from field_line_tiles import TileKey, tiles_covering, tile_trace_margin, trace_tile_lines, TILE_TRACE_MARGIN
+from render_geometry import line_point_counts, kept_points_mask, build_arrowheads
+from render_geometry import POINT_SOURCE_RADIUS, CHARGE_PLANE_WIDTH, FIELD_LINE_COLOUR, Colour
+from render_geometry import element_colour, point_source_screen_pos, charge_plane_screen_segment
+from recalculation_worker import TraceConfig
+from viewport import Viewport
+from settings import load_settings
+
+
+BACKGROUND_COLOUR: Colour = (0, 0, 0, 255)
+
+DEFAULT_QUANTIZATION: float = 0.1
+"""The default size (in pixels) of the grid that coordinates are rounded to"""
+
+
+def _hex_colour(colour: Colour) -> str:
+    return f"#{colour[0]:02x}{colour[1]:02x}{colour[2]:02x}"
+
+
+def _quantize(points: np.ndarray, quantization: float) -> np.ndarray:
+    return np.round(points / quantization).astype(np.int64)
+
+
+def polyline_path_data(points: np.ndarray) -> Optional[str]:
+    """Creates the SVG path data of a polyline through quantized points, using relative moves between points and skipping points that don't move
+
+Parameters:
+
+    points - a (N,2) array of integer positions
+
+Returns:
+
+    d - the path data, or None if the points are all in the same position
+"""
+
+    deltas = np.diff(points, axis=0)
+    deltas = deltas[np.any(deltas != 0, axis=1)]
+
+    if deltas.shape[0] == 0:
+        return None
+
+    return f"M{points[0, 0]} {points[0, 1]}l" + " ".join(map(str, deltas.ravel().tolist()))
+
+
+def triangles_path_data(triangles: np.ndarray) -> str:
+    """Creates the SVG path data of many closed triangles, from a (T,6) array of quantized triangle corners"""
+
+    return "".join(
+        f"M{x1} {y1}L{x2} {y2} {x3} {y3}z"
+        for x1, y1, x2, y2, x3, y3 in triangles.tolist()
+    )
+
+
+def iter_field_line_tiles(field: Field,
+                          viewport: Viewport,
+                          width: int,
+                          height: int,
+                          base_config: TraceConfig) -> Iterator[Tuple[TileKey, TracedLines]]:
+    """Traces the lines that the visualisation window would show for a viewport, a line tile at a time, \
+so that only one tile's lines are held in memory at once. \
+The tiles and their lines are the same as those drawn by the window
+
+Parameters:
+
+    field - the field to trace
+
+    viewport - the part of the field to trace the lines shown in
+
+    width - the width of the window in pixels
+
+    height - the height of the window in pixels
+
+    base_config - the values to trace the lines with, for the default scale
+
+Returns:
+
+    tiles - an iterator of the key and lines of each tile
+"""
+
+    keys = tiles_covering(viewport.clip_bounds(width, height), viewport.zoom_level, margin=TILE_TRACE_MARGIN)
+    margin = tile_trace_margin(width, height)
+
+    config = base_config.rescaled(viewport.scale)
+
+    for key in keys:
+        yield key, trace_tile_lines(field, key, config, margin=margin)
+
+
+def _write_field_lines_tile(stream: TextIO,
+                            lines: TracedLines,
+                            config: TraceConfig,
+                            quantization: float) -> None:
+
+    field_lines = lines.to_padded()
+    positives = lines.positives
+
+    if field_lines.shape[1] <= 1:
+        return
+
+    screen_lines = field_lines[:, :, :2] / config.scale
+    counts = line_point_counts(field_lines)
+    keep_mask = kept_points_mask(screen_lines, counts, config.simplify_tolerance)
+
+    quantized_lines = _quantize(screen_lines, quantization)
+
+    for i in range(field_lines.shape[0]):
+
+        path_data = polyline_path_data(quantized_lines[i][keep_mask[i]])
+
+        if path_data is not None:
+            stream.write(f"<path d=\"{path_data}\"/>\n")
+
+    if config.show_arrows:
+
+        arrowheads = build_arrowheads(screen_lines, counts, positives, config.arrowhead_spacing)
+
+        if arrowheads.shape[0] > 0:
+            stream.write(f"<path fill=\"{_hex_colour(FIELD_LINE_COLOUR)}\" stroke=\"none\" d=\"{triangles_path_data(_quantize(arrowheads, quantization))}\"/>\n")
+
+
+def _write_element(stream: TextIO,
+                   ele: ElementBase,
+                   clip_bounds: np.ndarray,
+                   scale: float,
+                   quantization: float) -> None:
+
+    colour = _hex_colour(element_colour(ele))
+
+    match ele:
+
+        case PointSource():
+            x, y = _quantize(np.array(point_source_screen_pos(ele, scale), dtype=float), quantization).tolist()
+            r = round(POINT_SOURCE_RADIUS / quantization)
+            stream.write(f"<circle cx=\"{x}\" cy=\"{y}\" r=\"{r}\" fill=\"{colour}\"/>\n")
+
+        case ChargePlane():
+            x1, y1, x2, y2 = _quantize(np.array(charge_plane_screen_segment(ele, clip_bounds, scale)), quantization).tolist()
+            stroke_width = round(CHARGE_PLANE_WIDTH / quantization)
+            stream.write(f"<line x1=\"{x1}\" y1=\"{y1}\" x2=\"{x2}\" y2=\"{y2}\" stroke=\"{colour}\" stroke-width=\"{stroke_width}\"/>\n")
+
+        case _:
+            raise ValueError("Unhandled element class")
+
+
+def write_field_svg(field: Field,
+                    stream: TextIO,
+                    width: int,
+                    height: int,
+                    config: Optional[TraceConfig] = None,
+                    zoom_level: int = 0,
+                    quantization: float = DEFAULT_QUANTIZATION) -> None:
+    """Traces a field's lines and writes an SVG image of them and the field's elements, framed as the visualisation window frames it.
+
+Lines are traced in the same line tiles as the window traces, and written a tile at a time, so neither all of the lines nor the whole document are ever held in memory. \
+The lines drawn are the same as the lines drawn on screen. \
+Coordinates are written as integer multiples of the quantization, in a group scaled to screen space and flipped to have y pointing up
+
+Parameters:
+
+    field - the field to draw
+
+    stream - the text stream to write the document to
+
+    width - the width of the image in pixels
+
+    height - the height of the image in pixels
+
+    config (optional) - the values to trace and draw the lines with, for the default scale. If not provided, the values are taken from the current settings
+
+    zoom_level (default 0) - the zoom level to draw the field at, which decides the number of units of distance in the field per pixel of the image
+
+    quantization (optional) - the size (in pixels) of the grid that coordinates are rounded to
+"""
+
+    if config is None:
+        config = TraceConfig.from_settings()
+
+    viewport = Viewport((0.0, 0.0), zoom_level)
+    clip_bounds = viewport.clip_bounds(width, height)
+
+    scaled_config = config.rescaled(viewport.scale)
+
+    group_transform = f"matrix({quantization:g} 0 0 {-quantization:g} 0 {height})"
+
+    stream.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
+    stream.write(f"<svg xmlns=\"http://www.w3.org/2000/svg\" width=\"{width}\" height=\"{height}\" viewBox=\"0 0 {width} {height}\">\n")
+    stream.write(f"<rect width=\"{width}\" height=\"{height}\" fill=\"{_hex_colour(BACKGROUND_COLOUR)}\"/>\n")
+
+    # Field lines
+
+    stream.write(f"<g transform=\"{group_transform}\" fill=\"none\" stroke=\"{_hex_colour(FIELD_LINE_COLOUR)}\" stroke-width=\"{round(1 / quantization)}\">\n")
+
+    for _, lines in iter_field_line_tiles(field, viewport, width, height, config):
+        _write_field_lines_tile(stream, lines, scaled_config, quantization)
+
+    stream.write("</g>\n")
+
+    # Field elements
+
+    stream.write(f"<g transform=\"{group_transform}\">\n")
+
+    for ele in field.iter_elements():
+        _write_element(stream, ele, clip_bounds, viewport.scale, quantization)
+
+    stream.write("</g>\n")
+
+    stream.write("</svg>\n")
+
+
+def export_field_svg(field: Field,
+                     filename: str,
+                     width: int,
+                     height: int,
+                     config: Optional[TraceConfig] = None,
+                     zoom_level: int = 0,
+                     quantization: float = DEFAULT_QUANTIZATION) -> None:
+    """Writes an SVG image of a field and its lines to a file. See write_field_svg"""
+
+    with open(filename, "w") as file:
+        write_field_svg(field, file, width, height, config, zoom_level, quantization)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Draw SVG images of field files without a display")
+    parser.add_argument("fields", nargs="+", help="the .field or .fieldb files to draw")
+    parser.add_argument("-o", "--out-dir", default=".", help="the directory to write the images to")
+    parser.add_argument("--width", type=int, default=720)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--zoom-level", type=int, default=0, help="the zoom level to draw the fields at, as in the visualisation window")
+    parser.add_argument("--quantization", type=float, default=DEFAULT_QUANTIZATION)
+    parser.add_argument("--settings", default=None, help="a settings file to take the field line settings from (defaults are used otherwise)")
+
+    args = parser.parse_args(argv)
+
+    if args.settings is not None:
+        load_settings(args.settings)
+
+    makedirs(args.out_dir, exist_ok=True)
+
+    for field_filename in args.fields:
+
+        field = read_field_file(field_filename)
+
+        out_filename = joinpath(args.out_dir, splitext(basename(field_filename))[0] + ".svg")
+
+        export_field_svg(field, out_filename, args.width, args.height,
+                         zoom_level=args.zoom_level, quantization=args.quantization)
+
+        print(out_filename)
+
+
+if __name__ == "__main__":
+    main()
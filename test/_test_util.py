@@ -1,4 +1,8 @@
 import numpy as np
+from io import StringIO
+from field import Field, FieldSerialize
+from field_element import PointSource
+from recalculation_worker import TraceConfig
 
 
 def compare_arrs(a: np.ndarray, b: np.ndarray):
@@ -7,3 +11,34 @@ def compare_arrs(a: np.ndarray, b: np.ndarray):
     assert a.shape == b.shape, "Arrays have different shapes"
 
     assert np.all(np.isclose(a, b)), "Arrays' elements differ"
+
+
+def create_charge_pair_field(positive_strength: float = 2) -> Field:
+    """A field of a positive and a negative point source, within the default viewport"""
+
+    field = Field()
+    field.add_element(PointSource(np.array([1500.0, 2000.0]), positive_strength))
+    field.add_element(PointSource(np.array([4500.0, 2500.0]), -2))
+
+    return field
+
+
+def field_text(field: Field) -> str:
+
+    stream = StringIO()
+    FieldSerialize.serialize(field, stream)
+
+    return stream.getvalue()
+
+
+def small_trace_config(max_step_count: int = 100) -> TraceConfig:
+    """A configuration that traces few, coarse lines, so that tests trace quickly"""
+    return TraceConfig(
+        line_count_factor=1.0,
+        max_step_count=max_step_count,
+        step_distance=50.0,
+        element_stop_distance=20.0,
+        show_arrows=False,
+        arrowhead_spacing=40.0,
+        simplify_tolerance=0.5
+    )
@@ -0,0 +1,258 @@
+#!/bin/env python3
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+import numpy as np
+from field import Field, TraceTelemetry, INTEGRATORS
+from field_element import PointSource, POINT_SOURCE_DTYPE
+from render_geometry import line_point_counts
+from test.benchmark.run_benchmarks import environment_metadata
+
+
+RESULTS_FORMAT_VERSION: int = 1
+
+BACKEND_TABLE: str = "table"
+"""Point sources stored in the field's point source table, whose grads are found by the vectorised table kernels"""
+BACKEND_ELEMENTS: str = "elements"
+"""Point sources stored as individual element objects, whose grads are found and summed one element at a time"""
+
+BACKENDS: Tuple[str, ...] = (BACKEND_TABLE, BACKEND_ELEMENTS)
+
+DEFAULT_STEP_DISTANCES: Sequence[float] = (1.0, 2.0, 5.0, 10.0, 20.0)
+
+CHARGE_STRENGTH: float = 16.0
+"""The magnitude of the strengths of the charges in the reference scenes, which decides how many lines are traced"""
+
+HALF_SEPARATION: float = 100.0
+"""Half of the distance between the charges of the charge pair scene"""
+
+TRACE_EXTENT: float = 1000.0
+"""Lines are clipped to a square of this half-width around the reference scenes' origin"""
+
+MAX_LINE_LENGTH: float = 4000.0
+"""How long lines can be traced for. The most points traced for each line is chosen from this and the step distance"""
+
+ON_AXIS_TOLERANCE: float = 1e-9
+"""How close to the axis through the charge pair a line's start must be for the line to be taken as being along the axis"""
+
+
+def trace_bounds() -> np.ndarray:
+    return np.array([[-TRACE_EXTENT, TRACE_EXTENT], [-TRACE_EXTENT, TRACE_EXTENT]], dtype=float)
+
+
+def charge_field(charges: Sequence[Tuple[np.ndarray, float]], backend: str) -> Field:
+    """Creates a field of point charges stored using one of the BACKENDS
+
+Parameters:
+
+    charges - the position and strength of each charge
+
+    backend - how the charges are stored
+
+Returns:
+
+    field - the field
+"""
+
+    field = Field()
+
+    if backend == BACKEND_TABLE:
+
+        table = np.zeros(shape=(len(charges),), dtype=POINT_SOURCE_DTYPE)
+
+        for i, (pos, strength) in enumerate(charges):
+            table[i] = (pos[0], pos[1], strength)
+
+        field.add_point_source_table(table)
+
+    elif backend == BACKEND_ELEMENTS:
+
+        for pos, strength in charges:
+            field.add_element(PointSource(np.array(pos, dtype=float), strength))
+
+    else:
+        raise ValueError("Unknown backend")
+
+    return field
+
+
+# Reference lines
+
+def radial_errors(points: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """The distances of points on the lines of a single charge at the origin from their reference lines. \
+The lines are rays from the charge through their starts"""
+
+    dirs = starts / np.linalg.norm(starts, axis=1)[:, np.newaxis]
+
+    along = np.sum(points * dirs, axis=1)
+    across = np.abs(points[:, 0] * dirs[:, 1] - points[:, 1] * dirs[:, 0])
+
+    # Points on the wrong side of the charge are as far from the ray as from the charge
+
+    return np.where(along >= 0, across, np.linalg.norm(points, axis=1))
+
+
+def circle_errors(points: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """The distances of points on the lines of an equal and opposite pair of charges at (-HALF_SEPARATION, 0) and (HALF_SEPARATION, 0) \
+from their reference lines. The lines are arcs of the circles through both charges and their starts, \
+or the axis through the charges for lines starting on it"""
+
+    on_axis = np.abs(starts[:, 1]) <= ON_AXIS_TOLERANCE * HALF_SEPARATION
+
+    # The circles' centres are on the perpendicular bisector of the charges, at (0, k)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ks = (np.sum(np.square(starts), axis=1) - HALF_SEPARATION ** 2) / (2 * starts[:, 1])
+        radii = np.sqrt(HALF_SEPARATION ** 2 + np.square(ks))
+        circle_dists = np.abs(np.sqrt(np.square(points[:, 0]) + np.square(points[:, 1] - ks)) - radii)
+
+    return np.where(on_axis, np.abs(points[:, 1]), circle_dists)
+
+
+ReferenceScene = Tuple[Sequence[Tuple[np.ndarray, float]], Callable[[np.ndarray, np.ndarray], np.ndarray]]
+"""The charges of a scene and the function giving the distances of points on its lines from their reference lines, \
+given the points and the starts of their lines"""
+
+
+SCENES: Dict[str, ReferenceScene] = {
+    "single_charge": (
+        [(np.array([0.0, 0.0]), CHARGE_STRENGTH)],
+        radial_errors
+    ),
+    "charge_pair": (
+        [(np.array([-HALF_SEPARATION, 0.0]), CHARGE_STRENGTH), (np.array([HALF_SEPARATION, 0.0]), -CHARGE_STRENGTH)],
+        circle_errors
+    ),
+}
+
+
+# Benchmarking
+
+def measure_accuracy(scene_name: str, backend: str, integrator: str, step_distance: float) -> Dict[str, Any]:
+    """Traces the lines of a reference scene and compares them to their reference lines
+
+Parameters:
+
+    scene_name - the name of the scene, from SCENES
+
+    backend - how the scene's charges are stored, from BACKENDS
+
+    integrator - the integrator to trace with
+
+    step_distance - the distance to step along lines
+
+Returns:
+
+    result - the distances of the traced points from their reference lines, the steps and grad evaluations made and the time taken
+"""
+
+    charges, errors_func = SCENES[scene_name]
+
+    field = charge_field(charges, backend)
+
+    starts, positives = field.get_field_line_starts(trace_bounds())
+
+    max_points = int(np.ceil(MAX_LINE_LENGTH / step_distance)) + 1
+    telemetry = TraceTelemetry(max_points)
+
+    start_time = perf_counter()
+
+    lines = field.trace_field_lines(
+        starts,
+        max_points,
+        positives,
+        step_distance=step_distance,
+        element_stop_distance=step_distance,
+        clip_ranges=trace_bounds(),
+        integrator=integrator,
+        telemetry=telemetry
+    )
+
+    time = perf_counter() - start_time
+
+    counts = line_point_counts(lines)
+    keep_mask = np.arange(lines.shape[1])[np.newaxis, :] < counts[:, np.newaxis]
+
+    line_idxs, _ = np.nonzero(keep_mask)
+    errors = errors_func(lines[keep_mask], starts[line_idxs])
+
+    return {
+        "scene": scene_name,
+        "backend": backend,
+        "integrator": integrator,
+        "step_distance": step_distance,
+        "line_count": int(starts.shape[0]),
+        "steps": int(np.sum(telemetry.active_counts)),
+        "grad_evaluations": int(np.sum(telemetry.grad_evaluation_counts)),
+        "max_error": float(np.max(errors)),
+        "mean_error": float(np.mean(errors)),
+        "time": time,
+    }
+
+
+def run_accuracy_benchmark(scene_names: Sequence[str] = tuple(SCENES.keys()),
+                           backends: Sequence[str] = BACKENDS,
+                           integrators: Sequence[str] = INTEGRATORS,
+                           step_distances: Sequence[float] = DEFAULT_STEP_DISTANCES,
+                           log: bool = True) -> Dict[str, Any]:
+    """Measures the accuracy and cost of tracing the reference scenes with each combination of backend, integrator and step distance
+
+Parameters:
+
+    scene_names (optional) - the names of the scenes, from SCENES
+
+    backends (optional) - how the scenes' charges are stored, from BACKENDS
+
+    integrators (optional) - the integrators to trace with
+
+    step_distances (optional) - the distances to step along lines
+
+    log (default True) - whether to print each result as it is measured
+
+Returns:
+
+    results - the results document, with the environment and the results of measure_accuracy for each combination
+"""
+
+    results: List[Dict[str, Any]] = []
+
+    for scene_name in scene_names:
+        for backend in backends:
+            for integrator in integrators:
+                for step_distance in step_distances:
+
+                    result = measure_accuracy(scene_name, backend, integrator, step_distance)
+                    results.append(result)
+
+                    if log:
+                        print(f"{scene_name:>14} {backend:>9} {integrator:>9} {step_distance:>7g}  max err {result['max_error']:10.3g}  mean err {result['mean_error']:10.3g}  steps {result['steps']:>8}  grads {result['grad_evaluations']:>8}")
+
+    return {
+        "version": RESULTS_FORMAT_VERSION,
+        "environment": environment_metadata(),
+        "results": results,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Compare traced field lines to the exact field lines of a single charge and of an equal and opposite pair of charges")
+    parser.add_argument("-o", "--out", default=None, help="the file to write the results to, as JSON")
+    parser.add_argument("--scenes", nargs="+", choices=list(SCENES.keys()), default=list(SCENES.keys()))
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--integrators", nargs="+", choices=list(INTEGRATORS), default=list(INTEGRATORS))
+    parser.add_argument("--step-distances", type=float, nargs="+", default=list(DEFAULT_STEP_DISTANCES))
+
+    args = parser.parse_args(argv)
+
+    results = run_accuracy_benchmark(args.scenes, args.backends, args.integrators, args.step_distances)
+
+    if args.out is not None:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from typing import Callable, Dict, Optional, Tuple
+from io import StringIO
+import numpy as np
+from field import Field, FieldSerialize
+from render_geometry import build_field_line_geometry
+from scene_generator import DEFAULT_EXTENT, scene_bounds
+
+
+class BenchmarkParams:
+    """The sizes of the work done by each benchmark case, besides the size of the scene
+
+Parameters:
+
+    position_count - how many positions the field is evaluated at
+
+    line_count - the most lines traced. The scene's line starts are subsampled evenly down to this many
+
+    max_points - the most points traced for each line in a full trace
+
+    step_distance - the distance stepped along lines
+
+    element_stop_distance - how close lines get to elements before being stopped
+"""
+
+    def __init__(self,
+                 position_count: int = 1000,
+                 line_count: int = 256,
+                 max_points: int = 200,
+                 step_distance: float = 10.0,
+                 element_stop_distance: float = 5.0):
+
+        self.position_count = position_count
+        self.line_count = line_count
+        self.max_points = max_points
+        self.step_distance = step_distance
+        self.element_stop_distance = element_stop_distance
+
+    def to_json(self) -> Dict:
+        return dict(vars(self))
+
+
+def random_positions(count: int, seed: int = 0) -> np.ndarray:
+    """Creates random positions within the scene bounds"""
+
+    rng = np.random.default_rng(seed)
+
+    return rng.uniform(0, DEFAULT_EXTENT, size=(count, 2))
+
+
+BenchmarkCase = Callable[[Field, BenchmarkParams], Optional[Callable[[], object]]]
+"""Prepares a benchmark of a scene, returning the callable to time, or None if the case can't be run on the scene"""
+
+
+def line_starts(field: Field, params: BenchmarkParams) -> Tuple[np.ndarray, np.ndarray]:
+    """The starts of the lines traced by the trace benchmarks"""
+
+    starts, positives = field.get_field_line_starts(scene_bounds())
+
+    if starts.shape[0] > params.line_count:
+        idxs = np.linspace(0, starts.shape[0] - 1, params.line_count).astype(np.int64)
+        starts = starts[idxs]
+        positives = positives[idxs]
+
+    return starts, positives
+
+
+def _trace(field: Field, params: BenchmarkParams, starts: np.ndarray, positives: np.ndarray, max_points: int) -> np.ndarray:
+    return field.trace_field_lines(
+        starts,
+        max_points,
+        positives,
+        step_distance=params.step_distance,
+        element_stop_distance=params.element_stop_distance,
+        clip_ranges=scene_bounds()
+    )
+
+
+def evaluate_case(field: Field, params: BenchmarkParams) -> Optional[Callable[[], object]]:
+
+    _, others = field.get_element_tables()
+
+    if len(others) > 0:
+        # The field of a charge plane is unbounded, so only fields of point sources can be evaluated
+        return None
+
+    poss = random_positions(params.position_count)
+
+    return lambda: field.evaluate(poss)
+
+
+def grad_case(field: Field, params: BenchmarkParams) -> Callable[[], object]:
+    poss = random_positions(params.position_count)
+    return lambda: field.grad(poss)
+
+
+def line_seg_nearest_element_case(field: Field, params: BenchmarkParams) -> Callable[[], object]:
+
+    seg_starts = random_positions(params.position_count, seed=1)
+    seg_ends = seg_starts + random_positions(params.position_count, seed=2) * (params.step_distance / scene_bounds()[0, 1])
+    use_absorbers = np.arange(params.position_count) % 2 == 0
+
+    return lambda: field.line_seg_nearest_element(seg_starts, seg_ends, use_absorbers)
+
+
+def trace_iteration_case(field: Field, params: BenchmarkParams) -> Callable[[], object]:
+
+    starts, positives = line_starts(field, params)
+
+    # A trace of two points is a single iteration of tracing
+    return lambda: _trace(field, params, starts, positives, 2)
+
+
+def trace_case(field: Field, params: BenchmarkParams) -> Callable[[], object]:
+
+    starts, positives = line_starts(field, params)
+
+    return lambda: _trace(field, params, starts, positives, params.max_points)
+
+
+def deserialize_case(field: Field, params: BenchmarkParams) -> Callable[[], object]:
+
+    stream = StringIO()
+    FieldSerialize.serialize(field, stream)
+    text = stream.getvalue()
+
+    return lambda: FieldSerialize.deserialize(StringIO(text))
+
+
+def geometry_case(field: Field, params: BenchmarkParams) -> Callable[[], object]:
+
+    starts, positives = line_starts(field, params)
+    lines = _trace(field, params, starts, positives, params.max_points)
+
+    return lambda: build_field_line_geometry(lines, positives, scale=1.0, show_arrows=True, arrowhead_spacing=40.0, simplify_tolerance=0.5)
+
+
+CASES: Dict[str, BenchmarkCase] = {
+    "evaluate": evaluate_case,
+    "grad": grad_case,
+    "line_seg_nearest_element": line_seg_nearest_element_case,
+    "trace_iteration": trace_iteration_case,
+    "trace": trace_case,
+    "deserialize": deserialize_case,
+    "geometry": geometry_case,
+}
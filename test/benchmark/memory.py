@@ -0,0 +1,209 @@
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from os.path import join
+from tempfile import TemporaryDirectory
+import gc
+import tracemalloc
+import numpy as np
+from field import Field, FieldBinarySerialize, LINE_TERMINATION_MAX_POINTS
+from field_line_store import FieldLineStore, TracedLines
+from render_geometry import FieldLineGeometry, build_field_line_geometry
+from scene_generator import SCENE_UNIFORM, generate_scene, scene_bounds
+from test.benchmark.cases import BenchmarkParams
+
+
+MEMORY_STAGES: Sequence[str] = ("scene", "seed", "trace", "geometry", "io")
+"""The stages that scenes are run through, in order. Each stage uses the results of the stages before it"""
+
+
+def numpy_buffer_bytes(value: Any) -> int:
+    """Estimates the size of the NumPy buffers held by a value, \
+looking through containers and the attributes of objects. Buffers shared by several arrays are only counted once"""
+
+    seen_ids = set()
+    buffer_ids = set()
+    total = 0
+
+    stack = [value]
+
+    while stack:
+
+        curr = stack.pop()
+
+        if id(curr) in seen_ids:
+            continue
+        seen_ids.add(id(curr))
+
+        if isinstance(curr, np.ndarray):
+
+            # Views are counted by the arrays that own their memory
+
+            base = curr
+            while isinstance(base.base, np.ndarray):
+                base = base.base
+
+            if id(base) not in buffer_ids:
+                buffer_ids.add(id(base))
+                total += base.nbytes
+
+        elif isinstance(curr, dict):
+            stack.extend(curr.values())
+
+        elif isinstance(curr, (list, tuple, set)):
+            stack.extend(curr)
+
+        elif hasattr(curr, "__dict__"):
+            stack.extend(vars(curr).values())
+
+    return total
+
+
+def pyglet_shape_count(field: Field, geometry: FieldLineGeometry) -> int:
+    """How many pyglet shapes the visualisation window keeps alive to draw a field and the geometry of its lines. \
+Each element, line segment and arrowhead is drawn as its own shape"""
+    return sum(1 for _ in field.iter_elements()) + geometry.segment_count + geometry.arrowhead_count
+
+
+def measure_stage(run: Callable[[], Any]) -> Tuple[Any, Dict[str, int]]:
+    """Runs a stage, measuring its memory use with tracemalloc, which must be tracing
+
+Parameters:
+
+    run - runs the stage, returning its results
+
+Returns:
+
+    result - the results of the stage
+
+    measurements - the peak memory allocated while the stage ran, the memory still allocated once it finished \
+(which includes its results) and the size of the NumPy buffers of its results, all in bytes
+"""
+
+    gc.collect()
+
+    tracemalloc.reset_peak()
+    start_bytes, _ = tracemalloc.get_traced_memory()
+
+    result = run()
+
+    gc.collect()
+
+    end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+
+    return result, {
+        "peak_bytes": peak_bytes - start_bytes,
+        "retained_bytes": end_bytes - start_bytes,
+        "numpy_bytes": numpy_buffer_bytes(result),
+    }
+
+
+def _round_trip(field: Field, lines: TracedLines, directory: str) -> Tuple[Field, FieldLineStore]:
+    """Writes and then reads back a field and its traced lines, as the program does with field files and line caches"""
+
+    field_filename = join(directory, "scene.fieldb")
+    lines_filename = join(directory, "scene.lines")
+
+    FieldBinarySerialize.serialize_file(field, field_filename)
+    FieldLineStore("", None, {(0,): lines}).save(lines_filename)
+
+    return FieldBinarySerialize.deserialize(field_filename, mmap=False), FieldLineStore.load(lines_filename)
+
+
+def profile_scene_memory(size: int, params: BenchmarkParams, seed: int = 0, scene_kind: str = SCENE_UNIFORM) -> Dict[str, Any]:
+    """Runs a scene through each of the MEMORY_STAGES, measuring the memory used by each. tracemalloc must be tracing
+
+Parameters:
+
+    size - the number of elements in the scene
+
+    params - the sizes of the work done
+
+    seed (default 0) - the seed of the scene's random values
+
+    scene_kind (optional) - the kind of scene, from scene_generator.SCENE_KINDS
+
+Returns:
+
+    result - the measurements of each stage and the number of pyglet shapes that would be drawn
+"""
+
+    stages: Dict[str, Dict[str, int]] = {}
+
+    field, stages["scene"] = measure_stage(lambda: generate_scene(scene_kind, size, seed=seed))
+
+    (starts, positives), stages["seed"] = measure_stage(lambda: field.get_field_line_starts(scene_bounds()))
+
+    terminations = np.full(shape=(starts.shape[0],), fill_value=LINE_TERMINATION_MAX_POINTS, dtype=np.int8)
+
+    lines, stages["trace"] = measure_stage(lambda: field.trace_field_lines(
+        starts,
+        params.max_points,
+        positives,
+        step_distance=params.step_distance,
+        element_stop_distance=params.element_stop_distance,
+        clip_ranges=scene_bounds(),
+        terminations=terminations
+    ))
+
+    geometry, stages["geometry"] = measure_stage(lambda: build_field_line_geometry(lines, positives, scale=1.0, show_arrows=True, arrowhead_spacing=40.0, simplify_tolerance=0.5))
+
+    traced_lines = TracedLines.from_padded(lines, positives, terminations)
+
+    with TemporaryDirectory() as directory:
+        _, stages["io"] = measure_stage(lambda: _round_trip(field, traced_lines, directory))
+
+    return {
+        "size": size,
+        "line_count": starts.shape[0],
+        "stages": stages,
+        "pyglet_shape_count": pyglet_shape_count(field, geometry),
+    }
+
+
+def run_memory_profile(sizes: Sequence[int],
+                       params: BenchmarkParams,
+                       seed: int = 0,
+                       log: bool = True,
+                       scene_kind: str = SCENE_UNIFORM) -> List[Dict[str, Any]]:
+    """Measures the memory used by each stage for scenes of different sizes, tracing memory allocations while doing so
+
+Parameters:
+
+    sizes - the numbers of elements in the scenes
+
+    params - the sizes of the work done
+
+    seed (default 0) - the seed of the scenes' random values
+
+    log (default True) - whether to print each stage's memory use as it is measured
+
+    scene_kind (optional) - the kind of scenes, from scene_generator.SCENE_KINDS
+
+Returns:
+
+    results - the results of profile_scene_memory for each scene
+"""
+
+    was_tracing = tracemalloc.is_tracing()
+
+    if not was_tracing:
+        tracemalloc.start()
+
+    try:
+
+        results = []
+
+        for size in sizes:
+
+            result = profile_scene_memory(size, params, seed, scene_kind)
+            results.append(result)
+
+            if log:
+                for stage, measurements in result["stages"].items():
+                    print(f"{'memory.' + stage:>26} {size:>9} peak {measurements['peak_bytes'] / 1e6:10.2f}MB  retained {measurements['retained_bytes'] / 1e6:10.2f}MB")
+                print(f"{'pyglet_shapes':>26} {size:>9} {result['pyglet_shape_count']:>10}")
+
+        return results
+
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
@@ -0,0 +1,233 @@
+#!/bin/env python3
+
+from typing import Any, Dict, List, Optional, Sequence
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from os import cpu_count
+from time import perf_counter
+import json
+import platform
+import subprocess
+import sys
+import numpy as np
+from scene_generator import SCENE_KINDS, SCENE_UNIFORM, generate_scene
+from test.benchmark.cases import CASES, BenchmarkParams
+from test.benchmark.memory import run_memory_profile
+
+
+RESULTS_FORMAT_VERSION: int = 1
+
+DEFAULT_SIZES: Sequence[int] = (100, 1000, 10000)
+"""The default numbers of elements in the scenes benchmarked"""
+
+DEFAULT_REPEAT: int = 5
+
+DEFAULT_THRESHOLD: float = 0.2
+"""The default fraction that a case's median time can be slower than its baseline's before it counts as a regression"""
+
+
+def environment_metadata() -> Dict[str, Any]:
+    """Describes the machine and code that benchmarks were run with, so results from different environments aren't mistaken for regressions"""
+
+    try:
+        commit: Optional[str] = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": cpu_count(),
+        "commit": commit,
+    }
+
+
+def time_case(run, repeat: int) -> List[float]:
+    """Times a callable, after running it once untimed to warm up any caches"""
+
+    run()
+
+    times = []
+
+    for _ in range(repeat):
+        start_time = perf_counter()
+        run()
+        times.append(perf_counter() - start_time)
+
+    return times
+
+
+def run_benchmarks(case_names: Sequence[str],
+                   sizes: Sequence[int],
+                   repeat: int = DEFAULT_REPEAT,
+                   params: Optional[BenchmarkParams] = None,
+                   seed: int = 0,
+                   log: bool = True,
+                   memory: bool = False,
+                   scene_kind: str = SCENE_UNIFORM) -> Dict[str, Any]:
+    """Runs benchmark cases on synthetic scenes of different sizes
+
+Parameters:
+
+    case_names - the names of the cases to run, from CASES
+
+    sizes - the numbers of elements in the scenes to run each case on
+
+    repeat (optional) - how many times to time each case on each scene
+
+    params (optional) - the sizes of the work done by each case
+
+    seed (default 0) - the seed of the scenes' random values
+
+    log (default True) - whether to print each case's median time as it is run
+
+    memory (default False) - whether to also measure the memory used by each stage of running each scene. \
+This is done separately from timing the cases, as tracing memory allocations slows them down
+
+    scene_kind (optional) - the kind of scenes to run the cases on, from scene_generator.SCENE_KINDS
+
+Returns:
+
+    results - the results document, with the environment and the times of each case on each scene. \
+Cases that can't be run on a kind of scene are left out
+"""
+
+    if params is None:
+        params = BenchmarkParams()
+
+    results = []
+
+    for size in sizes:
+
+        field = generate_scene(scene_kind, size, seed=seed)
+
+        for case_name in case_names:
+
+            run = CASES[case_name](field, params)
+
+            if run is None:
+                if log:
+                    print(f"{case_name:>26} {size:>9}    skipped")
+                continue
+
+            times = time_case(run, repeat)
+
+            result = {
+                "case": case_name,
+                "size": size,
+                "times": times,
+                "median": float(np.median(times)),
+                "min": float(np.min(times)),
+                "mean": float(np.mean(times)),
+            }
+
+            results.append(result)
+
+            if log:
+                print(f"{case_name:>26} {size:>9} {result['median'] * 1000:10.2f}ms")
+
+    document = {
+        "version": RESULTS_FORMAT_VERSION,
+        "environment": environment_metadata(),
+        "params": params.to_json(),
+        "scene_kind": scene_kind,
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+    if memory:
+        document["memory"] = run_memory_profile(sizes, params, seed, log=log, scene_kind=scene_kind)
+
+    return document
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """Compares results to baseline results of the same cases and scene sizes
+
+Parameters:
+
+    results - the results document to check
+
+    baseline - the results document to compare to
+
+    threshold (optional) - the fraction that a case's median time can be slower than its baseline's before it counts as a regression
+
+Returns:
+
+    comparisons - for each case and size in both documents, the baseline's and the results' medians, their ratio and whether it is a regression
+"""
+
+    baseline_medians = {(result["case"], result["size"]): result["median"] for result in baseline["results"]}
+
+    comparisons = []
+
+    for result in results["results"]:
+
+        baseline_median = baseline_medians.get((result["case"], result["size"]))
+
+        if baseline_median is None:
+            continue
+
+        ratio = result["median"] / baseline_median if baseline_median > 0 else float("inf")
+
+        comparisons.append({
+            "case": result["case"],
+            "size": result["size"],
+            "baseline_median": baseline_median,
+            "median": result["median"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold,
+        })
+
+    return comparisons
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Benchmark the field maths, tracing, deserialization and geometry building on synthetic scenes")
+    parser.add_argument("-o", "--out", default=None, help="the file to write the results to, as JSON")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES.keys()), default=list(CASES.keys()))
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="the numbers of elements in the scenes")
+    parser.add_argument("--scene", choices=list(SCENE_KINDS), default=SCENE_UNIFORM, help="the kind of scenes")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--positions", type=int, default=BenchmarkParams().position_count, help="how many positions the field is evaluated at")
+    parser.add_argument("--lines", type=int, default=BenchmarkParams().line_count, help="the most lines traced")
+    parser.add_argument("--max-points", type=int, default=BenchmarkParams().max_points, help="the most points traced for each line")
+    parser.add_argument("--memory", action="store_true", help="also measure the memory used by each stage of running each scene")
+    parser.add_argument("--baseline", default=None, help="a results file to compare the results to")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="the fraction slower than the baseline that counts as a regression")
+
+    args = parser.parse_args(argv)
+
+    params = BenchmarkParams(position_count=args.positions, line_count=args.lines, max_points=args.max_points)
+
+    results = run_benchmarks(args.cases, args.sizes, args.repeat, params, args.seed, memory=args.memory, scene_kind=args.scene)
+
+    if args.out is not None:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline is not None:
+
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+
+        comparisons = compare_to_baseline(results, baseline, args.threshold)
+
+        for comparison in comparisons:
+            flag = "REGRESSION" if comparison["regression"] else ""
+            print(f"{comparison['case']:>26} {comparison['size']:>9} {comparison['ratio']:6.2f}x {flag}")
+
+        if any(comparison["regression"] for comparison in comparisons):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import json
+import os
+from os.path import join as joinpath, basename, isfile
+import numpy as np
+from field_element import PointSource
+from field_journal import FieldJournal
+import batch_trace
+from batch_trace import BatchConfig, run_batch, run_scenario, find_scenarios, SUMMARY_FILENAME, STATUS_TRACED, STATUS_CACHED, STATUS_FAILED
+from test._test_util import create_charge_pair_field, field_text, small_trace_config
+
+
+def _config(output_format: str = "npz") -> BatchConfig:
+    return BatchConfig(small_trace_config(max_step_count=50), output_format=output_format)
+
+
+def _write_field(filename: str, strength: float) -> None:
+    with open(filename, "w") as file:
+        file.write(field_text(create_charge_pair_field(strength)))
+
+
+def _run_scenario_crashing(field_filename, out_filename, config):
+
+    if basename(field_filename).startswith("crash"):
+        os._exit(1)
+
+    return run_scenario(field_filename, out_filename, config)
+
+
+def test_find_scenarios(tmp_path):
+
+    for name in ("a.field", "b.fieldb", "c.txt"):
+        (tmp_path / name).write_text("")
+
+    assert find_scenarios([str(tmp_path)]) == [str(tmp_path / "a.field"), str(tmp_path / "b.fieldb")]
+    assert find_scenarios([str(tmp_path / "*.field"), str(tmp_path / "a.*")]) == [str(tmp_path / "a.field")]
+
+
+def test_run_batch(tmp_path):
+
+    in_dir = tmp_path / "in"
+    out_dir = str(tmp_path / "out")
+    in_dir.mkdir()
+
+    field_filenames = [str(in_dir / "a.field"), str(in_dir / "b.field"), str(in_dir / "broken.fieldb")]
+
+    _write_field(field_filenames[0], 2)
+    _write_field(field_filenames[1], 3)
+    (in_dir / "broken.fieldb").write_bytes(b"not a binary field file")
+
+    summary = run_batch(field_filenames, out_dir, _config(), workers=2)
+
+    assert [report["status"] for report in summary["scenarios"]] == [STATUS_TRACED, STATUS_TRACED, STATUS_FAILED]
+    assert "error" in summary["scenarios"][2]
+    assert summary["failed_count"] == 1
+
+    with open(joinpath(out_dir, SUMMARY_FILENAME), "r") as file:
+        assert json.load(file)["traced_count"] == 2
+
+    result = np.load(joinpath(out_dir, "a.npz"))
+    assert result["positives"].shape[0] == summary["scenarios"][0]["line_count"]
+
+    # Valid results are reused, changed scenarios and changed configurations are retraced
+
+    _write_field(field_filenames[1], 4)
+
+    summary = run_batch(field_filenames[:2], out_dir, _config())
+
+    assert [report["status"] for report in summary["scenarios"]] == [STATUS_CACHED, STATUS_TRACED]
+
+    summary = run_batch(field_filenames[:2], out_dir, _config("json"))
+
+    assert [report["status"] for report in summary["scenarios"]] == [STATUS_TRACED, STATUS_TRACED]
+    assert isfile(joinpath(out_dir, "a.json"))
+
+
+def test_run_batch_replays_journal(tmp_path):
+
+    field_filename = str(tmp_path / "a.field")
+    out_dir = str(tmp_path / "out")
+
+    field = create_charge_pair_field()
+    journal = FieldJournal.create(field, field_filename)
+
+    summary = run_batch([field_filename], out_dir, _config(), workers=1)
+
+    line_count = summary["scenarios"][0]["line_count"]
+
+    # Saving an edit only appends it to the journal, leaving the field file unchanged
+
+    ele = PointSource(np.array([3000.0, 1000.0]), 5)
+    field.add_element(ele)
+    journal.record_add(ele)
+    journal.flush()
+
+    summary = run_batch([field_filename], out_dir, _config(), workers=1)
+
+    assert summary["scenarios"][0]["status"] == STATUS_TRACED
+    assert summary["scenarios"][0]["line_count"] > line_count
+
+
+def test_run_batch_worker_crash(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(batch_trace, "run_scenario", _run_scenario_crashing)
+
+    field_filenames = [str(tmp_path / f"{name}.field") for name in ("a", "b", "crash", "c", "d")]
+
+    for i, field_filename in enumerate(field_filenames):
+        _write_field(field_filename, i + 1)
+
+    summary = run_batch(field_filenames, str(tmp_path / "out"), _config(), workers=2)
+
+    # Only the scenario that crashed its worker fails, the ones traced alongside it are retried
+
+    assert [report["status"] for report in summary["scenarios"]] == [STATUS_TRACED, STATUS_TRACED, STATUS_FAILED, STATUS_TRACED, STATUS_TRACED]
+    assert "BrokenProcessPool" in summary["scenarios"][2]["error"]
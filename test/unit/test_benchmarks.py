@@ -0,0 +1,115 @@
+import json
+import numpy as np
+import pytest
+from test.benchmark.cases import CASES, BenchmarkParams
+from test.benchmark.run_benchmarks import run_benchmarks, compare_to_baseline
+from test.benchmark.memory import MEMORY_STAGES, numpy_buffer_bytes
+from test.benchmark.accuracy import run_accuracy_benchmark, circle_errors, SCENES, BACKEND_TABLE, HALF_SEPARATION
+from field import INTEGRATOR_EULER, INTEGRATOR_RK4
+from scene_generator import SCENE_KINDS, SCENE_CAPACITOR, SCENE_MIXED
+
+
+def _results(medians):
+    return {"results": [{"case": case, "size": size, "median": median} for (case, size), median in medians.items()]}
+
+
+@pytest.mark.parametrize("scene_kind", SCENE_KINDS)
+def test_run_benchmarks_all_cases(scene_kind):
+
+    params = BenchmarkParams(position_count=10, line_count=8, max_points=10)
+
+    results = run_benchmarks(list(CASES.keys()), [4], repeat=1, params=params, log=False, scene_kind=scene_kind)
+
+    # Fields with charge planes can't be evaluated
+
+    expected_cases = [case for case in CASES if (case != "evaluate") or (scene_kind not in (SCENE_CAPACITOR, SCENE_MIXED))]
+
+    assert results["scene_kind"] == scene_kind
+    assert [result["case"] for result in results["results"]] == expected_cases
+    assert all(len(result["times"]) == 1 for result in results["results"])
+    assert results["environment"]["numpy"]
+
+    # Results must be JSON-serializable
+
+    json.dumps(results)
+
+
+def test_compare_to_baseline():
+
+    baseline = _results({("trace", 100): 1.0, ("grad", 100): 1.0, ("evaluate", 100): 1.0})
+    results = _results({("trace", 100): 1.3, ("grad", 100): 1.1, ("evaluate", 1000): 5.0})
+
+    comparisons = compare_to_baseline(results, baseline, threshold=0.2)
+
+    assert [(c["case"], c["regression"]) for c in comparisons] == [("trace", True), ("grad", False)]
+
+
+def test_run_benchmarks_memory():
+
+    params = BenchmarkParams(line_count=8, max_points=10)
+
+    results = run_benchmarks(["evaluate"], [20], repeat=1, params=params, log=False, memory=True)
+
+    [memory] = results["memory"]
+
+    assert memory["size"] == 20
+    assert list(memory["stages"].keys()) == list(MEMORY_STAGES)
+    assert all(stage["peak_bytes"] >= stage["retained_bytes"] for stage in memory["stages"].values())
+
+    # The traced lines are kept by the stage, so are at least retained
+
+    assert memory["stages"]["trace"]["numpy_bytes"] >= memory["line_count"] * 10 * 2 * 8
+    assert memory["stages"]["trace"]["retained_bytes"] >= memory["stages"]["trace"]["numpy_bytes"]
+    assert memory["pyglet_shape_count"] >= 20
+
+    json.dumps(results)
+
+
+def test_numpy_buffer_bytes():
+
+    a = np.zeros(100)
+    b = np.zeros(50, dtype=np.int32)
+
+    # Views of an array share its buffer, so aren't counted again
+
+    assert numpy_buffer_bytes({"a": a, "views": [a[:10], a[::2]], "b": (b,)}) == 100 * 8 + 50 * 4
+
+
+def test_accuracy_benchmark():
+
+    results = run_accuracy_benchmark(backends=[BACKEND_TABLE], integrators=[INTEGRATOR_EULER, INTEGRATOR_RK4], step_distances=[5.0], log=False)
+
+    by_key = {(result["scene"], result["integrator"]): result for result in results["results"]}
+
+    assert set(by_key.keys()) == {(scene, integrator) for scene in SCENES for integrator in (INTEGRATOR_EULER, INTEGRATOR_RK4)}
+
+    # A single charge's lines are straight so are traced exactly by any integrator
+
+    assert by_key[("single_charge", INTEGRATOR_EULER)]["max_error"] < 1e-6
+
+    # The charge pair's lines curve, which a higher-order integrator follows more closely for more grad evaluations per step
+
+    euler = by_key[("charge_pair", INTEGRATOR_EULER)]
+    rk4 = by_key[("charge_pair", INTEGRATOR_RK4)]
+
+    assert rk4["max_error"] < euler["max_error"]
+    assert rk4["grad_evaluations"] == 4 * rk4["steps"]
+    assert euler["grad_evaluations"] == euler["steps"]
+
+    json.dumps(results)
+
+
+def test_circle_errors():
+
+    # Points on the circle through both charges and (0, HALF_SEPARATION), which is centred on the origin
+
+    angles = np.linspace(0, np.pi, 7)
+    points = HALF_SEPARATION * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    starts = np.repeat([[0, HALF_SEPARATION]], 7, axis=0)
+
+    assert np.allclose(circle_errors(points, starts), 0)
+    assert np.allclose(circle_errors(points * 2, starts), HALF_SEPARATION)
+
+    # Lines starting on the axis through the charges stay on it
+
+    assert np.allclose(circle_errors(np.array([[50.0, 3.0]]), np.array([[-90.0, 0.0]])), 3.0)
@@ -0,0 +1,111 @@
+import numpy as np
+from field import Field
+from field_element import PointSource, ChargePlane
+from element_hit_index import ElementHitIndex
+
+
+SCALE: float = 10
+
+
+def _create_index() -> ElementHitIndex:
+    return ElementHitIndex(point_radius=5, plane_width=5)
+
+
+def test_point_sources():
+
+    index = _create_index()
+
+    a = PointSource(np.array([100.0, 100.0]), 1)
+    b = PointSource(np.array([1000.0, 500.0]), -1)
+
+    index.add(a)
+    index.add(b)
+
+    assert index.find_at(100, 100, SCALE) is a
+    assert index.find_at(130, 140, SCALE) is a
+    assert index.find_at(140, 140, SCALE) is None
+    assert index.find_at(1000, 460, SCALE) is b
+    assert index.find_at(500, 500, SCALE) is None
+
+
+def test_cell_boundaries():
+
+    index = ElementHitIndex(point_radius=5, plane_width=5, cell_size=8)
+
+    ps = PointSource(np.array([7.5, 7.5]), 1)
+    index.add(ps)
+
+    assert index.find_at(11, 11, 1) is ps
+    assert index.find_at(4, 4, 1) is ps
+    assert index.find_at(7.5, 12, 1) is ps
+
+
+def test_scale_changes_radius():
+
+    index = _create_index()
+
+    ps = PointSource(np.array([0.0, 0.0]), 1)
+    index.add(ps)
+
+    # The index doesn't need rebuilding for a different scale, as only the radius in world space changes
+
+    assert index.find_at(0, 200, SCALE) is None
+    assert index.find_at(0, 200, SCALE * 8) is ps
+    assert index.find_at(0, 2, SCALE / 8) is ps
+    assert index.find_at(0, 20, SCALE / 8) is None
+
+
+def test_planes():
+
+    index = _create_index()
+
+    cp = ChargePlane(np.array([0.0, 200.0]), np.array([0.0, 1.0]), 1)
+    index.add(cp)
+
+    assert index.find_at(5000, 200, SCALE) is cp
+    assert index.find_at(-30000, 240, SCALE) is cp
+    assert index.find_at(0, 260, SCALE) is None
+    assert index.find_at(0, 260, SCALE * 2) is cp
+
+
+def test_earliest_added_found():
+
+    index = _create_index()
+
+    a = PointSource(np.array([100.0, 100.0]), 1)
+    cp = ChargePlane(np.array([0.0, 100.0]), np.array([0.0, 1.0]), 1)
+    b = PointSource(np.array([101.0, 100.0]), -1)
+
+    index.add(cp)
+    index.add(a)
+    index.add(b)
+
+    assert index.find_at(100, 100, SCALE) is cp
+
+    index.remove(cp)
+
+    assert index.find_at(100, 100, SCALE) is a
+
+    index.replace(a, PointSource(np.array([500.0, 500.0]), 1))
+
+    assert index.find_at(100, 100, SCALE) is b
+
+
+def test_rebuild():
+
+    field = Field()
+
+    a = PointSource(np.array([100.0, 100.0]), 1)
+    b = PointSource(np.array([300.0, 100.0]), 1)
+
+    field.add_element(a)
+    field.add_element(b)
+
+    index = _create_index()
+    index.add(PointSource(np.array([0.0, 0.0]), 1))
+
+    index.rebuild(field)
+
+    assert len(index) == 2
+    assert index.find_at(0, 0, SCALE) is None
+    assert index.find_at(300, 100, SCALE) is b
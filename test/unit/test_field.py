@@ -1,6 +1,8 @@
 import numpy as np
-from field import Field
+import pytest
+from field import Field, INTEGRATORS, INTEGRATOR_RK4, TraceTelemetry, LINE_TERMINATION_MAX_POINTS, LINE_TERMINATION_CLIPPED, LINE_TERMINATION_ELEMENT
 from field_element import PointSource
+from render_geometry import line_point_counts
 from test._test_util import *
 
 
@@ -175,3 +177,151 @@ def test_tripole_0():
     outs = field.evaluate(inps)
 
     compare_arrs(outs, exps)
+
+
+def test_replace_element_keeps_order():
+
+    field = Field()
+
+    a = PointSource(np.array([0, 0]), 1)
+    b = PointSource(np.array([1, 0]), 2)
+    c = PointSource(np.array([2, 0]), 3)
+    new_b = PointSource(np.array([5, 5]), -2)
+
+    field.add_element(a)
+    field.add_element(b)
+    field.add_element(c)
+
+    field.replace_element(b, new_b)
+
+    assert list(field.iter_elements()) == [a, new_b, c]
+
+
+@pytest.mark.parametrize("integrator", INTEGRATORS)
+def test_trace_single_point_lines_are_radial(integrator):
+
+    field = Field()
+
+    centre = np.array([3.0, 4.0])
+    field.add_element(PointSource(centre, 2))
+
+    starts, positives = field.get_field_line_starts(np.array([[-50, 50], [-50, 50]], dtype=float))
+
+    lines = field.trace_field_lines(starts, 20, positives, step_distance=1, element_stop_distance=0.1, integrator=integrator)
+
+    start_dirs = (starts - centre) / np.linalg.norm(starts - centre, axis=1)[:, np.newaxis]
+    point_dirs = (lines - centre) / np.linalg.norm(lines - centre, axis=2)[:, :, np.newaxis]
+
+    compare_arrs(point_dirs, np.broadcast_to(start_dirs[:, np.newaxis, :], point_dirs.shape))
+
+    # Each step moves a step distance away from the charge
+
+    compare_arrs(np.diff(np.linalg.norm(lines - centre, axis=2), axis=1), np.ones(shape=(lines.shape[0], lines.shape[1] - 1)))
+
+
+def test_trace_dtype():
+
+    field = Field()
+    field.add_element(PointSource(np.array([2550.0, 2530.0]), 1))
+
+    starts, positives = field.get_field_line_starts(np.array([[0, 5000], [0, 5000]], dtype=float))
+
+    lines64 = field.trace_field_lines(starts, 50, positives, step_distance=10, element_stop_distance=5)
+    lines32 = field.trace_field_lines(starts, 50, positives, step_distance=10, element_stop_distance=5, dtype=np.float32)
+
+    assert lines32.dtype == np.float32
+
+    # Lines are stepped at full precision, so starts too close to their element to be stored exactly are still traced correctly
+
+    assert np.all(np.isfinite(lines32))
+    assert np.allclose(lines32, lines64, atol=1e-2)
+
+
+def test_trace_unknown_integrator():
+
+    field = Field()
+    field.add_element(PointSource(np.array([0.0, 0.0]), 1))
+
+    with pytest.raises(ValueError):
+        field.trace_field_lines(np.array([[1.0, 0.0]]), 10, np.array([True]), integrator="leapfrog")
+
+
+def test_trace_telemetry():
+
+    field = Field()
+    field.add_element(PointSource(np.array([0.0, 0.0]), 1))
+    field.add_element(PointSource(np.array([20.0, 0.0]), -1))
+
+    starts, positives = field.get_field_line_starts(np.array([[-100, 100], [-100, 100]], dtype=float))
+    line_count = starts.shape[0]
+    max_points = 200
+
+    telemetry = TraceTelemetry(max_points)
+    terminations = np.zeros(shape=(line_count,), dtype=np.uint8)
+
+    lines = field.trace_field_lines(starts, max_points, positives, step_distance=1, element_stop_distance=0.5,
+                                    clip_ranges=np.array([[-100, 100], [-100, 100]], dtype=float),
+                                    terminations=terminations, integrator=INTEGRATOR_RK4, telemetry=telemetry)
+
+    n = telemetry.iteration_count
+
+    assert 0 < n <= max_points - 1
+    assert telemetry.active_counts[0] == line_count
+
+    # Every line that stopped being active was either clipped or hit an element
+
+    stopped_counts = telemetry.clipped_counts + telemetry.positive_element_hit_counts + telemetry.negative_element_hit_counts
+
+    assert np.all(telemetry.active_counts[1:n] == telemetry.active_counts[:n-1] - stopped_counts[:n-1])
+    assert np.sum(stopped_counts[:n]) == np.count_nonzero(terminations != LINE_TERMINATION_MAX_POINTS)
+
+    assert np.sum(telemetry.clipped_counts) == np.count_nonzero(terminations == LINE_TERMINATION_CLIPPED)
+
+    # The positive charge's line ends at the negative charge
+
+    element_terminations = terminations == LINE_TERMINATION_ELEMENT
+
+    assert np.sum(telemetry.positive_element_hit_counts) == np.count_nonzero(element_terminations & positives) == 1
+    assert np.sum(telemetry.negative_element_hit_counts) == np.count_nonzero(element_terminations & ~positives)
+
+    assert np.all(telemetry.grad_evaluation_counts[:n] == 4 * telemetry.active_counts[:n])
+    assert np.all(telemetry.stalled_counts[:n] == 0)
+    assert np.all(telemetry.phase_times_ms[:n] >= 0)
+
+    # Collecting telemetry doesn't change the lines traced
+
+    compare_arrs(lines, field.trace_field_lines(starts, max_points, positives, step_distance=1, element_stop_distance=0.5,
+                                                clip_ranges=np.array([[-100, 100], [-100, 100]], dtype=float), integrator=INTEGRATOR_RK4))
+
+    json_telemetry = telemetry.to_json()
+
+    assert len(json_telemetry["active_counts"]) == n
+    assert set(json_telemetry["phase_times_ms"].keys()) == set(TraceTelemetry.PHASES)
+
+
+@pytest.mark.parametrize("integrator", INTEGRATORS)
+def test_trace_pair_lines_end_at_element(integrator):
+
+    field = Field()
+
+    negative_pos = np.array([100.0, 0.0])
+    field.add_element(PointSource(np.array([-100.0, 0.0]), 16))
+    field.add_element(PointSource(negative_pos, -16))
+
+    bounds = np.array([[-1000, 1000], [-1000, 1000]], dtype=float)
+
+    starts, positives = field.get_field_line_starts(bounds)
+    terminations = np.zeros(shape=(starts.shape[0],), dtype=np.uint8)
+
+    lines = field.trace_field_lines(starts, 201, positives, step_distance=20, element_stop_distance=20,
+                                    clip_ranges=bounds, terminations=terminations, integrator=integrator)
+
+    # Lines reaching the negative charge stop at it, rather than stepping back and forth across it until running out of points
+
+    assert np.all(terminations != LINE_TERMINATION_MAX_POINTS)
+
+    reached_mask = positives & (terminations == LINE_TERMINATION_ELEMENT)
+    ends = lines[np.arange(lines.shape[0]), line_point_counts(lines) - 1]
+
+    assert np.any(reached_mask)
+    compare_arrs(ends[reached_mask], np.broadcast_to(negative_pos, ends[reached_mask].shape))
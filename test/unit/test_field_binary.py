@@ -0,0 +1,142 @@
+import numpy as np
+from io import StringIO
+from os.path import join as joinpath
+from field import Field, FieldSerialize, FieldBinarySerialize
+from field_element import PointSource, ChargePlane
+from binary_tables import write_tables, read_tables, InvalidBinaryFileException
+
+
+def _create_fields(with_charge_plane: bool = True):
+    """Creates the same field with its point sources as element objects and as a table"""
+
+    rng = np.random.default_rng(0)
+
+    pss = [
+        PointSource(rng.uniform(-100, 100, size=(2,)), float(s))
+        for s in rng.choice([-9.0, -2.0, 1.0, 4.0], size=40)
+    ]
+    cp = ChargePlane(np.array([0.0, -150.0]), np.array([0.0, 1.0]), 3)
+
+    object_field = Field()
+    for ps in pss:
+        object_field.add_element(ps)
+    if with_charge_plane:
+        object_field.add_element(cp)
+
+    table_field = Field()
+    table_field.add_point_source_table(PointSource.create_table(pss))
+    if with_charge_plane:
+        table_field.add_element(cp)
+
+    return object_field, table_field
+
+
+def test_table_kernels_match_elements():
+
+    # N.B. potentials are unbounded with charge planes so are compared without them
+
+    object_field, table_field = _create_fields(with_charge_plane=False)
+
+    poss = np.random.default_rng(1).uniform(-120, 120, size=(50, 2))
+
+    assert np.allclose(object_field.evaluate(poss), table_field.evaluate(poss))
+
+    object_field, table_field = _create_fields()
+
+    assert np.allclose(object_field.grad(poss), table_field.grad(poss))
+
+    bounds = np.array([[-200, 200], [-200, 200]], dtype=float)
+
+    object_starts, object_positives = object_field.get_field_line_starts(bounds)
+    table_starts, table_positives = table_field.get_field_line_starts(bounds)
+
+    assert np.allclose(object_starts, table_starts)
+    assert np.array_equal(object_positives, table_positives)
+
+    starts = poss
+    ends = poss + np.random.default_rng(2).uniform(-20, 20, size=poss.shape)
+    use_absorbers = np.arange(poss.shape[0]) % 2 == 0
+
+    object_nearest = object_field.line_seg_nearest_element(starts, ends, use_absorbers)
+    table_nearest = table_field.line_seg_nearest_element(starts, ends, use_absorbers)
+
+    for object_arr, table_arr in zip(object_nearest, table_nearest):
+        assert np.allclose(object_arr, table_arr)
+
+    object_lines = object_field.trace_field_lines(object_starts[:20], 50, object_positives[:20], clip_ranges=bounds)
+    table_lines = table_field.trace_field_lines(table_starts[:20], 50, table_positives[:20], clip_ranges=bounds)
+
+    assert np.allclose(object_lines, table_lines, equal_nan=True)
+
+
+def test_binary_round_trip(tmp_path):
+
+    object_field, _ = _create_fields()
+
+    filename = joinpath(tmp_path, "test.fieldb")
+
+    with open(filename, "wb") as file:
+        FieldBinarySerialize.serialize(object_field, file)
+
+    for mmap in (True, False):
+
+        field = FieldBinarySerialize.deserialize(filename, mmap=mmap)
+
+        assert field.element_count == object_field.element_count
+
+        original_text = StringIO()
+        loaded_text = StringIO()
+
+        FieldSerialize.serialize(object_field, original_text)
+        FieldSerialize.serialize(field, loaded_text)
+
+        assert original_text.getvalue() == loaded_text.getvalue()
+
+
+def test_binary_point_sources_are_memory_mapped(tmp_path):
+
+    table = PointSource.create_table([PointSource(np.array([i, 0.0]), 1) for i in range(10)])
+
+    filename = joinpath(tmp_path, "test.fieldb")
+
+    with open(filename, "wb") as file:
+        write_tables(file, FieldBinarySerialize.MAGIC, {"point_sources": table, "charge_planes": ChargePlane.create_table([])}, {"version": FieldBinarySerialize.FORMAT_VERSION})
+
+    tables, _ = read_tables(filename, FieldBinarySerialize.MAGIC)
+
+    assert isinstance(tables["point_sources"], np.memmap)
+    assert np.array_equal(tables["point_sources"], table)
+    assert tables["charge_planes"].shape == (0,)
+
+    field = FieldBinarySerialize.deserialize(filename)
+    assert field.element_count == 10
+
+
+def test_binary_invalid_file(tmp_path):
+
+    filename = joinpath(tmp_path, "test.fieldb")
+
+    with open(filename, "wb") as file:
+        file.write(b"pointsource 0 0 1\n")
+
+    try:
+        FieldBinarySerialize.deserialize(filename)
+        assert False, "Expected an exception"
+    except InvalidBinaryFileException:
+        pass
+
+
+def test_adding_point_source_tables_to_copies():
+
+    field = Field()
+
+    for i in range(10):
+        field.add_point_source_table(PointSource.create_table([PointSource(np.array([i, 0.0]), 1)]))
+
+    copy = field.copy()
+
+    field.add_point_source_table(PointSource.create_table([PointSource(np.array([100.0, 0.0]), 1)]))
+    copy.add_point_source_table(PointSource.create_table([PointSource(np.array([200.0, 0.0]), 1)]))
+
+    assert [ele.x for ele in field.iter_elements()] == list(range(10)) + [100]  # type: ignore
+    assert [ele.x for ele in copy.iter_elements()] == list(range(10)) + [200]  # type: ignore
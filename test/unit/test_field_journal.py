@@ -0,0 +1,237 @@
+import numpy as np
+from os.path import join as joinpath
+from field import Field, FieldSerialize
+from field_element import PointSource, ChargePlane
+from field_journal import FieldJournal, field_journal_filename, read_field_file, journaled_field_file_hash
+import field_journal
+from test._test_util import field_text
+
+
+def _create_field() -> Field:
+
+    field = Field()
+    field.add_element(PointSource(np.array([1.0, 2.0]), 3))
+    field.add_element(ChargePlane(np.array([0.0, -10.0]), np.array([0.0, 1.0]), 2))
+    field.add_element(PointSource(np.array([4.0, 5.0]), -6))
+
+    return field
+
+
+def _edit(field: Field, journal: FieldJournal) -> None:
+
+    ele = PointSource(np.array([7.0, 8.0]), 9)
+    field.add_element(ele)
+    journal.record_add(ele)
+
+    old = field.element_at(0)
+    new = PointSource(np.array([-1.0, -2.0]), 1)
+    journal.record_modify(field.index_of(old), new)
+    field.replace_element(old, new)
+
+    ele = field.element_at(1)
+    journal.record_remove(field.index_of(ele))
+    field.remove_element(ele)
+
+
+def test_journal_replay(tmp_path):
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    with open(filename, "r") as file:
+        snapshot_text = file.read()
+
+    _edit(field, journal)
+
+    assert journal.has_unsaved_operations
+
+    journal.save(field)
+
+    assert not journal.has_unsaved_operations
+    assert journal.operation_count == 3
+
+    # Saving only appended to the journal
+
+    with open(filename, "r") as file:
+        assert file.read() == snapshot_text
+
+    loaded_field, loaded_journal = FieldJournal.open(filename)
+
+    assert field_text(loaded_field) == field_text(field)
+    assert loaded_journal.operation_count == 3
+
+
+def test_journal_ignores_incomplete_final_line(tmp_path):
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    _edit(field, journal)
+    journal.save(field)
+
+    with open(field_journal_filename(filename), "a") as file:
+        file.write("add pointsource 100.000 100")
+
+    loaded_field, _ = FieldJournal.open(filename)
+
+    assert field_text(loaded_field) == field_text(field)
+
+
+def test_journal_edits_after_incomplete_final_line(tmp_path):
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    ele = PointSource(np.array([7.0, 8.0]), 9)
+    field.add_element(ele)
+    journal.record_add(ele)
+    journal.flush()
+
+    # A crash while appending left part of an operation at the end of the journal
+
+    with open(field_journal_filename(filename), "a") as file:
+        file.write("add pointsource 7.000 8.0")
+
+    field, journal = FieldJournal.open(filename)
+
+    for x in (10.0, 20.0):
+        ele = PointSource(np.array([x, x]), 1)
+        field.add_element(ele)
+        journal.record_add(ele)
+
+    journal.flush()
+
+    loaded_field, loaded_journal = FieldJournal.open(filename)
+
+    assert loaded_field.element_count == 6
+    assert field_text(loaded_field) == field_text(field)
+    assert loaded_journal.operation_count == 3
+
+
+def test_journal_flush_after_interrupted_flush(tmp_path):
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    # A previous flush by the same journal was interrupted part way through an operation
+
+    with open(field_journal_filename(filename), "a") as file:
+        file.write("add pointsource 7.000 8.0")
+
+    ele = PointSource(np.array([10.0, 10.0]), 1)
+    field.add_element(ele)
+    journal.record_add(ele)
+    journal.flush()
+
+    loaded_field, _ = FieldJournal.open(filename)
+
+    assert field_text(loaded_field) == field_text(field)
+
+
+def test_read_field_file_replays_journal(tmp_path):
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    snapshot_hash = journaled_field_file_hash(filename)
+
+    _edit(field, journal)
+    journal.save(field)
+
+    with open(field_journal_filename(filename), "a") as file:
+        file.write("add pointsource 100.000 100")
+
+    with open(field_journal_filename(filename), "rb") as file:
+        journal_data = file.read()
+
+    assert field_text(read_field_file(filename)) == field_text(field)
+    assert journaled_field_file_hash(filename) != snapshot_hash
+
+    # Reading doesn't cut off the incomplete line, as only the journal's owner may change it
+
+    with open(field_journal_filename(filename), "rb") as file:
+        assert file.read() == journal_data
+
+
+def test_journal_compaction(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(field_journal, "COMPACTION_MIN_OPERATION_COUNT", 3)
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    _edit(field, journal)
+    journal.save(field)
+
+    assert journal.operation_count == 0
+
+    with open(filename, "r") as file:
+        assert file.read() == field_text(field)
+
+    loaded_field, _ = FieldJournal.open(filename)
+
+    assert field_text(loaded_field) == field_text(field)
+
+
+def test_journal_for_old_snapshot_is_ignored(tmp_path):
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    _edit(field, journal)
+    journal.save(field)
+
+    # The snapshot is changed without the journal (eg. a compaction was interrupted after writing the snapshot)
+
+    with open(filename, "w") as file:
+        FieldSerialize.serialize(field, file)
+
+    loaded_field, loaded_journal = FieldJournal.open(filename)
+
+    assert field_text(loaded_field) == field_text(field)
+    assert loaded_journal.operation_count == 0
+
+
+def test_journal_charge_plane_round_trip(tmp_path, monkeypatch):
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    plane = ChargePlane(np.array([3.0, 4.0]), np.array([1.0, 0.0]), -5)
+    field.add_element(plane)
+    journal.record_add(plane)
+    journal.save(field)
+
+    # Both the snapshot's and the journaled charge planes are read back with the strength densities they were written with
+
+    loaded_field, _ = FieldJournal.open(filename)
+
+    expected_densities = [ele.strength_density for ele in field.iter_elements() if isinstance(ele, ChargePlane)]
+    loaded_densities = [ele.strength_density for ele in loaded_field.iter_elements() if isinstance(ele, ChargePlane)]
+
+    assert np.allclose(loaded_densities, expected_densities)
+
+    # Compacting and reopening again doesn't weaken them
+
+    journal.compact(loaded_field)
+    compacted_field, _ = FieldJournal.open(filename)
+
+    compacted_densities = [ele.strength_density for ele in compacted_field.iter_elements() if isinstance(ele, ChargePlane)]
+
+    assert np.allclose(compacted_densities, expected_densities)
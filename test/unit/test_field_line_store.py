@@ -0,0 +1,156 @@
+import numpy as np
+import pytest
+from os.path import join as joinpath
+from field import Field, write_field_file, LINE_TERMINATION_MAX_POINTS, LINE_TERMINATION_CLIPPED, LINE_TERMINATION_ELEMENT
+from field_journal import read_field_file
+from field_element import PointSource, ChargePlane
+from field_journal import FieldJournal
+from field_line_store import TracedLines, FieldLineStore, field_lines_filename
+from render_geometry import line_point_counts
+
+
+def _create_field() -> Field:
+
+    field = Field()
+    field.add_element(PointSource(np.array([0.0, 0.0]), 4))
+    field.add_element(PointSource(np.array([100.0, 0.0]), -4))
+
+    return field
+
+
+def _trace(field: Field, max_points: int = 200):
+
+    clip_bounds = np.array([[-100, 200], [-100, 100]], dtype=float)
+
+    starts, positives = field.get_field_line_starts(clip_bounds)
+    terminations = np.zeros(shape=(starts.shape[0],), dtype=np.int8)
+
+    lines = field.trace_field_lines(starts, max_points, positives, step_distance=5, element_stop_distance=5,
+                                    clip_ranges=clip_bounds, terminations=terminations)
+
+    return lines, positives, terminations
+
+
+def test_trace_terminations():
+
+    lines, _, terminations = _trace(_create_field())
+
+    assert set(terminations.tolist()) <= {LINE_TERMINATION_CLIPPED, LINE_TERMINATION_ELEMENT}
+    assert np.any(terminations == LINE_TERMINATION_ELEMENT)
+
+    _, _, short_terminations = _trace(_create_field(), max_points=3)
+
+    assert np.all(short_terminations == LINE_TERMINATION_MAX_POINTS)
+
+
+def test_traced_lines_padding_round_trip():
+
+    lines, positives, terminations = _trace(_create_field())
+
+    traced_lines = TracedLines.from_padded(lines, positives, terminations)
+
+    assert traced_lines.line_count == lines.shape[0]
+    assert traced_lines.points.shape[0] == np.sum(line_point_counts(lines))
+
+    padded = traced_lines.to_padded()
+    counts = line_point_counts(lines)
+
+    assert np.array_equal(line_point_counts(padded), counts)
+
+    for i in range(lines.shape[0]):
+        assert np.array_equal(padded[i, :counts[i]], lines[i, :counts[i]])
+
+
+def test_store_save_and_load(tmp_path):
+
+    field = _create_field()
+    lines, positives, terminations = _trace(field)
+
+    params = {"config": (1.0, 200), "tile_size": 256}
+
+    store = FieldLineStore(field.content_hash, params)
+    store.put((0, 0, 0), TracedLines.from_padded(lines[:3], positives[:3], terminations[:3]))
+    store.put((0, -1, 2), TracedLines.from_padded(lines[3:], positives[3:], terminations[3:]))
+
+    filename = field_lines_filename(joinpath(tmp_path, "test.field"))
+    assert filename.endswith(".fieldlines")
+
+    store.save(filename)
+
+    loaded = FieldLineStore.try_load(filename, _create_field().content_hash, params)
+
+    assert loaded is not None
+    assert len(loaded) == 2
+
+    for key in [(0, 0, 0), (0, -1, 2)]:
+
+        original_lines = store.get(key)
+        loaded_lines = loaded.get(key)
+
+        assert original_lines is not None
+        assert loaded_lines is not None
+
+        assert np.array_equal(original_lines.points, loaded_lines.points)
+        assert np.array_equal(original_lines.offsets, loaded_lines.offsets)
+        assert np.array_equal(original_lines.positives, loaded_lines.positives)
+        assert np.array_equal(original_lines.terminations, loaded_lines.terminations)
+
+    # Saving over the file that the loaded lines are memory-mapped from
+    loaded.save(filename)
+
+    # Stored lines aren't used for other fields or other parameters
+
+    other_field = _create_field()
+    other_field.add_element(PointSource(np.array([0.0, 50.0]), 1))
+
+    assert FieldLineStore.try_load(filename, other_field.content_hash, params) is None
+    assert FieldLineStore.try_load(filename, field.content_hash, {"config": (2.0, 200), "tile_size": 256}) is None
+    assert FieldLineStore.try_load(joinpath(tmp_path, "missing.fieldlines"), field.content_hash, params) is None
+
+
+@pytest.mark.parametrize("extension", [".field", ".fieldb"])
+def test_store_matches_reopened_field(tmp_path, extension):
+
+    field = Field()
+    field.add_element(PointSource(np.array([123.45678, -9.87654]), 4.3217))
+    field.add_element(ChargePlane(np.array([-20.00049, 31.5]), np.array([0.2, 1.0]), -2.71828))
+
+    filename = joinpath(tmp_path, "test" + extension)
+    params = {"config": (1.0, 200), "tile_size": 256}
+
+    lines, positives, terminations = _trace(_create_field())
+
+    # Saving the field and its lines, as the program does, then reopening them
+
+    write_field_file(field, filename)
+
+    store = FieldLineStore(field.content_hash, params)
+    store.put((0, 0, 0), TracedLines.from_padded(lines, positives, terminations))
+    store.save(field_lines_filename(filename))
+
+    reopened_field = read_field_file(filename)
+
+    assert FieldLineStore.load(field_lines_filename(filename)).matches(reopened_field.content_hash, params)
+
+    # Saving the reopened field again doesn't change it
+
+    write_field_file(reopened_field, filename)
+
+    assert read_field_file(filename).content_hash == field.content_hash
+
+
+def test_store_matches_journaled_field(tmp_path):
+
+    filename = joinpath(tmp_path, "test.field")
+
+    field = _create_field()
+    journal = FieldJournal.create(field, filename)
+
+    plane = ChargePlane(np.array([3.14159, 4.0]), np.array([1.0, 0.3]), -5.55555)
+    field.add_element(plane)
+    journal.record_add(plane)
+    journal.save(field)
+
+    reopened_field, _ = FieldJournal.open(filename)
+
+    assert FieldLineStore(field.content_hash, {}).matches(reopened_field.content_hash, {})
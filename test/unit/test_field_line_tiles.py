@@ -0,0 +1,173 @@
+import numpy as np
+from field import Field
+from field_element import PointSource
+from render_geometry import FieldLineGeometry
+from recalculation_worker import TraceConfig
+from field_line_tiles import LineTileCache, LineTileWorker, tiles_covering, tile_bounds, tile_world_size, tile_trace_margin, trace_tile, trace_tile_lines, TILE_TRACE_MARGIN
+from field_line_store import TracedLines
+from viewport import Viewport
+from perf_stats import perf_stats
+
+
+def test_tiles_covering():
+
+    size = tile_world_size(0)
+
+    bounds = np.array([
+        [0.5 * size, 2.5 * size],
+        [-0.5 * size, 0.5 * size]
+    ])
+
+    keys = tiles_covering(bounds, 0)
+
+    assert set(keys) == {(0, col, row) for col in range(0, 3) for row in range(-1, 1)}
+
+    # The tiles nearest the centre come first
+    assert keys[0][1] == 1
+
+    assert len(tiles_covering(bounds, 0, margin=1)) == 5 * 4
+
+
+def test_trace_tile_only_starts_lines_in_tile():
+
+    size = tile_world_size(0)
+
+    field = Field()
+    field.add_element(PointSource(np.array([0.5, 0.5]) * size, 4))
+
+    config = TraceConfig.from_settings()
+
+    assert trace_tile(field, (0, 0, 0), config).segment_count > 0
+    assert trace_tile(field, (0, 1, 0), config).segment_count == 0
+
+
+def test_tile_bounds_partition():
+
+    key = (1, -2, 3)
+    bounds = tile_bounds(key)
+    size = tile_world_size(1)
+
+    assert np.isclose(bounds[0, 1] - bounds[0, 0], size)
+    assert np.isclose(tile_bounds((1, -1, 3))[0, 0], bounds[0, 1])
+
+
+def test_cache_evicts_least_recently_used():
+
+    cache = LineTileCache(max_tiles=2)
+    cache.set_context("a")
+
+    cache.put((0, 0, 0), FieldLineGeometry.empty())
+    cache.put((0, 1, 0), FieldLineGeometry.empty())
+
+    assert cache.get((0, 0, 0)) is not None
+
+    cache.put((0, 2, 0), FieldLineGeometry.empty())
+
+    assert (0, 0, 0) in cache
+    assert (0, 1, 0) not in cache
+    assert (0, 2, 0) in cache
+
+
+def test_cache_context_change_discards_tiles():
+
+    cache = LineTileCache()
+    cache.set_context("a")
+    cache.put((0, 0, 0), FieldLineGeometry.empty())
+
+    cache.set_context("a")
+    assert len(cache) == 1
+
+    cache.set_context("b")
+    assert len(cache) == 0
+
+
+def test_worker_publishes_each_tile():
+
+    size = tile_world_size(0)
+
+    field = Field()
+    field.add_element(PointSource(np.array([0.5, 0.5]) * size, 4))
+
+    worker = LineTileWorker(record_stats=False)
+
+    keys = [(0, 0, 0), (0, 1, 0), (0, 0, 1)]
+
+    worker.submit(field, "context", TraceConfig.from_settings(), keys)
+
+    assert worker.wait_until_idle(timeout=10)
+
+    results = worker.take_results()
+
+    assert sorted(key for _, key, _, _ in results) == sorted(keys)
+    assert all(context == "context" for context, _, _, _ in results)
+
+    worker.stop()
+
+
+def test_worker_records_totals_of_all_tiles():
+
+    size = tile_world_size(0)
+
+    field = Field()
+    field.add_element(PointSource(np.array([0.5, 0.5]) * size, 4))
+    field.add_element(PointSource(np.array([1.5, 0.5]) * size, -3))
+
+    config = TraceConfig.from_settings()
+    keys = [(0, 0, 0), (0, 1, 0)]
+
+    line_counts = [trace_tile_lines(field, key, config.rescaled(Viewport.scale_of_zoom_level(0))).line_count for key in keys]
+    assert all(line_count > 0 for line_count in line_counts)
+
+    worker = LineTileWorker()
+
+    worker.submit(field, "context", config, keys)
+
+    assert worker.wait_until_idle(timeout=10)
+
+    # The figures are for both tiles rather than only the last one traced
+
+    assert perf_stats.traced_line_count == sum(line_counts)
+    assert perf_stats.segment_count == sum(geometry.segment_count for _, _, geometry, _ in worker.take_results())
+
+    worker.stop()
+
+
+def test_tile_lines_reach_window_edges():
+
+    width, height = 720, 480
+
+    viewport = Viewport((-1000.0, -700.0), 0)
+    bounds = viewport.clip_bounds(width, height)
+
+    field = Field()
+    field.add_element(PointSource(np.array([-300.0, 0.0]), 9))
+    field.add_element(PointSource(np.array([300.0, 0.0]), -9))
+
+    config = TraceConfig.from_settings(viewport.scale)
+
+    # The lines of the whole window, traced at once
+
+    starts, positives = field.get_field_line_starts(bounds, fac=config.line_count_factor)
+
+    window_lines = field.trace_field_lines(starts, config.max_step_count, positives,
+                                           step_distance=config.step_distance,
+                                           element_stop_distance=config.element_stop_distance,
+                                           clip_ranges=bounds)
+
+    # The lines of the tiles that the window would draw
+
+    margin = tile_trace_margin(width, height)
+
+    tile_points = np.concatenate([
+        trace_tile_lines(field, key, config, margin=margin).points
+        for key in tiles_covering(bounds, viewport.zoom_level, margin=TILE_TRACE_MARGIN)
+    ])
+
+    def shown_points(points):
+        inside_mask = np.all((points > bounds[:, 0]) & (points < bounds[:, 1]), axis=1)
+        return {tuple(point) for point in np.round(points[inside_mask], 6).tolist()}
+
+    window_points = shown_points(TracedLines.from_padded(window_lines, positives, np.zeros(shape=positives.shape, dtype=np.int8)).points)
+
+    assert len(window_points) > 0
+    assert window_points <= shown_points(tile_points)
@@ -0,0 +1,174 @@
+import numpy as np
+from io import StringIO
+from contextlib import redirect_stdout
+from field import FieldSerialize, LoadCancelledException
+from field_element import PointSource, ChargePlane
+
+
+def _deserialize(text: str):
+
+    output = StringIO()
+
+    with redirect_stdout(output):
+        field = FieldSerialize.deserialize(StringIO(text))
+
+    return field, output.getvalue()
+
+
+def test_deserialize_bulk():
+
+    field, output = _deserialize(
+        "# A comment\n"
+        "pointsource 1.000 2.000 3.000\n"
+        "\n"
+        "  PointSource -4.5 5 -6.000  \n"
+        "chargeplane 0.000 -10.000 2.000 0.000 1.000"
+    )
+
+    assert output == ""
+
+    eles = list(field.iter_elements())
+
+    assert len(eles) == 3
+
+    assert isinstance(eles[0], PointSource)
+    assert np.allclose(eles[0].pos, [1, 2])
+    assert eles[0].strength == 3
+
+    assert isinstance(eles[1], PointSource)
+    assert np.allclose(eles[1].pos, [-4.5, 5])
+    assert eles[1].strength == -6
+
+    assert isinstance(eles[2], ChargePlane)
+    assert np.allclose(eles[2].pos, [0, -10])
+    assert np.allclose(eles[2].normal, [0, 1])
+
+
+def test_deserialize_keeps_file_order():
+
+    field, _ = _deserialize(
+        "pointsource 1 0 1\n"
+        "chargeplane 0 0 1 0 1\n"
+        "pointsource 2 0 1\n"
+    )
+
+    assert [type(ele) for ele in field.iter_elements()] == [PointSource, ChargePlane, PointSource]
+
+
+def test_deserialize_reports_invalid_lines():
+
+    field, output = _deserialize(
+        "pointsource 1 0 1\n"
+        "pointsource .5 0 1\n"
+        "pointsource 1 2\n"
+        "nonsense\n"
+        "pointsource 2 0 1\n"
+    )
+
+    assert output == "".join(
+        f"Encountered invalid line when reading file:\n{line}\n"
+        for line in ["pointsource .5 0 1", "pointsource 1 2", "nonsense"]
+    )
+
+    assert [ele.x for ele in field.iter_elements()] == [1, 2]  # type: ignore
+
+
+def test_deserialize_round_trip():
+
+    field, _ = _deserialize("pointsource 1.250 -2.500 3.000\npointsource 4.000 5.000 -6.000\n")
+
+    stream = StringIO()
+    FieldSerialize.serialize(field, stream)
+
+    assert stream.getvalue() == "pointsource 1.250 -2.500 3.000\npointsource 4.000 5.000 -6.000\n"
+
+
+def test_charge_plane_file_round_trip():
+
+    # A file in the format of the original .field files, which hold the strength densities given to the ChargePlane constructor
+
+    text = (
+        "pointsource 1.250 -2.500 3.000\n"
+        "chargeplane 0.000 -10.000 2.000 0.000 1.000\n"
+        "chargeplane 3.500 4.000 -5.500 0.600 0.800\n"
+        "chargeplane -1.000 2.000 0.250 -0.707 0.707\n"
+    )
+
+    field, output = _deserialize(text)
+
+    assert output == ""
+
+    planes = [ele for ele in field.iter_elements() if isinstance(ele, ChargePlane)]
+
+    assert np.allclose([cp.strength_density for cp in planes], np.array([2.0, -5.5, 0.25]) * ChargePlane.STRENGTH_DENSITY_FACTOR)
+
+    stream = StringIO()
+    FieldSerialize.serialize(field, stream)
+
+    assert stream.getvalue() == text
+
+    reread_field, _ = _deserialize(stream.getvalue())
+
+    assert reread_field.content_hash == field.content_hash
+
+
+def test_charge_plane_normal_normalised():
+
+    cp = ChargePlane(np.array([0.0, 0.0]), np.array([-0.707, 0.707]), 1)
+
+    assert np.isclose(np.linalg.norm(cp.normal), 1)
+    assert np.allclose(cp.normal, np.array([-1.0, 1.0]) / np.sqrt(2))
+
+
+def test_deserialize_in_chunks():
+
+    text = "".join(f"pointsource {i}.000 0.000 1.000\n" for i in range(100))
+
+    progresses = []
+
+    field = FieldSerialize.deserialize(
+        StringIO(text),
+        chunk_size=64,
+        progress_callback=lambda progress: progresses.append((progress.line_count, progress.element_count))
+    )
+
+    assert [ele.x for ele in field.iter_elements()] == list(range(100))  # type: ignore
+
+    assert len(progresses) > 1
+    assert progresses[-1] == (100, 100)
+
+
+def test_deserialize_region():
+
+    text = "".join(f"pointsource {i}.000 0.000 1.000\n" for i in range(100)) \
+        + "chargeplane 15 0 1 1 0\n" \
+        + "chargeplane 500 0 1 1 0\n"
+
+    region = np.array([[10, 20], [-1, 1]], dtype=float)
+
+    field = FieldSerialize.deserialize(StringIO(text), chunk_size=64, region=region, region_margin=5)
+
+    eles = list(field.iter_elements())
+
+    assert [ele.x for ele in eles if isinstance(ele, PointSource)] == list(range(5, 26))
+    assert [ele.x for ele in eles if isinstance(ele, ChargePlane)] == [15]
+
+
+def test_deserialize_cancel():
+
+    text = "".join(f"pointsource {i}.000 0.000 1.000\n" for i in range(100))
+
+    progresses = []
+
+    try:
+        FieldSerialize.deserialize(
+            StringIO(text),
+            chunk_size=64,
+            progress_callback=progresses.append,
+            should_cancel=lambda: len(progresses) >= 2
+        )
+        assert False, "Expected an exception"
+    except LoadCancelledException:
+        pass
+
+    assert len(progresses) == 2
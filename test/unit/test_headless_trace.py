@@ -0,0 +1,90 @@
+import sys
+import json
+import subprocess
+from os import listdir
+from os.path import join as joinpath
+import numpy as np
+from field import FieldSerialize, INTEGRATOR_RK4
+from viewport import Viewport
+from headless_trace import trace_viewport, main
+from test._test_util import create_charge_pair_field, small_trace_config
+
+
+def _assert_lines_equal(a, b):
+    assert a.tile_keys == b.tile_keys
+    assert np.array_equal(a.tile_line_offsets, b.tile_line_offsets)
+    assert np.array_equal(a.lines.offsets, b.lines.offsets)
+    assert np.array_equal(a.lines.positives, b.lines.positives)
+    assert np.array_equal(a.lines.terminations, b.lines.terminations)
+    assert np.allclose(a.lines.points, b.lines.points)
+
+
+def test_field_maths_doesnt_import_gui():
+
+    code = "import sys, headless_trace; print(any(name.split('.')[0] in ('pyglet', 'tkinter') for name in sys.modules))"
+
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "False"
+
+
+def test_trace_viewport_covers_field():
+
+    field = create_charge_pair_field()
+
+    viewport_lines = trace_viewport(field, Viewport(), 720, 480, base_config=small_trace_config())
+
+    lines = viewport_lines.lines
+
+    assert lines.line_count == field.get_field_line_starts(np.zeros(shape=(2, 2)))[0].shape[0]
+    assert viewport_lines.line_tile_keys.shape == (lines.line_count, 3)
+    assert viewport_lines.tile_line_offsets[-1] == lines.line_count
+
+
+def test_trace_viewport_workers_and_cache(tmp_path):
+
+    field = create_charge_pair_field()
+
+    serial = trace_viewport(field, Viewport(), 720, 480, base_config=small_trace_config(), integrator=INTEGRATOR_RK4)
+    parallel = trace_viewport(field, Viewport(), 720, 480, base_config=small_trace_config(), integrator=INTEGRATOR_RK4,
+                              workers=2, cache_dir=str(tmp_path))
+
+    _assert_lines_equal(serial, parallel)
+
+    assert len(listdir(tmp_path)) == 1
+
+    cached = trace_viewport(field, Viewport(), 720, 480, base_config=small_trace_config(), integrator=INTEGRATOR_RK4,
+                            cache_dir=str(tmp_path))
+
+    _assert_lines_equal(serial, cached)
+
+
+def test_main_outputs(tmp_path):
+
+    field_filename = str(tmp_path / "test.field")
+
+    with open(field_filename, "w") as file:
+        FieldSerialize.serialize(create_charge_pair_field(), file)
+
+    outputs = {}
+
+    for ext in ("npz", "csv", "json"):
+        outputs[ext] = joinpath(tmp_path, "lines." + ext)
+        main([field_filename, "-o", outputs[ext], "--dtype", "float32"])
+
+    npz = np.load(outputs["npz"])
+
+    assert npz["points"].dtype == np.float32
+
+    with open(outputs["csv"], "r") as file:
+        rows = file.read().splitlines()
+
+    assert rows[0] == "line,point,x,y,positive,termination"
+    assert len(rows) - 1 == npz["points"].shape[0]
+
+    with open(outputs["json"], "r") as file:
+        doc = json.load(file)
+
+    assert len(doc["lines"]) == npz["positives"].shape[0]
+    assert sum(len(line["points"]) for line in doc["lines"]) == npz["points"].shape[0]
+    assert np.allclose(np.array(doc["lines"][0]["points"]), npz["points"][:npz["offsets"][1]])
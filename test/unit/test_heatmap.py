@@ -0,0 +1,98 @@
+import numpy as np
+from field import Field
+from field_element import PointSource, ChargePlane
+from heatmap import HeatmapWorker, raster_positions, raster_covering, field_raster, colour_map, render_heatmap, HEATMAP_MAX_ALPHA
+from test._test_util import *
+
+
+CLIP_BOUNDS = np.array([
+    [0.0, 40.0],
+    [0.0, 20.0]
+])
+
+
+def test_raster_positions():
+
+    poss = raster_positions(CLIP_BOUNDS, 4, 2)
+
+    exp = np.array([
+        [5, 5], [15, 5], [25, 5], [35, 5],
+        [5, 15], [15, 15], [25, 15], [35, 15],
+    ], dtype=float)
+
+    compare_arrs(poss, exp)
+
+
+def test_potential_raster_matches_evaluate():
+
+    field = Field()
+    field.add_element(PointSource(np.array([12.0, 3.0]), 5))
+    field.add_element(PointSource(np.array([31.0, 17.0]), -2))
+
+    values, is_field_strength = field_raster(field, CLIP_BOUNDS, 4, 2, show_field_strength=False)
+
+    assert not is_field_strength
+    compare_arrs(values.ravel(), field.evaluate(raster_positions(CLIP_BOUNDS, 4, 2)))
+
+
+def test_unbounded_uses_field_strength():
+
+    field = Field()
+    field.add_element(ChargePlane(np.array([0.0, 10.0]), np.array([0.0, 1.0]), 5))
+
+    values, is_field_strength = field_raster(field, CLIP_BOUNDS, 4, 2, show_field_strength=False)
+
+    assert is_field_strength
+    assert values.shape == (2, 4)
+    assert np.allclose(values, values[0, 0])
+
+
+def test_potential_colours():
+
+    values = np.array([
+        [1.0, -1.0, 0.0, np.inf],
+    ])
+
+    rgba = colour_map(values, is_field_strength=False)
+
+    assert rgba.dtype == np.uint8
+    assert rgba[0, 0, 0] == 255 and rgba[0, 0, 2] == 0
+    assert rgba[0, 1, 0] == 0 and rgba[0, 1, 2] == 255
+    assert rgba[0, 2, 3] == 0
+    assert rgba[0, 3, 3] == HEATMAP_MAX_ALPHA
+
+
+def test_raster_covering_keeps_partial_cells():
+
+    clip_bounds = np.array([[100.0, 110.0], [0.0, 8.0]])
+
+    raster_bounds, width, height = raster_covering(clip_bounds, 10, 8, 4)
+
+    # The 10 pixel wide window needs a third, partial, column of cells
+
+    assert (width, height) == (3, 2)
+
+    compare_arrs(raster_bounds, np.array([[100.0, 112.0], [0.0, 8.0]]))
+
+
+def test_worker_renders_latest():
+
+    field = Field()
+    field.add_element(PointSource(np.array([12.0, 3.0]), 5))
+
+    worker = HeatmapWorker()
+
+    for i in range(5):
+        worker.submit(field, CLIP_BOUNDS, 4 + i, 2, show_field_strength=False, context=i)
+
+    assert worker.wait_until_idle(timeout=10)
+
+    result = worker.take_result()
+
+    assert result is not None
+    assert result.context == 4
+    assert np.array_equal(result.rgba, render_heatmap(field, CLIP_BOUNDS, 8, 2, show_field_strength=False))
+
+    assert worker.take_result() is None
+
+    worker.stop()
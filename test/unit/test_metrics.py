@@ -0,0 +1,85 @@
+import json
+import numpy as np
+from metrics import MetricsRegistry, load_snapshot, snapshot_summary_lines
+
+
+def test_disabled_registry_records_nothing():
+
+    registry = MetricsRegistry()
+
+    registry.increment("a")
+    registry.set_gauge("b", 1)
+    registry.observe("c", 1)
+
+    with registry.timer("d") as timer:
+        pass
+
+    snapshot = registry.snapshot()
+
+    assert snapshot["counters"] == {} and snapshot["gauges"] == {} and snapshot["histograms"] == {}
+
+    # The duration is still measured for the caller
+
+    assert timer.elapsed_ms >= 0
+
+
+def test_counters_gauges_and_histograms():
+
+    registry = MetricsRegistry(enabled=True)
+
+    registry.increment("hits")
+    registry.increment("hits", 2)
+    registry.set_gauge("shapes", 5)
+    registry.set_gauge("shapes", 7)
+
+    for value in range(1, 101):
+        registry.observe("latency", value, unit="ms")
+
+    snapshot = registry.snapshot()
+
+    assert snapshot["counters"] == {"hits": 3}
+    assert snapshot["gauges"] == {"shapes": 7}
+
+    latency = snapshot["histograms"]["latency"]
+
+    assert latency["count"] == 100
+    assert latency["min"] == 1 and latency["max"] == 100
+    assert np.isclose(latency["mean"], 50.5)
+    assert np.isclose(latency["p50"], 50.5)
+    assert np.isclose(latency["p99"], np.percentile(np.arange(1, 101), 99))
+
+
+def test_timed_decorator():
+
+    registry = MetricsRegistry(enabled=True)
+
+    @registry.timed("stage")
+    def stage(x):
+        return x * 2
+
+    assert stage(3) == 6
+    assert stage(4) == 8
+
+    assert registry.snapshot()["histograms"]["stage"]["count"] == 2
+
+
+def test_dump_and_load(tmp_path):
+
+    registry = MetricsRegistry(enabled=True)
+
+    with registry.timer("trace"):
+        pass
+
+    registry.increment("cache.hits")
+
+    filename = str(tmp_path / "metrics.json")
+    registry.dump(filename)
+
+    snapshot = load_snapshot(filename)
+
+    assert snapshot == json.loads(json.dumps(registry.snapshot() | {"timestamp": snapshot["timestamp"]}))
+
+    lines = snapshot_summary_lines(snapshot)
+
+    assert lines[0].startswith("trace: p50")
+    assert lines[1] == "cache.hits: 1"
@@ -0,0 +1,67 @@
+import numpy as np
+from perf_stats import PerfStats, PerfTotals
+from render_geometry import FieldLineGeometry
+
+
+def test_frames_only_recorded_when_enabled():
+
+    stats = PerfStats()
+
+    stats.record_frame(0.1)
+    assert stats.fps is None
+
+    stats.record_frame_times = True
+    stats.record_frame(0.1)
+    stats.record_frame(0.3)
+
+    assert np.isclose(stats.fps, 5)
+
+
+def test_cache_hit_rates():
+
+    stats = PerfStats()
+
+    stats.record_cache_access("a", True)
+    stats.record_cache_access("a", True)
+    stats.record_cache_access("a", False)
+    stats.record_cache_access("b", False)
+
+    rates = stats.cache_hit_rates()
+
+    assert np.isclose(rates["a"], 2/3)
+    assert np.isclose(rates["b"], 0)
+
+
+def test_summary_lines():
+
+    stats = PerfStats()
+
+    stats.record_trace(123.4, traced_line_count=20, unfinished_line_count=3)
+    stats.record_geometry(FieldLineGeometry(np.zeros(shape=(7, 4)), np.zeros(shape=(2, 6)), removed_vertex_count=11))
+    stats.record_plot(5, shape_count=9)
+    stats.record_cache_access("Line starts", True)
+
+    text = "\n".join(stats.summary_lines())
+
+    assert "Trace: 123ms" in text
+    assert "Lines: 20 (3 hit step limit)" in text
+    assert "Vertices: 14 (11 simplified away)" in text
+    assert "9 line (7 segments, 2 arrowheads)" in text
+    assert "Cache \"Line starts\": 100% hits" in text
+
+
+def test_record_totals():
+
+    stats = PerfStats()
+    totals = PerfTotals()
+
+    totals.add_trace(10, traced_line_count=20, unfinished_line_count=3)
+    totals.add_trace(5, traced_line_count=4, unfinished_line_count=1)
+    totals.add_geometry(FieldLineGeometry(np.zeros(shape=(7, 4)), np.zeros(shape=(2, 6)), removed_vertex_count=11))
+    totals.add_geometry(FieldLineGeometry(np.zeros(shape=(3, 4)), np.zeros(shape=(0, 6)), removed_vertex_count=1))
+
+    stats.record_totals(totals)
+
+    assert np.isclose(stats.last_trace_ms, 15)
+    assert (stats.traced_line_count, stats.unfinished_line_count) == (24, 4)
+    assert (stats.segment_count, stats.arrowhead_count, stats.removed_vertex_count) == (10, 2, 12)
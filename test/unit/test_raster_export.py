@@ -0,0 +1,139 @@
+from io import BytesIO
+import struct
+import zlib
+import numpy as np
+from field import Field
+from field_element import PointSource, ChargePlane
+from render_geometry import FieldLineGeometry, element_colour
+from raster_export import RasterScene, rasterize_tile, rasterize, write_png, iter_raster_strips
+from field_line_tiles import build_tile_geometry
+from recalculation_worker import TraceConfig
+from svg_export import iter_field_line_tiles
+from viewport import Viewport
+from settings import settings
+from test._test_util import *
+
+
+def _read_png_rgba(data: bytes) -> np.ndarray:
+
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+
+    i = 8
+    idat = b""
+    width = height = 0
+
+    while i < len(data):
+
+        length, = struct.unpack(">I", data[i:i+4])
+        chunk_type = data[i+4:i+8]
+        chunk_data = data[i+8:i+8+length]
+        crc, = struct.unpack(">I", data[i+8+length:i+12+length])
+
+        assert crc == zlib.crc32(chunk_type + chunk_data) & 0xFFFFFFFF
+
+        if chunk_type == b"IHDR":
+            width, height = struct.unpack(">II", chunk_data[:8])
+        elif chunk_type == b"IDAT":
+            idat += chunk_data
+
+        i += 12 + length
+
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape((height, -1))
+
+    assert np.all(rows[:, 0] == 0)
+
+    return rows[:, 1:].reshape((height, width, 4))
+
+
+def _lines_scene(segments: np.ndarray, width: int = 20, height: int = 10) -> RasterScene:
+    return RasterScene(width, height, FieldLineGeometry(segments, np.zeros(shape=(0, 6))), [], scale=1)
+
+
+def test_horizontal_line_coverage():
+
+    # Screen y of 4.5 is the centre of the image's row 5 (from the top)
+    scene = _lines_scene(np.array([[2.0, 4.5, 12.0, 4.5]]))
+
+    rgba = rasterize_tile(scene, 0, 0, 20, 10)
+
+    assert np.all(rgba[5, 3:11, :3] == 255)
+    assert np.all(rgba[[4, 6], 3:11, :3] == 0)
+    assert np.all(rgba[:, :, 3] == 255)
+
+    # The total ink is about the length of the line
+    assert abs((np.sum(rgba[:, :, 0]) / 255) - 10) < 0.5
+
+
+def test_tiles_match_whole_image():
+
+    field = Field()
+    field.add_element(PointSource(np.array([30.0, 40.0]), 5))
+    field.add_element(PointSource(np.array([90.0, 20.0]), -5))
+    field.add_element(ChargePlane(np.array([0.0, 55.0]), np.array([1.0, 3.0]), 1))
+
+    scene = RasterScene.from_field(field, 70, 37, scale=2)
+
+    whole = rasterize_tile(scene, 0, 0, 70, 37)
+
+    compare_arrs(rasterize(scene, tile_size=16).astype(float), whole.astype(float))
+
+
+def test_lines_match_window_tiles():
+
+    field = Field()
+    field.add_element(PointSource(np.array([-300.0, 200.0]), 5))
+    field.add_element(PointSource(np.array([2000.0, 900.0]), -5))
+
+    scene = RasterScene.from_field(field, 300, 200)
+
+    config = TraceConfig.from_settings()
+    tile_geometries = [build_tile_geometry(lines, config) for _, lines in iter_field_line_tiles(field, Viewport(), 300, 200, config)]
+
+    # As drawn in the window, flipped into image space
+    expected = RasterScene(300, 200, FieldLineGeometry(
+        np.concatenate([tile.segments for tile in tile_geometries]),
+        np.concatenate([tile.arrowheads for tile in tile_geometries])
+    ), [], scale=settings.VIEWPORT_SCALE_FAC)
+
+    assert len(tile_geometries) > 1
+    assert scene.segments.shape[0] > 0
+    compare_arrs(scene.segments, expected.segments)
+    compare_arrs(scene.arrowheads, expected.arrowheads)
+
+
+def test_element_glyphs():
+
+    field = Field()
+    ps = PointSource(np.array([50.0, 50.0]), 5)
+    field.add_element(ps)
+
+    scene = RasterScene(20, 10, FieldLineGeometry.empty(), list(field.iter_elements()), scale=10)
+
+    rgba = rasterize_tile(scene, 0, 0, 20, 10)
+
+    # Screen position (5, 5) is the corner between image rows 4 and 5
+    compare_arrs(rgba[4, 4].astype(float), np.array(element_colour(ps), dtype=float))
+    compare_arrs(rgba[5, 5].astype(float), np.array(element_colour(ps), dtype=float))
+    compare_arrs(rgba[0, 19].astype(float), np.array([0, 0, 0, 255], dtype=float))
+
+
+def test_later_elements_drawn_on_top():
+
+    below = PointSource(np.array([50.0, 50.0]), 5)
+    above = PointSource(np.array([50.0, 50.0]), -5)
+
+    scene = RasterScene(10, 10, FieldLineGeometry.empty(), [below, above], scale=10)
+
+    rgba = rasterize_tile(scene, 0, 0, 10, 10)
+
+    compare_arrs(rgba[5, 5].astype(float), np.array(element_colour(above), dtype=float))
+
+
+def test_write_png():
+
+    scene = _lines_scene(np.array([[0.0, 0.0, 20.0, 10.0], [3.0, 9.0, 15.0, 1.0]]), width=21, height=11)
+
+    stream = BytesIO()
+    write_png(stream, 21, 11, iter_raster_strips(scene, tile_size=4))
+
+    compare_arrs(_read_png_rgba(stream.getvalue()).astype(float), rasterize(scene).astype(float))
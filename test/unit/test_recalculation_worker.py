@@ -0,0 +1,200 @@
+import numpy as np
+from field import Field
+from field_element import PointSource
+from recalculation_worker import RecalculationWorker, TraceConfig
+from metrics import metrics
+
+
+CLIP_BOUNDS = np.array([
+    [0.0, 1000.0],
+    [0.0, 1000.0]
+])
+
+
+def test_result_published():
+
+    field = Field()
+    field.add_element(PointSource(np.array([500.0, 500.0]), 4))
+
+    worker = RecalculationWorker()
+
+    job_id = worker.submit(field, CLIP_BOUNDS)
+
+    assert worker.wait_until_idle(timeout=10)
+
+    result = worker.take_result()
+
+    assert result is not None
+    assert result.job_id == job_id
+    assert result.geometry.segment_count > 0
+
+    assert worker.take_result() is None
+
+    worker.stop()
+
+
+def test_latest_wins():
+
+    field = Field()
+    field.add_element(PointSource(np.array([500.0, 500.0]), 4))
+
+    worker = RecalculationWorker()
+
+    for _ in range(10):
+        field.add_element(PointSource(np.array([500.0, 500.0]) + np.random.rand(2) * 100, -4))
+        worker.submit(field.copy(), CLIP_BOUNDS)
+
+    empty_job_id = worker.submit(Field(), CLIP_BOUNDS)
+
+    assert worker.wait_until_idle(timeout=10)
+
+    result = worker.take_result()
+
+    assert result is not None
+    assert result.job_id == empty_job_id
+    assert result.geometry.segment_count == 0
+
+    worker.stop()
+
+
+def test_superseded_result_not_taken():
+
+    field = Field()
+    field.add_element(PointSource(np.array([500.0, 500.0]), 4))
+
+    worker = RecalculationWorker()
+
+    worker.submit(field, CLIP_BOUNDS)
+    assert worker.wait_until_idle(timeout=10)
+
+    # The first job's result was published before the second job was submitted, so is stale
+
+    edited_field = field.copy()
+    edited_field.add_element(PointSource(np.array([700.0, 500.0]), -4))
+
+    second_job_id = worker.submit(edited_field, CLIP_BOUNDS)
+
+    result = worker.take_result()
+
+    assert (result is None) or (result.job_id == second_job_id)
+
+    worker.stop()
+
+
+def test_submitted_copy_unaffected_by_edits():
+
+    field = Field()
+    field.add_element(PointSource(np.array([500.0, 500.0]), 4))
+
+    worker = RecalculationWorker()
+
+    # The worker doesn't copy fields, so callers submit a copy that later edits don't affect
+
+    worker.submit(field.copy(), CLIP_BOUNDS)
+    field.remove_element(next(field.iter_elements()))
+
+    assert worker.wait_until_idle(timeout=10)
+
+    result = worker.take_result()
+
+    assert result is not None
+    assert result.geometry.segment_count > 0
+
+    worker.stop()
+
+
+def test_extra_elements():
+
+    field = Field()
+    field.add_element(PointSource(np.array([300.0, 500.0]), 4))
+
+    extra = PointSource(np.array([700.0, 500.0]), -4)
+
+    combined_field = field.copy()
+    combined_field.add_element(extra)
+
+    worker = RecalculationWorker()
+
+    worker.submit(combined_field, CLIP_BOUNDS)
+    assert worker.wait_until_idle(timeout=10)
+    combined_result = worker.take_result()
+
+    worker.submit(field, CLIP_BOUNDS)  # Caches the field's line starts
+    worker.submit(field, CLIP_BOUNDS, extra_elements=[extra])
+    assert worker.wait_until_idle(timeout=10)
+    extra_result = worker.take_result()
+
+    assert combined_result is not None
+    assert extra_result is not None
+    assert np.allclose(combined_result.geometry.segments, extra_result.geometry.segments)
+
+    worker.stop()
+
+
+def test_extra_elements_reuse_unchanged_lines(monkeypatch):
+
+    monkeypatch.setattr(metrics, "enabled", True)
+
+    field = Field()
+    field.add_element(PointSource(np.array([200.0, 500.0]), 8))
+
+    # A weak extra element only noticeably changes the lines passing close to it
+
+    extra = PointSource(np.array([800.0, 500.0]), -0.05)
+
+    base_line_count = field.get_field_line_starts(CLIP_BOUNDS, fac=TraceConfig.from_settings().line_count_factor)[0].shape[0]
+
+    worker = RecalculationWorker()
+
+    worker.submit(field, CLIP_BOUNDS, extra_elements=[extra])
+    assert worker.wait_until_idle(timeout=10)
+    assert worker.take_result() is not None
+
+    reused_count = metrics.snapshot()["counters"].get("trace.reused_lines", 0)
+
+    moved_extra = PointSource(np.array([800.0, 800.0]), -0.05)
+
+    worker.submit(field, CLIP_BOUNDS, extra_elements=[moved_extra])
+    assert worker.wait_until_idle(timeout=10)
+    result = worker.take_result()
+
+    newly_reused_count = metrics.snapshot()["counters"]["trace.reused_lines"] - reused_count
+
+    assert result is not None
+    assert result.geometry.segment_count > 0
+    assert 0 < newly_reused_count < base_line_count
+
+    worker.stop()
+
+
+def test_coarsened_config():
+
+    field = Field()
+    field.add_element(PointSource(np.array([500.0, 500.0]), 4))
+
+    worker = RecalculationWorker()
+
+    config = TraceConfig(
+        line_count_factor=4.0,
+        max_step_count=100,
+        step_distance=10,
+        element_stop_distance=10,
+        show_arrows=True,
+        arrowhead_spacing=10,
+        simplify_tolerance=0
+    )
+
+    worker.submit(field, CLIP_BOUNDS, config=config)
+    assert worker.wait_until_idle(timeout=10)
+    full_result = worker.take_result()
+
+    worker.submit(field, CLIP_BOUNDS, config=config.coarsened(2))
+    assert worker.wait_until_idle(timeout=10)
+    coarse_result = worker.take_result()
+
+    assert full_result is not None
+    assert coarse_result is not None
+    assert coarse_result.geometry.segment_count < full_result.geometry.segment_count
+    assert coarse_result.geometry.arrowhead_count == 0
+
+    worker.stop()
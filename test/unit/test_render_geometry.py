@@ -0,0 +1,116 @@
+import numpy as np
+from render_geometry import line_point_counts, simplify_lines_mask, build_field_line_geometry, ARROWHEAD_LENGTH
+from test._test_util import *
+
+
+def test_point_counts():
+
+    lines = np.array([
+        [[0, 0], [1, 0], [2, 0], [3, 0]],  # Never stops
+        [[0, 0], [1, 0], [1, 0], [1, 0]],  # Stopped after 2 points
+        [[0, 0], [0, 0], [0, 0], [0, 0]],  # Stopped immediately
+        [[0, 0], [1, 0], [np.inf, 0], [np.inf, 0]],  # Went to infinity
+    ], dtype=float)
+
+    exp = np.array([4, 2, 1, 2])
+
+    out = line_point_counts(lines)
+
+    compare_arrs(out, exp)
+
+
+def test_segments():
+
+    lines = np.array([
+        [[0, 0], [10, 0], [20, 0], [20, 0]],
+        [[0, 0], [0, 0], [0, 0], [0, 0]],
+        [[0, 0], [0, 10], [0, 20], [0, 30]],
+    ], dtype=float)
+    positives = np.array([True, True, False])
+
+    geometry = build_field_line_geometry(lines, positives, scale=10, show_arrows=False, arrowhead_spacing=1)
+
+    exp = np.array([
+        [0, 0, 1, 0],
+        [1, 0, 2, 0],
+        [0, 0, 0, 1],
+        [0, 1, 0, 2],
+        [0, 2, 0, 3],
+    ], dtype=float)
+
+    compare_arrs(geometry.segments, exp)
+    assert geometry.arrowhead_count == 0
+
+
+def test_arrowheads():
+
+    lines = np.array([
+        [[0, 0], [10, 0], [20, 0], [30, 0], [40, 0]],
+        [[0, 0], [0, 10], [0, 20], [0, 30], [0, 40]],
+    ], dtype=float)
+    positives = np.array([True, False])
+
+    geometry = build_field_line_geometry(lines, positives, scale=1, show_arrows=True, arrowhead_spacing=20)
+
+    L = ARROWHEAD_LENGTH
+
+    exp = np.array([
+        [20+L, 0, 20, -L/2, 20, L/2],
+        [40+L, 0, 40, -L/2, 40, L/2],
+        [0, 20-L, -L/2, 20, L/2, 20],
+        [0, 40-L, -L/2, 40, L/2, 40],
+    ], dtype=float)
+
+    compare_arrs(geometry.arrowheads, exp)
+
+
+def test_simplify_collinear():
+
+    lines = np.array([
+        [[0, 0], [1, 0], [2, 0], [3, 0], [4, 0]],
+        [[0, 0], [1, 1], [2, 2], [2, 2], [2, 2]],
+    ], dtype=float)
+    counts = line_point_counts(lines)
+
+    exp = np.array([
+        [True, False, False, False, True],
+        [True, False, True, False, False],
+    ])
+
+    out = simplify_lines_mask(lines, counts, tolerance=0.1)
+
+    compare_arrs(out, exp)
+
+
+def test_simplify_keeps_corners():
+
+    lines = np.array([
+        [[0, 0], [1, 0.01], [2, 0], [2, 1], [2, 2], [2.01, 3], [2, 4]],
+    ], dtype=float)
+    counts = line_point_counts(lines)
+
+    exp = np.array([
+        [True, False, True, False, False, False, True],
+    ])
+
+    out = simplify_lines_mask(lines, counts, tolerance=0.1)
+
+    compare_arrs(out, exp)
+
+
+def test_simplified_geometry():
+
+    lines = np.array([
+        [[0, 0], [10, 0], [20, 0], [20, 10], [20, 20], [20, 20]],
+    ], dtype=float)
+    positives = np.array([True])
+
+    geometry = build_field_line_geometry(lines, positives, scale=10, show_arrows=False, arrowhead_spacing=1, simplify_tolerance=0.5)
+
+    exp = np.array([
+        [0, 0, 2, 0],
+        [2, 0, 2, 2],
+    ], dtype=float)
+
+    compare_arrs(geometry.segments, exp)
+    assert geometry.removed_vertex_count == 2
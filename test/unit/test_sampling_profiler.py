@@ -0,0 +1,87 @@
+import time
+from os.path import join as joinpath
+from threading import Event, Thread
+from sampling_profiler import SamplingProfiler, frame_stack
+
+
+def _busy_loop(stop_event: Event) -> None:
+    while not stop_event.is_set():
+        sum(range(1000))
+
+
+def test_samples_other_threads():
+
+    stop_event = Event()
+    busy_thread = Thread(target=_busy_loop, args=(stop_event,), name="BusyThread")
+    busy_thread.start()
+
+    try:
+        with SamplingProfiler(interval=0.001) as profiler:
+            time.sleep(0.1)
+    finally:
+        stop_event.set()
+        busy_thread.join()
+
+    assert not profiler.is_running
+    assert profiler.sample_count > 0
+
+    stacks = profiler.collapsed_stacks()
+
+    busy_stacks = [stack for stack in stacks if stack.startswith("BusyThread;")]
+
+    assert len(busy_stacks) > 0
+    assert all("_busy_loop (test_sampling_profiler.py:" in stack for stack in busy_stacks)
+
+    # The sampling thread itself isn't sampled
+
+    assert not any(stack.startswith("SamplingProfiler;") for stack in stacks)
+
+
+def test_frame_stack_is_outermost_first():
+
+    def inner():
+        import sys
+        return frame_stack(sys._getframe())
+
+    stack = inner()
+
+    assert stack[-1].startswith("inner (")
+    assert stack[-2].startswith("test_frame_stack_is_outermost_first (")
+
+
+def test_write_collapsed(tmp_path):
+
+    profiler = SamplingProfiler()
+
+    profiler.sample()
+    profiler.sample()
+
+    filename = joinpath(tmp_path, "profile.collapsed")
+    profiler.write_collapsed(filename)
+
+    with open(filename, "r") as file:
+        lines = file.read().splitlines()
+
+    assert len(lines) == len(profiler.collapsed_stacks())
+
+    counts = {}
+
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        counts[stack] = int(count)
+
+    assert counts == profiler.collapsed_stacks()
+
+    # Stacks are of functions rather than of lines, so both samples of this test's thread have the same stack
+
+    assert [count for stack, count in counts.items() if "test_write_collapsed" in stack] == [2]
+
+
+def test_stop_without_start():
+
+    profiler = SamplingProfiler()
+
+    profiler.stop()
+
+    assert not profiler.is_running
+    assert profiler.sample_count == 0
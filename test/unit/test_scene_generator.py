@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from os.path import join as joinpath
+from field_journal import read_field_file
+from field_element import ChargePlane
+from scene_generator import generate_scene, main, SCENE_KINDS, SCENE_UNIFORM, SCENE_CLUSTERED, SCENE_DIPOLE_LATTICE, SCENE_CAPACITOR, SCENE_MIXED, MIXED_PLATE_COUNT
+
+
+@pytest.mark.parametrize("kind", SCENE_KINDS)
+def test_generate_scene_is_reproducible(kind):
+
+    a = generate_scene(kind, 6, seed=3)
+    b = generate_scene(kind, 6, seed=3)
+    c = generate_scene(kind, 6, seed=4)
+
+    assert a.content_hash == b.content_hash
+    assert a.content_hash != c.content_hash
+
+
+@pytest.mark.parametrize("kind", [SCENE_UNIFORM, SCENE_CLUSTERED, SCENE_DIPOLE_LATTICE, SCENE_MIXED])
+def test_generate_scene_point_sources_in_extent(kind):
+
+    field = generate_scene(kind, 1000, extent=500.0)
+
+    table, others = field.get_element_tables()
+
+    assert table.shape[0] == 1000
+    assert np.all((table["x"] >= 0) & (table["x"] <= 500) & (table["y"] >= 0) & (table["y"] <= 500))
+    assert np.all(table["strength"] != 0)
+
+    assert len(others) == (MIXED_PLATE_COUNT if kind == SCENE_MIXED else 0)
+
+
+def test_dipole_lattice_is_neutral():
+
+    table, _ = generate_scene(SCENE_DIPOLE_LATTICE, 200).get_element_tables()
+
+    assert np.isclose(np.sum(table["strength"]), 0)
+    assert np.count_nonzero(table["strength"] > 0) == 100
+
+
+def test_capacitor_plates_alternate():
+
+    field = generate_scene(SCENE_CAPACITOR, 4)
+
+    plates = list(field.iter_elements())
+
+    assert all(isinstance(plate, ChargePlane) for plate in plates)
+    assert [plate.strength_density > 0 for plate in plates] == [True, False, True, False]
+
+
+def test_generate_scene_large():
+
+    table, _ = generate_scene(SCENE_CLUSTERED, 1_000_000).get_element_tables()
+
+    assert table.shape[0] == 1_000_000
+
+
+def test_generate_scene_unknown_kind():
+    with pytest.raises(ValueError):
+        generate_scene("spiral", 10)
+
+
+def test_main_writes_field_file(tmp_path):
+
+    filename = joinpath(tmp_path, "scene.fieldb")
+
+    main([SCENE_MIXED, "50", "-o", filename, "--seed", "2"])
+
+    assert read_field_file(filename).content_hash == generate_scene(SCENE_MIXED, 50, seed=2).content_hash
+
+
+def test_main_writes_text_field_file(tmp_path):
+
+    filename = joinpath(tmp_path, "scene.field")
+
+    main([SCENE_UNIFORM, "50", "-o", filename])
+
+    # The text format rounds values, so only the elements' count and signs are compared
+
+    table, _ = read_field_file(filename).get_element_tables()
+    expected_table, _ = generate_scene(SCENE_UNIFORM, 50).get_element_tables()
+
+    assert np.array_equal(table["strength"] > 0, expected_table["strength"] > 0)
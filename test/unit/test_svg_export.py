@@ -0,0 +1,104 @@
+from io import StringIO
+import re
+import xml.etree.ElementTree as ET
+import numpy as np
+from field import Field
+from field_element import PointSource, ChargePlane
+from field_line_tiles import tiles_covering, tile_trace_margin, trace_tile_lines, build_tile_geometry, TILE_TRACE_MARGIN
+from headless_trace import trace_viewport
+from recalculation_worker import TraceConfig
+from viewport import Viewport
+from svg_export import write_field_svg, iter_field_line_tiles, polyline_path_data
+from test._test_util import *
+
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+
+def _create_field() -> Field:
+
+    field = Field()
+    field.add_element(PointSource(np.array([1500.0, 2000.0]), 9))
+    field.add_element(PointSource(np.array([4500.0, 2500.0]), -9))
+    field.add_element(ChargePlane(np.array([0.0, 4000.0]), np.array([0.2, 1.0]), -2))
+
+    return field
+
+
+def _decode_polyline(d: str) -> np.ndarray:
+
+    match = re.fullmatch(r"M(-?\d+) (-?\d+)l(.*)", d)
+    assert match is not None
+
+    start = np.array([int(match.group(1)), int(match.group(2))])
+    deltas = np.array([int(v) for v in match.group(3).split(" ")]).reshape((-1, 2))
+
+    return np.concatenate([start[np.newaxis, :], start + np.cumsum(deltas, axis=0)])
+
+
+def test_polyline_path_data():
+
+    points = np.array([[10, 20], [13, 20], [13, 20], [11, 25]])
+
+    assert polyline_path_data(points) == "M10 20l3 0 -2 5"
+    assert polyline_path_data(np.array([[4, 4], [4, 4]])) is None
+
+
+def test_same_geometry_as_renderer():
+
+    field = _create_field()
+    config = TraceConfig.from_settings()
+    quantization = 0.1
+
+    stream = StringIO()
+    write_field_svg(field, stream, 720, 480, config=config, quantization=quantization)
+
+    root = ET.fromstring(stream.getvalue())
+    lines_group, elements_group = root.findall(f"{SVG_NS}g")
+
+    line_paths = [path for path in lines_group.findall(f"{SVG_NS}path") if path.get("fill") is None]
+
+    svg_segments = np.concatenate([
+        np.concatenate([points[:-1], points[1:]], axis=1)
+        for points in (_decode_polyline(path.get("d")) for path in line_paths)  # type: ignore
+    ]) * quantization
+
+    # The geometry of the line tiles, as drawn on screen
+
+    viewport = Viewport((0.0, 0.0), 0)
+    bounds = viewport.clip_bounds(720, 480)
+    tile_config = config.rescaled(viewport.scale)
+
+    tile_segments = [
+        build_tile_geometry(trace_tile_lines(field, key, tile_config, margin=tile_trace_margin(720, 480)), tile_config).segments
+        for key in tiles_covering(bounds, viewport.zoom_level, margin=TILE_TRACE_MARGIN)
+    ]
+
+    geometry_segments = np.concatenate([segments for segments in tile_segments if segments.shape[0] > 0])
+
+    # Segments shorter than the quantization may be merged, so compare the segments' end points
+
+    exp_points = np.unique(np.round(geometry_segments.reshape((-1, 2)) / quantization).astype(int), axis=0)
+    svg_points = np.unique(np.round(svg_segments.reshape((-1, 2)) / quantization).astype(int), axis=0)
+
+    compare_arrs(svg_points, exp_points)
+
+    # Elements
+
+    assert len(elements_group.findall(f"{SVG_NS}circle")) == 2
+    assert len(elements_group.findall(f"{SVG_NS}line")) == 1
+
+
+def test_tiles_same_as_headless_trace():
+
+    field = _create_field()
+    config = TraceConfig.from_settings()
+    viewport = Viewport((-2000.0, 1000.0), 1)
+
+    tiles = list(iter_field_line_tiles(field, viewport, 720, 480, config))
+
+    viewport_lines = trace_viewport(field, viewport, 720, 480, base_config=config)
+
+    assert [key for key, _ in tiles] == viewport_lines.tile_keys
+
+    compare_arrs(np.concatenate([lines.points for _, lines in tiles]), viewport_lines.lines.points)
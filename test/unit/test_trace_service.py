@@ -0,0 +1,187 @@
+import json
+from os import remove
+from os.path import join as joinpath
+from threading import Thread
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+import numpy as np
+import pytest
+from viewport import Viewport
+from headless_trace import trace_viewport
+from field import FieldBinarySerialize
+from trace_service import TraceService, TraceRequest, UnknownFieldException, create_server, encode_binary, decode_binary, _worker_field
+from test._test_util import create_charge_pair_field, field_text, small_trace_config
+
+
+def _config():
+    return small_trace_config(max_step_count=50)
+
+
+@pytest.fixture(scope="module")
+def service():
+
+    service = TraceService(workers=2, default_config=_config())
+
+    yield service
+
+    service.close()
+
+
+def _post(url: str, body: bytes):
+
+    with urlopen(Request(url, data=body, method="POST")) as response:
+        return response.read(), dict(response.headers)
+
+
+def test_binary_encoding_round_trip():
+
+    viewport_lines = trace_viewport(create_charge_pair_field(), Viewport(), 720, 480, base_config=_config())
+
+    decoded = decode_binary(encode_binary(viewport_lines))
+
+    assert decoded.tile_keys == viewport_lines.tile_keys
+    assert np.array_equal(decoded.tile_line_offsets, viewport_lines.tile_line_offsets)
+    assert np.array_equal(decoded.lines.points, viewport_lines.lines.points)
+    assert np.array_equal(decoded.lines.offsets, viewport_lines.lines.offsets)
+    assert np.array_equal(decoded.lines.positives, viewport_lines.lines.positives)
+    assert np.array_equal(decoded.lines.terminations, viewport_lines.lines.terminations)
+
+
+def test_trace_request_from_json():
+
+    request = TraceRequest.from_json({"viewport": {"origin": [10, 20], "zoom_level": 1}, "config": {"max_step_count": 7}}, _config())
+
+    assert request.origin == (10.0, 20.0)
+    assert request.zoom_level == 1
+    assert request.base_config.max_step_count == 7
+    assert request.base_config.step_distance == _config().step_distance
+
+    for invalid in ({"config": {"scale": 2}}, {"integrator": "leapfrog"}, {"viewport": {"width": 0}}, {"viewport": []}):
+        with pytest.raises(ValueError):
+            TraceRequest.from_json(invalid, _config())
+
+
+def test_service_coalesces_and_caches(service):
+
+    field = create_charge_pair_field()
+    field_hash = service.add_field(field)
+
+    request = TraceRequest(_config(), origin=(100.0, 0.0))
+
+    before = service.stats()
+
+    results = [None] * 4
+
+    def run(i):
+        results[i] = service.trace(field_hash, request)
+
+    threads = [Thread(target=run, args=(i,)) for i in range(len(results))]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    after = service.stats()
+
+    # Only one of the identical requests was traced, the others waited for it or used its cached result
+
+    assert after["traces"] - before["traces"] == 1
+    assert (after["coalesced"] + after["cache_hits"]) - (before["coalesced"] + before["cache_hits"]) == len(results) - 1
+
+    expected = trace_viewport(field, Viewport((100.0, 0.0)), 720, 480, base_config=_config())
+
+    for result in results:
+        assert np.array_equal(result.lines.points, expected.lines.points)
+
+    with pytest.raises(UnknownFieldException):
+        service.trace("0" * 64, request)
+
+
+def test_worker_keeps_fields_loaded(tmp_path):
+
+    field = create_charge_pair_field()
+    filename = joinpath(tmp_path, "test.fieldb")
+
+    FieldBinarySerialize.serialize_file(field, filename)
+
+    loaded_field = _worker_field(field.content_hash, filename)
+
+    assert loaded_field.content_hash == field.content_hash
+
+    # Later traces of the field use the field already loaded instead of reading it again
+
+    remove(filename)
+
+    assert _worker_field(field.content_hash, filename) is loaded_field
+
+
+def test_discarded_fields_not_traced():
+
+    service = TraceService(workers=1, default_config=_config(), max_fields=1)
+
+    try:
+
+        first_hash = service.add_field(create_charge_pair_field())
+        second_hash = service.add_field(create_charge_pair_field(positive_strength=3))
+
+        assert not service.has_field(first_hash)
+        assert service.stats()["fields"] == 1
+
+        with pytest.raises(UnknownFieldException):
+            service.trace(first_hash, TraceRequest(_config()))
+
+        assert service.trace(second_hash, TraceRequest(_config())).lines.line_count > 0
+
+    finally:
+        service.close()
+
+
+def test_http(service):
+
+    server = create_server(service, port=0)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+
+        field = create_charge_pair_field()
+
+        # Inline field, JSON encoding
+
+        body, headers = _post(url + "/trace", json.dumps({"field": field_text(field), "viewport": {"zoom_level": 1}}).encode("utf-8"))
+
+        assert headers["X-Field-Hash"] == field.content_hash
+        assert len(json.loads(body)["lines"]) > 0
+
+        # Field by hash, binary encoding
+
+        body, headers = _post(url + "/fields", field_text(field).encode("utf-8"))
+        field_hash = json.loads(body)["field_hash"]
+
+        assert field_hash == field.content_hash
+
+        body, headers = _post(url + "/trace", json.dumps({"field_hash": field_hash, "viewport": {"zoom_level": 1}, "encoding": "binary"}).encode("utf-8"))
+
+        assert headers["Content-Type"] == "application/octet-stream"
+        assert decode_binary(body).lines.line_count > 0
+
+        with urlopen(url + "/status") as response:
+            assert json.loads(response.read())["cache_hits"] >= 1
+
+        # Errors
+
+        with pytest.raises(HTTPError) as e:
+            _post(url + "/trace", json.dumps({"field_hash": "0" * 64}).encode("utf-8"))
+        assert e.value.code == 404
+
+        with pytest.raises(HTTPError) as e:
+            _post(url + "/trace", b"not json")
+        assert e.value.code == 400
+
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,59 @@
+import numpy as np
+from viewport import Viewport
+from settings import settings
+from test._test_util import *
+
+
+def test_screen_world_round_trip():
+
+    viewport = Viewport(origin=(120.0, -40.0), zoom_level=2)
+
+    world_pos = viewport.screen_to_world(30, 70)
+
+    compare_arrs(world_pos, np.array([120.0, -40.0]) + np.array([30.0, 70.0]) * settings.VIEWPORT_SCALE_FAC / 4)
+    compare_arrs(viewport.world_to_screen(world_pos), np.array([30.0, 70.0]))
+
+
+def test_pan():
+
+    viewport = Viewport()
+
+    viewport.pan(10, -5)
+
+    # Dragging the view right and down shows what was to the left and above
+    compare_arrs(viewport.origin, np.array([-10.0, 5.0]) * settings.VIEWPORT_SCALE_FAC)
+
+
+def test_zoom_keeps_position_under_cursor():
+
+    viewport = Viewport(origin=(300.0, 200.0))
+
+    fixed = viewport.screen_to_world(50, 80)
+
+    assert viewport.zoom_at(50, 80, 1)
+    assert viewport.scale == settings.VIEWPORT_SCALE_FAC / Viewport.ZOOM_FACTOR
+
+    compare_arrs(viewport.screen_to_world(50, 80), fixed)
+
+    assert viewport.zoom_at(50, 80, -3)
+    compare_arrs(viewport.screen_to_world(50, 80), fixed)
+
+
+def test_zoom_clamped():
+
+    viewport = Viewport(zoom_level=Viewport.MAX_ZOOM_LEVEL)
+
+    assert not viewport.zoom_at(0, 0, 1)
+    assert viewport.zoom_level == Viewport.MAX_ZOOM_LEVEL
+
+
+def test_clip_bounds():
+
+    viewport = Viewport(origin=(5.0, 7.0), zoom_level=-1)
+
+    exp = np.array([
+        [5.0, 5.0 + 100 * settings.VIEWPORT_SCALE_FAC * 2],
+        [7.0, 7.0 + 50 * settings.VIEWPORT_SCALE_FAC * 2]
+    ])
+
+    compare_arrs(viewport.clip_bounds(100, 50), exp)
@@ -0,0 +1,585 @@
+#!/bin/env python3
+
+from typing import Any, Dict, Optional, Sequence, Tuple
+from argparse import ArgumentParser
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from threading import RLock
+from os import cpu_count, remove
+from os.path import join as joinpath
+from tempfile import TemporaryDirectory
+import json
+import numpy as np
+from field import Field, FieldSerialize, FieldBinarySerialize, INTEGRATORS, INTEGRATOR_EULER, BINARY_FIELD_FILE_EXTENSION
+from field_line_store import TracedLines
+from headless_trace import ViewportLines, trace_viewport, write_json, DTYPES
+from binary_tables import write_tables, read_tables_bytes
+from recalculation_worker import TraceConfig
+from viewport import Viewport
+from settings import load_settings
+from metrics import metrics
+
+
+TRACE_RESULT_MAGIC: bytes = b"FLTRACE\0"
+TRACE_RESULT_FORMAT_VERSION: int = 1
+
+ENCODING_JSON: str = "json"
+ENCODING_BINARY: str = "binary"
+
+CONFIG_OVERRIDE_KEYS: Tuple[str, ...] = ("line_count_factor", "max_step_count", "step_distance", "element_stop_distance")
+"""The trace config values that a request can set, for the default scale"""
+
+DEFAULT_MAX_FIELDS: int = 64
+"""How many fields are kept to be traced by hash before the least recently used are discarded"""
+
+DEFAULT_MAX_WORKER_FIELDS: int = 8
+"""How many fields each worker process keeps loaded before the least recently used are discarded"""
+
+DEFAULT_MAX_CACHE_BYTES: int = 256 << 20
+"""How much memory the cached results can use before the least recently used are discarded"""
+
+MAX_REQUEST_BYTES: int = 1 << 30
+
+
+class UnknownFieldException(Exception): pass
+
+
+class TraceRequest:
+    """The viewport to trace a field's lines in and the values to trace them with
+
+Parameters:
+
+    base_config - the values to trace the lines with, for the default scale
+
+    origin - the world-space position shown at the bottom-left corner of the viewport
+
+    zoom_level - the zoom level of the viewport
+
+    width - the width of the viewport in pixels
+
+    height - the height of the viewport in pixels
+
+    integrator - the method to step along the lines with. See Field.trace_field_lines
+
+    dtype_name - the name of the floating-point type to trace the lines' positions with, one of the keys of DTYPES
+"""
+
+    def __init__(self,
+                 base_config: TraceConfig,
+                 origin: Tuple[float, float] = (0.0, 0.0),
+                 zoom_level: int = 0,
+                 width: int = 720,
+                 height: int = 480,
+                 integrator: str = INTEGRATOR_EULER,
+                 dtype_name: str = "float64"):
+
+        if integrator not in INTEGRATORS:
+            raise ValueError("Unknown integrator")
+
+        if dtype_name not in DTYPES:
+            raise ValueError("Unknown dtype")
+
+        if (width <= 0) or (height <= 0):
+            raise ValueError("Viewport size must be positive")
+
+        self.base_config = base_config
+        self.origin = origin
+        self.zoom_level = zoom_level
+        self.width = width
+        self.height = height
+        self.integrator = integrator
+        self.dtype_name = dtype_name
+
+    @staticmethod
+    def from_json(value: Dict[str, Any], default_config: TraceConfig) -> "TraceRequest":
+        """Reads a request's values from the body of a trace request, taking any values not in it from a default config. Raises ValueError if the values are invalid"""
+
+        try:
+
+            viewport = value.get("viewport", {})
+            config_values = value.get("config", {})
+
+            unknown_keys = set(config_values.keys()) - set(CONFIG_OVERRIDE_KEYS)
+
+            if len(unknown_keys) > 0:
+                raise ValueError(f"Unknown config values: {', '.join(sorted(unknown_keys))}")
+
+            base_config = TraceConfig(
+                line_count_factor=float(config_values.get("line_count_factor", default_config.line_count_factor)),
+                max_step_count=int(config_values.get("max_step_count", default_config.max_step_count)),
+                step_distance=float(config_values.get("step_distance", default_config.step_distance)),
+                element_stop_distance=float(config_values.get("element_stop_distance", default_config.element_stop_distance)),
+                show_arrows=default_config.show_arrows,
+                arrowhead_spacing=default_config.arrowhead_spacing,
+                simplify_tolerance=default_config.simplify_tolerance,
+                scale=default_config.scale
+            )
+
+            origin_x, origin_y = viewport.get("origin", (0.0, 0.0))
+
+            return TraceRequest(
+                base_config,
+                origin=(float(origin_x), float(origin_y)),
+                zoom_level=int(viewport.get("zoom_level", 0)),
+                width=int(viewport.get("width", 720)),
+                height=int(viewport.get("height", 480)),
+                integrator=str(value.get("integrator", INTEGRATOR_EULER)),
+                dtype_name=str(value.get("dtype", "float64"))
+            )
+
+        except (AttributeError, TypeError) as e:
+            raise ValueError("Invalid trace request") from e
+
+    @property
+    def key(self) -> str:
+        """A value that is equal for requests that trace the same lines"""
+        return json.dumps([list(self.base_config.key), list(self.origin), self.zoom_level, self.width, self.height, self.integrator, self.dtype_name])
+
+
+# Worker processes
+
+_worker_fields: "OrderedDict[str, Field]" = OrderedDict()
+"""The fields loaded by this worker process, by their content hashes"""
+_worker_max_fields: int = DEFAULT_MAX_WORKER_FIELDS
+
+
+def _init_worker(max_fields: int) -> None:
+
+    global _worker_max_fields
+
+    _worker_max_fields = max_fields
+
+
+def _warm_up() -> None:
+    """Does nothing, but submitting it to each worker starts the worker processes (running their initializer) before the first request"""
+    pass
+
+
+def _worker_field(field_hash: str, field_filename: str) -> Field:
+    """Gets a field loaded by this worker process, loading it from its file if it isn't loaded"""
+
+    field = _worker_fields.get(field_hash)
+
+    if field is not None:
+        _worker_fields.move_to_end(field_hash)
+        return field
+
+    with metrics.timer("service.load_field"):
+        field = FieldBinarySerialize.deserialize(field_filename, mmap=False)
+
+    _worker_fields[field_hash] = field
+
+    while len(_worker_fields) > _worker_max_fields:
+        _worker_fields.popitem(last=False)
+
+    return field
+
+
+def _trace_request(field_hash: str, field_filename: str, request: TraceRequest) -> ViewportLines:
+    return trace_viewport(
+        _worker_field(field_hash, field_filename),
+        Viewport(request.origin, request.zoom_level),
+        request.width,
+        request.height,
+        base_config=request.base_config,
+        integrator=request.integrator,
+        dtype=DTYPES[request.dtype_name]
+    )
+
+
+def _viewport_lines_nbytes(viewport_lines: ViewportLines) -> int:
+
+    lines = viewport_lines.lines
+
+    return lines.points.nbytes + lines.offsets.nbytes + lines.positives.nbytes + lines.terminations.nbytes + viewport_lines.tile_line_offsets.nbytes
+
+
+# Encoding
+
+def encode_binary(viewport_lines: ViewportLines) -> bytes:
+    """Encodes traced lines as a binary container of tables (see binary_tables.write_tables) of the arrays of a TracedLines and of the tiles' keys and line ranges"""
+
+    lines = viewport_lines.lines
+
+    tables = {
+        "points": np.asarray(lines.points),
+        "offsets": lines.offsets.astype(np.int64),
+        "positives": lines.positives.astype(np.uint8),
+        "terminations": lines.terminations.astype(np.int8),
+        "tile_keys": np.array(viewport_lines.tile_keys, dtype=np.int64).reshape((len(viewport_lines.tile_keys), 3)),
+        "tile_line_offsets": viewport_lines.tile_line_offsets.astype(np.int64),
+    }
+
+    stream = BytesIO()
+    write_tables(stream, TRACE_RESULT_MAGIC, tables, {"version": TRACE_RESULT_FORMAT_VERSION})
+
+    return stream.getvalue()
+
+
+def decode_binary(data: bytes) -> ViewportLines:
+    """Decodes traced lines encoded by encode_binary"""
+
+    tables, _ = read_tables_bytes(data, TRACE_RESULT_MAGIC)
+
+    return ViewportLines(
+        [tuple(key) for key in tables["tile_keys"].tolist()],
+        TracedLines(tables["points"], tables["offsets"], tables["positives"].astype(bool), tables["terminations"]),
+        tables["tile_line_offsets"]
+    )
+
+
+def encode_json(viewport_lines: ViewportLines) -> bytes:
+    """Encodes traced lines as JSON, as written by headless_trace.write_json"""
+
+    stream = StringIO()
+    write_json(stream, viewport_lines)
+
+    return stream.getvalue().encode("utf-8")
+
+
+# Service
+
+class TraceService:
+    """Traces fields' lines for requests, in a pool of worker processes that is kept running between requests.
+
+Fields are identified by their content hash, so a field can be sent once and then traced many times by its hash. \
+Each field kept is written to a temporary .fieldb file, which each worker process loads the first time it traces the field and keeps loaded, \
+so a field isn't sent to the workers with every request. \
+Results are cached by the field's hash and the request's values. \
+Identical requests made while the first of them is being traced wait for that trace instead of tracing the lines again
+
+Parameters:
+
+    workers (optional) - how many processes to trace in
+
+    default_config (optional) - the values to trace with that requests don't set. If not provided, the values are taken from the current settings
+
+    max_fields (optional) - how many fields to keep to be traced by hash
+
+    max_cache_bytes (optional) - how much memory the cached results can use
+
+    max_worker_fields (optional) - how many fields each worker process keeps loaded
+"""
+
+    def __init__(self,
+                 workers: Optional[int] = None,
+                 default_config: Optional[TraceConfig] = None,
+                 max_fields: int = DEFAULT_MAX_FIELDS,
+                 max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+                 max_worker_fields: int = DEFAULT_MAX_WORKER_FIELDS):
+
+        if workers is None:
+            workers = cpu_count() or 1
+
+        self.__executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(max_worker_fields,))
+        self.__default_config = default_config if default_config is not None else TraceConfig.from_settings()
+        self.__max_fields = max_fields
+        self.__max_cache_bytes = max_cache_bytes
+
+        # N.B. the lock is reentrant as a future's done callback runs immediately on the thread adding it if the future is already done
+        self.__lock = RLock()
+
+        self.__fields_dir = TemporaryDirectory(prefix="trace_service_")
+        self.__fields: OrderedDict[str, str] = OrderedDict()
+        """The file of each field kept, by the field's hash"""
+        self.__discarded_fields: Dict[str, str] = {}
+        """The files of fields that have been discarded but may still be being traced, by the fields' hashes"""
+        self.__results: OrderedDict[Tuple[str, str], ViewportLines] = OrderedDict()
+        self.__results_nbytes: int = 0
+        self.__in_flight: Dict[Tuple[str, str], Future] = {}
+
+        self.__stats: Dict[str, int] = {
+            "requests": 0,
+            "traces": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+            "failures": 0,
+        }
+
+        # Start the worker processes now so the first requests don't wait for them
+
+        for future in [self.__executor.submit(_warm_up) for _ in range(workers)]:
+            future.result()
+
+    @property
+    def default_config(self) -> TraceConfig:
+        return self.__default_config
+
+    def stats(self) -> Dict[str, int]:
+        """How many requests have been made, traced, answered from the cache, merged into an identical request being traced and failed, \
+and how many fields and results are held"""
+
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["fields"] = len(self.__fields)
+            stats["cached_results"] = len(self.__results)
+            stats["cached_result_bytes"] = self.__results_nbytes
+            stats["in_flight"] = len(self.__in_flight)
+            return stats
+
+    def close(self) -> None:
+        self.__executor.shutdown(wait=True, cancel_futures=True)
+        self.__fields_dir.cleanup()
+
+    # Fields
+
+    def add_field(self, field: Field) -> str:
+        """Keeps a field to be traced by its hash. Returns the field's content hash"""
+
+        field_hash = field.content_hash
+        field_filename = joinpath(self.__fields_dir.name, field_hash + BINARY_FIELD_FILE_EXTENSION)
+
+        # N.B. the field's file is written with the lock held so that it can't be deleted by the field being discarded while being written
+
+        with self.__lock:
+
+            if (field_hash not in self.__fields) and (field_hash not in self.__discarded_fields):
+                FieldBinarySerialize.serialize_file(field, field_filename)
+
+            self.__discarded_fields.pop(field_hash, None)
+
+            self.__fields[field_hash] = field_filename
+            self.__fields.move_to_end(field_hash)
+
+            while len(self.__fields) > self.__max_fields:
+                discarded_hash, discarded_filename = self.__fields.popitem(last=False)
+                self.__discarded_fields[discarded_hash] = discarded_filename
+
+            self.__remove_discarded_field_files()
+
+        return field_hash
+
+    def __remove_discarded_field_files(self) -> None:
+        """Deletes the files of the discarded fields that aren't being traced. Must be called with the lock held"""
+
+        traced_hashes = {field_hash for field_hash, _ in self.__in_flight}
+
+        for field_hash in [field_hash for field_hash in self.__discarded_fields if field_hash not in traced_hashes]:
+            remove(self.__discarded_fields.pop(field_hash))
+
+    def has_field(self, field_hash: str) -> bool:
+        with self.__lock:
+            return field_hash in self.__fields
+
+    # Tracing
+
+    def trace(self, field_hash: str, request: TraceRequest) -> ViewportLines:
+        """Traces the lines of a field kept by add_field. Raises UnknownFieldException if the field isn't kept"""
+
+        key = (field_hash, request.key)
+
+        with self.__lock:
+
+            self.__stats["requests"] += 1
+
+            cached = self.__results.get(key)
+
+            if cached is not None:
+                self.__results.move_to_end(key)
+                self.__stats["cache_hits"] += 1
+                return cached
+
+            future = self.__in_flight.get(key)
+
+            if future is not None:
+
+                self.__stats["coalesced"] += 1
+
+            else:
+
+                field_filename = self.__fields.get(field_hash)
+
+                if field_filename is None:
+                    raise UnknownFieldException("No field with the hash given")
+
+                self.__fields.move_to_end(field_hash)
+
+                future = self.__executor.submit(_trace_request, field_hash, field_filename, request)
+
+                self.__in_flight[key] = future
+                self.__stats["traces"] += 1
+
+                future.add_done_callback(lambda done_future: self.__trace_done(key, done_future))
+
+        return future.result()
+
+    def __trace_done(self, key: Tuple[str, str], future: Future) -> None:
+
+        with self.__lock:
+
+            self.__in_flight.pop(key, None)
+            self.__remove_discarded_field_files()
+
+            if future.cancelled() or (future.exception() is not None):
+                self.__stats["failures"] += 1
+                return
+
+            viewport_lines = future.result()
+
+            self.__results[key] = viewport_lines
+            self.__results_nbytes += _viewport_lines_nbytes(viewport_lines)
+
+            while (self.__results_nbytes > self.__max_cache_bytes) and (len(self.__results) > 0):
+                _, evicted = self.__results.popitem(last=False)
+                self.__results_nbytes -= _viewport_lines_nbytes(evicted)
+
+
+# HTTP
+
+class TraceRequestHandler(BaseHTTPRequestHandler):
+    """Handles the requests of a trace service's HTTP server:
+
+    GET /status - the service's stats, as JSON
+
+    GET /metrics - a snapshot of the metrics of the service's process (see metrics.MetricsRegistry.snapshot), as JSON
+
+    POST /fields - keeps the field in the body (in the .field format) to be traced by hash. Responds with {"field_hash": ...}
+
+    POST /trace - traces a field's lines. The body is a JSON object with either "field" (the field in the .field format) or "field_hash", \
+and optionally "viewport" ({"origin", "zoom_level", "width", "height"}), "config" (values of CONFIG_OVERRIDE_KEYS), "integrator", "dtype" \
+and "encoding" ("json" or "binary"). Responds with the lines encoded by encode_json or encode_binary, and the field's hash in the X-Field-Hash header
+"""
+
+    service: TraceService
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # Requests aren't logged to stderr
+
+    def do_GET(self) -> None:
+
+        if self.path == "/status":
+            self.__send_json(200, self.service.stats())
+        elif self.path == "/metrics":
+            self.__send_json(200, metrics.snapshot())
+        else:
+            self.__send_json(404, {"error": "Unknown path"})
+
+    def do_POST(self) -> None:
+
+        try:
+
+            body = self.__read_body()
+
+            if self.path == "/fields":
+                field_hash = self.service.add_field(FieldSerialize.deserialize(StringIO(body.decode("utf-8"))))
+                self.__send_json(200, {"field_hash": field_hash})
+
+            elif self.path == "/trace":
+                self.__trace(body)
+
+            else:
+                self.__send_json(404, {"error": "Unknown path"})
+
+        except UnknownFieldException as e:
+            self.__send_json(404, {"error": str(e)})
+
+        except ValueError as e:
+            self.__send_json(400, {"error": str(e)})
+
+        except Exception as e:
+            self.__send_json(500, {"error": str(e)})
+
+    def __read_body(self) -> bytes:
+
+        length = int(self.headers.get("Content-Length", 0))
+
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError("Request is too large")
+
+        return self.rfile.read(length)
+
+    def __trace(self, body: bytes) -> None:
+
+        value = json.loads(body.decode("utf-8"))
+
+        if not isinstance(value, dict):
+            raise ValueError("Trace request must be a JSON object")
+
+        if "field" in value:
+            field_hash = self.service.add_field(FieldSerialize.deserialize(StringIO(str(value["field"]))))
+        elif "field_hash" in value:
+            field_hash = str(value["field_hash"])
+        else:
+            raise ValueError("Trace request must have a field or a field hash")
+
+        encoding = value.get("encoding", ENCODING_JSON)
+
+        if encoding not in (ENCODING_JSON, ENCODING_BINARY):
+            raise ValueError("Unknown encoding")
+
+        request = TraceRequest.from_json(value, self.service.default_config)
+
+        with metrics.timer("service.trace"):
+            viewport_lines = self.service.trace(field_hash, request)
+
+        if encoding == ENCODING_BINARY:
+            self.__send(200, encode_binary(viewport_lines), "application/octet-stream", {"X-Field-Hash": field_hash})
+        else:
+            self.__send(200, encode_json(viewport_lines), "application/json", {"X-Field-Hash": field_hash})
+
+    def __send_json(self, status: int, value: Any) -> None:
+        self.__send(status, json.dumps(value).encode("utf-8"), "application/json")
+
+    def __send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+
+        for name, header_value in (headers or {}).items():
+            self.send_header(name, header_value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(service: TraceService, host: str = "127.0.0.1", port: int = 8000) -> ThreadingHTTPServer:
+    """Creates an HTTP server for a trace service. Each request is handled on its own thread, so identical concurrent requests can be merged"""
+
+    handler_class = type("BoundTraceRequestHandler", (TraceRequestHandler,), {"service": service})
+
+    return ThreadingHTTPServer((host, port), handler_class)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+
+    parser = ArgumentParser(description="Serve field line traces over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="how many processes to trace in (defaults to the number of processors)")
+    parser.add_argument("--max-fields", type=int, default=DEFAULT_MAX_FIELDS, help="how many fields to keep to be traced by hash")
+    parser.add_argument("--max-cache-mib", type=float, default=DEFAULT_MAX_CACHE_BYTES / (1 << 20), help="how much memory (in MiB) cached results can use")
+    parser.add_argument("--settings", default=None, help="a settings file to take the default field line settings from (defaults are used otherwise)")
+
+    args = parser.parse_args(argv)
+
+    if args.settings is not None:
+        load_settings(args.settings)
+
+    metrics.enabled = True
+
+    service = TraceService(
+        workers=args.workers,
+        max_fields=args.max_fields,
+        max_cache_bytes=round(args.max_cache_mib * (1 << 20))
+    )
+
+    server = create_server(service, args.host, args.port)
+
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -25,7 +25,7 @@ Returns:
     assert a.shape[0] == b.shape[0], "Inputs have different numbers of elements"
     assert a.shape[1] == b.shape[1], "Inputs' vectors have different numbers of components"
 
-    return np.diagonal(a @ b.T)
+    return np.einsum("ij,ij->i", a, b)
 
 
 def single_dot(a: np.ndarray, b: np.ndarray):
@@ -0,0 +1,95 @@
+from typing import Tuple
+import numpy as np
+from settings import settings
+
+
+class Viewport:
+    """Which part of the field is shown in the visualisation window and how large it is shown.
+
+The field is shown at one of a set of discrete zoom levels so that geometry traced for a zoom level can be reused whenever that level is returned to. \
+Geometry is drawn in zoom space, which is world space divided by the zoom level's scale. \
+Screen space is zoom space translated so that the viewport's origin is at the bottom-left corner of the window, so panning never changes the drawn geometry
+
+Parameters:
+
+    origin (optional) - the world-space position shown at the bottom-left corner of the window
+
+    zoom_level (optional) - the zoom level to start at
+"""
+
+    ZOOM_FACTOR: float = 2.0
+    """How many times larger the field is shown at each zoom level than at the level below it"""
+
+    MIN_ZOOM_LEVEL: int = -6
+    MAX_ZOOM_LEVEL: int = 6
+
+    def __init__(self,
+                 origin: Tuple[float, float] = (0.0, 0.0),
+                 zoom_level: int = 0):
+
+        self.__origin = np.array(origin, dtype=float)
+        self.__zoom_level = zoom_level
+
+    @property
+    def origin(self) -> np.ndarray:
+        """The world-space position shown at the bottom-left corner of the window"""
+        return self.__origin.copy()
+
+    @property
+    def zoom_level(self) -> int:
+        return self.__zoom_level
+
+    @property
+    def scale(self) -> float:
+        """The number of units of distance in the field per pixel of display"""
+        return Viewport.scale_of_zoom_level(self.__zoom_level)
+
+    @staticmethod
+    def scale_of_zoom_level(zoom_level: int) -> float:
+        return settings.VIEWPORT_SCALE_FAC * (Viewport.ZOOM_FACTOR ** -zoom_level)
+
+    @property
+    def zoom_space_offset(self) -> np.ndarray:
+        """The zoom-space position shown at the bottom-left corner of the window"""
+        return self.__origin / self.scale
+
+    def screen_to_world(self, posx: float, posy: float) -> np.ndarray:
+        return self.__origin + (np.array([posx, posy], dtype=float) * self.scale)
+
+    def world_to_screen(self, pos: np.ndarray) -> np.ndarray:
+        return (pos - self.__origin) / self.scale
+
+    def clip_bounds(self, width: int, height: int) -> np.ndarray:
+        """The range of positions in world-space shown in a window of the size specified"""
+
+        scale = self.scale
+
+        return np.array([
+            [self.__origin[0], self.__origin[0] + (width * scale)],
+            [self.__origin[1], self.__origin[1] + (height * scale)]
+        ])
+
+    def pan(self, dx: float, dy: float) -> None:
+        """Moves the viewport so that what is shown moves by a screen-space displacement"""
+        self.__origin -= np.array([dx, dy], dtype=float) * self.scale
+
+    def zoom_at(self, posx: float, posy: float, steps: int) -> bool:
+        """Zooms in (or out for negative steps) by some number of zoom levels, keeping the world-space position under a screen-space position where it is. \
+Returns whether the zoom level was changed"""
+
+        new_zoom_level = min(Viewport.MAX_ZOOM_LEVEL, max(Viewport.MIN_ZOOM_LEVEL, self.__zoom_level + steps))
+
+        if new_zoom_level == self.__zoom_level:
+            return False
+
+        fixed_world_pos = self.screen_to_world(posx, posy)
+
+        self.__zoom_level = new_zoom_level
+        self.__origin = fixed_world_pos - (np.array([posx, posy], dtype=float) * self.scale)
+
+        return True
+
+    def reset(self) -> None:
+        """Goes back to showing the field from the origin at zoom level 0"""
+        self.__origin = np.zeros(shape=(2,))
+        self.__zoom_level = 0
@@ -1,15 +1,27 @@
 import pyglet
 from abc import ABC, abstractmethod
-from typing import Optional, Callable, Set, Tuple
+from typing import Optional, Callable, Set, Tuple, Dict, List, Hashable
+from threading import Lock
 from os.path import join as joinpath
-import vectors
+from time import perf_counter
 from field import Field
 from field_element import ElementBase, PointSource, ChargePlane
 from settings import settings
 from shortcuts import RawCommand as KeyPressCommand
 from shortcuts import MOD_SHIFT, MOD_CTRL, MOD_ALT
 import numpy as np
-from _debug_util import Timer
+from render_geometry import FieldLineGeometry, POINT_SOURCE_RADIUS, CHARGE_PLANE_WIDTH
+from render_geometry import element_colour, point_source_screen_pos, charge_plane_screen_segment
+from recalculation_worker import RecalculationWorker, TraceConfig
+from field_line_tiles import LineTileCache, LineTileWorker, TileKey, tiles_covering, tile_store_params, tile_trace_margin, build_tile_geometry, TILE_TRACE_MARGIN
+from field_line_store import FieldLineStore
+from field_journal import FieldJournal
+from viewport import Viewport
+from binary_tables import InvalidBinaryFileException
+from element_hit_index import ElementHitIndex
+from perf_stats import perf_stats
+from heatmap import HeatmapWorker, raster_covering
+from metrics import metrics
 
 
 def _resource(*path: str) -> str:
@@ -21,8 +33,16 @@ WINDOW_DEFAULT_WIDTH = 720
 WINDOW_DEFAULT_HEIGHT = 480
 
 
-ARROWHEAD_LENGTH: int = 5
 STATUS_ICON_POSITION: Tuple[int, int] = (0, 0)
+LOADING_ICON_POSITION: Tuple[int, int] = (64, 0)
+PERF_HUD_MARGIN: int = 8
+PERF_HUD_WIDTH: int = 480
+PERF_HUD_REFRESH_INTERVAL: float = 0.25
+"""How often (in seconds) the performance HUD's text is updated"""
+HEATMAP_PIXEL_SIZE: int = 4
+"""The width and height in screen pixels of each pixel of the heatmap"""
+PAN_MOUSE_BUTTONS: int = pyglet.window.mouse.RIGHT | pyglet.window.mouse.MIDDLE
+"""The mouse buttons that pan the view when dragged"""
 
 
 STATUS_ICON_RES_PATH_ADD = _resource("status_icons", "add.png")
@@ -48,13 +68,41 @@ class AppNotRunningException(Exception): pass
 
 class _FieldElementRenderBase(ABC):
 
+    def __init__(self):
+        self.__shapes: Set = set()
+
+    def redraw(self, draw_bounds: np.ndarray, scale: float, batch: pyglet.graphics.Batch) -> None:
+        """Replaces the shapes the renderer is keeping for the element with newly-created ones"""
+
+        self.delete_shapes()
+        self.__shapes = self.draw(draw_bounds, scale, batch)
+
+    @property
+    def shape_count(self) -> int:
+        return len(self.__shapes)
+
+    def delete_shapes(self) -> None:
+        """Deletes the shapes the renderer is keeping for the element"""
+
+        for shape in self.__shapes:
+            shape.delete()
+
+        self.__shapes.clear()
+
+    @property
+    def depends_on_draw_bounds(self) -> bool:
+        """Whether the element's shapes need to be redrawn when the drawing area moves"""
+        return False
+
     @abstractmethod
-    def draw(self, draw_bounds: np.ndarray, batch: pyglet.graphics.Batch) -> Set:
-        """Creates the shapes required for rendering the element, adds them to the batch and then returns a set of the shapes created.
+    def draw(self, draw_bounds: np.ndarray, scale: float, batch: pyglet.graphics.Batch) -> Set:
+        """Creates the zoom-space shapes required for rendering the element, adds them to the batch and then returns a set of the shapes created.
 
 Parameters:
 
-    draw_bounds - the boundaries of the drawing area. Useful for drawing infinite elements
+    draw_bounds - the world-space boundaries of the drawing area. Useful for drawing infinite elements
+
+    scale - the number of units of distance in the field per pixel of display
 
     batch - the batch to add the shapes to
 
@@ -64,44 +112,26 @@ Returns:
 """
         raise NotImplementedError()
 
-    @abstractmethod
-    def point_in_draw_bounds(self, posx: int, posy: int) -> bool:
-        """Checks if the point specified lies in the region that the rendered element is in"""
-        raise NotImplementedError()
-
 
 class _PointSourceRender(_FieldElementRenderBase):
 
-    RADIUS: int = 5
+    RADIUS: int = POINT_SOURCE_RADIUS
     SQR_RADIUS: int = RADIUS * RADIUS
 
     def __init__(self, ps: PointSource):
+        super().__init__()
         self.ps = ps
 
     def get_color(self) -> Tuple[int, int, int, int]:
+        return element_colour(self.ps)
 
-        if self.ps.strength == 0:
-            return WHITE
-        elif self.ps.strength > 0:
-            return (
-                255,
-                128*(1-round(np.tanh(self.ps.strength/50))),
-                128*(1-round(np.tanh(self.ps.strength/50))),
-                255
-            )
-        else:
-            return (
-                128*(1-round(np.tanh(-self.ps.strength/50))),
-                128*(1-round(np.tanh(-self.ps.strength/50))),
-                255,
-                255
-            )
+    def draw(self, draw_bounds: np.ndarray, scale: float, batch: pyglet.graphics.Batch) -> Set:
 
-    def draw(self, draw_bounds: np.ndarray, batch: pyglet.graphics.Batch) -> Set:
+        x, y = point_source_screen_pos(self.ps, scale)
 
         circle = pyglet.shapes.Circle(
-            x=round(self.ps.x/settings.VIEWPORT_SCALE_FAC),
-            y=round(self.ps.y/settings.VIEWPORT_SCALE_FAC),
+            x=x,
+            y=y,
             radius=_PointSourceRender.RADIUS,
             color=self.get_color(),
             batch=batch
@@ -109,84 +139,32 @@ class _PointSourceRender(_FieldElementRenderBase):
 
         return {circle}
 
-    def point_in_draw_bounds(self, posx: int, posy: int) -> bool:
-
-        pos_vec = np.array([posx, posy], dtype=float)
-
-        sqr_dist = vectors.sqr_magnitudes(pos_vec - (self.ps.pos/settings.VIEWPORT_SCALE_FAC))[0]
-
-        return sqr_dist <= _PointSourceRender.SQR_RADIUS
-
 
 class _ChargePlaneRender(_FieldElementRenderBase):
 
-    WIDTH: int = 5
+    WIDTH: int = CHARGE_PLANE_WIDTH
     SQR_WIDTH: int = WIDTH * WIDTH
 
     def __init__(self, cp: ChargePlane):
+        super().__init__()
         self.cp = cp
 
     def get_color(self) -> Tuple[int, int, int, int]:
+        return element_colour(self.cp)
 
-        if self.cp.strength_density == 0:
-            return WHITE
-        elif self.cp.strength_density > 0:
-            return (
-                255,
-                128*(1-round(np.tanh(self.cp.strength_density/50))),
-                128*(1-round(np.tanh(self.cp.strength_density/50))),
-                255
-            )
-        else:
-            return (
-                128*(1-round(np.tanh(-self.cp.strength_density/50))),
-                128*(1-round(np.tanh(-self.cp.strength_density/50))),
-                255,
-                255
-            )
-
-    def draw(self, draw_bounds: np.ndarray, batch: pyglet.graphics.Batch) -> Set:
-
-        xstart: float
-        xend: float
-        ystart: float
-        yend: float
-
-        if np.isclose(self.cp.normal[0], 0):
-
-            # Plane is horizontal
-
-            xstart = draw_bounds[0][0]
-            xend = draw_bounds[0][1]
-
-            ystart = self.cp.pos[1]
-            yend = self.cp.pos[1]
-
-        elif np.isclose(self.cp.normal[1], 0):
-
-            # Plane is vertical
-
-            xstart = self.cp.pos[0]
-            xend = self.cp.pos[0]
-
-            ystart = draw_bounds[1][0]
-            yend = draw_bounds[1][1]
-
-        else:
-
-            plane_grad = -self.cp.normal[0] / self.cp.normal[1]
+    @property
+    def depends_on_draw_bounds(self) -> bool:
+        return True
 
-            xstart = draw_bounds[0][0]
-            xend = draw_bounds[0][1]
+    def draw(self, draw_bounds: np.ndarray, scale: float, batch: pyglet.graphics.Batch) -> Set:
 
-            ystart = self.cp.pos[1] + ((xstart - self.cp.pos[0]) * plane_grad)
-            yend = self.cp.pos[1] + ((xend - self.cp.pos[0]) * plane_grad)
+        x1, y1, x2, y2 = charge_plane_screen_segment(self.cp, draw_bounds, scale)
 
         line = pyglet.shapes.Line(
-            x=xstart/settings.VIEWPORT_SCALE_FAC,
-            y=ystart/settings.VIEWPORT_SCALE_FAC,
-            x2=xend/settings.VIEWPORT_SCALE_FAC,
-            y2=yend/settings.VIEWPORT_SCALE_FAC,
+            x=x1,
+            y=y1,
+            x2=x2,
+            y2=y2,
             width=_ChargePlaneRender.WIDTH,
             color=self.get_color(),
             batch=batch
@@ -194,22 +172,9 @@ class _ChargePlaneRender(_FieldElementRenderBase):
 
         return {line}
 
-    def point_in_draw_bounds(self, posx: int, posy: int) -> bool:
-
-        pos_vec_screen = np.array([posx, posy])
-        pos_vec_world = pos_vec_screen*settings.VIEWPORT_SCALE_FAC
-
-        closest_plane_pos_world = vectors.plane_closest_point_to_point(
-            self.cp.pos[np.newaxis, :],
-            self.cp.normal[np.newaxis, :],
-            pos_vec_world[np.newaxis, :]
-        )[0]
-
-        closest_plane_pos_screen = closest_plane_pos_world / settings.VIEWPORT_SCALE_FAC
 
-        sqr_dist = vectors.sqr_magnitudes(closest_plane_pos_screen - pos_vec_screen)[0]
-
-        return sqr_dist <= _ChargePlaneRender.SQR_WIDTH
+FIELD_LINE_PREVIEW_COARSENESS: float = 2.0
+"""How many times fewer lines and longer steps are used for field line previews than for regular field lines"""
 
 
 def _create_element_renderer(ele: ElementBase) -> _FieldElementRenderBase:
@@ -241,21 +206,43 @@ class Window(pyglet.window.Window):
 
         self.__on_exit = on_exit
 
+        self.__viewport = Viewport()
+        self.view_changed_callback: Optional[Callable[[bool], None]] = None
+        """Function run whenever the view is panned or zoomed, with whether the zoom level changed"""
+
         self.field_lines_batch = pyglet.graphics.Batch()
-        self.__field_lines_shapes: Set = set()
+        self.__field_line_tile_shapes: Dict[TileKey, Tuple[FieldLineGeometry, Set]] = {}
+        """The geometry of each line tile currently drawn and the shapes created for it"""
         self.field_elements_batch = pyglet.graphics.Batch()
-        self.__field_elements_shapes: Set = set()
+        self.__field_element_renderers: Dict[ElementBase, _FieldElementRenderBase] = {}
+        """The renderers of the elements currently drawn. Each keeps the shapes for its element"""
 
         self.__preview_ele_pos_gen: Optional[Callable[[np.ndarray], ElementBase]] = None
         """Function to generate a pre-configured (so doesn't require a MenuWindows.AddElementWindow.Config instance) \
 field element for previewing or None if nothing to preview"""
         self.field_element_preview_batch = pyglet.graphics.Batch()
         self.__field_element_preview_shapes: Set = set()
+        self.preview_element_moved_callback: Optional[Callable[[ElementBase], None]] = None
+        """Function run with the preview element whenever it is moved"""
+
+        self.field_line_preview_batch = pyglet.graphics.Batch()
+        self.__field_line_preview_shapes: Set = set()
+        self.__showing_field_line_preview: bool = False
 
         self.add_mode_sprite = pyglet.sprite.Sprite(status_icon_add, x=STATUS_ICON_POSITION[0], y=STATUS_ICON_POSITION[1])
         self.delete_mode_sprite = pyglet.sprite.Sprite(status_icon_delete, x=STATUS_ICON_POSITION[0], y=STATUS_ICON_POSITION[1])
         self.__click_mode_sprite: Optional[pyglet.sprite.Sprite] = None
 
+        self.loading_sprite = pyglet.sprite.Sprite(status_icon_loading, x=LOADING_ICON_POSITION[0], y=LOADING_ICON_POSITION[1])
+        self.__is_loading: bool = False
+
+        self.__heatmap_sprite: Optional[pyglet.sprite.Sprite] = None
+
+        self.__perf_hud_label: Optional[pyglet.text.Label] = None
+        """The label of the performance HUD or None if it isn't being shown"""
+        self.__perf_hud_refresh_timer: float = 0
+        self.__last_draw_time: Optional[float] = None
+
         self.mouse_press_callback = on_mouse_press
         self.key_press_callback = on_key_press
 
@@ -266,10 +253,62 @@ field element for previewing or None if nothing to preview"""
     @property
     def clip_bounds(self) -> np.ndarray:
         """The range of positions in world-space that should be rendered"""
-        return np.array([
-            [0.0, self.width*settings.VIEWPORT_SCALE_FAC],
-            [0.0, self.height*settings.VIEWPORT_SCALE_FAC]
-        ])
+        return self.__viewport.clip_bounds(self.width, self.height)
+
+    @property
+    def scale(self) -> float:
+        """The number of units of distance in the field per pixel of display at the current zoom level"""
+        return self.__viewport.scale
+
+    @property
+    def zoom_level(self) -> int:
+        return self.__viewport.zoom_level
+
+    def screen_to_world(self, posx: float, posy: float) -> np.ndarray:
+        return self.__viewport.screen_to_world(posx, posy)
+
+    def pan(self, dx: float, dy: float) -> None:
+        """Moves the view so that what is shown moves by a screen-space displacement"""
+
+        self.__viewport.pan(dx, dy)
+        self.__view_changed(zoom_changed=False)
+
+    def zoom_at(self, posx: float, posy: float, steps: int) -> None:
+        """Zooms in (or out for negative steps) by some number of zoom levels around a screen-space position"""
+
+        if self.__viewport.zoom_at(posx, posy, steps):
+            self.__view_changed(zoom_changed=True)
+
+    def reset_view(self) -> None:
+        """Goes back to the initial view of the field"""
+
+        zoom_changed = self.__viewport.zoom_level != 0
+
+        self.__viewport.reset()
+        self.__view_changed(zoom_changed)
+
+    def __view_changed(self, zoom_changed: bool) -> None:
+
+        self.switch_to()
+
+        # Elements are drawn in zoom space so only need redrawing when the zoom changes, or if they are infinite
+        for renderer in self.__field_element_renderers.values():
+            if zoom_changed or renderer.depends_on_draw_bounds:
+                renderer.redraw(self.clip_bounds, self.scale, self.field_elements_batch)
+
+        if zoom_changed:
+            self.clear_field_line_preview()
+            self.set_heatmap(None)
+
+        if self.view_changed_callback is not None:
+            self.view_changed_callback(zoom_changed)
+
+    def __zoom_space_view_matrix(self) -> pyglet.math.Mat4:
+        """The view matrix for drawing zoom-space shapes to the screen"""
+
+        offset = self.__viewport.zoom_space_offset
+
+        return pyglet.math.Mat4.from_translation(pyglet.math.Vec3(-offset[0], -offset[1], 0))
 
     def set_click_mode_none(self) -> None:
         self.__click_mode_sprite = None
@@ -280,142 +319,218 @@ field element for previewing or None if nothing to preview"""
     def set_click_mode_delete(self) -> None:
         self.__click_mode_sprite = self.delete_mode_sprite
 
-    def __clear_field_element_shapes(self) -> None:
+    def set_loading(self, is_loading: bool) -> None:
+        self.__is_loading = is_loading
 
-        for shape in self.__field_elements_shapes:
-            shape.delete()
+    def set_heatmap(self,
+                    rgba: Optional[np.ndarray],
+                    pixel_size: float = 1,
+                    position: Tuple[float, float] = (0, 0)) -> None:
+        """Uploads an RGBA image (with row 0 at the bottom) as a texture to show behind the field lines, or stops showing the heatmap if None. \
+The image is drawn in zoom space, so it stays in place when panning but is stopped being shown when the zoom changes
 
-        self.__field_elements_shapes.clear()
+Parameters:
 
-    def draw_field_elements(self,
-                            field: Field) -> None:
-        """Draws the field elements of a field without drawing the field lines"""
+    rgba - a uint8 array with shape (height, width, 4), or None
+
+    pixel_size - the width and height in screen pixels of each pixel of the image
+
+    position - the zoom-space position of the bottom-left corner of the image
+"""
+
+        if self.__heatmap_sprite is not None:
+            self.__heatmap_sprite.delete()
+            self.__heatmap_sprite = None
+
+        if rgba is None:
+            return
+
+        self.switch_to()
+
+        image = pyglet.image.ImageData(
+            rgba.shape[1],
+            rgba.shape[0],
+            "RGBA",
+            np.ascontiguousarray(rgba, dtype=np.uint8).tobytes()
+        )
 
-        self.__clear_field_element_shapes()
+        self.__heatmap_sprite = pyglet.sprite.Sprite(image, x=position[0], y=position[1])
+        self.__heatmap_sprite.scale = pixel_size
 
-        for ele in field.iter_elements():
+    def toggle_perf_hud(self) -> None:
+        """Shows or hides the performance HUD. While hidden, no frame timing is done and the HUD's text isn't updated"""
+
+        if self.__perf_hud_label is None:
 
             self.switch_to()
-            shapes: Set = _create_element_renderer(ele).draw(self.clip_bounds, self.field_elements_batch)
 
-            self.__field_elements_shapes |= shapes
+            self.__perf_hud_label = pyglet.text.Label(
+                "",
+                x=PERF_HUD_MARGIN,
+                y=self.height - PERF_HUD_MARGIN,
+                width=PERF_HUD_WIDTH,
+                anchor_y="top",
+                multiline=True,
+                font_size=10,
+                color=WHITE
+            )
+            self.__perf_hud_refresh_timer = 0
+            self.__last_draw_time = None
 
-    def __clear_field_lines_shapes(self) -> None:
+            perf_stats.record_frame_times = True
 
-        for shape in self.__field_lines_shapes:
-            shape.delete()
+        else:
 
-        self.__field_lines_shapes.clear()
+            self.__perf_hud_label.delete()
+            self.__perf_hud_label = None
 
-    def draw_field_lines(self,
-                         field: Field) -> None:
-        """Draws the field lines of a field without drawing the field elements"""
+            perf_stats.record_frame_times = False
+            perf_stats.frame_times.clear()
 
-        self.__clear_field_lines_shapes()
+    def __refresh_perf_hud(self) -> None:
 
-        # Generate field line generation data
+        assert self.__perf_hud_label is not None
 
-        line_starts_list = []
-        postives_list = []
+        perf_stats.field_element_shape_count = sum(renderer.shape_count for renderer in self.__field_element_renderers.values())
 
-        for ele in field.iter_elements():
+        self.__perf_hud_label.y = self.height - PERF_HUD_MARGIN
+        self.__perf_hud_label.text = "\n".join(perf_stats.summary_lines())
 
-            starts, pos = ele.get_field_line_starts(self.clip_bounds, fac=settings.field_line_count_factor)
-            line_starts_list.append(starts)
-            postives_list.append(pos)
+    def add_field_element(self, ele: ElementBase) -> None:
+        """Draws a single field element, keeping its shapes until it is removed"""
 
-        if len(line_starts_list) == 0:
+        if ele in self.__field_element_renderers:
             return
 
-        line_starts = np.concatenate(line_starts_list)
-        positives = np.concatenate(postives_list)
+        self.switch_to()
 
-        # Generate field line data
+        renderer = _create_element_renderer(ele)
+        renderer.redraw(self.clip_bounds, self.scale, self.field_elements_batch)
 
-        with Timer("Trace Lines"):  # TODO - remove timers when ready
-            field_lines = field.trace_field_lines(
-                line_starts,
-                settings.field_line_trace_max_step_count,
-                positives,
-                clip_ranges=self.clip_bounds
-            )
+        self.__field_element_renderers[ele] = renderer
 
-        # Plot calculated lines
+    def remove_field_element(self, ele: ElementBase) -> None:
+        """Deletes the shapes of a single drawn field element"""
 
-        with Timer("Plot Lines"):  # TODO - remove timers when ready
-            self.__add_field_lines(field_lines, positives)
+        renderer = self.__field_element_renderers.pop(ele, None)
 
-    def __add_field_lines(self,
-                          lines: np.ndarray,
-                          positives: np.ndarray) -> None:
+        if renderer is not None:
+            renderer.delete_shapes()
 
-        assert lines.shape[0] == positives.shape[0]
+    def update_field_element(self, ele: ElementBase) -> None:
+        """Recreates the shapes of a single drawn field element, for if it has been changed"""
 
-        for i in range(lines.shape[0]):
-            points = lines[i]
-            positive = positives[i]
-            self.__add_field_line(points, positive)
+        renderer = self.__field_element_renderers.get(ele)
 
-    def __add_field_line(self,
-                         points: np.ndarray,
-                         positive: bool) -> None:
+        if renderer is not None:
+            self.switch_to()
+            renderer.redraw(self.clip_bounds, self.scale, self.field_elements_batch)
+        else:
+            self.add_field_element(ele)
 
-        self.switch_to()
+    def draw_field_elements(self,
+                            field: Field) -> None:
+        """Makes the drawn field elements match those of a field without drawing the field lines. \
+Elements that are already drawn keep their shapes"""
 
-        # If not enough points then don't draw anything
+        field_eles = list(field.iter_elements())
+        field_ele_set = set(field_eles)
 
-        if points.shape[0] <= 1:
-            return
+        for ele in [ele for ele in self.__field_element_renderers if ele not in field_ele_set]:
+            self.remove_field_element(ele)
 
-        # Draw parts of line
+        for ele in field_eles:
+            self.add_field_element(ele)
+
+    def __clear_field_lines_shapes(self) -> None:
 
-        prev = points[0]
-        last_arrowhead_pos = prev/settings.VIEWPORT_SCALE_FAC  # N.B. not drawing arrohead at start
+        for _, shapes in self.__field_line_tile_shapes.values():
+            for shape in shapes:
+                shape.delete()
 
-        for curr in points[1:]:
+        self.__field_line_tile_shapes.clear()
 
-            if np.any(curr == np.inf):
-                break
+    def __create_field_line_shapes(self,
+                                   geometry: FieldLineGeometry,
+                                   batch: pyglet.graphics.Batch) -> Set:
 
-            # If point is repeated (probably meaning the line was clipped) then stop drawing
-            if np.all(np.isclose(prev, curr)):
-                break
+        shapes: Set = set()
 
-            x1 = prev[0]/settings.VIEWPORT_SCALE_FAC
-            y1 = prev[1]/settings.VIEWPORT_SCALE_FAC
-            x2 = curr[0]/settings.VIEWPORT_SCALE_FAC
-            y2 = curr[1]/settings.VIEWPORT_SCALE_FAC
+        for x1, y1, x2, y2 in geometry.segments:
 
             line = pyglet.shapes.Line(
                 x1, y1,
                 x2, y2,
-                batch=self.field_lines_batch
+                batch=batch
             )
-            self.__field_lines_shapes.add(line)
+            shapes.add(line)
 
-            screen_pos = np.array([x2,y2])
+        for x1, y1, x2, y2, x3, y3 in geometry.arrowheads:
 
-            if settings.show_field_line_arrows:
+            arrowhead = pyglet.shapes.Triangle(
+                x1, y1,
+                x2, y2,
+                x3, y3,
+                batch=batch
+            )
+            shapes.add(arrowhead)
+
+        return shapes
+
+    def draw_field_line_tiles(self,
+                              tiles: Dict[TileKey, FieldLineGeometry]) -> None:
+        """Makes the drawn field lines be those of some line tiles. \
+Tiles that are already drawn with the same geometry keep their shapes"""
+
+        self.switch_to()
+
+        with metrics.timer("render.plot") as plot_timer:
+
+            for key in [key for key in self.__field_line_tile_shapes if key not in tiles]:
+                for shape in self.__field_line_tile_shapes.pop(key)[1]:
+                    shape.delete()
 
-                if vectors.magnitudes(last_arrowhead_pos-screen_pos)[0] >= settings.field_line_render_arrowhead_spacing:
+            for key, geometry in tiles.items():
 
-                    line_dir = (curr-prev) / vectors.magnitudes(curr-prev)[0] * (1 if positive else -1)
-                    line_norm = np.array([line_dir[1], -line_dir[0]])
-                    arrowhead_tip = screen_pos + (line_dir*ARROWHEAD_LENGTH)
-                    arrowhead_side1 = screen_pos + (line_norm*ARROWHEAD_LENGTH/2)
-                    arrowhead_side2 = screen_pos - (line_norm*ARROWHEAD_LENGTH/2)
+                drawn = self.__field_line_tile_shapes.get(key)
 
-                    arrowhead = pyglet.shapes.Triangle(
-                        arrowhead_tip[0], arrowhead_tip[1],
-                        arrowhead_side1[0], arrowhead_side1[1],
-                        arrowhead_side2[0], arrowhead_side2[1],
-                        batch=self.field_lines_batch
-                    )
-                    self.__field_lines_shapes.add(arrowhead)
+                if (drawn is not None) and (drawn[0] is geometry):
+                    continue
 
-                    last_arrowhead_pos = screen_pos
+                if drawn is not None:
+                    for shape in drawn[1]:
+                        shape.delete()
 
-            prev = curr
+                self.__field_line_tile_shapes[key] = (geometry, self.__create_field_line_shapes(geometry, self.field_lines_batch))
+
+        shape_count = sum(len(shapes) for _, shapes in self.__field_line_tile_shapes.values())
+
+        perf_stats.record_plot(plot_timer.elapsed_ms, shape_count)
+        metrics.set_gauge("render.field_line_shapes", shape_count)
+
+    def __clear_field_line_preview_shapes(self) -> None:
+
+        for shape in self.__field_line_preview_shapes:
+            shape.delete()
+
+        self.__field_line_preview_shapes.clear()
+
+    def draw_field_line_preview(self,
+                                geometry: FieldLineGeometry) -> None:
+        """Shows preview field lines instead of the field lines until the preview is cleared"""
+
+        self.switch_to()
+
+        self.__clear_field_line_preview_shapes()
+
+        self.__field_line_preview_shapes = self.__create_field_line_shapes(geometry, self.field_line_preview_batch)
+        self.__showing_field_line_preview = True
+
+    def clear_field_line_preview(self) -> None:
+        """Stops showing preview field lines and goes back to showing the field lines"""
+
+        self.__clear_field_line_preview_shapes()
+        self.__showing_field_line_preview = False
 
     def set_preview_element(self, ele_pos_gen: Optional[Callable[[np.ndarray], ElementBase]]) -> None:
         self.__preview_ele_pos_gen = ele_pos_gen
@@ -436,16 +551,19 @@ field element for previewing or None if nothing to preview"""
 
         if self.__preview_ele_pos_gen is not None:
 
-            world_space_pos = np.array([posx, posy], dtype=float) * settings.VIEWPORT_SCALE_FAC
+            world_space_pos = self.screen_to_world(posx, posy)
             ele = self.__preview_ele_pos_gen(world_space_pos)
 
             renderer = _create_element_renderer(ele)
 
-            self.__field_element_preview_shapes |= renderer.draw(self.clip_bounds, self.field_element_preview_batch)
+            self.__field_element_preview_shapes |= renderer.draw(self.clip_bounds, self.scale, self.field_element_preview_batch)
+
+            if self.preview_element_moved_callback is not None:
+                self.preview_element_moved_callback(ele)
 
     def clear_screen(self) -> None:
 
-        self.__field_lines_shapes.clear()
+        self.__clear_field_lines_shapes()
 
     def round_float_pos(self, pos: np.ndarray) -> np.ndarray:
 
@@ -458,26 +576,83 @@ field element for previewing or None if nothing to preview"""
 
         self.switch_to()
 
-        self.field_lines_batch.draw()
+        # Zoom-space shapes
+
+        self.view = self.__zoom_space_view_matrix()
+
+        if self.__heatmap_sprite is not None:
+            self.__heatmap_sprite.draw()
+
+        if self.__showing_field_line_preview:
+            self.field_line_preview_batch.draw()
+        else:
+            self.field_lines_batch.draw()
 
         self.field_elements_batch.draw()
 
         self.field_element_preview_batch.draw()
 
+        # Screen-space overlays
+
+        self.view = pyglet.math.Mat4()
+
         if self.__click_mode_sprite is not None:
             self.__click_mode_sprite.draw()
 
+        if self.__is_loading:
+            self.loading_sprite.draw()
+
+        if self.__perf_hud_label is not None:
+
+            now = perf_counter()
+
+            if self.__last_draw_time is not None:
+                perf_stats.record_frame(now - self.__last_draw_time)
+
+            self.__last_draw_time = now
+
+            self.__perf_hud_label.draw()
+
     def update(self, delta_time: float) -> None:
 
         self.__lifetime += delta_time
 
+        if self.__perf_hud_label is not None:
+
+            self.__perf_hud_refresh_timer -= delta_time
+
+            if self.__perf_hud_refresh_timer <= 0:
+                self.__refresh_perf_hud()
+                self.__perf_hud_refresh_timer = PERF_HUD_REFRESH_INTERVAL
+
     def on_mouse_press(self, x, y, button, modifiers):
+
+        # Pressing a pan button starts panning so isn't a click
+
+        if button & PAN_MOUSE_BUTTONS:
+            return
+
         self.mouse_press_callback(x, y, button, modifiers)
 
     def on_mouse_motion(self, x, y, dx, dy):
 
         self.__set_field_element_preview_pos(x, y)
 
+    def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
+
+        if buttons & PAN_MOUSE_BUTTONS:
+            self.pan(dx, dy)
+
+        self.__set_field_element_preview_pos(x, y)
+
+    def on_mouse_scroll(self, x, y, scroll_x, scroll_y):
+
+        steps = int(np.sign(scroll_y))
+
+        if steps != 0:
+            self.zoom_at(x, y, steps)
+            self.__set_field_element_preview_pos(x, y)
+
     def on_key_press(self, sym, mods):
 
         # Stop escape from closing the window
@@ -520,19 +695,303 @@ class Controller:
         else:
             self.__field = Field()
 
+        self.__tile_worker = LineTileWorker()
+        self.__tile_cache = LineTileCache()
+        self.__showing_field_lines: bool = False
+        """Whether field lines have been requested since the field was last edited, so should be traced for newly-shown regions"""
+        self.__line_store: Optional[FieldLineStore] = None
+        """Saved line tiles to draw instead of tracing them, while they are valid for the field and the settings"""
+        self.__window.view_changed_callback = self.__view_changed
+
+        self.__preview_worker = RecalculationWorker(record_stats=False)
+        self.__preview_base_field: Optional[Field] = None
+        """A copy of the field submitted for each field line preview until the field is edited, so that the preview worker can reuse its lines"""
+        self.__preview_job_id: Optional[int] = None
+        """The id of the latest field line preview job, if it was requested since the field was last edited. Only its result is drawn"""
+        self.__preview_element: Optional[ElementBase] = None
+        """The most recent preview element whose field line preview hasn't been requested yet"""
+        self.__window.preview_element_moved_callback = self.__preview_element_moved
+
+        self.__heatmap_worker = HeatmapWorker()
+        self.__heatmap_key: Optional[Tuple] = None
+        """What the latest heatmap was requested for, or None if no heatmap is being shown"""
+
+        self.__hit_index = ElementHitIndex(
+            point_radius=_PointSourceRender.RADIUS,
+            plane_width=_ChargePlaneRender.WIDTH
+        )
+        self.__hit_index.rebuild(self.__field)
+
+        self.__journal: Optional[FieldJournal] = None
+        """The journal of the file that the field was loaded from or saved to, which edits to the field are recorded in"""
+        self.__edit_lock = Lock()
+        """Held while editing the field and recording the edit, so that the journal is never saved between the two"""
+
     def get_field(self) -> Field:
         return self.__field
 
-    def set_field(self, field: Field) -> None:
-        self.__field = field
+    def set_field(self, field: Field, journal: Optional[FieldJournal] = None) -> None:
+        """Sets the field being shown, and the journal of the file it was loaded from if it has one"""
+
+        with self.__edit_lock:
+            self.__field = field
+            self.__journal = journal
+
+        self.__line_store = None
+        self.__hit_index.rebuild(field)
+        self.__field_edited()
+
+    @property
+    def has_journal(self) -> bool:
+        return self.__journal is not None
+
+    def start_journal(self, filename: str) -> None:
+        """Saves the field to a .field file and starts recording its edits in a journal for the file"""
+
+        with self.__edit_lock:
+            self.__journal = FieldJournal.create(self.__field, filename)
+
+    def stop_journal(self) -> None:
+        """Stops recording edits to the field, for when it is saved to a file without a journal"""
+
+        with self.__edit_lock:
+            self.__journal = None
+
+    def save_journal(self) -> bool:
+        """Saves the field's edits since the last save to its file's journal. Returns False if the field has no journal"""
+
+        with self.__edit_lock:
+
+            if self.__journal is None:
+                return False
+
+            self.__journal.save(self.__field)
+
+            return True
+
+    @property
+    def has_unsaved_edits(self) -> bool:
+        """Whether the field's journal has edits that haven't been saved"""
+        journal = self.__journal
+        return (journal is not None) and journal.has_unsaved_operations
+
+    def load_field_lines(self, filename: str) -> None:
+        """Uses the line tiles saved in a file (if it exists) instead of tracing them, for as long as they are valid for the field and the settings"""
+
+        try:
+            self.__line_store = FieldLineStore.load(filename)
+        except (OSError, InvalidBinaryFileException, KeyError):
+            self.__line_store = None
+
+    def save_field_lines(self, filename: str) -> None:
+        """Saves the line tiles traced for the field with the current settings to a file"""
+
+        base_config = TraceConfig.from_settings()
+        params = tile_store_params(base_config, self.__tile_trace_margin)
+
+        store = FieldLineStore(self.__field.content_hash, params)
+
+        # Loaded tiles that are still valid are kept even if they haven't been shown
+
+        if self.__valid_line_store(base_config) is not None:
+            for key, lines in self.__line_store.items():  # type: ignore
+                store.put(key, lines)
+
+        if self.__tile_cache.context == self.__tile_context(base_config):
+            for key, lines in self.__tile_cache.iter_lines():
+                store.put(key, lines)
+
+        store.save(filename)
+
+    def __valid_line_store(self, base_config: TraceConfig) -> Optional[FieldLineStore]:
+        """The loaded line tiles if they are valid for the field and the config, discarding them if they aren't"""
+
+        if (self.__line_store is not None) \
+            and (not self.__line_store.matches(self.__field.content_hash, tile_store_params(base_config, self.__tile_trace_margin))):
+            self.__line_store = None
+
+        return self.__line_store
+
+    def __field_edited(self) -> None:
+        self.__preview_base_field = None
+        self.__preview_job_id = None
+        self.__showing_field_lines = False
+        self.__window.clear_field_line_preview()
+
+    def screen_to_world(self, posx: float, posy: float) -> np.ndarray:
+        return self.__window.screen_to_world(posx, posy)
+
+    @property
+    def is_recalculating(self) -> bool:
+        """Whether there are line tiles waiting or being traced"""
+        return self.__tile_worker.is_busy
 
     def recalculate(self) -> None:
+        """Redraws the field elements and requests the field lines of the shown region to be recalculated in the background. \
+Line tiles already traced for the field with the current settings are reused"""
+
+        self.__window.draw_field_elements(self.__field)
+
+        self.__showing_field_lines = True
+        self.__request_shown_tiles()
+
+    @property
+    def __tile_trace_margin(self) -> int:
+        """How many tiles beyond each tile its lines are traced for, so that lines reach the edges of the window"""
+        return tile_trace_margin(self.__window.width, self.__window.height)
+
+    def __tile_context(self, base_config: TraceConfig) -> Hashable:
+        """What the line tiles are traced for. Tiles traced for a different context aren't drawn"""
+        return (self.__field.version, base_config.key, self.__tile_trace_margin)
+
+    def __shown_tile_keys(self) -> List[TileKey]:
+        """The line tiles whose lines can be in the shown region, ordered by how close they are to its centre"""
+        return tiles_covering(self.__window.clip_bounds, self.__window.zoom_level, margin=TILE_TRACE_MARGIN)
+
+    def __request_shown_tiles(self) -> None:
+        """Draws the cached line tiles for the shown region and requests any that are missing to be traced"""
+
+        base_config = TraceConfig.from_settings()
+        context = self.__tile_context(base_config)
+
+        self.__tile_cache.set_context(context)
+
+        shown_keys = self.__shown_tile_keys()
+        missing_keys: List[TileKey] = []
+
+        line_store = self.__valid_line_store(base_config)
+
+        for key in shown_keys:
+
+            hit = key in self.__tile_cache
+            perf_stats.record_cache_access("Line tiles", hit)
+
+            if hit:
+                continue
 
-        self.redraw_only_elements()
-        self.__window.draw_field_lines(self.__field)
+            stored_lines = line_store.get(key) if line_store is not None else None
+
+            if stored_lines is not None:
+                config = base_config.rescaled(Viewport.scale_of_zoom_level(key[0]))
+                self.__tile_cache.put(key, build_tile_geometry(stored_lines, config), stored_lines)
+            else:
+                missing_keys.append(key)
+
+        if len(missing_keys) > 0:
+            self.__tile_worker.submit(self.__field.copy(), context, base_config, missing_keys, margin=self.__tile_trace_margin)
+
+        self.__draw_shown_tiles(shown_keys)
+
+    def __draw_shown_tiles(self, shown_keys: List[TileKey]) -> None:
+
+        tiles: Dict[TileKey, FieldLineGeometry] = {}
+
+        for key in shown_keys:
+
+            geometry = self.__tile_cache.get(key)
+
+            if geometry is not None:
+                tiles[key] = geometry
+
+        self.__window.draw_field_line_tiles(tiles)
+
+    def __view_changed(self, zoom_changed: bool) -> None:
+
+        if self.__showing_field_lines:
+            self.__request_shown_tiles()
+
+    def update(self, delta_time: float) -> None:
+        """Applies any finished recalculation to the window. Must be run on the thread running the Pyglet event loop"""
+
+        tiles_received = False
+
+        for context, key, geometry, lines in self.__tile_worker.take_results():
+            if context == self.__tile_cache.context:
+                self.__tile_cache.put(key, geometry, lines)
+                tiles_received = True
+
+        if tiles_received and self.__showing_field_lines:
+            self.__draw_shown_tiles(self.__shown_tile_keys())
+
+        self.__window.set_loading(self.__tile_worker.is_busy)
+
+        # Field line previews are requested at most once per update so that they are throttled to the update rate
+
+        if self.__preview_element is not None:
+            self.__request_field_line_preview(self.__preview_element)
+            self.__preview_element = None
+
+        preview_result = self.__preview_worker.take_result()
+
+        if (preview_result is not None) and (preview_result.job_id == self.__preview_job_id):
+            self.__window.draw_field_line_preview(preview_result.geometry)
+
+        self.__update_heatmap()
+
+    def __update_heatmap(self) -> None:
+        """Requests the heatmap to be re-rendered in the background if the field or the viewport has changed since it was last requested, \
+and shows the heatmaps rendered for the field"""
+
+        if not settings.show_heatmap:
+
+            if self.__heatmap_key is not None:
+                self.__window.set_heatmap(None)
+                self.__heatmap_key = None
+
+            return
+
+        raster_bounds, width, height = raster_covering(self.__window.clip_bounds, self.__window.width, self.__window.height, HEATMAP_PIXEL_SIZE)
+
+        key = (self.__field.version, raster_bounds.tobytes(), width, height, settings.heatmap_show_field_strength)
+
+        if key != self.__heatmap_key:
+
+            self.__heatmap_worker.submit(
+                self.__field.copy(),
+                raster_bounds,
+                width,
+                height,
+                show_field_strength=settings.heatmap_show_field_strength,
+                context=self.__field.version
+            )
+
+            self.__heatmap_key = key
+
+        # Heatmaps rendered for an earlier viewport are shown in their place until the latest is rendered, but not those of an earlier field
+
+        result = self.__heatmap_worker.take_result()
+
+        if (result is not None) and (result.context == self.__field.version):
+
+            scale = self.__window.scale
+            cell_size = (result.clip_bounds[0, 1] - result.clip_bounds[0, 0]) / result.rgba.shape[1]
+
+            self.__window.set_heatmap(
+                result.rgba,
+                pixel_size=cell_size / scale,
+                position=(result.clip_bounds[0, 0] / scale, result.clip_bounds[1, 0] / scale)
+            )
+
+    def __preview_element_moved(self, ele: ElementBase) -> None:
+
+        if settings.live_field_line_preview:
+            self.__preview_element = ele
+
+    def __request_field_line_preview(self, ele: ElementBase) -> None:
+
+        if self.__preview_base_field is None:
+            self.__preview_base_field = self.__field.copy()
+
+        self.__preview_job_id = self.__preview_worker.submit(
+            self.__preview_base_field,
+            self.__window.clip_bounds,
+            config=TraceConfig.from_settings(self.__window.scale).coarsened(FIELD_LINE_PREVIEW_COARSENESS),
+            extra_elements=[ele]
+        )
 
     def redraw_only_elements(self) -> None:
 
+        self.__showing_field_lines = False
         self.__window.clear_screen()
         self.__window.draw_field_elements(self.__field)
 
@@ -541,24 +1000,66 @@ class Controller:
 
     def disable_element_preview(self) -> None:
         self.__window.clear_preview_element()
+        self.__preview_element = None
+        self.__preview_base_field = None
+        self.__preview_job_id = None
+        self.__window.clear_field_line_preview()
 
     def add_field_element(self, ele: ElementBase) -> None:
 
-        self.__field.add_element(ele)
+        with self.__edit_lock:
+
+            self.__field.add_element(ele)
+
+            if self.__journal is not None:
+                self.__journal.record_add(ele)
+
+        self.__hit_index.add(ele)
+        self.__field_edited()
+
+        self.__window.clear_screen()
+        self.__window.add_field_element(ele)
 
-        self.redraw_only_elements()
+    def replace_field_element(self, old: ElementBase, new: ElementBase) -> None:
+
+        with self.__edit_lock:
+
+            if self.__journal is not None:
+                self.__journal.record_modify(self.__field.index_of(old), new)
+
+            self.__field.replace_element(old, new)
+
+        self.__hit_index.replace(old, new)
+        self.__field_edited()
+
+        self.__window.clear_screen()
+        self.__window.remove_field_element(old)
+        self.__window.add_field_element(new)
 
     def try_delete_field_element_at(self, posx: int, posy: int) -> bool:
         """Tries to remove an element at the screen position specified. Returns whether one was found"""
 
-        for ele in self.__field.iter_elements():
+        world_pos = self.__window.screen_to_world(posx, posy)
 
-            if _create_element_renderer(ele).point_in_draw_bounds(posx, posy):
-                self.__field.remove_element(ele)
-                self.redraw_only_elements()
-                return True
+        ele = self.__hit_index.find_at(world_pos[0], world_pos[1], self.__window.scale)
 
-        return False
+        if ele is None:
+            return False
+
+        with self.__edit_lock:
+
+            if self.__journal is not None:
+                self.__journal.record_remove(self.__field.index_of(ele))
+
+            self.__field.remove_element(ele)
+
+        self.__hit_index.remove(ele)
+        self.__field_edited()
+
+        self.__window.clear_screen()
+        self.__window.remove_field_element(ele)
+
+        return True
 
     def set_click_mode_none(self):
         self.__window.set_click_mode_none()
@@ -569,6 +1070,12 @@ class Controller:
     def set_click_mode_delete(self):
         self.__window.set_click_mode_delete()
 
+    def toggle_perf_hud(self):
+        self.__window.toggle_perf_hud()
+
+    def reset_view(self):
+        self.__window.reset_view()
+
     def activate_window(self):
         self.__window.activate()
 
@@ -634,9 +1141,10 @@ Returns:
 
     controller = Controller(window)  # Create window's controller
 
-    # Schedule window's update function
+    # Schedule window's and controller's update functions
 
     pyglet.clock.schedule_interval(window.update, 1/30)
+    pyglet.clock.schedule_interval(controller.update, 1/30)
 
     # Return the window controller
 